@@ -0,0 +1,392 @@
+# Copyright 2014 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the
+#    License. You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing,
+#    software distributed under the License is distributed on an "AS
+#    IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+#    express or implied. See the License for the specific language
+#    governing permissions and limitations under the License.
+
+import datetime
+
+import github
+from six.moves.urllib import parse
+
+from tugboat import requester
+from tugboat import rest
+
+
+BASE_URL = 'https://api.github.com'
+EPOCH = datetime.datetime(2014, 1, 1, 0, 0, 0)
+
+
+def _timestamp(seconds):
+    """
+    Convert an offset in seconds from ``EPOCH`` into a Github
+    timestamp string.
+    """
+
+    return (EPOCH + datetime.timedelta(seconds=seconds)).strftime(
+        '%Y-%m-%dT%H:%M:%SZ')
+
+
+class FakeGithub(object):
+    """
+    An in-memory Github API server.  An instance is installed as the
+    innermost middleware of a real ``github.Github`` handle, so the
+    real PyGithub objects--with their lazy completion and
+    pagination--are exercised without any network access.  Every
+    request reaching the server is counted.
+    """
+
+    per_page = 30
+
+    def __init__(self):
+        self.repos = {}
+        self.users = {}
+        self.orgs = {}
+        self.counter = requester.RequestCounter()
+        self._next_id = 1
+
+    def add_user(self, login, name=None):
+        """
+        Add a user to the server.  Returns the user data.
+        """
+
+        self.users.setdefault(login, {
+            'login': login,
+            'id': self._allocate_id(),
+            'name': name,
+            'repos': [],
+        })
+        return self.users[login]
+
+    def add_org(self, login):
+        """
+        Add an organization to the server.  Returns the organization
+        data.
+        """
+
+        self.orgs.setdefault(login, {
+            'login': login,
+            'id': self._allocate_id(),
+            'repos': [],
+        })
+        return self.orgs[login]
+
+    def add_repo(self, full_name, pulls=0, authors=('author',)):
+        """
+        Add a repository to the server, with the designated number of
+        open pull requests.  The pull requests are proposed by the
+        listed authors in rotation; authors which are not yet known
+        are added as users with no name.  Returns the repository data.
+        """
+
+        owner = full_name.split('/')[0]
+        if owner in self.orgs:
+            self.orgs[owner]['repos'].append(full_name)
+        else:
+            self.add_user(owner)['repos'].append(full_name)
+
+        repo = {
+            'full_name': full_name,
+            'id': self._allocate_id(),
+            'pulls': [],
+        }
+        self.repos[full_name] = repo
+
+        for idx in range(pulls):
+            author = authors[idx % len(authors)]
+            self.add_user(author)
+            repo['pulls'].append({
+                'number': idx + 1,
+                'user': author,
+                'created_at': _timestamp(idx * 60),
+                'updated_at': _timestamp(idx * 60 + 30),
+                'mergeable': idx % 2 == 0,
+                'state': 'open',
+            })
+
+        return repo
+
+    def update_pull(self, full_name, number, seconds, **changes):
+        """
+        Update a pull request, as of the designated offset in seconds
+        from ``EPOCH``.  Returns the pull request data.
+        """
+
+        for pull in self.repos[full_name]['pulls']:
+            if pull['number'] == number:
+                pull.update(changes, updated_at=_timestamp(seconds))
+                return pull
+
+        raise KeyError(number)
+
+    def close_pull(self, full_name, number, seconds):
+        """
+        Close a pull request, as of the designated offset in seconds
+        from ``EPOCH``.  Returns the pull request data.
+        """
+
+        return self.update_pull(full_name, number, seconds, state='closed')
+
+    def github(self):
+        """
+        Construct a ``github.Github`` handle served by this fake.
+        """
+
+        gh = github.Github(base_url=BASE_URL)
+        requester.add_middleware(gh, self)
+        requester.add_middleware(gh, self.counter)
+        return gh
+
+    def rest_client(self):
+        """
+        Construct a ``tugboat.rest.Client`` served by this fake.
+        """
+
+        client = rest.Client(base_url=BASE_URL)
+        requester.add_middleware(client, self)
+        requester.add_middleware(client, self.counter)
+        return client
+
+    def breakdown(self):
+        """
+        Summarize the requests counted so far by endpoint.  Returns a
+        dictionary mapping endpoint names, such as "pull" or
+        "repo_pulls", to request counts.
+        """
+
+        result = {}
+        for verb, url in self.counter.requests:
+            parts = parse.urlparse(url).path.strip('/').split('/')
+            if parts[0] == 'repos':
+                name = '_'.join(['repo'] + parts[3:4])
+                if len(parts) == 5 and parts[3] == 'pulls':
+                    name = 'pull'
+            elif parts[0] in ('users', 'orgs'):
+                name = '_'.join([parts[0][:-1]] + parts[2:3])
+            else:
+                name = parts[0]
+            result[name] = result.get(name, 0) + 1
+        return result
+
+    def _allocate_id(self):
+        """
+        Allocate an object ID.
+        """
+
+        self._next_id += 1
+        return self._next_id - 1
+
+    def _user_json(self, login, complete=False):
+        """
+        Build the JSON representation of a user.
+        """
+
+        user = self.users[login]
+        result = {
+            'login': login,
+            'id': user['id'],
+            'url': '%s/users/%s' % (BASE_URL, login),
+            'repos_url': '%s/users/%s/repos' % (BASE_URL, login),
+            'type': 'User',
+        }
+        if complete:
+            result['name'] = user['name']
+        return result
+
+    def _owner_json(self, login):
+        """
+        Build the JSON representation of a repository owner.
+        """
+
+        if login in self.orgs:
+            return {
+                'login': login,
+                'id': self.orgs[login]['id'],
+                'url': '%s/orgs/%s' % (BASE_URL, login),
+                'type': 'Organization',
+            }
+        return self._user_json(login)
+
+    def _org_json(self, login):
+        """
+        Build the JSON representation of an organization.
+        """
+
+        return {
+            'login': login,
+            'id': self.orgs[login]['id'],
+            'url': '%s/orgs/%s' % (BASE_URL, login),
+            'repos_url': '%s/orgs/%s/repos' % (BASE_URL, login),
+            'type': 'Organization',
+        }
+
+    def _repo_json(self, full_name):
+        """
+        Build the JSON representation of a repository.
+        """
+
+        repo = self.repos[full_name]
+        return {
+            'full_name': full_name,
+            'name': full_name.split('/')[1],
+            'id': repo['id'],
+            'owner': self._owner_json(full_name.split('/')[0]),
+            'url': '%s/repos/%s' % (BASE_URL, full_name),
+            'html_url': 'https://github.com/%s' % full_name,
+            'open_issues_count': len([pull for pull in repo['pulls']
+                                      if pull.get('state', 'open') == 'open']),
+        }
+
+    def _pull_json(self, full_name, pull, complete=False):
+        """
+        Build the JSON representation of a pull request.
+        """
+
+        number = pull['number']
+        result = {
+            'number': number,
+            'id': self.repos[full_name]['id'] * 10000 + number,
+            'state': pull.get('state', 'open'),
+            'url': '%s/repos/%s/pulls/%d' % (BASE_URL, full_name, number),
+            'html_url': 'https://github.com/%s/pull/%d' % (full_name, number),
+            'created_at': pull['created_at'],
+            'updated_at': pull['updated_at'],
+            'user': self._user_json(pull['user']),
+            'head': {
+                'label': '%s:branch%d' % (pull['user'], number),
+                'ref': 'branch%d' % number,
+                'sha': '%040x' % (number * 7919),
+            },
+            'base': {
+                'label': '%s:master' % full_name.split('/')[0],
+                'ref': 'master',
+                'sha': '%040x' % pull.get('base_commit', 1),
+            },
+        }
+        if complete:
+            result['mergeable'] = pull['mergeable']
+        return result
+
+    def _paginate(self, url, items, parameters):
+        """
+        Return one page of a list, with an appropriate "Link" header.
+        """
+
+        per_page = int(parameters.get('per_page', self.per_page))
+        page = int(parameters.get('page', 1))
+        pages = max((len(items) + per_page - 1) // per_page, 1)
+
+        headers = {}
+        if page < pages:
+            query = dict(parameters, per_page=per_page)
+            links = []
+            for rel, num in (('next', page + 1), ('last', pages)):
+                query['page'] = num
+                links.append('<%s?%s>; rel="%s"' %
+                             (url, parse.urlencode(sorted(query.items())),
+                              rel))
+            headers['link'] = ', '.join(links)
+
+        return headers, items[(page - 1) * per_page:page * per_page]
+
+    def _list_pulls(self, full_name, parameters):
+        """
+        Select the pull requests of a repository to list, honoring
+        the "state", "sort", and "direction" parameters.  Only sorting
+        by creation, the default, and by last update is supported.
+        """
+
+        state = parameters.get('state', 'open')
+        pulls = [pull for pull in self.repos[full_name]['pulls']
+                 if state == 'all' or pull.get('state', 'open') == state]
+
+        key = 'updated_at' if parameters.get('sort') == 'updated' else \
+            'created_at'
+        default = 'asc' if key == 'created_at' else 'desc'
+        pulls.sort(key=lambda pull: pull[key],
+                   reverse=parameters.get('direction', default) == 'desc')
+
+        return [self._pull_json(full_name, pull) for pull in pulls]
+
+    def _list_all(self, url, parameters):
+        """
+        Return one page of the list of all repositories, which is
+        ordered by ID and paginated by the ID to start after.
+        """
+
+        per_page = int(parameters.get('per_page', self.per_page))
+        since = int(parameters.get('since', 0))
+        names = sorted((repo['id'], name) for name, repo in self.repos.items()
+                       if repo['id'] > since)
+
+        headers = {}
+        if len(names) > per_page:
+            query = dict(parameters, per_page=per_page,
+                         since=names[per_page - 1][0])
+            headers['link'] = '<%s?%s>; rel="next"' % (
+                url, parse.urlencode(sorted(query.items())))
+
+        return headers, [self._repo_json(name)
+                         for _id, name in names[:per_page]]
+
+    def __call__(self, call, verb, url, parameters=None, headers=None,
+                 input=None, **kwargs):
+        """
+        Serve a request.  The ``call`` argument is ignored; no request
+        ever proceeds past this middleware.
+        """
+
+        parsed = parse.urlparse(url)
+        path = parsed.path
+        if path.startswith(parse.urlparse(BASE_URL).path):
+            path = path[len(parse.urlparse(BASE_URL).path):]
+        params = dict(parse.parse_qsl(parsed.query))
+        params.update(parameters or {})
+        base = '%s%s' % (BASE_URL, path)
+        parts = path.strip('/').split('/')
+
+        if verb == 'GET':
+            if parts[0] == 'repos' and len(parts) >= 3:
+                full_name = '/'.join(parts[1:3])
+                if full_name in self.repos:
+                    if len(parts) == 3:
+                        return {}, self._repo_json(full_name)
+                    pulls = self.repos[full_name]['pulls']
+                    if parts[3:] == ['pulls']:
+                        return self._paginate(
+                            base, self._list_pulls(full_name, params), params)
+                    if len(parts) == 5 and parts[3] == 'pulls':
+                        for pull in pulls:
+                            if str(pull['number']) == parts[4]:
+                                return {}, self._pull_json(full_name, pull,
+                                                           True)
+            elif parts[0] == 'users' and parts[1] in self.users:
+                if len(parts) == 2:
+                    return {}, self._user_json(parts[1], True)
+                if parts[2:] == ['repos']:
+                    return self._paginate(base, [
+                        self._repo_json(name)
+                        for name in self.users[parts[1]]['repos']
+                    ], params)
+            elif parts[0] == 'orgs' and parts[1] in self.orgs:
+                if len(parts) == 2:
+                    return {}, self._org_json(parts[1])
+                if parts[2:] == ['repos']:
+                    return self._paginate(base, [
+                        self._repo_json(name)
+                        for name in self.orgs[parts[1]]['repos']
+                    ], params)
+            elif parts == ['repositories']:
+                return self._list_all(base, params)
+
+        raise github.UnknownObjectException(404, {'message': 'Not Found'},
+                                            {})
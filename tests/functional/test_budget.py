@@ -0,0 +1,878 @@
+# Copyright 2014 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the
+#    License. You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing,
+#    software distributed under the License is distributed on an "AS
+#    IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+#    express or implied. See the License for the specific language
+#    governing permissions and limitations under the License.
+
+import io
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+import github
+import mock
+import six
+
+from tests.functional import fake_github
+from tugboat import adaptive
+from tugboat import allrepos
+from tugboat import checkpoint
+from tugboat import delta
+from tugboat import hosts
+from tugboat import lazy
+from tugboat import mergecache
+from tugboat import metrics
+from tugboat import partial
+from tugboat import progress
+from tugboat import replay
+from tugboat import reports
+from tugboat import requester
+from tugboat import rest
+from tugboat import retry
+from tugboat import schedule
+from tugboat import shard
+from tugboat import sharedcache
+from tugboat import snapshot
+from tugboat import stats
+from tugboat import summary
+from tugboat import templates
+
+
+class ReportBudgetTest(unittest.TestCase):
+    """
+    Assert the exact number of API requests ``report()`` makes for
+    various shapes of repositories, pull requests, and authors.  If
+    one of these tests fails because the count went up, a change has
+    introduced extra round trips; if the count went down, update the
+    budget to lock in the improvement.
+    """
+
+    def setUp(self):
+        self.server = fake_github.FakeGithub()
+
+    def report(self, repos, repo_callback=None, template=None):
+        stream = six.StringIO()
+        reports.report(self.server.github(), repos, stream, repo_callback,
+                       template=template)
+        return stream.getvalue()
+
+    def assertBudget(self, total, **breakdown):
+        self.assertEqual(self.server.breakdown(), breakdown)
+        self.assertEqual(len(self.server.counter), total)
+
+    def test_repo_no_pulls(self):
+        self.server.add_repo('owner/repo')
+
+        self.report([('repo', 'owner/repo')])
+
+        self.assertBudget(2, repo=1, repo_pulls=1)
+
+    def test_repo_pulls(self):
+        self.server.add_repo('owner/repo', pulls=5)
+
+        self.report([('repo', 'owner/repo')])
+
+        self.assertBudget(12, repo=1, repo_pulls=1, pull=5, user=5)
+
+    def test_repo_pulls_paginated(self):
+        self.server.add_repo('owner/repo', pulls=61)
+
+        self.report([('repo', 'owner/repo')])
+
+        self.assertBudget(126, repo=1, repo_pulls=3, pull=61, user=61)
+
+    def test_repo_distinct_authors(self):
+        self.server.add_user('alice', 'Alice')
+        self.server.add_repo('owner/repo', pulls=4,
+                             authors=('alice', 'bob', 'carol', 'dave'))
+
+        result = self.report([('repo', 'owner/repo')])
+
+        self.assertIn('Proposed by Alice (alice)', result)
+        self.assertBudget(10, repo=1, repo_pulls=1, pull=4, user=4)
+
+    def test_organization(self):
+        self.server.add_org('org')
+        self.server.add_repo('org/repo1', pulls=2)
+        self.server.add_repo('org/repo2', pulls=3)
+        self.server.add_repo('org/repo3')
+
+        self.report([('organization', 'org')])
+
+        self.assertBudget(15, org=1, org_repos=1, repo_pulls=3, pull=5,
+                          user=5)
+
+    def test_user(self):
+        self.server.add_repo('someone/repo1', pulls=1)
+        self.server.add_repo('someone/repo2', pulls=2)
+
+        self.report([('user', 'someone')])
+
+        self.assertBudget(10, user=4, user_repos=1, repo_pulls=2, pull=3)
+
+    def test_mixed_targets(self):
+        self.server.add_org('org')
+        self.server.add_repo('org/repo1', pulls=2)
+        self.server.add_repo('someone/repo2', pulls=1)
+
+        self.report([('organization', 'org'), ('repo', 'someone/repo2')])
+
+        self.assertBudget(11, org=1, org_repos=1, repo=1, repo_pulls=2,
+                          pull=3, user=3)
+
+    def test_template_skips_lookups(self):
+        self.server.add_repo('owner/repo', pulls=5)
+        tmpl = templates.Template({
+            'header': u'Open PRs: {total}',
+            'pull': u'{pull.html_url} ({pull.user.login})',
+            'repo': u'    Open PRs for {repo.name}: {repo.pulls}',
+        })
+
+        result = self.report([('repo', 'owner/repo')], template=tmpl)
+
+        self.assertIn('Open PRs: 5\n', result)
+        self.assertBudget(2, repo=1, repo_pulls=1)
+
+    def test_template_username(self):
+        self.server.add_repo('owner/repo', pulls=5)
+        tmpl = templates.Template({
+            'header': u'Open PRs: {total}',
+            'pull': u'{pull.html_url} ({username})',
+            'repo': u'    Open PRs for {repo.name}: {repo.pulls}',
+        })
+
+        self.report([('repo', 'owner/repo')], template=tmpl)
+
+        self.assertBudget(7, repo=1, repo_pulls=1, user=5)
+
+    def test_split_dir(self):
+        self.server.add_repo('owner/repo1', pulls=2)
+        self.server.add_repo('owner/repo2', pulls=1)
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        stream = six.StringIO()
+
+        reports.report(self.server.github(),
+                       [('repo', 'owner/repo1'), ('repo', 'owner/repo2')],
+                       stream, split_dir=tmpdir)
+
+        self.assertBudget(10, repo=2, repo_pulls=2, pull=3, user=3)
+        self.assertNotIn('Pull request', stream.getvalue())
+        self.assertEqual(sorted(os.listdir(os.path.join(tmpdir, 'owner'))),
+                         ['repo1.txt', 'repo2.txt'])
+        with io.open(os.path.join(tmpdir, 'owner', 'repo1.txt'),
+                     encoding='utf-8') as f:
+            self.assertEqual(f.read().count('Pull request owner/repo1#'), 2)
+
+    def test_snapshot(self):
+        self.server.add_repo('owner/repo', pulls=5)
+        snap = snapshot.Snapshot()
+
+        reports.report(self.server.github(), [('repo', 'owner/repo')],
+                       six.StringIO(), snapshot=snap)
+
+        self.assertBudget(12, repo=1, repo_pulls=1, pull=5, user=5)
+        self.assertEqual(len(snap), 5)
+        self.assertEqual(snap.get(('owner/repo', 1)).mergeable, True)
+        self.assertEqual(snap.get(('owner/repo', 2)).mergeable, False)
+
+    def test_since_snapshot(self):
+        repo = self.server.add_repo('owner/repo', pulls=5)
+        previous = snapshot.Snapshot()
+        reports.report(self.server.github(), [('repo', 'owner/repo')],
+                       six.StringIO(), snapshot=previous)
+        self.server.counter.requests[:] = []
+
+        # Close #1, update #2, move the base of #3 so it's no longer
+        # mergeable, and open #6
+        del repo['pulls'][0]
+        repo['pulls'][0]['updated_at'] = '2014-02-01T00:00:00Z'
+        repo['pulls'][1]['base_commit'] = 2
+        repo['pulls'][1]['mergeable'] = False
+        repo['pulls'].append({
+            'number': 6,
+            'user': 'author',
+            'created_at': '2014-02-01T00:00:00Z',
+            'updated_at': '2014-02-01T00:00:00Z',
+            'mergeable': True,
+        })
+        snap = snapshot.Snapshot()
+        stream = six.StringIO()
+
+        reports.report(self.server.github(), [('repo', 'owner/repo')],
+                       stream, snapshot=snap, previous=previous)
+
+        # Only the new and changed pulls are looked up
+        self.assertBudget(8, repo=1, repo_pulls=1, pull=3, user=3)
+        result = stream.getvalue()
+        self.assertIn('1 new, 1 closed, 2 updated, 1 mergeability changed '
+                      '(2 unchanged)', result)
+        self.assertIn('\nNew pull requests: 1\n\nPull request owner/repo#6:',
+                      result)
+        self.assertIn('\nClosed pull requests: 1\n\n'
+                      'Pull request owner/repo#1:', result)
+        self.assertIn('\nMergeability changed: 1\n\n'
+                      'Pull request owner/repo#3:', result)
+        self.assertNotIn('owner/repo#4', result)
+        self.assertEqual(sorted(snap.pulls), [('owner/repo', 2),
+                                              ('owner/repo', 3),
+                                              ('owner/repo', 4),
+                                              ('owner/repo', 5),
+                                              ('owner/repo', 6)])
+
+    @mock.patch.object(sys, 'stderr', six.StringIO())
+    def test_progress(self):
+        self.server.add_repo('owner/repo', pulls=5)
+        tmpl = templates.Template({
+            'header': u'Open PRs: {total}',
+            'pull': u'{pull.html_url} ({pull.user.login})',
+            'repo': u'    Open PRs for {repo.name}: {repo.pulls}',
+        })
+        events = []
+        gh = self.server.github()
+        prog = progress.Progress([events.append])
+        requester.add_middleware(gh, prog)
+        terminal = six.StringIO()
+        prog.sinks.append(progress.TerminalSink(terminal, verbose=True))
+
+        reports.report(gh, [('repo', 'owner/repo')], six.StringIO(),
+                       template=tmpl, progress=prog)
+
+        # Reporting progress doesn't look anything up
+        self.assertBudget(2, repo=1, repo_pulls=1)
+        self.assertEqual([e['event'] for e in events],
+                         ['start', 'target', 'repo_start', 'repo_done',
+                          'finish', 'message'])
+        self.assertEqual(events[3]['repo_pulls'], 5)
+        self.assertEqual(events[4]['requests'], 2)
+        self.assertIn('Looking up repo "owner/repo"...\n', terminal.getvalue())
+        self.assertIn('Fetched repository "owner/repo" (1/1): 5 pulls\n',
+                      terminal.getvalue())
+
+    def test_stats(self):
+        self.server.add_repo('owner/repo', pulls=5)
+        gh = self.server.github()
+        st = stats.Stats()
+        requester.add_middleware(gh, st)
+
+        reports.report(gh, [('repo', 'owner/repo')], six.StringIO(),
+                       stats=st)
+
+        self.assertBudget(12, repo=1, repo_pulls=1, pull=5, user=5)
+        self.assertEqual(st.phases, ['enumerate', 'fetch', 'sort',
+                                     'mergeable', 'render'])
+        self.assertEqual(
+            dict((name, len(samples))
+                 for name, samples in st.requests.items()), {
+                'GET /repos/:/:': 1,
+                'GET /repos/:/:/pulls': 1,
+                'GET /repos/:/:/pulls/:': 5,
+                'GET /users/:': 5,
+            })
+
+    def test_trace_lazy(self):
+        self.server.add_repo('owner/repo', pulls=5)
+        gh = self.server.github()
+        tracer = lazy.LazyTracer()
+        requester.add_middleware(gh, tracer)
+
+        reports.report(gh, [('repo', 'owner/repo')], six.StringIO())
+
+        self.assertBudget(12, repo=1, repo_pulls=1, pull=5, user=5)
+        self.assertEqual(
+            dict((attr, sum(sites.values()))
+                 for attr, sites in tracer.accesses.items()), {
+                'PullRequest.mergeable': 5,
+                'NamedUser.name': 5,
+            })
+        for sites in tracer.accesses.values():
+            for site in sites:
+                self.assertTrue(site.startswith('tugboat.reports:'))
+
+    def test_shards(self):
+        self.server.add_org('org')
+        for idx in range(8):
+            self.server.add_repo('org/repo%d' % idx, pulls=idx % 4)
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        texts = dict(templates.default)
+        texts['pull'] = texts['pull'].replace('{age}', '').replace(
+            '{update}', '')
+        texts['footer'] = u''
+        tmpl = templates.Template(texts)
+
+        expected = self.report([('organization', 'org')], template=tmpl)
+        self.server.counter.requests[:] = []
+
+        paths = []
+        for idx in range(3):
+            spec = shard.Shard(idx, 3)
+            part = partial.PartialReport('created', spec)
+            reports.report(self.server.github(), [('organization', 'org')],
+                           six.StringIO(), shard=spec, partial=part)
+            paths.append(os.path.join(tmpdir, 'shard%d.json' % idx))
+            part.write(paths[-1])
+        stream = six.StringIO()
+        reports.merge(paths, stream, tmpl)
+
+        # Each shard looks up only its own repositories
+        self.assertBudget(38, org=3, org_repos=3, repo_pulls=8, pull=12,
+                          user=12)
+        self.assertEqual(stream.getvalue(), expected)
+
+    def test_resume(self):
+        self.server.add_org('org')
+        for idx in range(6):
+            self.server.add_repo('org/repo%d' % idx, pulls=idx % 3)
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        path = os.path.join(tmpdir, 'checkpoint.json')
+        texts = dict(templates.default)
+        texts['pull'] = texts['pull'].replace('{age}', '').replace(
+            '{update}', '')
+        texts['footer'] = u''
+        tmpl = templates.Template(texts)
+
+        expected = self.report([('organization', 'org')], template=tmpl)
+
+        # Interrupt the run while fetching the fifth repository
+        def crash(handler, verb, url, *args, **kwargs):
+            if url.endswith('/repos/org/repo4/pulls'):
+                raise IOError('connection reset')
+            return handler(verb, url, *args, **kwargs)
+
+        gh = self.server.github()
+        requester.add_middleware(gh, crash)
+        ckpt = checkpoint.Checkpoint(path)
+        ckpt.open()
+        self.assertRaises(IOError, reports.report, gh,
+                          [('organization', 'org')], six.StringIO(),
+                          template=tmpl, checkpoint=ckpt)
+        ckpt.close()
+        self.server.counter.requests[:] = []
+
+        ckpt = checkpoint.Checkpoint(path)
+        ckpt.open(True)
+        stream = six.StringIO()
+        reports.report(self.server.github(), [('organization', 'org')],
+                       stream, template=tmpl, checkpoint=ckpt)
+        ckpt.remove()
+
+        # Only the repositories which weren't checkpointed are fetched
+        self.assertBudget(10, org=1, org_repos=1, repo_pulls=2, pull=3,
+                          user=3)
+        self.assertEqual(stream.getvalue(), expected)
+
+    def test_merge_cache(self):
+        repo = self.server.add_repo('owner/repo', pulls=4)
+        cache = mergecache.MergeCache()
+        expected = self.report([('repo', 'owner/repo')])
+        self.server.counter.requests[:] = []
+
+        stream = six.StringIO()
+        reports.report(self.server.github(), [('repo', 'owner/repo')],
+                       stream, merge_cache=cache)
+        self.assertBudget(10, repo=1, repo_pulls=1, pull=4, user=4)
+        self.assertEqual(len(cache.entries), 4)
+        self.server.counter.requests[:] = []
+
+        # Move the base of #2; only it pays for a mergeability lookup,
+        # though the authors must still be looked up
+        repo['pulls'][1]['base_commit'] = 2
+        repo['pulls'][1]['mergeable'] = False
+        stream = six.StringIO()
+        reports.report(self.server.github(), [('repo', 'owner/repo')],
+                       stream, merge_cache=cache)
+
+        self.assertBudget(7, repo=1, repo_pulls=1, pull=1, user=4)
+        self.assertEqual(len(cache.entries), 5)
+        self.assertNotEqual(stream.getvalue(), expected)
+
+    def test_delta(self):
+        self.server.add_repo('owner/repo', pulls=4)
+        store = delta.DeltaStore()
+        tmpl = templates.Template({
+            'header': u'{total} open ({mergeable} mergeable)',
+            'pull': u'{pull.repo.full_name}#{pull.number} {pull.mergeable}',
+            'breakdown': u'',
+            'repo': u'{repo.name}: {repo.pulls}',
+            'footer': u'',
+        })
+
+        def run():
+            stream = six.StringIO()
+            reports.report(self.server.github(), [('repo', 'owner/repo')],
+                           stream, template=tmpl, delta=store)
+            return stream.getvalue()
+
+        # The first run lists the repository in full
+        expected = run()
+        self.assertBudget(10, repo=1, repo_pulls=1, pull=4, user=4)
+        self.server.counter.requests[:] = []
+
+        # With nothing changed, listing the open and the closed pull
+        # requests stops at the first page of each
+        result = run()
+        self.assertBudget(3, repo=1, repo_pulls=2)
+        self.assertEqual(result, expected)
+        self.server.counter.requests[:] = []
+
+        # Only the updated pull request is looked up again, and the
+        # closed one is dropped
+        self.server.update_pull('owner/repo', 2, 3600, mergeable=True)
+        self.server.close_pull('owner/repo', 3, 3660)
+        result = run()
+
+        self.assertBudget(5, repo=1, repo_pulls=2, pull=1, user=1)
+        self.assertEqual(sorted(store.get('owner/repo')[1]), [1, 2, 4])
+        self.assertNotEqual(result, expected)
+
+    def test_rest_client(self):
+        self.server.add_org('org')
+        self.server.add_repo('org/repo1', pulls=45, authors=('a', 'b'))
+        self.server.add_repo('org/repo2', pulls=3, authors=('a', 'c'))
+        self.server.add_user('a', 'Alice')
+        texts = dict(templates.default)
+        texts['pull'] = texts['pull'].replace('{age}', '').replace(
+            '{update}', '')
+        texts['footer'] = u''
+        tmpl = templates.Template(texts)
+        expected = self.report([('organization', 'org')], template=tmpl)
+        self.server.counter.requests[:] = []
+
+        stream = six.StringIO()
+        reports.report(self.server.rest_client(), [('organization', 'org')],
+                       stream, template=tmpl)
+
+        # Nothing is looked up just to find it, pages are as large as
+        # they can be, and each author is looked up once
+        self.assertBudget(54, org_repos=1, repo_pulls=2, pull=48, user=3)
+        self.assertEqual(stream.getvalue(), expected)
+
+    def test_summary_only(self):
+        self.server.add_org('org')
+        self.server.add_repo('org/small', pulls=3)
+        self.server.add_repo('org/large', pulls=150, authors=('a', 'b'))
+        self.server.add_repo('org/empty')
+        self.server.update_pull('org/large', 7, 100000)
+        texts = dict(templates.summary, pull=u'', footer=u'')
+        tmpl = templates.Template(texts)
+        expected = self.report([('organization', 'org')], template=tmpl)
+        self.server.counter.requests[:] = []
+
+        # The REST client doesn't look up the organization itself
+        for gh, budget in [(self.server.github(), {'org': 1}),
+                           (self.server.rest_client(), {})]:
+            stream = six.StringIO()
+            reports.report(gh, [('organization', 'org')], stream,
+                           template=tmpl, summary=summary.Summary())
+
+            # A repository on a single page costs one request, and a
+            # larger one four; no pull request or author is looked up
+            self.assertBudget(7 + len(budget), org_repos=1, repo_pulls=6,
+                              **budget)
+            self.assertEqual(stream.getvalue(), expected)
+            self.assertIn(u'Open PRs: 153\n', expected)
+            self.assertIn(u'Most recently updated PR, at 2014-01-02 '
+                          u'03:46:40+00:00: org/large#7', expected)
+            self.server.counter.requests[:] = []
+
+    def test_summary_only_mergeable(self):
+        self.server.add_repo('owner/small', pulls=3)
+        self.server.add_repo('owner/large', pulls=150)
+        texts = dict(templates.summary, pull=u'', footer=u'',
+                     repo=u'{repo.name}: {repo.mergeable}/{repo.pulls}')
+        tmpl = templates.Template(texts)
+        repos = [('repo', 'owner/small'), ('repo', 'owner/large')]
+        expected = self.report(repos, template=tmpl)
+        self.server.counter.requests[:] = []
+
+        stream = six.StringIO()
+        reports.report(self.server.rest_client(), repos, stream,
+                       template=tmpl, summary=summary.Summary())
+
+        # Counting the mergeable pull requests looks every one up; the
+        # small repository isn't listed again to do so
+        self.assertBudget(160, repo_pulls=7, pull=153)
+        self.assertEqual(stream.getvalue(), expected)
+
+    def test_replay(self):
+        self.server.add_org('org')
+        self.server.add_repo('org/repo1', pulls=3)
+        self.server.add_repo('org/repo2', pulls=2, authors=('a', 'b'))
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        texts = dict(templates.default)
+        texts['pull'] = texts['pull'].replace('{age}', '').replace(
+            '{update}', '')
+        texts['footer'] = u''
+        tmpl = templates.Template(texts)
+
+        gh = self.server.rest_client()
+        recorder = requester.add_middleware(gh, replay.Recorder(tmpdir))
+        expected = six.StringIO()
+        reports.report(gh, [('organization', 'org')], expected,
+                       template=tmpl)
+        recorder.close()
+        self.server.counter.requests[:] = []
+
+        # The replayed run never reaches the server
+        gh = rest.Client(base_url='http://unreachable.invalid')
+        requester.add_middleware(gh, replay.Replayer(tmpdir))
+        stream = six.StringIO()
+        reports.report(gh, [('organization', 'org')], stream,
+                       template=tmpl)
+
+        self.assertEqual(recorder.exchanges, 11)
+        self.assertBudget(0)
+        self.assertEqual(stream.getvalue(), expected.getvalue())
+
+    def test_hosts(self):
+        self.server.add_org('org')
+        self.server.add_repo('org/repo1', pulls=3, authors=('a', 'b'))
+        other = fake_github.FakeGithub()
+        other.add_org('org')
+        other.add_repo('org/repo1', pulls=2, authors=('a', 'c'))
+        tmpl = templates.Template({
+            'header': u'{total} open ({mergeable} mergeable)',
+            'pull': u'{pull.repo.full_name}#{pull.number} {pull.user.name}',
+            'breakdown': u'',
+            'repo': u'{repo.name}: {repo.pulls}',
+            'footer': u'',
+        })
+        gh = hosts.Hosts(self.server.rest_client())
+        gh.add('ghe.example.com', other.rest_client())
+
+        stream = six.StringIO()
+        reports.report(gh, [('organization', 'ghe.example.com:org'),
+                            ('organization', 'org')],
+                       stream, sort_by='repo', template=tmpl)
+
+        # Each host serves only its own targets, with the same budget
+        # as if it were reported on alone
+        self.assertBudget(7, org_repos=1, repo_pulls=1, pull=3, user=2)
+        self.assertEqual(other.breakdown(),
+                         dict(org_repos=1, repo_pulls=1, pull=2, user=2))
+        self.assertEqual(stream.getvalue(),
+                         '5 open (3 mergeable)\n'
+                         'ghe.example.com:org/repo1#1 None\n'
+                         'ghe.example.com:org/repo1#2 None\n'
+                         'org/repo1#1 None\n'
+                         'org/repo1#2 None\n'
+                         'org/repo1#3 None\n'
+                         'ghe.example.com:org/repo1: 2\n'
+                         'org/repo1: 3\n')
+
+    def test_all(self):
+        self.server.add_org('org')
+        self.server.add_repo('org/repo1', pulls=2)
+        self.server.add_repo('org/repo2', pulls=1)
+        self.server.add_user('u')
+        self.server.add_repo('u/repo3', pulls=1)
+        tmpl = templates.Template({
+            'header': u'{total} open',
+            'pull': u'{pull.repo.full_name}#{pull.number}',
+            'breakdown': u'',
+            'repo': u'',
+            'footer': u'',
+        })
+        index = allrepos.RepoIndex()
+
+        stream = six.StringIO()
+        reports.report(self.server.rest_client(), [('all', '')], stream,
+                       sort_by='repo', template=tmpl,
+                       enumerator=allrepos.Enumerator(1, 2, index))
+
+        # The ranges are walked in order, and the walk stops at the
+        # first range with nothing after it
+        self.assertBudget(7, repositories=4, repo_pulls=3)
+        self.assertEqual(stream.getvalue(),
+                         '4 open\n'
+                         'org/repo1#1\n'
+                         'org/repo1#2\n'
+                         'org/repo2#1\n'
+                         'u/repo3#1\n')
+
+        # Another run only walks the repositories created since
+        self.server.counter.requests[:] = []
+        self.server.add_repo('u/repo4', pulls=1)
+        stream = six.StringIO()
+        reports.report(self.server.rest_client(), [('all', '')], stream,
+                       sort_by='repo', template=tmpl,
+                       enumerator=allrepos.Enumerator(1, 2, index))
+
+        self.assertBudget(7, repositories=3, repo_pulls=4)
+        self.assertEqual(stream.getvalue().splitlines()[0], '5 open')
+        self.assertEqual(sorted(index.hosts['github.com']['repos'].values()),
+                         ['org/repo1', 'org/repo2', 'u/repo3', 'u/repo4'])
+
+    def test_schedule(self):
+        self.server.add_org('org')
+        self.server.add_repo('org/small', pulls=1)
+        self.server.add_repo('org/large', pulls=40)
+        self.server.add_repo('org/medium', pulls=5)
+        self.server.add_repo('org/empty')
+        tmpl = templates.Template({
+            'header': u'{total} open ({mergeable} mergeable)',
+            'pull': u'{pull.repo.full_name}#{pull.number} {pull.user.name}',
+            'breakdown': u'',
+            'repo': u'{repo.name}: {repo.pulls}',
+            'footer': u'',
+        })
+        expected = self.report([('organization', 'org')], template=tmpl)
+        self.server.counter.requests[:] = []
+        st = stats.Stats()
+        history = schedule.History()
+        events = []
+        scheduler = schedule.Scheduler(3, history=history, stats=st,
+                                       progress=progress.Progress(
+                                           [events.append]))
+
+        stream = six.StringIO()
+        reports.report(self.server.github(), [('organization', 'org')],
+                       stream, stats=st, template=tmpl, scheduler=scheduler)
+
+        # Fetching several repositories at once, largest first, costs
+        # nothing extra, and the report is the same
+        self.assertBudget(99, org=1, org_repos=1, repo_pulls=5, pull=46,
+                          user=46)
+        self.assertEqual(stream.getvalue(), expected)
+        self.assertEqual(sorted(history.repos), [
+            'org/empty', 'org/large', 'org/medium', 'org/small'])
+        self.assertEqual(events[0]['order'], [
+            'org/large', 'org/medium', 'org/small', 'org/empty'])
+        self.assertEqual(len(st.to_dict()['schedule']['repos']), 4)
+
+    def test_schedule_workers(self):
+        self.server.add_org('org')
+        for idx in range(4):
+            self.server.add_repo('org/repo%d' % idx, pulls=5)
+        tmpl = templates.Template({
+            'header': u'{total} open ({mergeable} mergeable)',
+            'pull': u'{pull.repo.full_name}#{pull.number} {pull.user.name}',
+            'breakdown': u'',
+            'repo': u'{repo.name}: {repo.pulls}',
+            'footer': u'',
+        })
+        expected = self.report([('organization', 'org')], template=tmpl)
+        self.server.counter.requests[:] = []
+
+        # Record the thread making each request for a pull request or
+        # its author; each takes a moment, so the workers overlap
+        threads = {}
+
+        def record(call, verb, url, *args, **kwargs):
+            if '/pulls/' in url or '/users/' in url:
+                threads.setdefault(threading.current_thread().name, 0)
+                threads[threading.current_thread().name] += 1
+                time.sleep(0.001)
+            return call(verb, url, *args, **kwargs)
+
+        for gh, total, lookups in ((self.server.github(), 46, 40),
+                                   (self.server.rest_client(), 26, 21)):
+            threads.clear()
+            self.server.counter.requests[:] = []
+            requester.add_middleware(gh, record)
+            stream = six.StringIO()
+            reports.report(gh, [('organization', 'org')], stream,
+                           template=tmpl, scheduler=schedule.Scheduler(4))
+
+            # The lookups for each pull request are made by the
+            # workers, not as the report is rendered, and cost
+            # nothing extra
+            self.assertEqual(stream.getvalue(), expected)
+            self.assertEqual(len(self.server.counter), total)
+            self.assertEqual(sum(threads.values()), lookups)
+            self.assertNotIn(threading.current_thread().name, threads)
+            self.assertTrue(len(threads) > 1)
+
+    def test_shared_cache(self):
+        self.server.add_org('org')
+        self.server.add_repo('org/repo1', pulls=2)
+        self.server.add_repo('org/repo2', pulls=1)
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        path = os.path.join(tmpdir, 'cache.db')
+        tmpl = templates.Template({
+            'header': u'{total} open ({mergeable} mergeable)',
+            'pull': u'{pull.repo.full_name}#{pull.number} {pull.user.name}',
+            'breakdown': u'',
+            'repo': u'{repo.name}: {repo.pulls}',
+            'footer': u'',
+        })
+
+        def run():
+            gh = self.server.github()
+            shared = sharedcache.SharedCache(path,
+                                             base_url='https://api.github.com')
+            requester.add_middleware(gh, shared)
+            stream = six.StringIO()
+            try:
+                reports.report(gh, [('organization', 'org')], stream,
+                               template=tmpl)
+            finally:
+                shared.close()
+            return stream.getvalue()
+
+        # The pull requests share an author, who is looked up once
+        expected = run()
+        self.assertBudget(8, org=1, org_repos=1, repo_pulls=2, pull=3,
+                          user=1)
+        self.server.counter.requests[:] = []
+
+        # An overlapping run finds everything it needs in the cache;
+        # only the organization itself isn't cached
+        result = run()
+
+        self.assertBudget(1, org=1)
+        self.assertEqual(result, expected)
+
+    def test_adaptive(self):
+        self.server.add_org('org')
+        for idx in range(4):
+            self.server.add_repo('org/repo%d' % idx, pulls=3)
+        gh = self.server.github()
+        st = stats.Stats()
+        limiter = adaptive.Limiter(4, host='github.com', stats=st)
+        requester.add_middleware(gh, limiter)
+
+        reports.report(gh, [('organization', 'org')], six.StringIO(),
+                       scheduler=schedule.Scheduler(4))
+
+        # Limiting the requests in flight costs nothing extra
+        self.assertBudget(30, org=1, org_repos=1, repo_pulls=4, pull=12,
+                          user=12)
+        self.assertEqual(limiter.in_flight, 0)
+        self.assertTrue(1 <= limiter.limit <= 4)
+        self.assertIn('github.com', st.to_dict()['concurrency'])
+
+    def test_adaptive_throttled(self):
+        self.server.add_org('org')
+        for idx in range(4):
+            self.server.add_repo('org/repo%d' % idx, pulls=10)
+        tmpl = templates.Template({
+            'header': u'{total} open ({mergeable} mergeable)',
+            'pull': u'{pull.repo.full_name}#{pull.number} {pull.user.name}',
+            'breakdown': u'',
+            'repo': u'{repo.name}: {repo.pulls}',
+            'footer': u'',
+        })
+        expected = self.report([('organization', 'org')], template=tmpl)
+        gh = self.server.github()
+
+        # The host throttles the per-pull request lookups once more
+        # than two are in flight
+        lock = threading.Lock()
+        state = {'in_flight': 0, 'peak': 0}
+
+        def host(call, verb, url, *args, **kwargs):
+            if '/pulls/' not in url:
+                return call(verb, url, *args, **kwargs)
+            with lock:
+                state['in_flight'] += 1
+                busy = state['in_flight'] > 2
+                state['peak'] = max(state['peak'], state['in_flight'])
+            try:
+                time.sleep(0.002)
+                if busy:
+                    raise github.GithubException(403, {
+                        'message': 'You have exceeded a secondary rate '
+                                   'limit.',
+                    }, {})
+                return call(verb, url, *args, **kwargs)
+            finally:
+                with lock:
+                    state['in_flight'] -= 1
+
+        # Throttled requests are retried, each attempt passing through
+        # the limiter
+        def again(call, verb, url, *args, **kwargs):
+            while True:
+                try:
+                    return call(verb, url, *args, **kwargs)
+                except github.GithubException as exc:
+                    if not adaptive.throttled(exc):
+                        raise
+
+        # Only the throttling cuts the window, not the latency
+        requester.add_middleware(gh, host)
+        limiter = adaptive.Limiter(8, initial=8, tolerance=float('inf'))
+        requester.add_middleware(gh, limiter)
+        requester.add_middleware(gh, again)
+        stream = six.StringIO()
+        reports.report(gh, [('organization', 'org')], stream,
+                       template=tmpl, scheduler=schedule.Scheduler(4))
+
+        # The lookups made by the workers overlap, are throttled, and
+        # shrink the window
+        self.assertEqual(stream.getvalue(), expected)
+        self.assertTrue(state['peak'] > 2)
+        self.assertTrue(limiter.throttles > 0)
+        self.assertTrue(min(limit for _offset, limit
+                            in limiter.changes) <= 4)
+        self.assertEqual(limiter.in_flight, 0)
+
+    @mock.patch.object(retry.time, 'sleep')
+    def test_retry(self, mock_sleep):
+        self.server.add_repo('owner/repo1', pulls=2)
+        texts = dict(templates.default)
+        texts['pull'] = texts['pull'].replace('{age}', '').replace(
+            '{update}', '')
+        texts['footer'] = u''
+        tmpl = templates.Template(texts)
+        expected = self.report([('repo', 'owner/repo1')], template=tmpl)
+        self.server.counter.requests[:] = []
+
+        # The load balancer fails the first request for the pulls
+        failures = [github.GithubException(502, 'Bad Gateway')]
+
+        def flaky(handler, verb, url, *args, **kwargs):
+            if url.endswith('/pulls') and failures:
+                raise failures.pop()
+            return handler(verb, url, *args, **kwargs)
+
+        gh = self.server.github()
+        requester.add_middleware(gh, flaky)
+        middleware = retry.Retry()
+        requester.add_middleware(gh, middleware)
+        stream = six.StringIO()
+        reports.report(gh, [('repo', 'owner/repo1')], stream, template=tmpl)
+
+        # The failed request never reached the server
+        self.assertBudget(6, repo=1, repo_pulls=1, pull=2, user=2)
+        self.assertEqual(middleware.retried, 1)
+        self.assertEqual(mock_sleep.call_count, 1)
+        self.assertEqual(stream.getvalue(), expected)
+
+    def test_metrics(self):
+        self.server.add_repo('owner/repo1', pulls=2)
+        self.server.add_repo('owner/repo2', pulls=1)
+        gh = self.server.github()
+        mets = metrics.Metrics()
+        requester.add_middleware(gh, mets)
+
+        mets.start_run()
+        reports.report(gh, [('repo', 'owner/repo1'), ('repo', 'owner/repo2')],
+                       six.StringIO(), metrics=mets)
+        mets.end_run()
+        result = mets.format(gh)
+
+        self.assertBudget(10, repo=2, repo_pulls=2, pull=3, user=3)
+        self.assertEqual(mets.requests, 10)
+        self.assertIn('tugboat_open_pulls{repo="owner/repo1"} 2', result)
+        self.assertIn('tugboat_open_pulls{repo="owner/repo2"} 1', result)
+        self.assertIn('tugboat_api_requests 10', result)
+        self.assertEqual(result[-1], '# EOF')
@@ -0,0 +1,102 @@
+# Copyright 2014 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the
+#    License. You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing,
+#    software distributed under the License is distributed on an "AS
+#    IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+#    express or implied. See the License for the specific language
+#    governing permissions and limitations under the License.
+
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+
+# The directory containing the tugboat package
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+
+# The maximum time, in seconds, importing ``tugboat.reports`` may take
+# in a fresh interpreter; override with the TUGBOAT_IMPORT_BUDGET
+# environment variable on slow machines
+IMPORT_BUDGET = float(os.environ.get('TUGBOAT_IMPORT_BUDGET', '0.5'))
+
+# Modules which must not be imported just to build the command line
+# interface
+DEFERRED = ['github', 'requests', 'sqlite3', 'ssl']
+
+# Run in a fresh interpreter to time the import and report which
+# modules it loaded
+_script = '''
+import getpass
+import json
+import sys
+import time
+
+looked_up = []
+getpass.getuser = lambda: looked_up.append(True) or 'user'
+
+start = time.time()
+import tugboat.reports
+elapsed = time.time() - start
+
+json.dump({'elapsed': elapsed, 'modules': sorted(sys.modules),
+           'looked_up': bool(looked_up)}, sys.stdout)
+'''
+
+
+def _cold_import():
+    """
+    Import ``tugboat.reports`` in a fresh interpreter.
+
+    :returns: A tuple of the time the import took, in seconds, the
+              set of names of the loaded modules, and a flag
+              indicating whether the user name was looked up.
+    """
+
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [BASE_DIR] + [p for p in env.get('PYTHONPATH', '').split(os.pathsep)
+                      if p])
+    output = subprocess.check_output([sys.executable, '-c', _script],
+                                     cwd=BASE_DIR, env=env)
+    result = json.loads(output.decode('utf-8'))
+
+    return (result['elapsed'], set(result['modules']),
+            result['looked_up'])
+
+
+class StartupTest(unittest.TestCase):
+    """
+    Keep the cost of starting ``tugboat`` down.  The command line
+    interface is built when ``tugboat.reports`` is imported, so
+    everything imported at module load is paid for by every
+    invocation, including ``tugboat --help``.
+    """
+
+    def test_deferred_imports(self):
+        elapsed, modules, looked_up = _cold_import()
+
+        for name in DEFERRED:
+            self.assertNotIn(name, modules)
+
+    def test_deferred_username(self):
+        elapsed, modules, looked_up = _cold_import()
+
+        self.assertFalse(looked_up)
+
+    def test_import_budget(self):
+        # Take the best of several runs to reduce noise
+        elapsed = min(_cold_import()[0] for i in range(3))
+
+        self.assertTrue(elapsed < IMPORT_BUDGET,
+                        'Importing tugboat.reports took %.3fs; budget is '
+                        '%.3fs' % (elapsed, IMPORT_BUDGET))
@@ -0,0 +1,221 @@
+# Copyright 2014 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the
+#    License. You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing,
+#    software distributed under the License is distributed on an "AS
+#    IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+#    express or implied. See the License for the specific language
+#    governing permissions and limitations under the License.
+
+import threading
+import unittest
+
+import mock
+
+from tugboat import adaptive
+
+
+class ThrottledTest(unittest.TestCase):
+    def test_too_many_requests(self):
+        self.assertTrue(adaptive.throttled(mock.Mock(status=429)))
+
+    def test_abuse(self):
+        exc = mock.Mock(status=403, data={
+            'message': 'You have triggered an abuse detection mechanism.',
+        })
+
+        self.assertTrue(adaptive.throttled(exc))
+
+    def test_secondary(self):
+        exc = mock.Mock(status=403, data={
+            'message': 'You have exceeded a secondary rate limit.',
+        })
+
+        self.assertTrue(adaptive.throttled(exc))
+
+    def test_forbidden(self):
+        exc = mock.Mock(status=403, data={'message': 'Forbidden'})
+
+        self.assertFalse(adaptive.throttled(exc))
+        self.assertFalse(adaptive.throttled(mock.Mock(status=403, data=None)))
+
+    def test_other(self):
+        self.assertFalse(adaptive.throttled(mock.Mock(status=404)))
+        self.assertFalse(adaptive.throttled(ValueError('failed')))
+
+
+class TooManyRequests(Exception):
+    status = 429
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class LimiterTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.object(adaptive.stats_mod, 'clock', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def request(self, limiter, elapsed, exc=None):
+        def call(verb, url):
+            self.clock.now += elapsed
+            if exc is not None:
+                raise exc
+            return 'response'
+
+        return limiter(call, 'GET', 'url')
+
+    def test_init(self):
+        stats = mock.Mock()
+
+        result = adaptive.Limiter(8, host='github.com', stats=stats)
+
+        self.assertEqual(result.maximum, 8)
+        self.assertEqual(result.minimum, 1)
+        self.assertEqual(result.limit, adaptive.DEFAULT_INITIAL)
+        self.assertEqual(result.in_flight, 0)
+        self.assertEqual(result.throttles, 0)
+        self.assertEqual(result.changes, [(0.0, 2)])
+        stats.concurrency.assert_called_once_with('github.com', 0.0, 2)
+
+    def test_init_bounded(self):
+        self.assertEqual(adaptive.Limiter(1).limit, 1)
+        self.assertEqual(adaptive.Limiter(4, initial=0).limit, 1)
+
+    def test_call(self):
+        limiter = adaptive.Limiter(8)
+        call = mock.Mock(return_value='response')
+
+        result = limiter(call, 'GET', 'url', 'a', b='c')
+
+        self.assertEqual(result, 'response')
+        call.assert_called_once_with('GET', 'url', 'a', b='c')
+        self.assertEqual(limiter.in_flight, 0)
+
+    def test_increase(self):
+        stats = mock.Mock()
+        limiter = adaptive.Limiter(8, host='github.com', stats=stats)
+
+        # About one more for each limit's worth of requests at flat
+        # latency
+        for _i in range(3):
+            self.request(limiter, 1.0)
+        self.assertEqual(int(limiter.limit), 3)
+        for _i in range(3):
+            self.request(limiter, 1.0)
+
+        self.assertEqual(int(limiter.limit), 4)
+        self.assertEqual(limiter.changes, [(0.0, 2), (3.0, 3), (6.0, 4)])
+        stats.concurrency.assert_has_calls([
+            mock.call('github.com', 0.0, 2),
+            mock.call('github.com', 3.0, 3),
+            mock.call('github.com', 6.0, 4),
+        ])
+
+    def test_increase_maximum(self):
+        limiter = adaptive.Limiter(3)
+
+        for _i in range(20):
+            self.request(limiter, 1.0)
+
+        self.assertEqual(limiter.limit, 3)
+
+    def test_latency_spike(self):
+        limiter = adaptive.Limiter(8, initial=4)
+
+        # A single slow request doesn't cut the limit...
+        self.request(limiter, 1.0)
+        self.request(limiter, 4.0)
+        self.assertEqual(int(limiter.limit), 4)
+
+        # ...but a run of them does
+        self.request(limiter, 4.0)
+
+        self.assertEqual(int(limiter.limit), 2)
+        self.assertEqual(limiter.latency, None)
+        self.assertEqual(limiter.throttles, 0)
+
+    def test_throttled(self):
+        limiter = adaptive.Limiter(8, initial=6)
+
+        self.assertRaises(TooManyRequests, self.request, limiter, 1.0,
+                          TooManyRequests())
+
+        self.assertEqual(limiter.limit, 3)
+        self.assertEqual(limiter.throttles, 1)
+        self.assertEqual(limiter.in_flight, 0)
+
+    def test_not_throttled(self):
+        limiter = adaptive.Limiter(8, initial=6)
+
+        self.assertRaises(ValueError, self.request, limiter, 1.0,
+                          ValueError('failed'))
+
+        self.assertEqual(limiter.limit, 6)
+        self.assertEqual(limiter.throttles, 0)
+        self.assertEqual(limiter.in_flight, 0)
+
+    def test_throttled_in_flight(self):
+        limiter = adaptive.Limiter(8, initial=8)
+        limiter._cut = 101.0
+
+        # Issued before the last cut, so it doesn't cut the limit again
+        limiter._backoff(100.5)
+        self.assertEqual(limiter.limit, 8)
+
+        limiter._backoff(101.0)
+        self.assertEqual(limiter.limit, 4)
+
+    def test_minimum(self):
+        limiter = adaptive.Limiter(8, initial=2)
+
+        for _i in range(3):
+            self.clock.now += 1.0
+            limiter._backoff(self.clock.now)
+
+        self.assertEqual(limiter.limit, 1)
+        self.assertEqual(limiter.changes, [(0.0, 2), (1.0, 1)])
+
+    def test_blocks_at_limit(self):
+        limiter = adaptive.Limiter(8, initial=1)
+        entered = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def slow(verb, url):
+            entered.set()
+            self.assertTrue(release.wait(5))
+            calls.append(url)
+
+        def fast(verb, url):
+            calls.append(url)
+
+        first = threading.Thread(target=limiter, args=(slow, 'GET', 'one'))
+        first.start()
+        self.assertTrue(entered.wait(5))
+        second = threading.Thread(target=limiter, args=(fast, 'GET', 'two'))
+        second.start()
+
+        # The second request waits for the first to finish
+        second.join(0.1)
+        self.assertTrue(second.is_alive())
+        self.assertEqual(calls, [])
+
+        release.set()
+        first.join(5)
+        second.join(5)
+
+        self.assertEqual(calls, ['one', 'two'])
@@ -0,0 +1,362 @@
+# Copyright 2014 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the
+#    License. You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing,
+#    software distributed under the License is distributed on an "AS
+#    IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+#    express or implied. See the License for the specific language
+#    governing permissions and limitations under the License.
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import github
+import mock
+
+from tugboat import allrepos
+from tugboat import hosts
+from tugboat import rest
+
+
+class NotFound(Exception):
+    status = 404
+
+
+class FakeRepo(object):
+    def __init__(self, repo_id, full_name, missing=False):
+        self.id = repo_id
+        self.full_name = full_name
+        self.missing = missing
+
+    def get_pulls(self):
+        if self.missing:
+            raise NotFound()
+        return ['pull']
+
+
+class FakeHandle(object):
+    """
+    Serve repositories in order of ID, as Github's list of all
+    repositories does, with pages of ``per_page`` repositories.
+    """
+
+    def __init__(self, ids, per_page=2):
+        self.repos = dict((repo_id, FakeRepo(repo_id, 'o/r%d' % repo_id))
+                          for repo_id in ids)
+        self.per_page = per_page
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def get_repos(self, since=0):
+        ids = sorted(repo_id for repo_id in self.repos if repo_id > since)
+        while True:
+            with self._lock:
+                self.requests.append(since)
+            page = ids[:self.per_page]
+            ids = ids[self.per_page:]
+            for repo_id in page:
+                yield self.repos[repo_id]
+            if not ids:
+                break
+            since = page[-1]
+
+    def get_repo(self, full_name):
+        # Like the REST client, no request is made; a missing
+        # repository is reported when its pull requests are listed
+        for repo in self.repos.values():
+            if repo.full_name == full_name:
+                return repo
+        return FakeRepo(None, full_name, True)
+
+
+class RepoIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'index.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_init(self):
+        result = allrepos.RepoIndex()
+
+        self.assertEqual(result.max_age, allrepos.DEFAULT_MAX_AGE)
+        self.assertEqual(result.hosts, {})
+
+    def test_known_missing(self):
+        index = allrepos.RepoIndex()
+
+        self.assertEqual(index.known('github.com'), (0, {}))
+
+    @mock.patch('time.time', return_value=1000)
+    def test_update_known(self, mock_time):
+        index = allrepos.RepoIndex(100)
+
+        index.update('github.com', {5: 'o/r5'}, 7)
+
+        self.assertEqual(index.known('github.com'), (7, {5: 'o/r5'}))
+        self.assertEqual(index.hosts['github.com']['walked'], 1000)
+
+        # The time of the last full enumeration is kept
+        mock_time.return_value = 1050
+        index.update('github.com', {5: 'o/r5', 9: 'o/r9'}, 9)
+
+        self.assertEqual(index.hosts['github.com']['walked'], 1000)
+
+        # Until it's too old
+        mock_time.return_value = 1101
+
+        self.assertEqual(index.known('github.com'), (0, {}))
+
+    def test_round_trip(self):
+        index = allrepos.RepoIndex()
+        index.update('github.com', {5: 'o/r5', 2: 'o/r2'}, 7, 1000)
+        index.write(self.path)
+
+        with open(self.path) as f:
+            data = json.load(f)
+        result = allrepos.load(self.path, 100)
+
+        self.assertEqual(data, {
+            'version': allrepos.VERSION,
+            'hosts': {
+                'github.com': {
+                    'walked': 1000,
+                    'last_id': 7,
+                    'repos': [[2, 'o/r2'], [5, 'o/r5']],
+                },
+            },
+        })
+        self.assertEqual(result.max_age, 100)
+        self.assertEqual(result.hosts, index.hosts)
+
+    def test_load_missing(self):
+        result = allrepos.load(self.path)
+
+        self.assertEqual(result.hosts, {})
+
+    def test_load_bad_version(self):
+        with open(self.path, 'w') as f:
+            json.dump({'version': 0}, f)
+
+        self.assertRaises(ValueError, allrepos.load, self.path)
+
+
+class EnumeratorTest(unittest.TestCase):
+    def test_init(self):
+        result = allrepos.Enumerator()
+
+        self.assertEqual(result.workers, allrepos.DEFAULT_WORKERS)
+        self.assertEqual(result.chunk, allrepos.DEFAULT_CHUNK)
+        self.assertEqual(result.index, None)
+
+    def test_repos(self):
+        ids = [1, 2, 3, 15, 16, 48, 49, 50, 51]
+        gh = FakeHandle(ids)
+        enumerator = allrepos.Enumerator(workers=3, chunk=10)
+
+        result = [repo.id for repo in enumerator.repos(gh)]
+
+        self.assertEqual(sorted(result), ids)
+        for since in gh.requests:
+            self.assertTrue(since <= 60)
+
+    def test_repos_serial(self):
+        gh = FakeHandle([3, 25, 26, 27, 28], per_page=10)
+        enumerator = allrepos.Enumerator(workers=1, chunk=10)
+
+        result = [repo.id for repo in enumerator.repos(gh)]
+
+        # The ranges between 3 and 25 are known to be empty, and
+        # nothing at all follows 30
+        self.assertEqual(result, [3, 25, 26, 27, 28])
+        self.assertEqual(gh.requests, [0, 20, 30])
+
+    def test_repos_error(self):
+        gh = mock.Mock(**{'get_repos.side_effect': IOError('failed')})
+        enumerator = allrepos.Enumerator(workers=2, chunk=10)
+
+        self.assertRaises(IOError, list, enumerator.repos(gh))
+
+    @mock.patch('time.time', return_value=1000)
+    def test_repos_index(self, mock_time):
+        gh = FakeHandle([1, 2, 5])
+        index = allrepos.RepoIndex()
+        enumerator = allrepos.Enumerator(workers=2, chunk=10, index=index)
+
+        result = [repo.id for repo in enumerator.repos(gh)]
+
+        self.assertEqual(sorted(result), [1, 2, 5])
+        self.assertEqual(index.hosts, {
+            'github.com': {
+                'walked': 1000,
+                'last_id': 5,
+                'repos': {1: 'o/r1', 2: 'o/r2', 5: 'o/r5'},
+            },
+        })
+
+    @mock.patch('time.time', return_value=1000)
+    def test_repos_incremental(self, mock_time):
+        gh = FakeHandle([1, 5, 8, 9])
+        index = allrepos.RepoIndex()
+        index.update('github.com', {1: 'o/r1', 2: 'o/r2', 5: 'o/r5'}, 5, 900)
+        enumerator = allrepos.Enumerator(workers=1, chunk=10, index=index)
+
+        result = []
+        for repo in enumerator.repos(gh):
+            result.append((repo.full_name, list(repo.get_pulls())))
+
+        # The deleted repository is dropped once its pull requests are
+        # listed, and only those after the last ID seen are enumerated
+        self.assertEqual(result, [
+            ('o/r1', ['pull']),
+            ('o/r2', []),
+            ('o/r5', ['pull']),
+            ('o/r8', ['pull']),
+            ('o/r9', ['pull']),
+        ])
+        self.assertEqual(gh.requests[0], 5)
+        self.assertEqual(index.hosts['github.com'], {
+            'walked': 900,
+            'last_id': 9,
+            'repos': {1: 'o/r1', 5: 'o/r5', 8: 'o/r8', 9: 'o/r9'},
+        })
+
+    @mock.patch('time.time', return_value=1000)
+    def test_repos_incremental_dropped_late(self, mock_time):
+        gh = FakeHandle([1, 5])
+        index = allrepos.RepoIndex()
+        index.update('github.com', {1: 'o/r1', 2: 'o/r2', 5: 'o/r5'}, 5, 900)
+        enumerator = allrepos.Enumerator(workers=1, chunk=10, index=index)
+
+        # The pull requests are only listed once every repository has
+        # been produced, as when they're fetched in parallel
+        result = list(enumerator.repos(gh))
+        for repo in result:
+            list(repo.get_pulls())
+
+        self.assertEqual(index.hosts['github.com']['repos'],
+                         {1: 'o/r1', 5: 'o/r5'})
+
+    @mock.patch('time.time', return_value=1000)
+    def test_repos_index_host(self, mock_time):
+        gh = FakeHandle([1, 2])
+        index = allrepos.RepoIndex()
+        index.update('github.com', {1: 'o/r1'}, 1, 900)
+        enumerator = allrepos.Enumerator(workers=1, chunk=10, index=index,
+                                         host='ghe.example.com')
+
+        result = [repo.full_name for repo in enumerator.repos(gh)]
+
+        # The index for another host isn't used
+        self.assertEqual(result, ['o/r1', 'o/r2'])
+        self.assertEqual(gh.requests[0], 0)
+        self.assertEqual(index.hosts['ghe.example.com']['repos'],
+                         {1: 'o/r1', 2: 'o/r2'})
+        self.assertEqual(index.hosts['github.com']['repos'], {1: 'o/r1'})
+
+    def test_repos_host(self):
+        gh = mock.Mock(host='ghe.example.com')
+        gh.get_repos.side_effect = lambda since: iter(
+            [FakeRepo(3, 'ghe.example.com:o/r3')] if since < 3 else [])
+        index = allrepos.RepoIndex()
+        enumerator = allrepos.Enumerator(workers=1, chunk=10, index=index)
+
+        list(enumerator.repos(gh))
+
+        self.assertEqual(index.hosts['ghe.example.com']['repos'],
+                         {3: 'o/r3'})
+
+
+class IndexedRepoTest(unittest.TestCase):
+    def test_rest(self):
+        gh = rest.Client()
+
+        result = allrepos._indexed_repo(gh, 7, 'o/r')
+
+        self.assertTrue(isinstance(result, rest.Repository))
+        self.assertEqual(result.full_name, 'o/r')
+
+    def test_host(self):
+        gh = hosts.HostHandle('ghe.example.com', rest.Client())
+
+        result = allrepos._indexed_repo(gh, 7, 'o/r')
+
+        self.assertEqual(result.full_name, 'ghe.example.com:o/r')
+
+    def test_pygithub(self):
+        gh = github.Github(base_url='https://ghe.example.com/api/v3')
+
+        with mock.patch.object(gh._Github__requester,
+                               'requestJsonAndCheck') as mock_request:
+            result = allrepos._indexed_repo(gh, 7, 'o/r')
+
+            # Nothing is looked up
+            self.assertEqual(result.id, 7)
+            self.assertEqual(result.full_name, 'o/r')
+            self.assertEqual(result.name, 'r')
+            self.assertEqual(result.url,
+                             'https://ghe.example.com/api/v3/repos/o/r')
+            self.assertFalse(mock_request.called)
+
+
+class KnownRepositoryTest(unittest.TestCase):
+    def test_get_pulls(self):
+        drop = mock.Mock()
+        repo = allrepos._KnownRepository(FakeRepo(1, 'o/r1'), drop)
+
+        self.assertEqual(repo.full_name, 'o/r1')
+        self.assertEqual(list(repo.get_pulls()), ['pull'])
+        self.assertFalse(drop.called)
+
+    def test_get_pulls_kwargs(self):
+        inner = mock.Mock(**{'get_pulls.return_value': ['pull']})
+        repo = allrepos._KnownRepository(inner, mock.Mock())
+
+        result = list(repo.get_pulls(state='closed'))
+
+        self.assertEqual(result, ['pull'])
+        inner.get_pulls.assert_called_once_with(state='closed')
+
+    def test_get_pulls_deleted(self):
+        drop = mock.Mock()
+        inner = mock.Mock(**{'get_pulls.side_effect': NotFound()})
+        repo = allrepos._KnownRepository(inner, drop)
+
+        self.assertEqual(list(repo.get_pulls()), [])
+        drop.assert_called_once_with()
+
+    def test_get_pulls_error(self):
+        inner = mock.Mock(**{'get_pulls.side_effect': IOError()})
+        repo = allrepos._KnownRepository(inner, mock.Mock())
+
+        self.assertRaises(IOError, list, repo.get_pulls())
+
+    def test_get_pulls_page(self):
+        drop = mock.Mock()
+        inner = mock.Mock(**{'get_pulls_page.return_value': (['pull'], {})})
+        repo = allrepos._KnownRepository(inner, drop)
+
+        result = repo.get_pulls_page({'page': 2})
+
+        self.assertEqual(result, (['pull'], {}))
+        inner.get_pulls_page.assert_called_once_with({'page': 2})
+        self.assertFalse(drop.called)
+
+    def test_get_pulls_page_deleted(self):
+        drop = mock.Mock()
+        inner = mock.Mock(**{'get_pulls_page.side_effect': NotFound()})
+        repo = allrepos._KnownRepository(inner, drop)
+
+        self.assertEqual(repo.get_pulls_page({}), ([], {}))
+        drop.assert_called_once_with()
@@ -0,0 +1,203 @@
+# Copyright 2014 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the
+#    License. You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing,
+#    software distributed under the License is distributed on an "AS
+#    IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+#    express or implied. See the License for the specific language
+#    governing permissions and limitations under the License.
+
+import datetime
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from tugboat import checkpoint
+from tugboat import records
+
+
+def make_record(number, repo_name='owner/repo'):
+    return records.PullRecord(
+        repo_name=repo_name,
+        number=number,
+        created_at=datetime.datetime(2014, 1, 1, 0, 0, number,
+                                     tzinfo=records.UTC),
+        updated_at=datetime.datetime(2014, 1, 2, 0, 0, number,
+                                     tzinfo=records.UTC),
+        mergeable=bool(number % 2),
+    )
+
+
+def make_datetime(*times):
+    return mock.Mock(**{'datetime.utcnow.side_effect': [
+        datetime.datetime(2014, 2, 1, 0, 0, secs) for secs in times
+    ]})
+
+
+class CheckpointTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'checkpoint.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def read_lines(self):
+        with open(self.path) as f:
+            return [json.loads(line) for line in f]
+
+    def test_init(self):
+        result = checkpoint.Checkpoint(self.path)
+
+        self.assertEqual(result.path, self.path)
+        self.assertEqual(result.max_age, checkpoint.DEFAULT_MAX_AGE)
+        self.assertEqual(result.repos, {})
+        self.assertFalse(os.path.exists(self.path))
+
+    @mock.patch.object(records.PullRecord, 'from_pull',
+                       side_effect=lambda x: x)
+    @mock.patch.object(checkpoint, 'datetime', make_datetime(5, 6))
+    def test_add(self, mock_from_pull):
+        ckpt = checkpoint.Checkpoint(self.path)
+        ckpt.open()
+
+        result = ckpt.add('owner/repo', [make_record(1), make_record(2)])
+        ckpt.add('owner/empty', [])
+        ckpt.close()
+
+        self.assertEqual([r.key for r in result],
+                         [('owner/repo', 1), ('owner/repo', 2)])
+        self.assertEqual(ckpt.repos['owner/repo'][1], result)
+
+        lines = self.read_lines()
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(lines[0], {'version': checkpoint.VERSION})
+        self.assertEqual(lines[1]['repo'], 'owner/repo')
+        self.assertEqual(lines[1]['fetched'], '2014-02-01T00:00:05Z')
+        self.assertEqual([p['number'] for p in lines[1]['pulls']], [1, 2])
+        self.assertEqual(lines[2], {
+            'repo': 'owner/empty',
+            'fetched': '2014-02-01T00:00:06Z',
+            'pulls': [],
+        })
+        self.assertEqual(mock_from_pull.call_count, 2)
+
+    @mock.patch.object(records.PullRecord, 'from_pull',
+                       side_effect=lambda x: x)
+    def test_open_replaces(self, mock_from_pull):
+        with open(self.path, 'w') as f:
+            f.write('garbage\n')
+        ckpt = checkpoint.Checkpoint(self.path)
+
+        ckpt.open()
+        ckpt.close()
+
+        self.assertEqual(self.read_lines(), [{'version': checkpoint.VERSION}])
+
+    @mock.patch.object(records.PullRecord, 'from_pull',
+                       side_effect=lambda x: x)
+    def test_resume(self, mock_from_pull):
+        ckpt = checkpoint.Checkpoint(self.path, None)
+        ckpt.open()
+        ckpt.add('owner/repo', [make_record(1)])
+        ckpt.close()
+
+        ckpt = checkpoint.Checkpoint(self.path, None)
+        ckpt.open(True)
+        ckpt.add('owner/other', [make_record(2, 'owner/other')])
+        ckpt.close()
+
+        ckpt = checkpoint.Checkpoint(self.path, None)
+        ckpt.load()
+        self.assertEqual(sorted(ckpt.repos), ['owner/other', 'owner/repo'])
+        result = ckpt.get('owner/repo')
+        self.assertEqual([r.key for r in result], [('owner/repo', 1)])
+        self.assertEqual(result[0].created_at,
+                         datetime.datetime(2014, 1, 1, 0, 0, 1,
+                                           tzinfo=records.UTC))
+        self.assertEqual(result[0].mergeable, True)
+
+    def test_resume_missing(self):
+        ckpt = checkpoint.Checkpoint(self.path)
+
+        ckpt.open(True)
+        ckpt.close()
+
+        self.assertEqual(ckpt.repos, {})
+        self.assertEqual(self.read_lines(), [{'version': checkpoint.VERSION}])
+
+    @mock.patch.object(records.PullRecord, 'from_pull',
+                       side_effect=lambda x: x)
+    def test_resume_torn(self, mock_from_pull):
+        with open(self.path, 'w') as f:
+            f.write('{"version":1}\n'
+                    '{"repo":"owner/repo","fetched":"2014-02-01T00:00:00Z",'
+                    '"pulls":[]}\n'
+                    '{"repo":"owner/torn","fetch')
+        ckpt = checkpoint.Checkpoint(self.path, None)
+
+        ckpt.open(True)
+        ckpt.add('owner/other', [])
+        ckpt.close()
+
+        self.assertEqual(sorted(ckpt.repos), ['owner/other', 'owner/repo'])
+        ckpt.load()
+        self.assertEqual(sorted(ckpt.repos), ['owner/other', 'owner/repo'])
+
+    def test_load_version(self):
+        with open(self.path, 'w') as f:
+            f.write('{"version": 99}\n')
+        ckpt = checkpoint.Checkpoint(self.path)
+
+        self.assertRaises(ValueError, ckpt.load)
+
+    def test_get_missing(self):
+        ckpt = checkpoint.Checkpoint(self.path)
+
+        self.assertEqual(ckpt.get('owner/repo'), None)
+
+    @mock.patch.object(checkpoint, 'datetime', mock.Mock(**{
+        'datetime.utcnow.return_value': datetime.datetime(2014, 2, 1, 1),
+    }))
+    def test_get_fresh(self):
+        ckpt = checkpoint.Checkpoint(self.path, 3600)
+        ckpt.repos['owner/repo'] = (datetime.datetime(2014, 2, 1), ['rec'])
+
+        self.assertEqual(ckpt.get('owner/repo'), ['rec'])
+
+    @mock.patch.object(checkpoint, 'datetime', mock.Mock(**{
+        'datetime.utcnow.return_value': datetime.datetime(2014, 2, 1, 1,
+                                                          0, 1),
+    }))
+    def test_get_stale(self):
+        ckpt = checkpoint.Checkpoint(self.path, 3600)
+        ckpt.repos['owner/repo'] = (datetime.datetime(2014, 2, 1), ['rec'])
+
+        self.assertEqual(ckpt.get('owner/repo'), None)
+
+    def test_get_no_max_age(self):
+        ckpt = checkpoint.Checkpoint(self.path, None)
+        ckpt.repos['owner/repo'] = (datetime.datetime(2000, 1, 1), ['rec'])
+
+        self.assertEqual(ckpt.get('owner/repo'), ['rec'])
+
+    def test_remove(self):
+        ckpt = checkpoint.Checkpoint(self.path)
+        ckpt.open()
+
+        ckpt.remove()
+
+        self.assertFalse(os.path.exists(self.path))
+
+        # Removing again is harmless
+        ckpt.remove()
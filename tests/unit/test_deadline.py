@@ -0,0 +1,288 @@
+# Copyright 2014 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the
+#    License. You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing,
+#    software distributed under the License is distributed on an "AS
+#    IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+#    express or implied. See the License for the specific language
+#    governing permissions and limitations under the License.
+
+
+import threading
+import unittest
+
+import mock
+
+from tugboat import deadline
+from tugboat import rest
+
+
+class FakeClock(object):
+    def __init__(self, now=100.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class DeadlineTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.object(deadline.stats, 'clock', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_init(self):
+        result = deadline.Deadline(10, 2, 'requester')
+
+        self.assertEqual(result.budget, 10)
+        self.assertEqual(result.repo_timeout, 2)
+        self.assertEqual(result.requester, 'requester')
+        self.assertEqual(result.skipped, [])
+        self.assertEqual(result.remaining(), None)
+        self.assertFalse(result.expired)
+
+    def test_remaining(self):
+        dl = deadline.Deadline(10)
+        dl.start()
+        self.clock.now += 4
+
+        self.assertEqual(dl.remaining(), 6)
+        self.assertFalse(dl.expired)
+
+        self.clock.now += 6
+
+        self.assertEqual(dl.remaining(), 0)
+        self.assertTrue(dl.expired)
+
+        dl.stop()
+
+        self.assertEqual(dl.remaining(), None)
+        self.assertFalse(dl.expired)
+
+    def test_remaining_no_budget(self):
+        dl = deadline.Deadline()
+        dl.start()
+
+        self.assertEqual(dl.remaining(), None)
+
+    @mock.patch.object(deadline.requester_mod, 'cap_timeout',
+                       return_value=15)
+    def test_call_unlimited(self, mock_cap_timeout):
+        dl = deadline.Deadline(requester='requester')
+        dl.start()
+        call = mock.Mock(return_value='result')
+
+        result = dl(call, 'GET', 'url', a=1)
+
+        self.assertEqual(result, 'result')
+        call.assert_called_once_with('GET', 'url', a=1)
+        self.assertFalse(mock_cap_timeout.called)
+
+    @mock.patch.object(deadline.requester_mod, 'cap_timeout',
+                       return_value=15)
+    def test_call_caps_timeout(self, mock_cap_timeout):
+        dl = deadline.Deadline(10, requester='requester')
+        dl.start()
+        self.clock.now += 8
+        call = mock.Mock(return_value='result')
+
+        result = dl(call, 'GET', 'url')
+
+        self.assertEqual(result, 'result')
+        call.assert_called_once_with('GET', 'url')
+        mock_cap_timeout.assert_has_calls([
+            mock.call('requester', 2),
+            mock.call('requester', 15),
+        ])
+        self.assertEqual(mock_cap_timeout.call_count, 2)
+
+    @mock.patch.object(deadline.requester_mod, 'cap_timeout',
+                       return_value=1)
+    def test_call_keeps_shorter_timeout(self, mock_cap_timeout):
+        dl = deadline.Deadline(10, requester='requester')
+        dl.start()
+        call = mock.Mock(return_value='result')
+
+        dl(call, 'GET', 'url')
+
+        mock_cap_timeout.assert_has_calls([
+            mock.call('requester', 10),
+            mock.call('requester', 1),
+            mock.call('requester', 1),
+        ])
+
+    @mock.patch.object(deadline.requester_mod, 'cap_timeout',
+                       return_value=15)
+    def test_bind(self, mock_cap_timeout):
+        dl = deadline.Deadline(10, requester='requester')
+        dl.start()
+        self.clock.now += 8
+        call = mock.Mock(return_value='result')
+        middleware = dl.bind('other')
+
+        result = middleware(call, 'GET', 'url')
+
+        self.assertEqual(result, 'result')
+        call.assert_called_once_with('GET', 'url')
+        mock_cap_timeout.assert_has_calls([
+            mock.call('other', 2),
+            mock.call('other', 15),
+        ])
+        self.assertEqual(mock_cap_timeout.call_count, 2)
+
+    def test_call_concurrent(self):
+        client = rest.Client(timeout=15)
+        dl = deadline.Deadline(10, 2, client)
+        dl.start()
+        timeouts = {}
+        entered = threading.Event()
+        released = threading.Event()
+
+        def slow(verb, url):
+            timeouts[url] = client._timeout()
+            entered.set()
+            released.wait(5)
+            return url
+
+        def fast(verb, url):
+            entered.wait(5)
+            timeouts[url] = client._timeout()
+            released.set()
+            return url
+
+        # The first worker is fetching a repository, with its own
+        # timeout; the second is only bound by the run's budget, and
+        # finishes first
+        threads = [
+            threading.Thread(target=dl.fetch,
+                             args=('a/b', dl, slow, 'GET', 'slow')),
+            threading.Thread(target=dl.guard,
+                             args=('a', dl, fast, 'GET', 'fast')),
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        dl.stop()
+
+        self.assertEqual(timeouts, {'slow': 2, 'fast': 10})
+        self.assertEqual(client.timeout, 15)
+        self.assertEqual(client._timeout(), 15)
+
+    def test_bind_expired(self):
+        dl = deadline.Deadline(10)
+        dl.start()
+        self.clock.now += 10
+        call = mock.Mock()
+
+        self.assertRaises(deadline.DeadlineExceeded, dl.bind('other'), call,
+                          'GET', 'url')
+        self.assertFalse(call.called)
+
+    def test_call_expired(self):
+        dl = deadline.Deadline(10)
+        dl.start()
+        self.clock.now += 10
+        call = mock.Mock()
+
+        self.assertRaises(deadline.DeadlineExceeded, dl, call, 'GET', 'url')
+        self.assertFalse(call.called)
+
+    def test_call_cut_off(self):
+        dl = deadline.Deadline(10)
+        dl.start()
+
+        def call(verb, url):
+            self.clock.now += 10
+            raise IOError('timed out')
+
+        self.assertRaises(deadline.DeadlineExceeded, dl, call, 'GET', 'url')
+
+    def test_call_failure(self):
+        dl = deadline.Deadline(10)
+        dl.start()
+        call = mock.Mock(side_effect=IOError('failed'))
+
+        self.assertRaises(IOError, dl, call, 'GET', 'url')
+
+    def test_fetch(self):
+        dl = deadline.Deadline(10, 2)
+        dl.start()
+        remaining = []
+
+        def func(*args, **kwargs):
+            remaining.append(dl.remaining())
+            return args, kwargs
+
+        result = dl.fetch('owner/repo', func, 1, a=2)
+
+        self.assertEqual(result, ((1,), {'a': 2}))
+        self.assertEqual(remaining, [2])
+        self.assertEqual(dl.remaining(), 10)
+        self.assertEqual(dl.skipped, [])
+
+    def test_fetch_per_thread(self):
+        dl = deadline.Deadline(10, 2)
+        dl.start()
+        remaining = []
+
+        def func():
+            thread = threading.Thread(
+                target=lambda: remaining.append(dl.remaining()))
+            thread.start()
+            thread.join()
+            remaining.append(dl.remaining())
+
+        dl.fetch('owner/repo', func)
+
+        self.assertEqual(remaining, [10, 2])
+
+    def test_fetch_timed_out(self):
+        dl = deadline.Deadline(10, 2)
+        dl.start()
+        func = mock.Mock(side_effect=deadline.DeadlineExceeded())
+
+        result = dl.fetch('owner/repo', func)
+
+        self.assertEqual(result, None)
+        self.assertEqual(dl.skipped, [('owner/repo', 'timed out')])
+        self.assertEqual(dl.remaining(), 10)
+
+    def test_fetch_skipped(self):
+        dl = deadline.Deadline(10, 2)
+        dl.start()
+        self.clock.now += 10
+        func = mock.Mock()
+
+        result = dl.fetch('owner/repo', func)
+
+        self.assertEqual(result, None)
+        self.assertFalse(func.called)
+        self.assertEqual(dl.skipped, [('owner/repo', 'skipped')])
+
+    def test_guard(self):
+        dl = deadline.Deadline(10, 2)
+        dl.start()
+        remaining = []
+
+        result = dl.guard('org', lambda: remaining.append(dl.remaining()))
+
+        self.assertEqual(result, None)
+        self.assertEqual(remaining, [10])
+        self.assertEqual(dl.skipped, [])
+
+    def test_covers(self):
+        dl = deadline.Deadline()
+        dl.skipped = [('org', 'skipped'), ('owner/repo', 'timed out')]
+
+        self.assertTrue(dl.covers('org/repo'))
+        self.assertTrue(dl.covers('owner/repo'))
+        self.assertFalse(dl.covers('owner/repo2'))
+        self.assertFalse(dl.covers('organization/repo'))
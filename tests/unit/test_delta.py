@@ -0,0 +1,146 @@
+# Copyright 2014 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the
+#    License. You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing,
+#    software distributed under the License is distributed on an "AS
+#    IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+#    express or implied. See the License for the specific language
+#    governing permissions and limitations under the License.
+
+import datetime
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from tugboat import delta
+from tugboat import records
+
+
+def make_record(number, minute):
+    return records.PullRecord(
+        'a/b', number, updated_at=records.aware(
+            datetime.datetime(2014, 1, 1, 0, minute)))
+
+
+class DeltaStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'delta.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_init(self):
+        result = delta.DeltaStore()
+
+        self.assertEqual(result.max_age, delta.DEFAULT_MAX_AGE)
+        self.assertEqual(result.stats, None)
+        self.assertEqual(result.repos, {})
+        self.assertEqual(result.get('a/b'), None)
+
+    @mock.patch.object(delta.time, 'time', return_value=1000.0)
+    def test_update_get(self, mock_time):
+        store = delta.DeltaStore()
+        pulls = [make_record(1, 5), make_record(2, 3)]
+
+        store.update('a/b', pulls)
+        watermark, result = store.get('a/b')
+
+        self.assertEqual(watermark, pulls[0].updated_at)
+        self.assertEqual(result, {1: pulls[0], 2: pulls[1]})
+        self.assertEqual(store.repos['a/b']['listed'], 1000.0)
+
+        # The caller may modify the result freely
+        result.clear()
+        self.assertEqual(len(store.get('a/b')[1]), 2)
+
+    def test_update_watermark(self):
+        store = delta.DeltaStore()
+        later = records.aware(datetime.datetime(2014, 1, 2))
+
+        store.update('a/b', [make_record(1, 5)], later)
+
+        self.assertEqual(store.get('a/b')[0], later)
+
+    def test_update_keeps_listed(self):
+        store = delta.DeltaStore()
+        store.update('a/b', [make_record(1, 5)], listed=10.0)
+
+        store.update('a/b', [make_record(1, 6)])
+
+        self.assertEqual(store.repos['a/b']['listed'], 10.0)
+
+    def test_empty(self):
+        store = delta.DeltaStore()
+
+        # With no watermark, there's nothing to list from
+        store.update('a/b', [])
+
+        self.assertEqual(store.get('a/b'), None)
+
+    @mock.patch.object(delta.time, 'time', return_value=100000.0)
+    def test_stale(self, mock_time):
+        store = delta.DeltaStore(max_age=60)
+        store.update('a/b', [make_record(1, 5)], listed=100000.0 - 61)
+        store.update('a/c', [make_record(1, 5)], listed=100000.0 - 59)
+
+        self.assertEqual(store.get('a/b'), None)
+        self.assertNotEqual(store.get('a/c'), None)
+
+    def test_count(self):
+        stats = mock.Mock()
+        store = delta.DeltaStore(stats=stats)
+
+        store.count('delta_full')
+        store.count('delta_changed', 0)
+        store.count('delta_changed', 3)
+
+        stats.count.assert_has_calls([
+            mock.call('delta_full', 1),
+            mock.call('delta_changed', 3),
+        ])
+        self.assertEqual(stats.count.call_count, 2)
+
+    def test_count_no_stats(self):
+        delta.DeltaStore().count('delta_full')
+
+    def test_round_trip(self):
+        store = delta.DeltaStore()
+        store.update('a/b', [make_record(2, 3), make_record(1, 5)],
+                     listed=10.0)
+        store.write(self.path)
+
+        with open(self.path) as f:
+            data = json.load(f)
+        result = delta.load(self.path)
+
+        self.assertEqual(data['version'], delta.VERSION)
+        self.assertEqual(data['repos']['a/b']['watermark'],
+                         '2014-01-01T00:05:00Z')
+        self.assertEqual([pull['number']
+                          for pull in data['repos']['a/b']['pulls']], [1, 2])
+        self.assertEqual(result.repos['a/b']['listed'], 10.0)
+        self.assertEqual(result.repos['a/b']['watermark'],
+                         make_record(1, 5).updated_at)
+        self.assertEqual(sorted(result.repos['a/b']['pulls']), [1, 2])
+
+    def test_load_missing(self):
+        result = delta.load(self.path)
+
+        self.assertEqual(result.repos, {})
+
+    def test_load_bad_version(self):
+        with open(self.path, 'w') as f:
+            json.dump({'version': 0}, f)
+
+        self.assertRaises(ValueError, delta.load, self.path)
@@ -0,0 +1,294 @@
+# Copyright 2014 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the
+#    License. You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing,
+#    software distributed under the License is distributed on an "AS
+#    IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+#    express or implied. See the License for the specific language
+#    governing permissions and limitations under the License.
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import mock
+
+from tugboat import hosts
+
+
+class SplitTargetTest(unittest.TestCase):
+    def test_plain(self):
+        self.assertEqual(hosts.split_target('owner/repo'),
+                         (None, 'owner/repo'))
+
+    def test_host(self):
+        self.assertEqual(hosts.split_target('ghe.example.com:owner/repo'),
+                         ('ghe.example.com', 'owner/repo'))
+
+    def test_host_org(self):
+        self.assertEqual(hosts.split_target('ghe.example.com:acme'),
+                         ('ghe.example.com', 'acme'))
+
+    def test_not_host(self):
+        self.assertEqual(hosts.split_target(':acme'), (None, ':acme'))
+        self.assertEqual(hosts.split_target('owner/re:po'),
+                         (None, 'owner/re:po'))
+
+
+class UrlTest(unittest.TestCase):
+    def test_api_url_default(self):
+        self.assertEqual(hosts.api_url('github.com'),
+                         'https://api.github.com')
+
+    def test_api_url_enterprise(self):
+        self.assertEqual(hosts.api_url('ghe.example.com'),
+                         'https://ghe.example.com/api/v3')
+
+    def test_url_host_default(self):
+        self.assertEqual(hosts.url_host('https://api.github.com/'),
+                         'github.com')
+
+    def test_url_host_enterprise(self):
+        self.assertEqual(hosts.url_host('https://ghe.example.com/api/v3'),
+                         'ghe.example.com')
+
+
+class LoadCredentialsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'credentials.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, data):
+        with open(self.path, 'w') as f:
+            json.dump(data, f)
+
+    def test_load(self):
+        self.write({'ghe.example.com': {'username': 'u', 'password': 'p'}})
+
+        result = hosts.load_credentials(self.path)
+
+        self.assertEqual(result, {
+            'ghe.example.com': {'username': 'u', 'password': 'p'},
+        })
+
+    def test_not_dict(self):
+        self.write(['ghe.example.com'])
+
+        self.assertRaises(ValueError, hosts.load_credentials, self.path)
+
+    def test_host_not_dict(self):
+        self.write({'ghe.example.com': 'token'})
+
+        self.assertRaises(ValueError, hosts.load_credentials, self.path)
+
+
+class HostHandleTest(unittest.TestCase):
+    def test_get_repo(self):
+        gh = mock.Mock()
+        gh.get_repo.return_value = mock.Mock(full_name='owner/repo',
+                                             html_url='url')
+        handle = hosts.HostHandle('ghe.example.com', gh)
+
+        result = handle.get_repo('owner/repo')
+
+        self.assertTrue(isinstance(result, hosts.HostRepository))
+        self.assertEqual(result.full_name, 'ghe.example.com:owner/repo')
+        self.assertEqual(result.html_url, 'url')
+        gh.get_repo.assert_called_once_with('owner/repo')
+
+    def test_get_organization(self):
+        gh = mock.Mock()
+        gh.get_organization.return_value.get_repos.return_value = [
+            mock.Mock(full_name='acme/a'),
+            mock.Mock(full_name='acme/b'),
+        ]
+        handle = hosts.HostHandle('ghe.example.com', gh)
+
+        result = handle.get_organization('acme')
+
+        self.assertEqual([repo.full_name for repo in result.get_repos()],
+                         ['ghe.example.com:acme/a', 'ghe.example.com:acme/b'])
+        gh.get_organization.assert_called_once_with('acme')
+
+    def test_get_user(self):
+        gh = mock.Mock()
+        gh.get_user.return_value.get_repos.return_value = [
+            mock.Mock(full_name='user/a'),
+        ]
+        handle = hosts.HostHandle('ghe.example.com', gh)
+
+        result = handle.get_user('user')
+
+        self.assertEqual([repo.full_name for repo in result.get_repos()],
+                         ['ghe.example.com:user/a'])
+        gh.get_user.assert_called_once_with('user')
+
+    def test_get_repos(self):
+        gh = mock.Mock()
+        gh.get_repos.return_value = [mock.Mock(full_name='owner/repo')]
+        handle = hosts.HostHandle('ghe.example.com', gh)
+
+        result = [repo.full_name for repo in handle.get_repos()]
+
+        self.assertEqual(result, ['ghe.example.com:owner/repo'])
+
+    def test_get_repos_since(self):
+        gh = mock.Mock()
+        gh.get_repos.return_value = [mock.Mock(full_name='owner/repo', id=8)]
+        handle = hosts.HostHandle('ghe.example.com', gh)
+
+        result = [repo.id for repo in handle.get_repos(since=5)]
+
+        self.assertEqual(result, [8])
+        gh.get_repos.assert_called_once_with(since=5)
+
+    def test_get_pulls(self):
+        repo = mock.Mock(full_name='owner/repo')
+        repo.get_pulls.return_value = ['pull']
+
+        result = hosts.HostRepository('ghe.example.com', repo)
+
+        self.assertEqual(result.get_pulls(), ['pull'])
+
+
+class HostsTest(unittest.TestCase):
+    def test_init(self):
+        result = hosts.Hosts('gh')
+
+        self.assertEqual(result.default, 'gh')
+        self.assertEqual(result.default_host, 'github.com')
+        self.assertEqual(result.handles, {})
+        self.assertEqual(result.all(), [('github.com', 'gh')])
+
+    def test_all(self):
+        result = hosts.Hosts('gh')
+        result.add('ghe2.example.com', 'gh2')
+        result.add('ghe1.example.com', 'gh1')
+
+        self.assertEqual(result.all(), [
+            ('github.com', 'gh'),
+            ('ghe1.example.com', 'gh1'),
+            ('ghe2.example.com', 'gh2'),
+        ])
+
+    def test_group(self):
+        handles = hosts.Hosts('gh')
+        handles.add('ghe1.example.com', 'gh1')
+        handles.add('ghe2.example.com', 'gh2')
+
+        result = handles.group([
+            ('organization', 'ghe2.example.com:acme'),
+            ('repo', 'owner/repo'),
+            ('user', 'ghe1.example.com:user'),
+            ('repo', 'github.com:owner/other'),
+            ('repo', 'ghe2.example.com:acme/repo'),
+        ])
+
+        self.assertEqual(len(result), 3)
+        self.assertEqual(result[0], ('gh', [
+            ('repo', 'owner/repo', 'owner/repo'),
+            ('repo', 'owner/other', 'owner/other'),
+        ]))
+        self.assertEqual(result[1][0].host, 'ghe2.example.com')
+        self.assertEqual(result[1][0].gh, 'gh2')
+        self.assertEqual(result[1][1], [
+            ('organization', 'ghe2.example.com:acme', 'acme'),
+            ('repo', 'ghe2.example.com:acme/repo', 'acme/repo'),
+        ])
+        self.assertEqual(result[2][0].host, 'ghe1.example.com')
+        self.assertEqual(result[2][1], [
+            ('user', 'ghe1.example.com:user', 'user'),
+        ])
+
+    def test_group_other_only(self):
+        handles = hosts.Hosts('gh')
+        handles.add('ghe.example.com', 'gh1')
+
+        result = handles.group([('repo', 'ghe.example.com:owner/repo')])
+
+        self.assertEqual(len(result), 1)
+        self.assertEqual(result[0][0].host, 'ghe.example.com')
+
+    def test_group_handle(self):
+        result = hosts.group('gh', [('repo', 'owner/repo'),
+                                    ('organization', 'acme')])
+
+        self.assertEqual(result, [('gh', [
+            ('repo', 'owner/repo', 'owner/repo'),
+            ('organization', 'acme', 'acme'),
+        ])])
+
+    def test_group_handle_default_host(self):
+        gh = mock.Mock(_Github__requester=mock.Mock(
+            base_url='https://api.github.com'))
+
+        result = hosts.group(gh, [('organization', 'github.com:acme'),
+                                  ('repo', 'owner/repo')])
+
+        # The prefix naming the handle's own host is dropped
+        self.assertEqual(result, [(gh, [
+            ('organization', 'acme', 'acme'),
+            ('repo', 'owner/repo', 'owner/repo'),
+        ])])
+
+    def test_group_handle_enterprise_host(self):
+        gh = mock.Mock(spec=['requestJsonAndCheck', 'base_url'],
+                       base_url='https://ghe.example.com/api/v3')
+
+        result = hosts.group(gh, [('repo', 'ghe.example.com:owner/repo')])
+
+        self.assertEqual(result, [(gh, [
+            ('repo', 'owner/repo', 'owner/repo'),
+        ])])
+
+    def test_group_hosts(self):
+        handles = hosts.Hosts('gh')
+
+        result = hosts.group(handles, [('repo', 'owner/repo')])
+
+        self.assertEqual(result, [('gh', [
+            ('repo', 'owner/repo', 'owner/repo'),
+        ])])
+
+
+class ConcurrentlyTest(unittest.TestCase):
+    def test_results(self):
+        threads = set()
+
+        def func(a, b):
+            threads.add(threading.current_thread().name)
+            return a + b
+
+        result = hosts.concurrently(func, [(1, 2), (3, 4), (5, 6)])
+
+        self.assertEqual(result, [3, 7, 11])
+        self.assertEqual(len(threads), 3)
+
+    def test_error(self):
+        finished = []
+
+        def func(idx):
+            if idx == 1:
+                raise ValueError('failed %d' % idx)
+            finished.append(idx)
+
+        try:
+            hosts.concurrently(func, [(0,), (1,), (2,)])
+        except ValueError as exc:
+            self.assertEqual(str(exc), 'failed 1')
+        else:
+            self.fail('Failed to raise ValueError')
+
+        self.assertEqual(sorted(finished), [0, 2])
@@ -0,0 +1,166 @@
+# Copyright 2014 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the
+#    License. You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing,
+#    software distributed under the License is distributed on an "AS
+#    IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+#    express or implied. See the License for the specific language
+#    governing permissions and limitations under the License.
+
+import sys
+import unittest
+
+import mock
+
+from tugboat import lazy
+
+
+# Simulates the relevant parts of a PyGithub lazy object
+github_source = '''
+class Lazy(object):
+    def __init__(self, request):
+        self.request = request
+        self._value = None
+
+    def _completeIfNotSet(self, value):
+        if value is None:
+            self._completeIfNeeded()
+
+    def _completeIfNeeded(self):
+        self._complete()
+
+    def _complete(self):
+        self.request()
+
+    @property
+    def name(self):
+        self._completeIfNotSet(self._value)
+        return 'name'
+
+    def complete(self):
+        self._completeIfNeeded()
+
+
+def get_completed(request):
+    return Lazy(request).complete()
+'''
+
+# Simulates tugboat.pulls passing an attribute access through
+passthrough_source = '''
+def passthrough(obj):
+    return obj.name
+'''
+
+
+def _load(source, name):
+    namespace = {'__name__': name}
+    exec(compile(source, '<%s>' % name, 'exec'), namespace)
+    return namespace
+
+
+class FindAccessTest(unittest.TestCase):
+    def setUp(self):
+        self.github = _load(github_source, 'github.Lazy')
+        self.passthrough = _load(passthrough_source, 'tugboat.pulls')
+        self.results = []
+
+    def request(self):
+        self.results.append(lazy.find_access(sys._getframe(1)))
+
+    def test_direct(self):
+        self.request()
+
+        self.assertEqual(self.results, [None])
+
+    def test_attribute(self):
+        obj = self.github['Lazy'](self.request)
+
+        obj.name
+        line = sys._getframe().f_lineno - 1
+
+        self.assertEqual(self.results, [
+            ('Lazy.name', '%s:%d (test_attribute)' % (__name__, line)),
+        ])
+
+    def test_passthrough(self):
+        obj = self.github['Lazy'](self.request)
+
+        self.passthrough['passthrough'](obj)
+        line = sys._getframe().f_lineno - 1
+
+        self.assertEqual(self.results, [
+            ('Lazy.name', '%s:%d (test_passthrough)' % (__name__, line)),
+        ])
+
+    def test_internal(self):
+        self.github['get_completed'](self.request)
+
+        self.assertEqual(self.results, [None])
+
+
+class LazyTracerTest(unittest.TestCase):
+    def test_init(self):
+        result = lazy.LazyTracer()
+
+        self.assertEqual(result.accesses, {})
+
+    @mock.patch.object(lazy, 'find_access', side_effect=[
+        ('Lazy.name', 'site1'),
+        None,
+        ('Lazy.name', 'site1'),
+        ('Lazy.name', 'site2'),
+        ('Other.attr', 'site1'),
+    ])
+    def test_call(self, mock_find_access):
+        call = mock.Mock(return_value=('headers', 'data'))
+        tracer = lazy.LazyTracer()
+
+        for i in range(5):
+            result = tracer(call, 'GET', 'url%d' % i, parameters={})
+            self.assertEqual(result, ('headers', 'data'))
+
+        self.assertEqual(tracer.accesses, {
+            'Lazy.name': {'site1': 2, 'site2': 1},
+            'Other.attr': {'site1': 1},
+        })
+        self.assertEqual(call.call_count, 5)
+        call.assert_called_with('GET', 'url4', parameters={})
+
+    def test_to_dict(self):
+        tracer = lazy.LazyTracer()
+        tracer.accesses = {
+            'Lazy.name': {'site1': 2, 'site2': 1},
+        }
+
+        result = tracer.to_dict()
+
+        self.assertEqual(result, {
+            'Lazy.name': {'site1': 2, 'site2': 1},
+        })
+
+    def test_format(self):
+        tracer = lazy.LazyTracer()
+        tracer.accesses = {
+            'Lazy.name': {'site1': 2, 'site2': 3},
+            'Other.attr': {'site1': 1},
+            'Third.attr': {'site3': 6},
+        }
+
+        result = tracer.format()
+
+        self.assertEqual(result, [
+            'Lazy completion requests: 12',
+            '    Third.attr: 6',
+            '        site3: 6',
+            '    Lazy.name: 5',
+            '        site2: 3',
+            '        site1: 2',
+            '    Other.attr: 1',
+            '        site1: 1',
+        ])
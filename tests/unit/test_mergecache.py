@@ -0,0 +1,117 @@
+# Copyright 2014 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the
+#    License. You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing,
+#    software distributed under the License is distributed on an "AS
+#    IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+#    express or implied. See the License for the specific language
+#    governing permissions and limitations under the License.
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from tugboat import mergecache
+
+
+@mock.patch.object(mergecache.time, 'time', return_value=1000000.0)
+class MergeCacheTest(unittest.TestCase):
+    def test_init(self, mock_time):
+        result = mergecache.MergeCache()
+
+        self.assertEqual(result.max_age, mergecache.DEFAULT_MAX_AGE)
+        self.assertEqual(result.stats, None)
+        self.assertEqual(result.entries, {})
+
+    def test_key(self, mock_time):
+        self.assertEqual(mergecache.MergeCache.key('a/b', 'head', 'base'),
+                         'a/b head base')
+
+    def test_miss(self, mock_time):
+        stats = mock.Mock()
+        cache = mergecache.MergeCache(stats=stats)
+
+        self.assertEqual(cache.get('a/b', 'head', 'base'), None)
+        stats.cache.assert_called_once_with('mergeable', False)
+
+    def test_hit(self, mock_time):
+        stats = mock.Mock()
+        cache = mergecache.MergeCache(stats=stats)
+        cache.entries['a/b head base'] = [False, 10]
+
+        self.assertEqual(cache.get('a/b', 'head', 'base'), False)
+        self.assertEqual(cache.entries['a/b head base'], [False, 1000000])
+        stats.cache.assert_called_once_with('mergeable', True)
+
+    def test_set(self, mock_time):
+        cache = mergecache.MergeCache()
+
+        cache.set('a/b', 'head', 'base', True)
+
+        self.assertEqual(cache.entries, {'a/b head base': [True, 1000000]})
+        self.assertEqual(cache.get('a/b', 'head', 'base'), True)
+        self.assertEqual(cache.get('a/b', 'head', 'moved'), None)
+
+    def test_set_unknown(self, mock_time):
+        cache = mergecache.MergeCache()
+
+        cache.set('a/b', 'head', 'base', None)
+
+        self.assertEqual(cache.entries, {})
+
+    def test_to_dict(self, mock_time):
+        cache = mergecache.MergeCache(max_age=100)
+        cache.entries = {
+            'a/b 1 1': [True, 999950],
+            'a/b 2 1': [False, 999850],
+        }
+
+        result = cache.to_dict()
+
+        self.assertEqual(result, {
+            'version': mergecache.VERSION,
+            'entries': {'a/b 1 1': [True, 999950]},
+        })
+
+
+class LoadTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'merge.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_missing(self):
+        result = mergecache.load(self.path, 60, 'stats')
+
+        self.assertEqual(result.entries, {})
+        self.assertEqual(result.max_age, 60)
+        self.assertEqual(result.stats, 'stats')
+
+    def test_round_trip(self):
+        cache = mergecache.MergeCache()
+        cache.set('a/b', 'head', 'base', True)
+        cache.set('a/c', 'head', 'base', False)
+        cache.write(self.path)
+
+        result = mergecache.load(self.path)
+
+        self.assertEqual(result.entries, cache.entries)
+        self.assertEqual(result.get('a/c', 'head', 'base'), False)
+
+    def test_bad_version(self):
+        with open(self.path, 'w') as f:
+            json.dump({'version': 0, 'entries': {}}, f)
+
+        self.assertRaises(ValueError, mergecache.load, self.path)
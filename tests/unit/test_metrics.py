@@ -0,0 +1,155 @@
+# Copyright 2014 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the
+#    License. You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing,
+#    software distributed under the License is distributed on an "AS
+#    IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+#    express or implied. See the License for the specific language
+#    governing permissions and limitations under the License.
+
+import unittest
+
+import mock
+
+from tugboat import metrics
+
+
+class EscapeTest(unittest.TestCase):
+    def test_plain(self):
+        self.assertEqual(metrics._escape('owner/repo'), 'owner/repo')
+
+    def test_special(self):
+        self.assertEqual(metrics._escape('a\\b"c\nd'), 'a\\\\b\\"c\\nd')
+
+
+class RepoMetricsTest(unittest.TestCase):
+    def test_init(self):
+        result = metrics.RepoMetrics('repo', 5, 3, 100)
+
+        self.assertEqual(result.name, 'repo')
+        self.assertEqual(result.pulls, 5)
+        self.assertEqual(result.mergeable, 3)
+        self.assertEqual(result.oldest_age, 100)
+
+
+class MetricsTest(unittest.TestCase):
+    def test_init(self):
+        result = metrics.Metrics()
+
+        self.assertEqual(result.repos, [])
+        self.assertEqual(result.requests, 0)
+        self.assertEqual(result.start, None)
+        self.assertEqual(result.end, None)
+
+    def test_call(self):
+        call = mock.Mock(return_value=('headers', 'data'))
+        mets = metrics.Metrics()
+
+        result = mets(call, 'GET', 'url', parameters={})
+
+        self.assertEqual(result, ('headers', 'data'))
+        self.assertEqual(mets.requests, 1)
+        call.assert_called_once_with('GET', 'url', parameters={})
+
+    @mock.patch('time.time', side_effect=[10.0, 12.5])
+    def test_run(self, mock_time):
+        mets = metrics.Metrics()
+
+        mets.start_run()
+        mets.end_run()
+
+        self.assertEqual(mets.start, 10.0)
+        self.assertEqual(mets.end, 12.5)
+
+    def test_add_repo(self):
+        mets = metrics.Metrics()
+
+        mets.add_repo('repo', 5, 3, 100)
+
+        self.assertEqual(len(mets.repos), 1)
+        self.assertEqual(mets.repos[0].name, 'repo')
+        self.assertEqual(mets.repos[0].pulls, 5)
+        self.assertEqual(mets.repos[0].mergeable, 3)
+        self.assertEqual(mets.repos[0].oldest_age, 100)
+
+    def test_format(self):
+        gh = mock.Mock(**{'_Github__requester.rate_limiting': (4990, 5000)})
+        mets = metrics.Metrics()
+        mets.add_repo('repo2', 1, 0, 50)
+        mets.add_repo('repo1', 5, 3, 100)
+        mets.requests = 12
+        mets.start = 10.0
+        mets.end = 12.5
+
+        result = mets.format(gh)
+
+        self.assertEqual(result, [
+            '# TYPE tugboat_open_pulls gauge',
+            '# HELP tugboat_open_pulls Number of open pull requests.',
+            'tugboat_open_pulls{repo="repo1"} 5',
+            'tugboat_open_pulls{repo="repo2"} 1',
+            '# TYPE tugboat_mergeable_pulls gauge',
+            '# HELP tugboat_mergeable_pulls Number of mergeable open pull '
+            'requests.',
+            'tugboat_mergeable_pulls{repo="repo1"} 3',
+            'tugboat_mergeable_pulls{repo="repo2"} 0',
+            '# TYPE tugboat_oldest_pull_age_seconds gauge',
+            '# HELP tugboat_oldest_pull_age_seconds Age of the oldest open '
+            'pull request.',
+            'tugboat_oldest_pull_age_seconds{repo="repo1"} 100',
+            'tugboat_oldest_pull_age_seconds{repo="repo2"} 50',
+            '# TYPE tugboat_run_duration_seconds gauge',
+            '# HELP tugboat_run_duration_seconds Duration of the run.',
+            'tugboat_run_duration_seconds 2.5',
+            '# TYPE tugboat_run_timestamp_seconds gauge',
+            '# HELP tugboat_run_timestamp_seconds Time the run ended.',
+            'tugboat_run_timestamp_seconds 12.5',
+            '# TYPE tugboat_api_requests gauge',
+            '# HELP tugboat_api_requests Number of API requests made by the '
+            'run.',
+            'tugboat_api_requests 12',
+            '# TYPE tugboat_rate_limit_remaining gauge',
+            '# HELP tugboat_rate_limit_remaining Remaining API rate limit at '
+            'the end of the run.',
+            'tugboat_rate_limit_remaining 4990',
+            '# EOF',
+        ])
+
+    def test_format_unknown(self):
+        gh = mock.Mock(**{'_Github__requester.rate_limiting': (-1, -1)})
+        mets = metrics.Metrics()
+
+        result = mets.format(gh)
+
+        self.assertEqual(result, [
+            '# TYPE tugboat_open_pulls gauge',
+            '# HELP tugboat_open_pulls Number of open pull requests.',
+            '# TYPE tugboat_mergeable_pulls gauge',
+            '# HELP tugboat_mergeable_pulls Number of mergeable open pull '
+            'requests.',
+            '# TYPE tugboat_oldest_pull_age_seconds gauge',
+            '# HELP tugboat_oldest_pull_age_seconds Age of the oldest open '
+            'pull request.',
+            '# TYPE tugboat_api_requests gauge',
+            '# HELP tugboat_api_requests Number of API requests made by the '
+            'run.',
+            'tugboat_api_requests 0',
+            '# EOF',
+        ])
+
+    @mock.patch.object(metrics.output, 'atomic_write')
+    @mock.patch.object(metrics.Metrics, 'format',
+                       return_value=['line1', 'line2'])
+    def test_write(self, mock_format, mock_atomic_write):
+        mets = metrics.Metrics()
+
+        mets.write('path', 'gh')
+
+        mock_format.assert_called_once_with('gh')
+        mock_atomic_write.assert_called_once_with('path', 'line1\nline2\n')
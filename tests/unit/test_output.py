@@ -0,0 +1,208 @@
+# Copyright 2014 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the
+#    License. You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing,
+#    software distributed under the License is distributed on an "AS
+#    IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+#    express or implied. See the License for the specific language
+#    governing permissions and limitations under the License.
+
+import io
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+
+import mock
+
+from tugboat import output
+
+
+class OutputTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'report.txt')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def read(self, path=None):
+        with io.open(path or self.path, encoding='utf-8') as f:
+            return f.read()
+
+    def write_old(self):
+        with io.open(self.path, 'w', encoding='utf-8') as f:
+            f.write(u'old text\n')
+
+
+class AtomicFileTest(OutputTestCase):
+    def test_write(self):
+        f = output.AtomicFile(self.path)
+        f.write(u'some ')
+        f.write(u'text\n')
+
+        self.assertFalse(os.path.exists(self.path))
+        self.assertFalse(f.closed)
+
+        f.close()
+
+        self.assertTrue(f.closed)
+        self.assertEqual(self.read(), u'some text\n')
+        self.assertEqual(os.listdir(self.tmpdir), ['report.txt'])
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o644)
+
+    def test_binary(self):
+        f = output.AtomicFile(self.path, binary=True)
+        f.write(b'\x1f\x8b')
+        f.close()
+
+        with open(self.path, 'rb') as fh:
+            self.assertEqual(fh.read(), b'\x1f\x8b')
+
+    def test_buffered(self):
+        f = output.AtomicFile(self.path, bufsize=1024)
+        f.write(u'some text\n')
+
+        self.assertEqual(os.path.getsize(f.tmp), 0)
+
+        f.flush()
+
+        self.assertEqual(os.path.getsize(f.tmp), 10)
+        f.abort()
+
+    def test_replace(self):
+        self.write_old()
+
+        with output.AtomicFile(self.path) as f:
+            f.write(u'new text\n')
+            self.assertEqual(self.read(), u'old text\n')
+
+        self.assertEqual(self.read(), u'new text\n')
+        self.assertEqual(os.listdir(self.tmpdir), ['report.txt'])
+
+    def test_close_twice(self):
+        f = output.AtomicFile(self.path)
+        f.write(u'some text\n')
+        f.close()
+
+        f.close()
+
+        self.assertEqual(self.read(), u'some text\n')
+
+    def test_abort(self):
+        self.write_old()
+        f = output.AtomicFile(self.path)
+        f.write(u'new text\n')
+
+        f.abort()
+
+        self.assertTrue(f.closed)
+        self.assertEqual(self.read(), u'old text\n')
+        self.assertEqual(os.listdir(self.tmpdir), ['report.txt'])
+
+    def test_context_failure(self):
+        self.write_old()
+
+        try:
+            with output.AtomicFile(self.path) as f:
+                f.write(u'new text\n')
+                raise ValueError('failed')
+        except ValueError:
+            pass
+        else:
+            self.fail('Exception not propagated')
+
+        self.assertEqual(self.read(), u'old text\n')
+        self.assertEqual(os.listdir(self.tmpdir), ['report.txt'])
+
+    @mock.patch('os.rename', side_effect=OSError)
+    def test_rename_failure(self, mock_rename):
+        self.write_old()
+        f = output.AtomicFile(self.path)
+        f.write(u'new text\n')
+
+        self.assertRaises(OSError, f.close)
+
+        self.assertEqual(self.read(), u'old text\n')
+        self.assertEqual(os.listdir(self.tmpdir), ['report.txt'])
+
+
+class AtomicWriteTest(OutputTestCase):
+    def test_write(self):
+        output.atomic_write(self.path, u'some text\n')
+
+        self.assertEqual(self.read(), u'some text\n')
+        self.assertEqual(os.listdir(self.tmpdir), ['report.txt'])
+
+    @mock.patch('os.rename', side_effect=OSError)
+    def test_failure(self, mock_rename):
+        self.write_old()
+
+        self.assertRaises(OSError, output.atomic_write, self.path,
+                          u'new text\n')
+
+        self.assertEqual(self.read(), u'old text\n')
+        self.assertEqual(os.listdir(self.tmpdir), ['report.txt'])
+
+
+class RepoPathTest(OutputTestCase):
+    def test_owner(self):
+        result = output.repo_path(self.tmpdir, 'owner/repo')
+
+        self.assertEqual(result,
+                         os.path.join(self.tmpdir, 'owner', 'repo.txt'))
+        self.assertTrue(os.path.isdir(os.path.join(self.tmpdir, 'owner')))
+
+    def test_existing(self):
+        os.mkdir(os.path.join(self.tmpdir, 'owner'))
+
+        result = output.repo_path(self.tmpdir, 'owner/repo', '.out')
+
+        self.assertEqual(result,
+                         os.path.join(self.tmpdir, 'owner', 'repo.out'))
+
+    def test_no_owner(self):
+        result = output.repo_path(self.tmpdir, 'repo')
+
+        self.assertEqual(result, os.path.join(self.tmpdir, 'repo.txt'))
+
+
+class WriteFilesTest(OutputTestCase):
+    def test_empty(self):
+        output.write_files({})
+
+        self.assertEqual(os.listdir(self.tmpdir), [])
+
+    def test_single(self):
+        path = os.path.join(self.tmpdir, 'file1')
+
+        output.write_files({path: u'text1\n'})
+
+        self.assertEqual(self.read(path), u'text1\n')
+
+    def test_parallel(self):
+        files = dict((os.path.join(self.tmpdir, 'file%d' % i),
+                      u'text%d\n' % i) for i in range(20))
+
+        output.write_files(files, workers=4)
+
+        self.assertEqual(sorted(os.listdir(self.tmpdir)),
+                         sorted('file%d' % i for i in range(20)))
+        for path, text in files.items():
+            self.assertEqual(self.read(path), text)
+
+    @mock.patch('os.rename', side_effect=OSError)
+    def test_failure(self, mock_rename):
+        files = dict((os.path.join(self.tmpdir, 'file%d' % i),
+                      u'text%d\n' % i) for i in range(4))
+
+        self.assertRaises(OSError, output.write_files, files)
+
+        self.assertEqual(os.listdir(self.tmpdir), [])
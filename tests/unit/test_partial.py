@@ -0,0 +1,146 @@
+# Copyright 2014 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the
+#    License. You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing,
+#    software distributed under the License is distributed on an "AS
+#    IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+#    express or implied. See the License for the specific language
+#    governing permissions and limitations under the License.
+
+
+import datetime
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from tugboat import partial
+from tugboat import records
+from tugboat import shard
+
+
+def make_record(number, repo_name='owner/repo'):
+    return records.PullRecord(
+        repo_name=repo_name,
+        number=number,
+        created_at=datetime.datetime(2014, 1, 1, 0, 0, number),
+        updated_at=datetime.datetime(2014, 1, 2, 0, 0, number),
+        mergeable=bool(number % 2),
+    )
+
+
+class PartialReportTest(unittest.TestCase):
+    def test_init(self):
+        result = partial.PartialReport()
+
+        self.assertEqual(result.sort_by, 'created')
+        self.assertEqual(result.shard, None)
+        self.assertEqual(result.generated, None)
+        self.assertEqual(result.records, [])
+
+    def test_add(self):
+        part = partial.PartialReport()
+
+        part.add('rec1')
+        part.add('rec2')
+
+        self.assertEqual(part.records, ['rec1', 'rec2'])
+
+    def test_header(self):
+        part = partial.PartialReport(
+            'updated', shard.Shard(1, 3),
+            datetime.datetime(2014, 2, 1, 0, 0, 0))
+        part.add('rec1')
+
+        result = part.header()
+
+        self.assertEqual(result, {
+            'version': partial.VERSION,
+            'sort_by': 'updated',
+            'shard': '1/3',
+            'generated': '2014-02-01T00:00:00Z',
+            'skipped': [],
+            'pulls': 1,
+        })
+
+    def test_header_skipped(self):
+        part = partial.PartialReport()
+        part.skipped = [('owner/repo', 'timed out')]
+
+        result = part.header()
+
+        self.assertEqual(result['skipped'], [['owner/repo', 'timed out']])
+
+    def test_header_no_shard(self):
+        part = partial.PartialReport()
+
+        result = part.header()
+
+        self.assertEqual(result['shard'], None)
+        self.assertEqual(result['generated'], None)
+
+    @mock.patch.object(partial.output, 'AtomicFile')
+    def test_write(self, mock_AtomicFile):
+        f = mock_AtomicFile.return_value.__enter__.return_value
+        part = partial.PartialReport()
+        part.add(make_record(1))
+
+        part.write('path')
+
+        mock_AtomicFile.assert_called_once_with('path')
+        self.assertEqual(f.write.call_count, 2)
+        header = json.loads(f.write.call_args_list[0][0][0])
+        self.assertEqual(header['pulls'], 1)
+        record = json.loads(f.write.call_args_list[1][0][0])
+        self.assertEqual(record['number'], 1)
+
+
+class ReadTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'partial.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_round_trip(self):
+        part = partial.PartialReport(
+            'repo', shard.Shard(0, 2),
+            datetime.datetime(2014, 2, 1, 0, 0, 0))
+        part.add(make_record(2))
+        part.add(make_record(1, 'owner/other'))
+        part.write(self.path)
+
+        header, reader = partial.read(self.path)
+        result = list(reader)
+
+        self.assertEqual(header['sort_by'], 'repo')
+        self.assertEqual(header['shard'], '0/2')
+        self.assertEqual(header['pulls'], 2)
+        self.assertEqual([r.key for r in result],
+                         [('owner/repo', 2), ('owner/other', 1)])
+        self.assertEqual(result[0].created_at,
+                         datetime.datetime(2014, 1, 1, 0, 0, 2,
+                                           tzinfo=records.UTC))
+        self.assertEqual(result[1].mergeable, True)
+
+    def test_version(self):
+        with open(self.path, 'w') as f:
+            f.write('{"version": 99}\n')
+
+        self.assertRaises(ValueError, partial.read, self.path)
+
+    def test_empty(self):
+        with open(self.path, 'w'):
+            pass
+
+        self.assertRaises(ValueError, partial.read, self.path)
@@ -0,0 +1,194 @@
+# Copyright 2014 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the
+#    License. You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing,
+#    software distributed under the License is distributed on an "AS
+#    IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+#    express or implied. See the License for the specific language
+#    governing permissions and limitations under the License.
+
+import os
+import pstats
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+import mock
+import six
+
+from tugboat import profiling
+
+
+class CPUProfilerTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.output = os.path.join(self.tmpdir, 'out.pstats')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_init(self):
+        result = profiling.CPUProfiler()
+
+        self.assertEqual(result.output, 'tugboat.pstats')
+        self.assertEqual(result.phases, [])
+        self.assertEqual(result.profiles, {})
+        self.assertEqual(result.threads, {})
+
+    def test_init_output(self):
+        result = profiling.CPUProfiler('output')
+
+        self.assertEqual(result.output, 'output')
+
+    def test_profile(self):
+        profiler = profiling.CPUProfiler(self.output)
+
+        profiler.start()
+        profiler.phase_start('one')
+        sorted(range(1000))
+        profiler.phase_end('one')
+        profiler.phase_start('two')
+        sum(range(1000))
+        profiler.phase_end('two')
+        profiler.phase_start('one')
+        profiler.phase_end('one')
+        profiler.finish()
+
+        self.assertEqual(profiler.phases, ['one', 'two'])
+        self.assertEqual(sorted(os.listdir(self.tmpdir)), [
+            'out.pstats', 'out.pstats.one', 'out.pstats.two',
+        ])
+        one = pstats.Stats(self.output + '.one')
+        two = pstats.Stats(self.output + '.two')
+        combined = pstats.Stats(self.output)
+        self.assertTrue(any('sorted' in func[2] for func in one.stats))
+        self.assertFalse(any('sorted' in func[2] for func in two.stats))
+        self.assertTrue(any('sum' in func[2] for func in two.stats))
+        self.assertTrue(any('sorted' in func[2] for func in combined.stats))
+        self.assertTrue(any('sum' in func[2] for func in combined.stats))
+
+    def test_profile_threads(self):
+        def worker_only():
+            return sum(range(1000))
+
+        def work():
+            worker_only()
+
+        profiler = profiling.CPUProfiler(self.output)
+
+        profiler.start()
+        profiler.phase_start('one')
+        thread = threading.Thread(target=work)
+        thread.start()
+        thread.join()
+        profiler.phase_end('one')
+        profiler.phase_start('two')
+        profiler.phase_end('two')
+        thread = threading.Thread(target=work)
+        thread.start()
+        thread.join()
+        profiler.finish()
+
+        # The work done by the thread is in the profile of the phase it
+        # was started in
+        one = pstats.Stats(self.output + '.one')
+        two = pstats.Stats(self.output + '.two')
+        combined = pstats.Stats(self.output)
+        self.assertTrue(any('worker_only' in func[2] for func in one.stats))
+        self.assertFalse(any('worker_only' in func[2]
+                             for func in two.stats))
+        self.assertTrue(any('worker_only' in func[2]
+                            for func in combined.stats))
+        self.assertEqual(sum(stat[1] for func, stat in combined.stats.items()
+                             if func[2] == 'worker_only'), 1)
+
+    def test_finish_empty(self):
+        profiler = profiling.CPUProfiler(self.output)
+
+        profiler.start()
+        profiler.finish()
+
+        self.assertEqual(os.listdir(self.tmpdir), [])
+
+
+class MemoryProfilerTest(unittest.TestCase):
+    def test_init(self):
+        result = profiling.MemoryProfiler()
+
+        self.assertEqual(result.output, '-')
+        self.assertEqual(result.limit, 10)
+        self.assertEqual(result.phases, [])
+        self.assertEqual(result.results, {})
+
+    @mock.patch.object(sys, 'stderr', six.StringIO())
+    def test_profile(self):
+        profiler = profiling.MemoryProfiler(limit=3)
+
+        profiler.start()
+        profiler.phase_start('one')
+        data = [list(range(100)) for i in range(100)]
+        profiler.phase_end('one')
+        profiler.phase_start('two')
+        profiler.phase_end('two')
+        profiler.finish()
+
+        self.assertEqual(profiler.phases, ['one', 'two'])
+        for name in ('one', 'two'):
+            self.assertTrue(len(profiler.results[name]['top']) <= 3)
+            self.assertTrue(len(profiler.results[name]['growth']) <= 3)
+        self.assertTrue(profiler.results['one']['current'] > 0)
+        self.assertTrue(__file__.rstrip('c') in
+                        str(profiler.results['one']['growth'][0]))
+        output = sys.stderr.getvalue().splitlines()
+        self.assertEqual(output[0], 'Memory profile:')
+        self.assertTrue(output[1].startswith('    After one: '))
+        self.assertEqual(output[2], '        Top allocators:')
+        del data
+
+    @mock.patch('io.open', new_callable=mock.mock_open)
+    @mock.patch.object(profiling.MemoryProfiler, 'format',
+                       return_value=['line1', 'line2'])
+    def test_finish_file(self, mock_format, mock_open):
+        profiler = profiling.MemoryProfiler('output')
+        profiler._tracemalloc = mock.Mock()
+
+        profiler.finish()
+
+        profiler._tracemalloc.stop.assert_called_once_with()
+        mock_open.assert_called_once_with('output', 'w', encoding='utf-8')
+        mock_open.return_value.write.assert_has_calls([
+            mock.call('line1\n'),
+            mock.call('line2\n'),
+        ])
+
+    def test_format(self):
+        profiler = profiling.MemoryProfiler()
+        profiler.phases = ['one']
+        profiler.results = {
+            'one': {
+                'current': 10,
+                'peak': 20,
+                'top': ['top1', 'top2'],
+                'growth': ['growth1'],
+            },
+        }
+
+        result = profiler.format()
+
+        self.assertEqual(result, [
+            'Memory profile:',
+            '    After one: 10 bytes current, 20 bytes peak',
+            '        Top allocators:',
+            '            top1',
+            '            top2',
+            '        Largest growth during phase:',
+            '            growth1',
+        ])
@@ -0,0 +1,358 @@
+# Copyright 2014 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the
+#    License. You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing,
+#    software distributed under the License is distributed on an "AS
+#    IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+#    express or implied. See the License for the specific language
+#    governing permissions and limitations under the License.
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import mock
+import six
+
+from tugboat import progress
+
+
+class FakeClock(object):
+    def __init__(self, now=100.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class SlowStream(object):
+    """
+    A stream which notes how many threads write to it at once.
+    """
+
+    def __init__(self):
+        self.lines = ['']
+        self.writers = 0
+        self.most_writers = 0
+        self._lock = threading.Lock()
+
+    def write(self, text):
+        with self._lock:
+            self.writers += 1
+            self.most_writers = max(self.most_writers, self.writers)
+        time.sleep(0.001)
+        with self._lock:
+            self.writers -= 1
+            parts = text.split('\n')
+            self.lines[-1] += parts[0]
+            self.lines.extend(parts[1:])
+
+    def flush(self):
+        pass
+
+
+def make_event(**kwargs):
+    event = {
+        'event': 'repo_done',
+        'elapsed': 10.0,
+        'repos': 4,
+        'pulls': 20,
+        'repos_per_sec': 0.4,
+        'pulls_per_sec': 2.0,
+        'in_flight': 1,
+        'index': 3,
+        'count': 10,
+        'eta': 15.0,
+        'repo': 'owner/repo',
+        'repo_pulls': 5,
+    }
+    event.update(kwargs)
+    return event
+
+
+class FormatEtaTest(unittest.TestCase):
+    def test_unknown(self):
+        self.assertEqual(progress.format_eta(None), '?')
+
+    def test_seconds(self):
+        self.assertEqual(progress.format_eta(12.4), '12s')
+
+    def test_minutes(self):
+        self.assertEqual(progress.format_eta(187), '3m07s')
+
+    def test_hours(self):
+        self.assertEqual(progress.format_eta(3720), '1h02m')
+
+
+class FormatStatusTest(unittest.TestCase):
+    def test_position(self):
+        result = progress.format_status(make_event())
+
+        self.assertEqual(result, '[4/10] 4 repos, 20 pulls | 0.4 repos/s, '
+                         '2.0 pulls/s | 1 in flight | ETA 15s')
+
+    def test_no_position(self):
+        result = progress.format_status(make_event(index=None, count=None,
+                                                   eta=None))
+
+        self.assertEqual(result, '4 repos, 20 pulls | 0.4 repos/s, '
+                         '2.0 pulls/s | 1 in flight | ETA ?')
+
+
+class ProgressTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.object(progress.stats, 'clock', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.events = []
+        self.prog = progress.Progress([self.events.append])
+
+    def test_init(self):
+        result = progress.Progress()
+
+        self.assertEqual(result.sinks, [])
+        self.assertEqual(result.repos, 0)
+        self.assertEqual(result.pulls, 0)
+        self.assertEqual(result.requests, 0)
+        self.assertEqual(result.in_flight, 0)
+
+    def test_middleware(self):
+        def call(verb, url, *args, **kwargs):
+            self.assertEqual(self.prog.in_flight, 1)
+            return 'result'
+
+        result = self.prog(call, 'GET', '/repos/a/b')
+
+        self.assertEqual(result, 'result')
+        self.assertEqual(self.prog.requests, 1)
+        self.assertEqual(self.prog.in_flight, 0)
+
+    def test_middleware_error(self):
+        call = mock.Mock(side_effect=IOError('reset'))
+
+        self.assertRaises(IOError, self.prog, call, 'GET', '/repos/a/b')
+        self.assertEqual(self.prog.requests, 1)
+        self.assertEqual(self.prog.in_flight, 0)
+
+    def test_events(self):
+        repo = mock.Mock(full_name='owner/repo')
+        pulls = [mock.Mock(spec=[]), mock.Mock(spec=[])]
+
+        self.prog.start()
+        self.prog.target('organization', 'owner')
+        self.clock.now += 1
+        self.prog.repo_callback(0, 4, repo)
+        self.clock.now += 1
+        self.prog.repo_callback(0, 4, repo, pulls)
+        self.prog.message('Generating report...')
+        self.prog.finish()
+
+        self.assertEqual([e['event'] for e in self.events],
+                         ['start', 'target', 'repo_start', 'repo_done',
+                          'message', 'finish'])
+        self.assertEqual(self.events[1]['target'], 'organization')
+        self.assertEqual(self.events[1]['name'], 'owner')
+        self.assertEqual(self.events[1]['index'], None)
+        self.assertEqual(self.events[2]['repo'], 'owner/repo')
+        self.assertEqual(self.events[2]['index'], 0)
+        self.assertEqual(self.events[2]['count'], 4)
+        self.assertEqual(self.events[2]['eta'], None)
+        done = self.events[3]
+        self.assertEqual(done['repo_pulls'], 2)
+        self.assertEqual(done['elapsed'], 2.0)
+        self.assertEqual(done['repos'], 1)
+        self.assertEqual(done['pulls'], 2)
+        self.assertEqual(done['repos_per_sec'], 0.5)
+        self.assertEqual(done['pulls_per_sec'], 1.0)
+        self.assertEqual(done['eta'], 6.0)
+        self.assertEqual(self.events[4]['message'], 'Generating report...')
+
+    def test_events_no_count(self):
+        repo = mock.Mock(full_name='owner/repo')
+
+        self.prog.start()
+        self.clock.now += 1
+        self.prog.repo_callback(3, None, repo, [])
+
+        done = self.events[1]
+        self.assertEqual(done['index'], 3)
+        self.assertEqual(done['count'], None)
+        self.assertEqual(done['eta'], None)
+        self.assertEqual(done['repos'], 1)
+
+    def test_emit_before_start(self):
+        self.prog.emit('message', message='hello')
+
+        self.assertEqual(self.events[0]['elapsed'], 0.0)
+        self.assertEqual(self.events[0]['repos_per_sec'], 0.0)
+
+    def test_close(self):
+        sink1 = mock.Mock(spec=[])
+        sink2 = mock.Mock()
+        prog = progress.Progress([sink1, sink2])
+
+        prog.close()
+
+        sink2.close.assert_called_once_with()
+
+
+class TerminalSinkTest(unittest.TestCase):
+    def test_init(self):
+        stream = mock.Mock(**{'isatty.return_value': True})
+
+        result = progress.TerminalSink(stream)
+
+        self.assertEqual(result.stream, stream)
+        self.assertEqual(result.interval, progress.DEFAULT_INTERVAL)
+        self.assertFalse(result.verbose)
+        self.assertTrue(result.tty)
+
+    def test_not_tty(self):
+        stream = six.StringIO()
+        sink = progress.TerminalSink(stream)
+
+        sink(make_event(event='target', target='repo', name='owner/repo'))
+        sink(make_event(event='repo_start', elapsed=0.0))
+        sink(make_event(event='repo_done', elapsed=0.2))
+        sink(make_event(event='repo_start', elapsed=0.6))
+        sink(make_event(event='message', message='Generating report...'))
+        sink(make_event(event='finish', elapsed=0.7))
+
+        status = progress.format_status(make_event())
+        self.assertEqual(stream.getvalue().split('\n'), [
+            'Looking up repo "owner/repo"...',
+            status,
+            status,
+            'Generating report...',
+            status,
+            '',
+        ])
+
+    def test_tty(self):
+        stream = six.StringIO()
+        stream.isatty = lambda: True
+        sink = progress.TerminalSink(stream)
+
+        sink(make_event(event='repo_start', elapsed=0.0))
+        sink(make_event(event='repo_done', elapsed=0.1))
+        sink(make_event(event='message', message='Deadline exceeded'))
+        sink(make_event(event='finish', elapsed=0.2))
+
+        status = progress.format_status(make_event())
+        self.assertEqual(stream.getvalue(),
+                         '\r%s\x1b[K' % status +
+                         '\r\x1b[KDeadline exceeded\n' +
+                         '\r%s\x1b[K\n' % status)
+
+    def test_verbose(self):
+        stream = six.StringIO()
+        sink = progress.TerminalSink(stream, interval=60, verbose=True)
+
+        sink(make_event(event='repo_start', elapsed=0.0))
+        sink(make_event(event='repo_done', elapsed=0.1))
+
+        status = progress.format_status(make_event())
+        self.assertEqual(stream.getvalue().split('\n'), [
+            status,
+            'Fetched repository "owner/repo" (4/10): 5 pulls',
+            status,
+            '',
+        ])
+
+    def test_verbose_no_count(self):
+        stream = six.StringIO()
+        sink = progress.TerminalSink(stream, interval=60, verbose=True)
+
+        sink(make_event(event='repo_done', elapsed=0.1, count=None,
+                        eta=None))
+
+        status = progress.format_status(make_event(count=None, eta=None))
+        self.assertEqual(stream.getvalue().split('\n'), [
+            'Fetched repository "owner/repo" (4/?): 5 pulls',
+            status,
+            '',
+        ])
+
+    def test_concurrent(self):
+        stream = SlowStream()
+        sink = progress.TerminalSink(stream, verbose=True)
+
+        def work(idx):
+            for i in range(5):
+                sink(make_event(event='message',
+                                message='thread %d %d' % (idx, i)))
+
+        threads = [threading.Thread(target=work, args=(idx,))
+                   for idx in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Each line is written whole
+        self.assertEqual(stream.most_writers, 1)
+        self.assertEqual(sorted(stream.lines), [''] + sorted(
+            'thread %d %d' % (idx, i) for idx in range(4) for i in range(5)))
+
+    def test_schedule(self):
+        stream = six.StringIO()
+        sink = progress.TerminalSink(stream, verbose=True)
+
+        sink(make_event(event='schedule', policy='largest',
+                        order=['a/big', 'a/medium', 'a/small', 'a/tiny'],
+                        costs=[4, 3, 2, 1]))
+        sink(make_event(event='schedule', policy='listed', order=['a/one'],
+                        costs=[1]))
+
+        self.assertEqual(stream.getvalue().split('\n'), [
+            'Fetching 4 repositories in "largest" order: a/big, a/medium, '
+            'a/small, ...',
+            'Fetching 1 repositories in "listed" order: a/one',
+            '',
+        ])
+
+    def test_schedule_not_verbose(self):
+        stream = six.StringIO()
+        sink = progress.TerminalSink(stream)
+
+        sink(make_event(event='schedule', policy='largest', order=['a/b'],
+                        costs=[1]))
+
+        self.assertEqual(stream.getvalue(), '')
+
+
+class JsonLinesSinkTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'events.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_write(self):
+        sink = progress.JsonLinesSink(self.path)
+
+        sink(make_event(event='start'))
+        sink(make_event())
+
+        # Each line is available as soon as it's written
+        with open(self.path) as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual([line['event'] for line in lines],
+                         ['start', 'repo_done'])
+        self.assertEqual(lines[1]['eta'], 15.0)
+
+        sink.close()
+        sink.close()
@@ -13,11 +13,31 @@
 #    express or implied. See the License for the specific language
 #    governing permissions and limitations under the License.
 
+import datetime
 import unittest
 
 import mock
 
+from tugboat import delta
 from tugboat import pulls
+from tugboat import records
+
+
+def make_pr(number, minute, mergeable=True):
+    return mock.Mock(
+        number=number, html_url='url%d' % number,
+        head=mock.Mock(label='head', sha='h%d' % number),
+        base=mock.Mock(label='base', sha='base'),
+        created_at=datetime.datetime(2014, 1, 1),
+        updated_at=datetime.datetime(2014, 1, 1, 0, minute),
+        user=mock.Mock(login='user'), mergeable=mergeable)
+
+
+def listing(*prs):
+    # A listing which fails if it's read past the given pull requests
+    for pr in prs:
+        yield pr
+    raise AssertionError('Listed too far')
 
 
 class PullRequestTest(unittest.TestCase):
@@ -37,14 +57,41 @@ class PullRequestTest(unittest.TestCase):
         repo1.get_pulls.assert_called_once_with()
         repo2.get_pulls.assert_called_once_with()
         mock_init.assert_has_calls([
-            mock.call(repo1, 'pr1_1'),
-            mock.call(repo1, 'pr1_2'),
-            mock.call(repo1, 'pr1_3'),
-            mock.call(repo2, 'pr2_1'),
-            mock.call(repo2, 'pr2_2'),
+            mock.call(repo1, 'pr1_1', None),
+            mock.call(repo1, 'pr1_2', None),
+            mock.call(repo1, 'pr1_3', None),
+            mock.call(repo2, 'pr2_1', None),
+            mock.call(repo2, 'pr2_2', None),
         ])
         self.assertEqual(mock_init.call_count, 5)
 
+    @mock.patch.object(pulls.PullRequest, '__init__', return_value=None)
+    def test_from_repos_stream(self, mock_init):
+        produced = []
+        repo1 = mock.Mock(**{'get_pulls.return_value': ['pr1_1']})
+        repo2 = mock.Mock(**{'get_pulls.return_value': ['pr2_1']})
+        cb = mock.Mock()
+
+        def repos():
+            for repo in (repo1, repo2):
+                produced.append(repo)
+                yield repo
+
+        def callback(idx, count, repo, pulls=None):
+            # Each repository is fetched as soon as it's produced
+            self.assertEqual(produced[-1], repo)
+            cb(idx, count, repo, pulls)
+
+        result = pulls.PullRequest._from_repos(repos(), callback, stream=True)
+
+        self.assertEqual(len(result), 2)
+        cb.assert_has_calls([
+            mock.call(0, None, repo1, None),
+            mock.call(0, None, repo1, result[:1]),
+            mock.call(1, None, repo2, None),
+            mock.call(1, None, repo2, result[1:]),
+        ])
+
     @mock.patch.object(pulls.PullRequest, '__init__', return_value=None)
     def test_from_repos_with_callback(self, mock_init):
         prs1 = ['pr1_1', 'pr1_2', 'pr1_3']
@@ -62,11 +109,11 @@ class PullRequestTest(unittest.TestCase):
         repo1.get_pulls.assert_called_once_with()
         repo2.get_pulls.assert_called_once_with()
         mock_init.assert_has_calls([
-            mock.call(repo1, 'pr1_1'),
-            mock.call(repo1, 'pr1_2'),
-            mock.call(repo1, 'pr1_3'),
-            mock.call(repo2, 'pr2_1'),
-            mock.call(repo2, 'pr2_2'),
+            mock.call(repo1, 'pr1_1', None),
+            mock.call(repo1, 'pr1_2', None),
+            mock.call(repo1, 'pr1_3', None),
+            mock.call(repo2, 'pr2_1', None),
+            mock.call(repo2, 'pr2_2', None),
         ])
         self.assertEqual(mock_init.call_count, 5)
         cb.assert_has_calls([
@@ -77,6 +124,334 @@ class PullRequestTest(unittest.TestCase):
         ])
         self.assertEqual(cb.call_count, 4)
 
+    @mock.patch.object(pulls.PullRequest, '__init__', return_value=None)
+    def test_from_repos_filter(self, mock_init):
+        repo1 = mock.Mock(full_name='spam/one',
+                          **{'get_pulls.return_value': ['pr1_1']})
+        repo2 = mock.Mock(full_name='spam/two',
+                          **{'get_pulls.return_value': ['pr2_1']})
+        cb = mock.Mock()
+        repo_filter = mock.Mock(side_effect=lambda x: x == 'spam/two')
+
+        result = pulls.PullRequest._from_repos(
+            (r for r in (repo1, repo2)), cb, repo_filter)
+
+        self.assertEqual(len(result), 1)
+        self.assertFalse(repo1.get_pulls.called)
+        repo2.get_pulls.assert_called_once_with()
+        mock_init.assert_called_once_with(repo2, 'pr2_1', None)
+        repo_filter.assert_has_calls([
+            mock.call('spam/one'),
+            mock.call('spam/two'),
+        ])
+        cb.assert_has_calls([
+            mock.call(0, 1, repo2),
+            mock.call(0, 1, repo2, result),
+        ])
+        self.assertEqual(cb.call_count, 2)
+
+    @mock.patch.object(pulls.PullRequest, '_fetch',
+                       side_effect=lambda x, cache: [x.full_name])
+    def test_from_repos_deadline(self, mock_fetch):
+        repo1 = mock.Mock(full_name='spam/one')
+        repo2 = mock.Mock(full_name='spam/two')
+        cb = mock.Mock()
+        deadline = mock.Mock(**{
+            'fetch.side_effect': lambda name, func, repo, cache: (
+                None if name == 'spam/one' else func(repo, cache)),
+        })
+
+        result = pulls.PullRequest._from_repos(
+            (r for r in (repo1, repo2)), cb, None, deadline)
+
+        self.assertEqual(result, ['spam/two'])
+        deadline.fetch.assert_has_calls([
+            mock.call('spam/one', pulls.PullRequest._fetch, repo1, None),
+            mock.call('spam/two', pulls.PullRequest._fetch, repo2, None),
+        ])
+        cb.assert_has_calls([
+            mock.call(0, 2, repo1),
+            mock.call(1, 2, repo2),
+            mock.call(1, 2, repo2, result),
+        ])
+        self.assertEqual(cb.call_count, 3)
+
+    @mock.patch.object(pulls.PullRequest, '_fetch',
+                       side_effect=lambda x, cache: [x.full_name])
+    def test_from_repos_checkpoint(self, mock_fetch):
+        repo1 = mock.Mock(full_name='spam/one')
+        repo2 = mock.Mock(full_name='spam/two')
+        cb = mock.Mock()
+        checkpoint = mock.Mock(**{
+            'get.side_effect': lambda name: (
+                ['saved'] if name == 'spam/one' else None),
+            'add.side_effect': lambda name, pulls: ['record:%s' % name],
+        })
+
+        result = pulls.PullRequest._from_repos(
+            (r for r in (repo1, repo2)), cb, None, None, checkpoint)
+
+        self.assertEqual(result, ['saved', 'record:spam/two'])
+        mock_fetch.assert_called_once_with(repo2, None)
+        checkpoint.assert_has_calls([
+            mock.call.get('spam/one'),
+            mock.call.get('spam/two'),
+            mock.call.add('spam/two', ['spam/two']),
+        ])
+        self.assertEqual(checkpoint.add.call_count, 1)
+        cb.assert_has_calls([
+            mock.call(0, 2, repo1),
+            mock.call(0, 2, repo1, ['saved']),
+            mock.call(1, 2, repo2),
+            mock.call(1, 2, repo2, ['record:spam/two']),
+        ])
+        self.assertEqual(cb.call_count, 4)
+
+    @mock.patch.object(pulls.PullRequest, '_fetch',
+                       side_effect=lambda x, cache: [x.full_name])
+    def test_from_repos_checkpoint_deadline(self, mock_fetch):
+        repo1 = mock.Mock(full_name='spam/one')
+        repo2 = mock.Mock(full_name='spam/two')
+        checkpoint = mock.Mock(**{
+            'get.return_value': None,
+            'add.side_effect': lambda name, pulls: pulls,
+        })
+        deadline = mock.Mock(**{
+            'fetch.side_effect': lambda name, func, repo, cache: (
+                None if name == 'spam/one' else func(repo, cache)),
+        })
+
+        result = pulls.PullRequest._from_repos(
+            (r for r in (repo1, repo2)), None, None, deadline, checkpoint)
+
+        self.assertEqual(result, ['spam/two'])
+        checkpoint.add.assert_called_once_with('spam/two', ['spam/two'])
+
+    @mock.patch.object(pulls.PullRequest, '_fetch',
+                       side_effect=lambda x, cache: [x.full_name])
+    def test_from_repos_scheduler(self, mock_fetch):
+        repo1 = mock.Mock(full_name='spam/one')
+        repo2 = mock.Mock(full_name='spam/two')
+        cb = mock.Mock()
+        scheduler = mock.Mock(lookups=(), **{
+            'order.side_effect': lambda repos: list(reversed(repos)),
+            'run.side_effect': lambda repos, func: [
+                func(idx, repo) for idx, repo in enumerate(repos)],
+            'fetch.side_effect': lambda name, func, repo, cache: (
+                None if name == 'spam/one' else func(repo, cache)),
+        })
+
+        result = pulls.PullRequest._from_repos(
+            (r for r in (repo1, repo2)), cb, scheduler=scheduler)
+
+        self.assertEqual(result, ['spam/two'])
+        scheduler.order.assert_called_once_with([repo1, repo2])
+        scheduler.fetch.assert_has_calls([
+            mock.call('spam/two', pulls.PullRequest._fetch, repo2, None),
+            mock.call('spam/one', pulls.PullRequest._fetch, repo1, None),
+        ])
+        cb.assert_has_calls([
+            mock.call(0, 2, repo2),
+            mock.call(0, 2, repo2, ['spam/two']),
+            mock.call(1, 2, repo1),
+        ])
+        self.assertEqual(cb.call_count, 3)
+
+    @mock.patch.object(pulls.PullRequest, '_fetch',
+                       side_effect=lambda x, cache: [x.full_name])
+    def test_from_repos_scheduler_deadline(self, mock_fetch):
+        repo = mock.Mock(full_name='spam/one')
+        deadline = mock.Mock(**{
+            'fetch.side_effect': lambda name, func, repo, cache: func(repo,
+                                                                      cache),
+        })
+        scheduler = mock.Mock(lookups=(), **{
+            'order.side_effect': lambda repos: repos,
+            'run.side_effect': lambda repos, func: [
+                func(idx, repo) for idx, repo in enumerate(repos)],
+            'fetch.side_effect': lambda name, func, *args: func(*args),
+        })
+
+        result = pulls.PullRequest._from_repos(
+            [repo], None, deadline=deadline, scheduler=scheduler)
+
+        self.assertEqual(result, ['spam/one'])
+        scheduler.fetch.assert_called_once_with(
+            'spam/one', deadline.fetch, 'spam/one', pulls.PullRequest._fetch,
+            repo, None)
+
+    @mock.patch.object(pulls.PullRequest, '_fetch',
+                       side_effect=lambda x, cache: [x.full_name])
+    def test_from_repos_scheduler_stream(self, mock_fetch):
+        repo = mock.Mock(full_name='spam/one')
+        scheduler = mock.Mock(lookups=(), **{
+            'run.side_effect': lambda repos, func: [
+                func(idx, repo) for idx, repo in enumerate(repos)],
+            'fetch.side_effect': lambda name, func, *args: func(*args),
+        })
+
+        result = pulls.PullRequest._from_repos(
+            iter([repo]), None, stream=True, scheduler=scheduler)
+
+        self.assertEqual(result, ['spam/one'])
+        self.assertFalse(scheduler.order.called)
+
+    def test_from_repos_scheduler_lookups(self):
+        pull = mock.Mock()
+        repo = mock.Mock(full_name='spam/one', **{
+            'get_pulls.return_value': [pull],
+        })
+        scheduler = mock.Mock(lookups=('mergeable',), **{
+            'order.side_effect': lambda repos: repos,
+            'run.side_effect': lambda repos, func: [
+                func(idx, repo) for idx, repo in enumerate(repos)],
+            'fetch.side_effect': lambda name, func, *args: func(*args),
+        })
+
+        result = pulls.PullRequest._from_repos([repo], None,
+                                               scheduler=scheduler)
+
+        self.assertEqual([p.pr for p in result], [pull])
+        scheduler.fetch.assert_called_once_with(
+            'spam/one', pulls.PullRequest._look_up, ('mergeable',),
+            pulls.PullRequest._fetch, repo, None)
+
+        # The mergeability was looked up within the fetch
+        self.assertEqual(result[0]._mergeable, pull.mergeable)
+
+    def test_look_up(self):
+        looked_up = []
+
+        class FakePull(object):
+            def __init__(self, number):
+                self.number = number
+
+            @property
+            def mergeable(self):
+                looked_up.append((self.number, 'mergeable'))
+
+            @property
+            def user(self):
+                looked_up.append((self.number, 'user'))
+                return mock.Mock()
+
+        prs = [FakePull(1), FakePull(2)]
+        fetch = mock.Mock(return_value=prs)
+
+        result = pulls.PullRequest._look_up(('mergeable', 'user.name'),
+                                            fetch, 'repo', 'cache')
+
+        self.assertEqual(result, prs)
+        fetch.assert_called_once_with('repo', 'cache')
+        self.assertEqual(looked_up, [
+            (1, 'mergeable'), (1, 'user'), (2, 'mergeable'), (2, 'user'),
+        ])
+
+    def test_look_up_skipped(self):
+        fetch = mock.Mock(return_value=None)
+
+        result = pulls.PullRequest._look_up(('mergeable',), fetch, 'repo')
+
+        self.assertEqual(result, None)
+
+    def test_from_repos_summary(self):
+        repo = mock.Mock(full_name='spam/one')
+        summary = mock.Mock(**{'fetch.return_value': ['pr']})
+        delta = mock.Mock()
+
+        result = pulls.PullRequest._from_repos([repo], None,
+                                               merge_cache='cache',
+                                               delta=delta, summary=summary)
+
+        self.assertEqual(result, ['pr'])
+        summary.fetch.assert_called_once_with(repo, 'cache')
+        self.assertFalse(delta.get.called)
+
+    def test_from_repos_delta_deadline(self):
+        repo = mock.Mock(full_name='spam/one')
+        deadline = mock.Mock(**{'fetch.return_value': ['pr']})
+        store = delta.DeltaStore()
+
+        result = pulls.PullRequest._from_repos(
+            [repo], None, deadline=deadline, delta=store)
+
+        self.assertEqual(result, ['pr'])
+        deadline.fetch.assert_called_once_with(
+            'spam/one', pulls.PullRequest._fetch_delta, repo, store, None)
+
+    @mock.patch.object(pulls.time, 'time', return_value=1000.0)
+    def test_fetch_delta_full(self, mock_time):
+        repo = mock.Mock(full_name='a/b', **{
+            'get_pulls.return_value': [make_pr(1, 5), make_pr(2, 3)],
+        })
+        stats = mock.Mock()
+        store = delta.DeltaStore(stats=stats)
+
+        result = pulls.PullRequest._fetch_delta(repo, store)
+
+        self.assertEqual([(r.repo_name, r.number, r.mergeable)
+                          for r in result],
+                         [('a/b', 1, True), ('a/b', 2, True)])
+        repo.get_pulls.assert_called_once_with()
+        self.assertEqual(store.repos['a/b']['listed'], 1000.0)
+        self.assertEqual(store.get('a/b')[0], result[0].updated_at)
+        stats.count.assert_called_once_with('delta_full', 1)
+
+    def test_fetch_delta_incremental(self):
+        repo = mock.Mock(full_name='a/b')
+        stats = mock.Mock()
+        store = delta.DeltaStore(stats=stats)
+        store.update('a/b', [
+            records.PullRecord.from_pull(pulls.PullRequest(repo, pr))
+            for pr in (make_pr(1, 5), make_pr(2, 3), make_pr(3, 1))
+        ])
+        repo.get_pulls.side_effect = [
+            listing(make_pr(4, 9), make_pr(2, 7, False),
+                    make_pr(1, 5, False), make_pr(5, 2)),
+            listing(make_pr(3, 8), make_pr(9, 6), make_pr(7, 0)),
+        ]
+
+        result = pulls.PullRequest._fetch_delta(repo, store)
+
+        # The unchanged pull request keeps its mergeability; the
+        # closed one is dropped
+        self.assertEqual([(r.number, r.mergeable) for r in result],
+                         [(1, True), (2, False), (4, True)])
+        repo.get_pulls.assert_has_calls([
+            mock.call(sort='updated', direction='desc'),
+            mock.call(state='closed', sort='updated', direction='desc'),
+        ])
+        self.assertEqual(store.get('a/b')[0], records.aware(
+            datetime.datetime(2014, 1, 1, 0, 9)))
+        self.assertEqual(sorted(store.get('a/b')[1]), [1, 2, 4])
+        stats.count.assert_has_calls([
+            mock.call('delta_incremental', 1),
+            mock.call('delta_changed', 2),
+            mock.call('delta_closed', 1),
+        ])
+
+    @mock.patch.object(pulls.PullRequest, '__init__', return_value=None)
+    def test_fetch(self, mock_init):
+        repo = mock.Mock(**{'get_pulls.return_value': ['pr1', 'pr2']})
+
+        result = pulls.PullRequest._fetch(repo)
+
+        self.assertEqual(len(result), 2)
+        repo.get_pulls.assert_called_once_with()
+        mock_init.assert_has_calls([
+            mock.call(repo, 'pr1', None),
+            mock.call(repo, 'pr2', None),
+        ])
+
+    @mock.patch.object(pulls.PullRequest, '__init__', return_value=None)
+    def test_fetch_merge_cache(self, mock_init):
+        repo = mock.Mock(**{'get_pulls.return_value': ['pr1']})
+
+        result = pulls.PullRequest._fetch(repo, 'cache')
+
+        self.assertEqual(len(result), 1)
+        mock_init.assert_called_once_with(repo, 'pr1', 'cache')
+
     @mock.patch.object(pulls.PullRequest, '_from_repos', return_value='pulls')
     def test_from_repo(self, mock_from_repos):
         gh = mock.Mock(**{'get_repo.return_value': 'repo'})
@@ -85,7 +460,12 @@ class PullRequestTest(unittest.TestCase):
 
         self.assertEqual(result, 'pulls')
         gh.get_repo.assert_called_once_with('spam')
-        mock_from_repos.assert_called_once_with(['repo'], None)
+        mock_from_repos.assert_called_once_with(['repo'], None,
+                                                deadline=None,
+                                                checkpoint=None,
+                                                merge_cache=None,
+                                                scheduler=None, delta=None,
+                                                summary=None)
 
     @mock.patch.object(pulls.PullRequest, '_from_repos', return_value='pulls')
     def test_from_repo_callback(self, mock_from_repos):
@@ -95,7 +475,43 @@ class PullRequestTest(unittest.TestCase):
 
         self.assertEqual(result, 'pulls')
         gh.get_repo.assert_called_once_with('spam')
-        mock_from_repos.assert_called_once_with(['repo'], 'call')
+        mock_from_repos.assert_called_once_with(['repo'], 'call',
+                                                deadline=None,
+                                                checkpoint=None,
+                                                merge_cache=None,
+                                                scheduler=None, delta=None,
+                                                summary=None)
+
+    @mock.patch.object(pulls.PullRequest, '_from_repos', return_value='pulls')
+    def test_from_repo_filtered(self, mock_from_repos):
+        gh = mock.Mock(**{'get_repo.return_value': 'repo'})
+        repo_filter = mock.Mock(return_value=False)
+
+        result = pulls.PullRequest.from_repo(gh, 'spam', 'call',
+                                             repo_filter)
+
+        self.assertEqual(result, [])
+        repo_filter.assert_called_once_with('spam')
+        self.assertFalse(gh.get_repo.called)
+        self.assertFalse(mock_from_repos.called)
+
+    @mock.patch.object(pulls.PullRequest, '_from_repos', return_value='pulls')
+    def test_from_repo_unfiltered(self, mock_from_repos):
+        gh = mock.Mock(**{'get_repo.return_value': 'repo'})
+        repo_filter = mock.Mock(return_value=True)
+
+        result = pulls.PullRequest.from_repo(gh, 'spam', 'call',
+                                             repo_filter)
+
+        self.assertEqual(result, 'pulls')
+        repo_filter.assert_called_once_with('spam')
+        gh.get_repo.assert_called_once_with('spam')
+        mock_from_repos.assert_called_once_with(['repo'], 'call',
+                                                deadline=None,
+                                                checkpoint=None,
+                                                merge_cache=None,
+                                                scheduler=None, delta=None,
+                                                summary=None)
 
     @mock.patch.object(pulls.PullRequest, '_from_repos', return_value='pulls')
     def test_from_organization(self, mock_from_repos):
@@ -107,7 +523,10 @@ class PullRequestTest(unittest.TestCase):
         self.assertEqual(result, 'pulls')
         gh.get_organization.assert_called_once_with('spam')
         org.get_repos.assert_called_once_with()
-        mock_from_repos.assert_called_once_with(['repo1', 'repo2'], None)
+        mock_from_repos.assert_called_once_with(['repo1', 'repo2'], None,
+                                                None, None, None, None,
+                                                scheduler=None, delta=None,
+                                                summary=None)
 
     @mock.patch.object(pulls.PullRequest, '_from_repos', return_value='pulls')
     def test_from_organization_callback(self, mock_from_repos):
@@ -119,7 +538,10 @@ class PullRequestTest(unittest.TestCase):
         self.assertEqual(result, 'pulls')
         gh.get_organization.assert_called_once_with('spam')
         org.get_repos.assert_called_once_with()
-        mock_from_repos.assert_called_once_with(['repo1', 'repo2'], 'call')
+        mock_from_repos.assert_called_once_with(['repo1', 'repo2'], 'call',
+                                                None, None, None, None,
+                                                scheduler=None, delta=None,
+                                                summary=None)
 
     @mock.patch.object(pulls.PullRequest, '_from_repos', return_value='pulls')
     def test_from_user(self, mock_from_repos):
@@ -131,7 +553,10 @@ class PullRequestTest(unittest.TestCase):
         self.assertEqual(result, 'pulls')
         gh.get_user.assert_called_once_with('spam')
         user.get_repos.assert_called_once_with()
-        mock_from_repos.assert_called_once_with(['repo1', 'repo2'], None)
+        mock_from_repos.assert_called_once_with(['repo1', 'repo2'], None,
+                                                None, None, None, None,
+                                                scheduler=None, delta=None,
+                                                summary=None)
 
     @mock.patch.object(pulls.PullRequest, '_from_repos', return_value='pulls')
     def test_from_user_callback(self, mock_from_repos):
@@ -143,7 +568,10 @@ class PullRequestTest(unittest.TestCase):
         self.assertEqual(result, 'pulls')
         gh.get_user.assert_called_once_with('spam')
         user.get_repos.assert_called_once_with()
-        mock_from_repos.assert_called_once_with(['repo1', 'repo2'], 'call')
+        mock_from_repos.assert_called_once_with(['repo1', 'repo2'], 'call',
+                                                None, None, None, None,
+                                                scheduler=None, delta=None,
+                                                summary=None)
 
     @mock.patch.object(pulls.PullRequest, '_from_repos', return_value='pulls')
     def test_from_all(self, mock_from_repos):
@@ -153,7 +581,25 @@ class PullRequestTest(unittest.TestCase):
 
         self.assertEqual(result, 'pulls')
         gh.get_repos.assert_called_once_with()
-        mock_from_repos.assert_called_once_with(['repo1', 'repo2'], None)
+        mock_from_repos.assert_called_once_with(['repo1', 'repo2'], None,
+                                                None, None, None, None,
+                                                scheduler=None, delta=None,
+                                                summary=None)
+
+    @mock.patch.object(pulls.PullRequest, '_from_repos', return_value='pulls')
+    def test_from_all_enumerator(self, mock_from_repos):
+        gh = mock.Mock()
+        enumerator = mock.Mock(**{'repos.return_value': 'repos'})
+
+        result = pulls.PullRequest.from_all(gh, 'call', enumerator=enumerator)
+
+        self.assertEqual(result, 'pulls')
+        self.assertFalse(gh.get_repos.called)
+        enumerator.repos.assert_called_once_with(gh)
+        mock_from_repos.assert_called_once_with('repos', 'call', None, None,
+                                                None, None, stream=True,
+                                                scheduler=None, delta=None,
+                                                summary=None)
 
     @mock.patch.object(pulls.PullRequest, '_from_repos', return_value='pulls')
     def test_from_all_callback(self, mock_from_repos):
@@ -163,7 +609,10 @@ class PullRequestTest(unittest.TestCase):
 
         self.assertEqual(result, 'pulls')
         gh.get_repos.assert_called_once_with()
-        mock_from_repos.assert_called_once_with(['repo1', 'repo2'], 'call')
+        mock_from_repos.assert_called_once_with(['repo1', 'repo2'], 'call',
+                                                None, None, None, None,
+                                                scheduler=None, delta=None,
+                                                summary=None)
 
     def test_init(self):
         pr = pulls.PullRequest('repo', 'pr')
@@ -171,6 +620,7 @@ class PullRequestTest(unittest.TestCase):
         self.assertEqual(pr._repo, 'repo')
         self.assertEqual(pr._pr, 'pr')
         self.assertEqual(pr._mergeable, None)
+        self.assertEqual(pr._merge_cache, None)
 
     def test_getattr(self):
         pr = pulls.PullRequest('repo', mock.Mock(attr='spam'))
@@ -190,6 +640,32 @@ class PullRequestTest(unittest.TestCase):
         self.assertEqual(pr.mergeable, 'mergeable')
         self.assertEqual(pr._mergeable, 'mergeable')
 
+    def test_mergeable_merge_cache_hit(self):
+        repo = mock.Mock(full_name='spam/one')
+        pr_obj = mock.Mock(mergeable=True, **{
+            'head.sha': 'head', 'base.sha': 'base',
+        })
+        cache = mock.Mock(**{'get.return_value': False})
+        pr = pulls.PullRequest(repo, pr_obj, cache)
+
+        self.assertEqual(pr.mergeable, False)
+        self.assertEqual(pr._mergeable, False)
+        cache.get.assert_called_once_with('spam/one', 'head', 'base')
+        self.assertFalse(cache.set.called)
+
+    def test_mergeable_merge_cache_miss(self):
+        repo = mock.Mock(full_name='spam/one')
+        pr_obj = mock.Mock(mergeable=True, **{
+            'head.sha': 'head', 'base.sha': 'base',
+        })
+        cache = mock.Mock(**{'get.return_value': None})
+        pr = pulls.PullRequest(repo, pr_obj, cache)
+
+        self.assertEqual(pr.mergeable, True)
+        self.assertEqual(pr._mergeable, True)
+        cache.get.assert_called_once_with('spam/one', 'head', 'base')
+        cache.set.assert_called_once_with('spam/one', 'head', 'base', True)
+
     def test_mergeable_clear(self):
         pr = pulls.PullRequest('repo', 'pr')
         pr._mergeable = 'cached'
@@ -0,0 +1,250 @@
+# Copyright 2014 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the
+#    License. You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing,
+#    software distributed under the License is distributed on an "AS
+#    IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+#    express or implied. See the License for the specific language
+#    governing permissions and limitations under the License.
+
+import datetime
+import unittest
+
+import mock
+
+from tugboat import records
+
+
+class TZ(datetime.tzinfo):
+    def utcoffset(self, dt):
+        return datetime.timedelta(hours=2)
+
+    def dst(self, dt):
+        return datetime.timedelta(0)
+
+    def tzname(self, dt):
+        return 'TZ'
+
+
+def make_pull(**kwargs):
+    attrs = {
+        'repo.full_name': 'owner/repo',
+        'number': 1,
+        'html_url': 'https://github/owner/repo/pull/1',
+        'head.label': 'me:branch',
+        'head.sha': 'head',
+        'base.label': 'owner:master',
+        'base.sha': 'base',
+        'created_at': datetime.datetime(2014, 1, 1, 0, 0, 0),
+        'updated_at': datetime.datetime(2014, 1, 2, 0, 0, 0),
+        'user.login': 'me',
+        'user.name': 'Me',
+        'mergeable': True,
+    }
+    attrs.update(kwargs)
+    return mock.Mock(**attrs)
+
+
+def make_record(**kwargs):
+    attrs = dict(
+        repo_name='owner/repo',
+        number=1,
+        html_url='https://github/owner/repo/pull/1',
+        head_label='me:branch',
+        head_sha='head',
+        base_label='owner:master',
+        base_sha='base',
+        created_at=datetime.datetime(2014, 1, 1, 0, 0, 0,
+                                     tzinfo=records.UTC),
+        updated_at=datetime.datetime(2014, 1, 2, 0, 0, 0,
+                                     tzinfo=records.UTC),
+        user_login='me',
+        user_name='Me',
+        mergeable=True,
+    )
+    attrs.update(kwargs)
+    return records.PullRecord(**attrs)
+
+
+class NaiveTest(unittest.TestCase):
+    def test_naive(self):
+        time = datetime.datetime(2000, 1, 1, 0, 0, 0)
+
+        self.assertEqual(records.naive(time), time)
+
+    def test_aware(self):
+        time = datetime.datetime(2000, 1, 1, 2, 0, 0, tzinfo=TZ())
+
+        result = records.naive(time)
+
+        self.assertEqual(result, datetime.datetime(2000, 1, 1, 0, 0, 0))
+        self.assertEqual(result.tzinfo, None)
+
+
+class AwareTest(unittest.TestCase):
+    def test_naive(self):
+        result = records.aware(datetime.datetime(2000, 1, 1, 0, 0, 0))
+
+        self.assertEqual(result, datetime.datetime(2000, 1, 1, 0, 0, 0,
+                                                   tzinfo=records.UTC))
+        self.assertEqual(result.utcoffset(), datetime.timedelta(0))
+
+    def test_aware(self):
+        time = datetime.datetime(2000, 1, 1, 2, 0, 0, tzinfo=TZ())
+
+        result = records.aware(time)
+
+        self.assertEqual(result.tzinfo, records.UTC)
+        self.assertEqual(str(result), '2000-01-01 00:00:00+00:00')
+
+    def test_none(self):
+        self.assertEqual(records.aware(None), None)
+
+
+class TimeTest(unittest.TestCase):
+    def test_format(self):
+        time = datetime.datetime(2000, 1, 1, 2, 3, 4, tzinfo=TZ())
+
+        self.assertEqual(records.format_time(time), '2000-01-01T00:03:04Z')
+
+    def test_format_none(self):
+        self.assertEqual(records.format_time(None), None)
+
+    def test_parse(self):
+        self.assertEqual(records.parse_time('2000-01-01T00:03:04Z'),
+                         datetime.datetime(2000, 1, 1, 0, 3, 4))
+
+    def test_parse_none(self):
+        self.assertEqual(records.parse_time(None), None)
+
+
+class RefTest(unittest.TestCase):
+    def test_init(self):
+        result = records.Ref(a=1, b=2)
+
+        self.assertEqual(result.a, 1)
+        self.assertEqual(result.b, 2)
+
+
+class PullRecordTest(unittest.TestCase):
+    def test_from_pull(self):
+        pull = make_pull()
+
+        result = records.PullRecord.from_pull(pull)
+
+        self.assertEqual(result.repo_name, 'owner/repo')
+        self.assertEqual(result.number, 1)
+        self.assertEqual(result.html_url, 'https://github/owner/repo/pull/1')
+        self.assertEqual(result.head_label, 'me:branch')
+        self.assertEqual(result.head_sha, 'head')
+        self.assertEqual(result.base_label, 'owner:master')
+        self.assertEqual(result.base_sha, 'base')
+        self.assertEqual(result.created_at,
+                         datetime.datetime(2014, 1, 1, 0, 0, 0,
+                                           tzinfo=records.UTC))
+        self.assertEqual(result.updated_at,
+                         datetime.datetime(2014, 1, 2, 0, 0, 0,
+                                           tzinfo=records.UTC))
+        self.assertEqual(result.user_login, 'me')
+        self.assertEqual(result.user_name, 'Me')
+        self.assertEqual(result.mergeable, True)
+
+    def test_from_pull_aware(self):
+        pull = make_pull(
+            created_at=datetime.datetime(2014, 1, 1, 2, 0, 0, tzinfo=TZ()))
+
+        result = records.PullRecord.from_pull(pull)
+
+        self.assertEqual(str(result.created_at), '2014-01-01 00:00:00+00:00')
+
+    def test_from_pull_previous_same(self):
+        pull = make_pull()
+        type(pull).mergeable = mock.PropertyMock(
+            side_effect=AssertionError('looked up'))
+        previous = make_record(user_name='Old', mergeable=False)
+
+        result = records.PullRecord.from_pull(pull, previous)
+
+        self.assertEqual(result.user_name, 'Old')
+        self.assertEqual(result.mergeable, False)
+
+    def test_from_pull_previous_updated(self):
+        pull = make_pull(updated_at=datetime.datetime(2014, 1, 3, 0, 0, 0))
+        previous = make_record(user_name='Old', mergeable=False)
+
+        result = records.PullRecord.from_pull(pull, previous)
+
+        self.assertEqual(result.user_name, 'Me')
+        self.assertEqual(result.mergeable, True)
+
+    def test_from_pull_previous_base_moved(self):
+        pull = make_pull(**{'base.sha': 'newbase'})
+        previous = make_record(user_name='Old', mergeable=False)
+
+        result = records.PullRecord.from_pull(pull, previous)
+
+        self.assertEqual(result.user_name, 'Me')
+        self.assertEqual(result.mergeable, True)
+
+    def test_init_defaults(self):
+        result = records.PullRecord('owner/repo', 1)
+
+        self.assertEqual(result.repo_name, 'owner/repo')
+        self.assertEqual(result.number, 1)
+        for field in records.PullRecord.fields[2:]:
+            self.assertEqual(getattr(result, field), None)
+
+    def test_to_dict(self):
+        record = make_record()
+
+        self.assertEqual(record.to_dict(), {
+            'repo_name': 'owner/repo',
+            'number': 1,
+            'html_url': 'https://github/owner/repo/pull/1',
+            'head_label': 'me:branch',
+            'head_sha': 'head',
+            'base_label': 'owner:master',
+            'base_sha': 'base',
+            'created_at': '2014-01-01T00:00:00Z',
+            'updated_at': '2014-01-02T00:00:00Z',
+            'user_login': 'me',
+            'user_name': 'Me',
+            'mergeable': True,
+        })
+
+    def test_from_dict(self):
+        record = make_record()
+
+        result = records.PullRecord.from_dict(record.to_dict())
+
+        for field in records.PullRecord.fields:
+            self.assertEqual(getattr(result, field), getattr(record, field))
+
+    def test_same_as(self):
+        self.assertTrue(make_record().same_as(make_record(mergeable=False)))
+        self.assertFalse(make_record().same_as(make_record(number=2)))
+        self.assertFalse(make_record().same_as(make_record(
+            updated_at=datetime.datetime(2014, 1, 3, 0, 0, 0,
+                                         tzinfo=records.UTC))))
+        self.assertFalse(make_record().same_as(make_record(head_sha='new')))
+        self.assertFalse(make_record().same_as(make_record(base_sha='new')))
+
+    def test_key(self):
+        self.assertEqual(make_record().key, ('owner/repo', 1))
+
+    def test_refs(self):
+        record = make_record()
+
+        self.assertEqual(record.repo.full_name, 'owner/repo')
+        self.assertEqual(record.head.label, 'me:branch')
+        self.assertEqual(record.head.sha, 'head')
+        self.assertEqual(record.base.label, 'owner:master')
+        self.assertEqual(record.base.sha, 'base')
+        self.assertEqual(record.user.login, 'me')
+        self.assertEqual(record.user.name, 'Me')
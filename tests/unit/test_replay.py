@@ -0,0 +1,168 @@
+# Copyright 2014 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the
+#    License. You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing,
+#    software distributed under the License is distributed on an "AS
+#    IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+#    express or implied. See the License for the specific language
+#    governing permissions and limitations under the License.
+
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from tugboat import replay
+from tugboat import rest
+
+
+class RequestKeyTest(unittest.TestCase):
+    def test_plain(self):
+        self.assertEqual(replay.request_key('GET', '/repos/a/b'),
+                         'GET /repos/a/b')
+
+    def test_parameters(self):
+        result = replay.request_key(
+            'GET', 'https://api.github.com/repos/a/b/pulls?page=2',
+            {'per_page': 100})
+
+        self.assertEqual(result, 'GET /repos/a/b/pulls?page=2&per_page=100')
+
+    def test_host_ignored(self):
+        self.assertEqual(
+            replay.request_key('GET', 'https://api.github.com/users/u'),
+            replay.request_key('GET', 'http://localhost/users/u'))
+
+
+class ArchiveTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.directory = os.path.join(self.tmpdir, 'archive')
+        self.path = os.path.join(self.directory, replay.ARCHIVE)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def read_lines(self):
+        with gzip.open(self.path, 'rb') as f:
+            return [json.loads(line.decode('utf-8')) for line in f]
+
+    def write_lines(self, *lines):
+        os.makedirs(self.directory)
+        with gzip.open(self.path, 'wb') as f:
+            for line in lines:
+                f.write((json.dumps(line) + '\n').encode('utf-8'))
+
+
+class RecorderTest(ArchiveTestCase):
+    def test_record(self):
+        recorder = replay.Recorder(self.directory)
+        call = mock.Mock(return_value=({'link': 'next'}, [1, 2]))
+
+        result = recorder(call, 'GET', '/repos/a/b/pulls', {'per_page': 100})
+
+        self.assertEqual(result, ({'link': 'next'}, [1, 2]))
+        call.assert_called_once_with('GET', '/repos/a/b/pulls',
+                                     {'per_page': 100}, None, None)
+
+        # Nothing is in place until the recorder is closed
+        self.assertFalse(os.path.exists(self.path))
+        recorder.close()
+        recorder.close()
+
+        self.assertEqual(recorder.exchanges, 1)
+        self.assertEqual(self.read_lines(), [
+            {'version': replay.VERSION},
+            {
+                'key': 'GET /repos/a/b/pulls?per_page=100',
+                'url': '/repos/a/b/pulls',
+                'status': 200,
+                'headers': {'link': 'next'},
+                'data': [1, 2],
+            },
+        ])
+
+    def test_record_error(self):
+        recorder = replay.Recorder(self.directory)
+        exc = rest.RestError(404, {'message': 'Not Found'}, {'a': 'b'})
+        call = mock.Mock(side_effect=exc)
+
+        self.assertRaises(rest.RestError, recorder, call, 'GET', '/users/u')
+        recorder.close()
+
+        self.assertEqual(self.read_lines()[1], {
+            'key': 'GET /users/u',
+            'url': '/users/u',
+            'status': 404,
+            'headers': {'a': 'b'},
+            'data': {'message': 'Not Found'},
+        })
+
+    def test_network_error(self):
+        recorder = replay.Recorder(self.directory)
+        call = mock.Mock(side_effect=IOError('connection reset'))
+
+        self.assertRaises(IOError, recorder, call, 'GET', '/users/u')
+        recorder.close()
+
+        self.assertEqual(recorder.exchanges, 0)
+        self.assertEqual(len(self.read_lines()), 1)
+
+
+class ReplayerTest(ArchiveTestCase):
+    def test_replay(self):
+        self.write_lines(
+            {'version': replay.VERSION},
+            {'key': 'GET /users/u', 'url': '/users/u', 'status': 502,
+             'headers': {}, 'data': {'message': 'Bad Gateway'}},
+            {'key': 'GET /users/u', 'url': '/users/u', 'status': 200,
+             'headers': {'h': 'v'}, 'data': {'login': 'u'}},
+        )
+        replayer = replay.Replayer(self.directory)
+        call = mock.Mock()
+
+        try:
+            replayer(call, 'GET', 'https://api.github.com/users/u')
+        except rest.RestError as exc:
+            self.assertEqual(exc.status, 502)
+        else:
+            self.fail('Failed to raise RestError')
+        result1 = replayer(call, 'GET', '/users/u')
+        result2 = replayer(call, 'GET', '/users/u')
+
+        self.assertEqual(result1, ({'h': 'v'}, {'login': 'u'}))
+        self.assertEqual(result2, result1)
+        self.assertFalse(call.called)
+
+    def test_not_recorded(self):
+        self.write_lines({'version': replay.VERSION})
+        replayer = replay.Replayer(self.directory)
+
+        self.assertRaises(replay.NotRecorded, replayer, mock.Mock(), 'GET',
+                          '/users/u')
+
+    def test_bad_version(self):
+        self.write_lines({'version': 0})
+
+        self.assertRaises(ValueError, replay.Replayer, self.directory)
+
+    def test_round_trip(self):
+        recorder = replay.Recorder(self.directory)
+        recorder(mock.Mock(return_value=({}, {'login': 'u'})), 'GET',
+                 '/users/u', {'a': 1})
+        recorder.close()
+
+        replayer = replay.Replayer(self.directory)
+        result = replayer(mock.Mock(), 'GET', '/users/u?a=1')
+
+        self.assertEqual(result, ({}, {'login': 'u'}))
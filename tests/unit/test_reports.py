@@ -14,6 +14,7 @@
 #    governing permissions and limitations under the License.
 
 import datetime
+import os
 import sys
 import unittest
 
@@ -21,7 +22,26 @@ import mock
 import six
 from six.moves import builtins
 
+from tugboat import adaptive
+from tugboat import deadline
+from tugboat import delta as delta_mod
+from tugboat import lazy
+from tugboat import metrics
+from tugboat import replay
 from tugboat import reports
+from tugboat import requester
+from tugboat import rest
+from tugboat import summary as summary_mod
+
+
+class ReportFailure(Exception):
+    pass
+
+
+def make_pull(**kwargs):
+    kwargs.setdefault('number', 1)
+    kwargs.setdefault('repo.full_name', 'some/repo')
+    return mock.Mock(**kwargs)
 
 
 class PullSummaryTest(unittest.TestCase):
@@ -34,7 +54,7 @@ class PullSummaryTest(unittest.TestCase):
         self.assertEqual(result.most_recent, None)
 
     def test_add_unset(self):
-        pull = mock.Mock(created_at=5, updated_at=5)
+        pull = make_pull(created_at=5, updated_at=5)
         summary = reports.PullSummary()
 
         summary.add_pull(pull)
@@ -45,8 +65,8 @@ class PullSummaryTest(unittest.TestCase):
         self.assertEqual(summary.most_recent, pull)
 
     def test_add_older(self):
-        pull = mock.Mock(created_at=5, updated_at=5)
-        other = mock.Mock(created_at=4, updated_at=5)
+        pull = make_pull(created_at=5, updated_at=5)
+        other = make_pull(created_at=4, updated_at=5)
         summary = reports.PullSummary()
         summary.oldest = pull
         summary.youngest = pull
@@ -61,8 +81,8 @@ class PullSummaryTest(unittest.TestCase):
         self.assertEqual(summary.most_recent, pull)
 
     def test_add_younger(self):
-        pull = mock.Mock(created_at=5, updated_at=5)
-        other = mock.Mock(created_at=6, updated_at=5)
+        pull = make_pull(created_at=5, updated_at=5)
+        other = make_pull(created_at=6, updated_at=5)
         summary = reports.PullSummary()
         summary.oldest = pull
         summary.youngest = pull
@@ -77,8 +97,8 @@ class PullSummaryTest(unittest.TestCase):
         self.assertEqual(summary.most_recent, pull)
 
     def test_add_less_recent(self):
-        pull = mock.Mock(created_at=5, updated_at=5)
-        other = mock.Mock(created_at=5, updated_at=4)
+        pull = make_pull(created_at=5, updated_at=5)
+        other = make_pull(created_at=5, updated_at=4)
         summary = reports.PullSummary()
         summary.oldest = pull
         summary.youngest = pull
@@ -93,8 +113,8 @@ class PullSummaryTest(unittest.TestCase):
         self.assertEqual(summary.most_recent, pull)
 
     def test_add_more_recent(self):
-        pull = mock.Mock(created_at=5, updated_at=5)
-        other = mock.Mock(created_at=5, updated_at=6)
+        pull = make_pull(created_at=5, updated_at=5)
+        other = make_pull(created_at=5, updated_at=6)
         summary = reports.PullSummary()
         summary.oldest = pull
         summary.youngest = pull
@@ -122,6 +142,19 @@ class PullSummaryTest(unittest.TestCase):
         ])
         self.assertEqual(mock_add_pull.call_count, 3)
 
+    def test_add_ties(self):
+        pull = make_pull(created_at=5, updated_at=5, number=2)
+        other = make_pull(created_at=5, updated_at=5, number=1)
+        summary = reports.PullSummary()
+
+        summary.add_pull(pull)
+        summary.add_pull(other)
+
+        self.assertEqual(summary.oldest, other)
+        self.assertEqual(summary.youngest, pull)
+        self.assertEqual(summary.least_recent, other)
+        self.assertEqual(summary.most_recent, pull)
+
 
 class RepoSummaryTest(unittest.TestCase):
     def test_init(self):
@@ -130,24 +163,37 @@ class RepoSummaryTest(unittest.TestCase):
         self.assertEqual(result.name, 'repo')
         self.assertEqual(result.pulls, 0)
         self.assertEqual(result.mergeable, 0)
+        self.assertEqual(result.oldest, None)
 
     def test_iadd_unmergeable(self):
         summary = reports.RepoSummary('repo')
-        pull = mock.Mock(mergeable=False)
+        pull = mock.Mock(mergeable=False, created_at=10)
 
         summary += pull
 
         self.assertEqual(summary.pulls, 1)
         self.assertEqual(summary.mergeable, 0)
+        self.assertEqual(summary.oldest, 10)
 
     def test_iadd_mergeable(self):
         summary = reports.RepoSummary('repo')
-        pull = mock.Mock(mergeable=True)
+        pull = mock.Mock(mergeable=True, created_at=10)
 
         summary += pull
 
         self.assertEqual(summary.pulls, 1)
         self.assertEqual(summary.mergeable, 1)
+        self.assertEqual(summary.oldest, 10)
+
+    def test_iadd_oldest(self):
+        summary = reports.RepoSummary('repo')
+
+        summary += mock.Mock(mergeable=True, created_at=20)
+        summary += mock.Mock(mergeable=True, created_at=10)
+        summary += mock.Mock(mergeable=True, created_at=30)
+
+        self.assertEqual(summary.pulls, 3)
+        self.assertEqual(summary.oldest, 10)
 
 
 class FormatAgeTest(unittest.TestCase):
@@ -175,6 +221,18 @@ class FormatAgeTest(unittest.TestCase):
 
         self.assertEqual(result, '')
 
+    def test_aware(self):
+        class TZ(datetime.tzinfo):
+            def utcoffset(self, dt):
+                return datetime.timedelta(hours=-5)
+
+        now = datetime.datetime(2000, 1, 1, 0, 0, 0)
+        time = datetime.datetime(1999, 12, 30, 19, 0, 0, tzinfo=TZ())
+
+        result = reports.format_age(now, time, "<%s>")
+
+        self.assertEqual(result, '<1 day, 0:00:00>')
+
 
 class RepoActionTest(unittest.TestCase):
     @mock.patch('argparse.Action.__init__', return_value=None)
@@ -203,21 +261,45 @@ class RepoActionTest(unittest.TestCase):
 
         self.assertEqual(namespace.dest, [('user', 'spam'), ('user', 'foo')])
 
+    @mock.patch('argparse.Action.__init__', return_value=None)
+    def test_call_no_value(self, mock_init):
+        action = reports.RepoAction('strings', 'dest', nargs=0, const='',
+                                    target='all')
+        action.dest = 'dest'
+        action.const = ''
+        namespace = mock.Mock(spec=[])
+
+        action('parser', namespace, [])
+
+        self.assertEqual(namespace.dest, [('all', '')])
+        mock_init.assert_called_once_with('strings', 'dest', nargs=0,
+                                          const='')
+
+
+class FromAllTest(unittest.TestCase):
+    @mock.patch.object(reports.pulls.PullRequest, 'from_all',
+                       return_value='pulls')
+    def test_from_all(self, mock_from_all):
+        result = reports._from_all('gh', '', 'callback', deadline='dl')
+
+        self.assertEqual(result, 'pulls')
+        mock_from_all.assert_called_once_with('gh', 'callback', deadline='dl')
+
 
 class SortKeysTest(unittest.TestCase):
     def test_created(self):
-        pull = mock.Mock(created_at=5)
+        pull = make_pull(created_at=5, number=3)
 
         result = reports.sort_keys['created'](pull)
 
-        self.assertEqual(result, 5)
+        self.assertEqual(result, (5, 'some/repo', 3))
 
     def test_updated(self):
-        pull = mock.Mock(updated_at=5)
+        pull = make_pull(updated_at=5, number=3)
 
         result = reports.sort_keys['updated'](pull)
 
-        self.assertEqual(result, 5)
+        self.assertEqual(result, (5, 'some/repo', 3))
 
     def test_repo(self):
         pull = mock.Mock(**{'repo.full_name': 'some/repo', 'number': 5})
@@ -226,6 +308,21 @@ class SortKeysTest(unittest.TestCase):
 
         self.assertEqual(result, ('some/repo', 5))
 
+    def test_ties(self):
+        pulls = [
+            make_pull(created_at=5, updated_at=5, number=2,
+                      **{'repo.full_name': 'some/repo'}),
+            make_pull(created_at=5, updated_at=5, number=1,
+                      **{'repo.full_name': 'some/repo'}),
+            make_pull(created_at=5, updated_at=5, number=1,
+                      **{'repo.full_name': 'other/repo'}),
+        ]
+
+        for sort_by in ('created', 'updated'):
+            result = sorted(pulls, key=reports.sort_keys[sort_by])
+
+            self.assertEqual(result, [pulls[2], pulls[1], pulls[0]])
+
 
 class ReportTest(unittest.TestCase):
     maxDiff = None
@@ -717,178 +814,691 @@ class ReportTest(unittest.TestCase):
         self.assertEqual(sys.stderr.getvalue(), 'Generating report...\n')
         self.assertFalse(mock_format_age.called)
 
+    @mock.patch('datetime.datetime', mock.Mock(utcnow=mock.Mock(side_effect=[
+        80,
+        82,
+    ])))
+    @mock.patch.dict(reports.targets, clear=True)
+    @mock.patch.object(sys, 'stderr', six.StringIO())
+    @mock.patch.object(reports, 'format_age',
+                       side_effect=lambda x, y, z: z % (x - y))
+    def test_empty_stats(self, mock_format_age):
+        stream = six.StringIO()
+        st = mock.Mock()
+
+        reports.report('gh', [], stream, None, stats=st)
+
+        self.assertEqual(stream.getvalue(), 'No open pull requests\n')
+        st.assert_has_calls([
+            mock.call.repo_callback(None),
+            mock.call.phase('sort'),
+            mock.call.stop(),
+        ])
+
+    @mock.patch('datetime.datetime', mock.Mock(utcnow=mock.Mock(side_effect=[
+        80,
+        82,
+    ])))
+    @mock.patch.dict(reports.targets, clear=True)
+    @mock.patch.object(sys, 'stderr', six.StringIO())
+    @mock.patch.object(reports, 'format_age', return_value='')
+    def test_stats(self, mock_format_age):
+        pr = mock.Mock(**{
+            'user.name': 'spam',
+            'mergeable': True,
+            'created_at': 10,
+            'updated_at': 20,
+            'repo.full_name': 'repo1',
+            'number': 1,
+        })
+        reports.targets = {
+            'repo': mock.Mock(return_value=[pr]),
+        }
+        stream = six.StringIO()
+        st = mock.Mock(**{'repo_callback.return_value': 'wrapped'})
+
+        reports.report('gh', [('repo', 'repo1')], stream, 'callback',
+                       stats=st)
+
+        reports.targets['repo'].assert_called_once_with(
+            'gh', 'repo1', 'wrapped')
+        st.assert_has_calls([
+            mock.call.repo_callback('callback'),
+            mock.call.phase('enumerate'),
+            mock.call.phase('sort'),
+            mock.call.phase('mergeable'),
+            mock.call.phase('render'),
+            mock.call.stop(),
+        ])
+        self.assertEqual(len(st.method_calls), 6)
 
-class NormalCallbackTest(unittest.TestCase):
+    @mock.patch('datetime.datetime', mock.Mock(utcnow=mock.Mock(side_effect=[
+        80,
+        82,
+    ])))
+    @mock.patch.dict(reports.targets, clear=True)
     @mock.patch.object(sys, 'stderr', six.StringIO())
-    def test_no_pulls(self):
-        repo = mock.Mock(full_name='repo')
+    @mock.patch.object(reports, 'format_age',
+                       side_effect=lambda x, y, z: z % (x - y))
+    def test_template(self, mock_format_age):
+        class Pull(object):
+            created_at = 10
+            updated_at = 20
+            number = 1
+            repo = mock.Mock(full_name='repo1')
 
-        reports._normal_callback(1, 3, repo)
+            @property
+            def mergeable(self):
+                raise AssertionError('mergeable looked up')
 
-        self.assertEqual(sys.stderr.getvalue(),
-                         'Processing repository "repo" (2/3)...\n')
+        reports.targets = {
+            'repo': mock.Mock(return_value=[Pull()]),
+        }
+        stream = six.StringIO()
+        tmpl = reports.templates.Template({
+            'header': u'{total} open',
+            'pull': u'{pull.repo.full_name}#{pull.number}{age}',
+            'breakdown': u'',
+            'repo': u'{repo.name}: {repo.pulls}',
+            'footer': u'',
+        })
+
+        reports.report('gh', [('repo', 'repo1')], stream, template=tmpl)
+
+        self.assertEqual(stream.getvalue(),
+                         '1 open\n'
+                         'repo1#1 (age: 70)\n'
+                         'repo1: 1\n')
+        mock_format_age.assert_called_once_with(80, 10, ' (age: %s)')
 
+    @mock.patch('datetime.datetime', mock.Mock(utcnow=mock.Mock(side_effect=[
+        80,
+        82,
+    ])))
+    @mock.patch.dict(reports.targets, clear=True)
     @mock.patch.object(sys, 'stderr', six.StringIO())
-    def test_with_pulls(self):
-        repo = mock.Mock(full_name='repo')
-        pulls = [
-            mock.Mock(mergeable=True),
-            mock.Mock(mergeable=False),
-            mock.Mock(mergeable=True),
+    @mock.patch.object(reports, 'format_age', return_value='')
+    @mock.patch.object(reports.output, 'write_files')
+    @mock.patch.object(reports.output, 'repo_path',
+                       side_effect=lambda x, y: '%s/%s.txt' % (x, y))
+    def test_split_dir(self, mock_repo_path, mock_write_files,
+                       mock_format_age):
+        prs = [
+            mock.Mock(**{
+                'created_at': 10 * i,
+                'updated_at': 10 * i,
+                'repo.full_name': 'owner/repo%d' % (i % 2),
+                'number': i,
+            })
+            for i in range(1, 4)
         ]
+        reports.targets = {
+            'repo': mock.Mock(return_value=prs),
+        }
+        stream = six.StringIO()
+        tmpl = reports.templates.Template({
+            'header': u'{total} open',
+            'pull': u'{pull.repo.full_name}#{pull.number}',
+            'repo': u'{repo.name}: {repo.pulls}',
+            'footer': u'',
+        })
+
+        reports.report('gh', [('repo', 'owner/repo0')], stream,
+                       template=tmpl, split_dir='split')
+
+        self.assertEqual(stream.getvalue(),
+                         '3 open\n'
+                         '\n'
+                         'Repositories with open pull requests: 2\n'
+                         'Breakdown by repository:\n'
+                         'owner/repo0: 1\n'
+                         'owner/repo1: 2\n')
+        mock_write_files.assert_called_once_with({
+            'split/owner/repo0.txt': u'owner/repo0#2\n',
+            'split/owner/repo1.txt': u'owner/repo1#1\nowner/repo1#3\n',
+        })
 
-        reports._normal_callback(1, 3, repo, pulls)
-
-        self.assertEqual(sys.stderr.getvalue(), '')
+    @mock.patch('datetime.datetime', mock.Mock(utcnow=mock.Mock(side_effect=[
+        80,
+        82,
+    ])))
+    @mock.patch.dict(reports.targets, clear=True)
+    @mock.patch.object(sys, 'stderr', six.StringIO())
+    @mock.patch.object(reports, 'format_age', return_value='')
+    @mock.patch.object(reports.records.PullRecord, 'from_pull',
+                       side_effect=lambda x: 'record%d' % x.number)
+    def test_shard(self, mock_from_pull, mock_format_age):
+        prs = [
+            mock.Mock(**{
+                'created_at': 10 * i,
+                'updated_at': 10 * i,
+                'repo.full_name': 'repo1',
+                'number': i,
+            })
+            for i in (2, 1)
+        ]
+        reports.targets = {
+            'organization': mock.Mock(return_value=prs),
+        }
+        stream = six.StringIO()
+        shard = reports.shard.Shard(0, 1)
+        part = mock.Mock()
+
+        reports.report('gh', [('organization', 'org')], stream, 'callback',
+                       shard=shard, partial=part)
+
+        reports.targets['organization'].assert_called_once_with(
+            'gh', 'org', 'callback', repo_filter=shard.__contains__)
+        self.assertEqual(part.generated, 80)
+        part.add.assert_has_calls([
+            mock.call('record1'),
+            mock.call('record2'),
+        ])
+        self.assertEqual(part.add.call_count, 2)
 
+    @mock.patch('datetime.datetime', mock.Mock(utcnow=mock.Mock(side_effect=[
+        80,
+        82,
+    ])))
+    @mock.patch.dict(reports.targets, clear=True)
+    @mock.patch.object(sys, 'stderr', new_callable=six.StringIO)
+    def test_progress(self, mock_stderr):
+        reports.targets = {
+            'organization': mock.Mock(return_value=[]),
+        }
+        prog = mock.Mock()
+
+        reports.report('gh', [('organization', 'org')], six.StringIO(),
+                       progress=prog)
+
+        reports.targets['organization'].assert_called_once_with(
+            'gh', 'org', prog.repo_callback)
+        prog.assert_has_calls([
+            mock.call.start(),
+            mock.call.target('organization', 'org'),
+            mock.call.finish(),
+            mock.call.message(u'Generating report...'),
+        ])
+        self.assertEqual(mock_stderr.getvalue(), '')
 
-class VerboseCallbackTest(unittest.TestCase):
+    @mock.patch('datetime.datetime', mock.Mock(utcnow=mock.Mock(side_effect=[
+        80,
+        82,
+    ])))
+    @mock.patch.dict(reports.targets, clear=True)
     @mock.patch.object(sys, 'stderr', six.StringIO())
-    def test_no_pulls(self):
-        repo = mock.Mock(full_name='repo')
+    def test_checkpoint(self):
+        reports.targets = {
+            'organization': mock.Mock(return_value=[]),
+        }
+        stream = six.StringIO()
 
-        reports._verbose_callback(1, 3, repo)
+        reports.report('gh', [('organization', 'org')], stream, 'callback',
+                       checkpoint='ckpt')
 
-        self.assertEqual(sys.stderr.getvalue(),
-                         'Processing repository "repo" (2/3)... ')
+        reports.targets['organization'].assert_called_once_with(
+            'gh', 'org', 'callback', checkpoint='ckpt')
 
+    @mock.patch('datetime.datetime', mock.Mock(utcnow=mock.Mock(side_effect=[
+        80,
+        82,
+    ])))
+    @mock.patch.dict(reports.targets, clear=True)
     @mock.patch.object(sys, 'stderr', six.StringIO())
-    def test_with_pulls(self):
-        repo = mock.Mock(full_name='repo')
-        pulls = [
-            mock.Mock(mergeable=True),
-            mock.Mock(mergeable=False),
-            mock.Mock(mergeable=True),
-        ]
+    def test_merge_cache(self):
+        reports.targets = {
+            'organization': mock.Mock(return_value=[]),
+        }
+        stream = six.StringIO()
 
-        reports._verbose_callback(1, 3, repo, pulls)
+        reports.report('gh', [('organization', 'org')], stream, 'callback',
+                       merge_cache='cache')
 
-        self.assertEqual(sys.stderr.getvalue(), '3 pulls (2 mergeable)\n')
+        reports.targets['organization'].assert_called_once_with(
+            'gh', 'org', 'callback', merge_cache='cache')
 
+    @mock.patch('datetime.datetime', mock.Mock(utcnow=mock.Mock(side_effect=[
+        80,
+        82,
+    ])))
+    @mock.patch.dict(reports.targets, clear=True)
+    @mock.patch.object(sys, 'stderr', six.StringIO())
+    def test_delta(self):
+        reports.targets = {
+            'organization': mock.Mock(return_value=[]),
+        }
+        stream = six.StringIO()
 
-class ProcessReportTest(unittest.TestCase):
-    @mock.patch('github.enable_console_debug_logging')
-    @mock.patch('getpass.getpass', return_value='prompted')
-    @mock.patch('github.Github', return_value='gh')
-    @mock.patch('io.open')
-    @mock.patch('sys.stdout', mock.Mock())
-    def test_basic(self, mock_open, mock_Github, mock_getpass,
-                   mock_enable_console_debug_logging):
-        args = mock.Mock(username='username', password='password',
-                         github_url='github_url', output='-',
-                         verbose=0, debug=False)
+        reports.report('gh', [('organization', 'org')], stream, 'callback',
+                       delta='store')
 
-        gen = reports._process_report(args)
-        next(gen)
+        reports.targets['organization'].assert_called_once_with(
+            'gh', 'org', 'callback', delta='store')
 
-        self.assertEqual(args.gh, 'gh')
-        self.assertEqual(args.stream, sys.stdout)
-        self.assertEqual(args.repo_callback, None)
-        self.assertFalse(mock_enable_console_debug_logging.called)
-        self.assertFalse(mock_getpass.called)
-        mock_Github.assert_called_once_with(
-            'username', 'password', 'github_url')
-        self.assertFalse(mock_open.called)
-        self.assertFalse(sys.stdout.close.called)
+    @mock.patch('datetime.datetime', mock.Mock(utcnow=mock.Mock(side_effect=[
+        80,
+        82,
+    ])))
+    @mock.patch.dict(reports.targets, clear=True)
+    @mock.patch.object(sys, 'stderr', six.StringIO())
+    def test_summary(self):
+        pull = mock.Mock(number=1, created_at=5, updated_at=7,
+                         repo=mock.Mock(full_name='a/b'))
+        reports.targets = {
+            'repo': mock.Mock(return_value=[pull]),
+        }
+        count = mock.Mock(pulls=3, mergeable=2)
+        count.name = 'a/b'
+        summary = mock.Mock(total=3, repos={'a/b': count})
+        stream = six.StringIO()
 
-        try:
-            next(gen)
-        except StopIteration:
-            pass
-        else:
-            self.fail('Failed to end iteration')
+        reports.report('gh', [('repo', 'a/b')], stream, summary=summary)
 
-        self.assertFalse(sys.stdout.close.called)
+        # Only the summary and the breakdown are emitted, and the
+        # mergeable pull requests aren't counted by default
+        self.assertEqual(stream.getvalue(), u'''Open PRs: 3
+    Oldest PR, from 5: a/b#1
+    Youngest PR, from 5: a/b#1
+    Least recently updated PR, at 7: a/b#1
+    Most recently updated PR, at 7: a/b#1
 
-    @mock.patch('github.enable_console_debug_logging')
-    @mock.patch('getpass.getpass', return_value='prompted')
-    @mock.patch('github.Github', return_value='gh')
-    @mock.patch('io.open')
-    @mock.patch('sys.stdout', mock.Mock())
-    def test_prompt(self, mock_open, mock_Github, mock_getpass,
-                    mock_enable_console_debug_logging):
-        args = mock.Mock(username='username', password=None,
-                         github_url='github_url', output='-',
-                         verbose=0, debug=False)
+Repositories with open pull requests: 1
+Breakdown by repository:
+    Open PRs for a/b: 3
 
-        gen = reports._process_report(args)
-        next(gen)
+Report generated in 2 at 80
+''')
+        reports.targets['repo'].assert_called_once_with(
+            'gh', 'a/b', None, summary=summary)
 
-        self.assertEqual(args.gh, 'gh')
-        self.assertEqual(args.stream, sys.stdout)
-        self.assertEqual(args.repo_callback, None)
-        self.assertFalse(mock_enable_console_debug_logging.called)
-        mock_getpass.assert_called_once_with('Password for username> ')
-        mock_Github.assert_called_once_with(
-            'username', 'prompted', 'github_url')
-        self.assertFalse(mock_open.called)
-        self.assertFalse(sys.stdout.close.called)
+    @mock.patch('datetime.datetime', mock.Mock(utcnow=mock.Mock(side_effect=[
+        80,
+        82,
+    ])))
+    @mock.patch.dict(reports.targets, clear=True)
+    @mock.patch.object(sys, 'stderr', six.StringIO())
+    def test_summary_mergeable(self):
+        pull = mock.Mock(number=1, created_at=5, updated_at=7,
+                         repo=mock.Mock(full_name='a/b'))
+        reports.targets = {
+            'repo': mock.Mock(return_value=[pull]),
+        }
+        count = mock.Mock(pulls=3, mergeable=2)
+        count.name = 'a/b'
+        summary = mock.Mock(total=3, repos={'a/b': count})
+        tmpl = reports.templates.Template({
+            'header': u'{total} ({mergeable} mergeable)',
+            'breakdown': u'',
+            'footer': u'',
+        }, reports.templates.summary)
+        stream = six.StringIO()
 
-        try:
-            next(gen)
-        except StopIteration:
-            pass
-        else:
-            self.fail('Failed to end iteration')
+        reports.report('gh', [('repo', 'a/b')], stream, template=tmpl,
+                       summary=summary)
 
-        self.assertFalse(sys.stdout.close.called)
+        self.assertEqual(stream.getvalue(),
+                         u'3 (2 mergeable)\n    Open PRs for a/b: 3\n')
 
-    @mock.patch('github.enable_console_debug_logging')
-    @mock.patch('getpass.getpass', return_value='prompted')
-    @mock.patch('github.Github', return_value='gh')
-    @mock.patch('io.open')
-    @mock.patch('sys.stdout', mock.Mock())
-    def test_output(self, mock_open, mock_Github, mock_getpass,
-                    mock_enable_console_debug_logging):
-        args = mock.Mock(username='username', password='password',
-                         github_url='github_url', output='output',
-                         verbose=0, debug=False)
+    @mock.patch('datetime.datetime', mock.Mock(utcnow=mock.Mock(side_effect=[
+        80,
+        82,
+    ])))
+    @mock.patch.dict(reports.targets, clear=True)
+    @mock.patch.object(sys, 'stderr', six.StringIO())
+    def test_summary_empty(self):
+        reports.targets = {
+            'repo': mock.Mock(return_value=[]),
+        }
+        summary = mock.Mock(total=0, repos={})
+        stream = six.StringIO()
 
-        gen = reports._process_report(args)
-        next(gen)
+        reports.report('gh', [('repo', 'a/b')], stream, summary=summary)
 
-        self.assertEqual(args.gh, 'gh')
-        self.assertEqual(args.stream, mock_open.return_value)
-        self.assertEqual(args.repo_callback, None)
-        self.assertFalse(mock_enable_console_debug_logging.called)
-        self.assertFalse(mock_getpass.called)
-        mock_Github.assert_called_once_with(
-            'username', 'password', 'github_url')
-        mock_open.assert_called_once_with('output', 'w', encoding='utf-8')
-        self.assertFalse(mock_open.return_value.close.called)
+        self.assertEqual(stream.getvalue(), u'No open pull requests\n')
 
-        try:
-            next(gen)
-        except StopIteration:
-            pass
-        else:
-            self.fail('Failed to end iteration')
+    @mock.patch('datetime.datetime', mock.Mock(utcnow=mock.Mock(side_effect=[
+        80,
+        82,
+    ])))
+    @mock.patch.dict(reports.targets, clear=True)
+    @mock.patch.object(sys, 'stderr', six.StringIO())
+    def test_scheduler(self):
+        reports.targets = {
+            'organization': mock.Mock(return_value=[]),
+            'repo': mock.Mock(return_value=[]),
+        }
+        stream = six.StringIO()
 
-        mock_open.return_value.close.assert_called_once_with()
+        sched = mock.Mock(lookups=())
 
-    @mock.patch('github.enable_console_debug_logging')
-    @mock.patch('getpass.getpass', return_value='prompted')
-    @mock.patch('github.Github', return_value='gh')
-    @mock.patch('io.open')
-    @mock.patch('sys.stdout', mock.Mock())
-    def test_verbosity_normal(self, mock_open, mock_Github, mock_getpass,
-                              mock_enable_console_debug_logging):
-        args = mock.Mock(username='username', password='password',
-                         github_url='github_url', output='-',
-                         verbose=1, debug=False)
+        reports.report('gh', [('organization', 'org'), ('repo', 'a/b')],
+                       stream, scheduler=sched)
 
-        gen = reports._process_report(args)
-        next(gen)
+        reports.targets['organization'].assert_called_once_with(
+            'gh', 'org', None, scheduler=sched)
+        reports.targets['repo'].assert_called_once_with(
+            'gh', 'a/b', None, scheduler=sched)
 
-        self.assertEqual(args.gh, 'gh')
-        self.assertEqual(args.stream, sys.stdout)
-        self.assertEqual(args.repo_callback, reports._normal_callback)
-        self.assertFalse(mock_enable_console_debug_logging.called)
-        self.assertFalse(mock_getpass.called)
-        mock_Github.assert_called_once_with(
-            'username', 'password', 'github_url')
-        self.assertFalse(mock_open.called)
-        self.assertFalse(sys.stdout.close.called)
+        # The workers look up what the default template needs
+        self.assertEqual(sched.lookups, ('mergeable', 'user.name'))
+
+    @mock.patch.dict(reports.targets, clear=True)
+    def test_scheduler_lookups(self):
+        reports.targets = {'repo': mock.Mock(return_value=[])}
+        stream = six.StringIO()
+        sched = mock.Mock(lookups=())
+        tmpl = reports.templates.Template({'pull': u'{pull.number}',
+                                           'header': u'{total}',
+                                           'repo': u'{repo.name}'})
+
+        reports.report('gh', [('repo', 'a/b')], stream, template=tmpl,
+                       scheduler=sched)
+
+        # Nothing the template doesn't use is looked up
+        self.assertEqual(sched.lookups, ())
+
+    @mock.patch.dict(reports.targets, clear=True)
+    def test_scheduler_lookups_pull(self):
+        reports.targets = {'repo': mock.Mock(return_value=[])}
+        stream = six.StringIO()
+        sched = mock.Mock(lookups=())
+        tmpl = reports.templates.Template({'pull': u'{pull.mergeable}',
+                                           'header': u'{total}',
+                                           'repo': u'{repo.name}'})
+
+        reports.report('gh', [('repo', 'a/b')], stream, template=tmpl,
+                       scheduler=sched)
+
+        self.assertEqual(sched.lookups, ('mergeable',))
+
+    @mock.patch.dict(reports.targets, clear=True)
+    def test_scheduler_lookups_header(self):
+        reports.targets = {'repo': mock.Mock(return_value=[])}
+        stream = six.StringIO()
+        sched = mock.Mock(lookups=())
+        tmpl = reports.templates.Template({'pull': u'{pull.number}',
+                                           'header': u'{oldest.user.name}',
+                                           'repo': u'{repo.name}'})
+
+        reports.report('gh', [('repo', 'a/b')], stream, template=tmpl,
+                       scheduler=sched)
+
+        self.assertEqual(sched.lookups, ('user.name',))
+
+    @mock.patch.dict(reports.targets, clear=True)
+    def test_scheduler_lookups_summary(self):
+        reports.targets = {'repo': mock.Mock(return_value=[])}
+        stream = six.StringIO()
+        sched = mock.Mock(lookups=())
+
+        reports.report('gh', [('repo', 'a/b')], stream, scheduler=sched,
+                       summary=summary_mod.Summary())
+
+        self.assertEqual(sched.lookups, ())
+
+    @mock.patch('datetime.datetime', mock.Mock(utcnow=mock.Mock(side_effect=[
+        80,
+        82,
+    ])))
+    @mock.patch.dict(reports.targets, clear=True)
+    @mock.patch.object(sys, 'stderr', six.StringIO())
+    def test_enumerator(self):
+        reports.targets = {
+            'organization': mock.Mock(return_value=[]),
+            'all': mock.Mock(return_value=[]),
+        }
+        stream = six.StringIO()
+
+        reports.report('gh', [('organization', 'org'), ('all', '')], stream,
+                       merge_cache='cache', enumerator='enum')
+
+        reports.targets['organization'].assert_called_once_with(
+            'gh', 'org', None, merge_cache='cache')
+        reports.targets['all'].assert_called_once_with(
+            'gh', '', None, merge_cache='cache', enumerator='enum')
+
+    @mock.patch('datetime.datetime', mock.Mock(utcnow=mock.Mock(side_effect=[
+        80,
+        82,
+    ])))
+    @mock.patch.dict(reports.targets, clear=True)
+    @mock.patch.object(sys, 'stderr', six.StringIO())
+    @mock.patch.object(reports, 'format_age', return_value='')
+    def test_hosts(self, mock_format_age):
+        prs = {
+            'owner/repo': [mock.Mock(**{
+                'created_at': 20,
+                'updated_at': 20,
+                'repo.full_name': 'owner/repo',
+                'number': 1,
+            })],
+            'acme/repo': [mock.Mock(**{
+                'created_at': 10,
+                'updated_at': 10,
+                'repo.full_name': 'ghe.example.com:acme/repo',
+                'number': 2,
+            })],
+        }
+        reports.targets = {
+            'repo': mock.Mock(side_effect=lambda gh, name, cb: prs[name]),
+        }
+        gh = reports.hosts.Hosts('gh')
+        gh.add('ghe.example.com', 'gh2')
+        stats = mock.Mock()
+        stream = six.StringIO()
+        tmpl = reports.templates.Template({
+            'header': u'{total} open',
+            'pull': u'{pull.repo.full_name}#{pull.number}',
+            'breakdown': u'',
+            'repo': u'',
+            'footer': u'',
+        })
+
+        reports.report(gh, [('repo', 'ghe.example.com:acme/repo'),
+                            ('repo', 'owner/repo')],
+                       stream, template=tmpl, stats=stats)
+
+        self.assertEqual(stream.getvalue(),
+                         '2 open\n'
+                         'ghe.example.com:acme/repo#2\n'
+                         'owner/repo#1\n')
+        calls = reports.targets['repo'].call_args_list
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(calls[0], mock.call('gh', 'owner/repo', None))
+        handle, name, callback = calls[1][0]
+        self.assertEqual((handle.host, handle.gh), ('ghe.example.com', 'gh2'))
+        self.assertEqual((name, callback), ('acme/repo', None))
+        self.assertEqual(stats.phase.call_args_list[0], mock.call('fetch'))
+        self.assertFalse(mock.call('enumerate') in stats.phase.call_args_list)
+        self.assertFalse(stats.repo_callback.return_value.called)
+
+    @mock.patch('datetime.datetime', mock.Mock(utcnow=mock.Mock(side_effect=[
+        80,
+        82,
+    ])))
+    @mock.patch.dict(reports.targets, clear=True)
+    @mock.patch.object(sys, 'stderr', six.StringIO())
+    @mock.patch.object(reports, 'format_age', return_value='')
+    def test_deadline(self, mock_format_age):
+        pr = mock.Mock(**{
+            'created_at': 10,
+            'updated_at': 20,
+            'repo.full_name': 'org/repo1',
+            'number': 1,
+        })
+        reports.targets = {
+            'organization': mock.Mock(return_value=[pr]),
+            'repo': mock.Mock(),
+        }
+        stream = six.StringIO()
+        skipped = [('org/repo2', 'timed out'), ('other/repo', 'skipped')]
+
+        def guard(name, func, *args, **kwargs):
+            if name == 'other/repo':
+                return None
+            return func(*args, **kwargs)
+
+        dl = mock.Mock(skipped=skipped, **{'guard.side_effect': guard})
+        tmpl = reports.templates.Template({
+            'header': u'{total} open',
+            'pull': u'{pull.repo.full_name}#{pull.number}',
+            'breakdown': u'',
+            'repo': u'{repo.name}: {repo.pulls}',
+            'footer': u'',
+        })
+
+        result = reports.report('gh', [('organization', 'org'),
+                                       ('repo', 'other/repo')],
+                                stream, template=tmpl, deadline=dl)
+
+        self.assertEqual(result, reports.EXIT_PARTIAL)
+        self.assertEqual(stream.getvalue(),
+                         '1 open\n'
+                         'org/repo1#1\n'
+                         'org/repo1: 1\n'
+                         '\n'
+                         'Incomplete report: 2 repositories skipped or '
+                         'timed out\n'
+                         '    org/repo2 (timed out)\n'
+                         '    other/repo (skipped)\n')
+        reports.targets['organization'].assert_called_once_with(
+            'gh', 'org', None, deadline=dl)
+        self.assertFalse(reports.targets['repo'].called)
+        dl.assert_has_calls([
+            mock.call.start(),
+            mock.call.guard('org', reports.targets['organization'], 'gh',
+                            'org', None, deadline=dl),
+            mock.call.guard('other/repo', reports.targets['repo'], 'gh',
+                            'other/repo', None, deadline=dl),
+            mock.call.stop(),
+        ])
+
+    @mock.patch('datetime.datetime', mock.Mock(utcnow=mock.Mock(side_effect=[
+        80,
+        82,
+    ])))
+    @mock.patch.dict(reports.targets, clear=True)
+    @mock.patch.object(sys, 'stderr', six.StringIO())
+    def test_deadline_complete(self):
+        reports.targets = {
+            'repo': mock.Mock(return_value=[]),
+        }
+        stream = six.StringIO()
+        dl = mock.Mock(skipped=[], **{
+            'guard.side_effect': lambda name, func, *args, **kwargs: func(
+                *args, **kwargs),
+        })
+
+        result = reports.report('gh', [('repo', 'repo1')], stream,
+                                deadline=dl)
+
+        self.assertEqual(result, None)
+        self.assertEqual(stream.getvalue(), 'No open pull requests\n')
+
+    @mock.patch('datetime.datetime', mock.Mock(utcnow=mock.Mock(side_effect=[
+        80,
+        82,
+    ])))
+    @mock.patch.dict(reports.targets, clear=True)
+    @mock.patch.object(sys, 'stderr', six.StringIO())
+    @mock.patch.object(reports, '_report_diff')
+    @mock.patch.object(reports.records.PullRecord, 'from_pull',
+                       side_effect=lambda x, y: reports.records.PullRecord(
+                           x.repo.full_name, x.number))
+    def test_deadline_diff(self, mock_from_pull, mock_report_diff):
+        pr = mock.Mock(**{'repo.full_name': 'owner/a', 'number': 1})
+        reports.targets = {
+            'repo': mock.Mock(return_value=[pr]),
+        }
+        previous = reports.snapshot.Snapshot()
+        previous.add(reports.records.PullRecord('owner/a', 2))
+        previous.add(reports.records.PullRecord('owner/b', 1))
+        snap = reports.snapshot.Snapshot()
+        dl = deadline.Deadline()
+        dl.guard = lambda name, func, *args, **kwargs: (
+            func(*args, **kwargs) if name == 'owner/a' else
+            dl.skipped.append((name, 'skipped')))
+        stream = six.StringIO()
+
+        result = reports.report('gh', [('repo', 'owner/a'),
+                                       ('repo', 'owner/b')],
+                                stream, snapshot=snap, previous=previous,
+                                deadline=dl)
+
+        self.assertEqual(result, reports.EXIT_PARTIAL)
+        diff = mock_report_diff.call_args[0][2]
+        self.assertEqual([r.key for r in diff.closed], [('owner/a', 2)])
+        self.assertEqual(sorted(snap.pulls), [('owner/a', 1), ('owner/b', 1)])
+        self.assertIn('    owner/b (skipped)\n', stream.getvalue())
+
+
+class EmitResultsTest(unittest.TestCase):
+    @mock.patch('io.open', new_callable=mock.mock_open)
+    @mock.patch.object(sys, 'stderr', six.StringIO())
+    def test_stderr(self, mock_open):
+        collector = mock.Mock(**{'format.return_value': ['line1', 'line2']})
+
+        reports._emit_results(collector, '-')
+
+        self.assertEqual(sys.stderr.getvalue(), 'line1\nline2\n')
+        self.assertFalse(mock_open.called)
+
+    @mock.patch('io.open', new_callable=mock.mock_open)
+    @mock.patch.object(sys, 'stderr', six.StringIO())
+    def test_file(self, mock_open):
+        collector = mock.Mock(**{'to_dict.return_value': {'b': 2, 'a': 1}})
+
+        reports._emit_results(collector, 'file.json')
+
+        self.assertEqual(sys.stderr.getvalue(), '')
+        mock_open.assert_called_once_with('file.json', 'w', encoding='utf-8')
+        mock_open.return_value.write.assert_called_once_with(
+            '{\n  "a": 1,\n  "b": 2\n}\n')
+
+
+def make_args(**kwargs):
+    defaults = dict(username='username', password='password',
+                    github_url='github_url', output='-', verbose=0,
+                    debug=False, metrics_output=None, stats_output=None,
+                    lazy_output=None, profile=None, profile_output=None,
+                    template=None, snapshot_output=None,
+                    since_snapshot=None, shard=None, partial_output=None,
+                    sort_by='created', deadline=None, repo_timeout=None,
+                    checkpoint_file=None, resume=False, max_age=3600.0,
+                    retries=0, backoff=0.5, progress_log=None,
+                    merge_cache_file=None, backend='pygithub',
+                    record=None, replay=None, repos=[], credentials=None,
+                    all_index=None, all_workers=4, jobs=1,
+                    schedule='largest', history_file=None,
+                    adaptive=False, shared_cache_file=None, cache_ttls=None,
+                    cache_size=1024, delta_file=None,
+                    summary_only=False, split_dir=None)
+    defaults.update(kwargs)
+    return mock.Mock(**defaults)
+
+
+class ProcessReportTest(unittest.TestCase):
+    @mock.patch('github.enable_console_debug_logging')
+    @mock.patch('getpass.getpass', return_value='prompted')
+    @mock.patch('github.Github', return_value='gh')
+    @mock.patch('io.open')
+    @mock.patch('sys.stdout', mock.Mock())
+    def test_basic(self, mock_open, mock_Github, mock_getpass,
+                   mock_enable_console_debug_logging):
+        args = make_args()
+
+        gen = reports._process_report(args)
+        next(gen)
+
+        self.assertEqual(args.gh, 'gh')
+        self.assertEqual(args.stream, sys.stdout)
+        self.assertEqual(args.repo_callback, None)
+        self.assertFalse(mock_enable_console_debug_logging.called)
+        self.assertFalse(mock_getpass.called)
+        mock_Github.assert_called_once_with(
+            'username', 'password', 'github_url')
+        self.assertFalse(mock_open.called)
+        self.assertFalse(sys.stdout.close.called)
 
         try:
             next(gen)
@@ -899,27 +1509,44 @@ class ProcessReportTest(unittest.TestCase):
 
         self.assertFalse(sys.stdout.close.called)
 
+    @mock.patch('github.enable_console_debug_logging')
+    @mock.patch('getpass.getuser', return_value='user')
+    @mock.patch('getpass.getpass', return_value='prompted')
+    @mock.patch('github.Github', return_value='gh')
+    @mock.patch('io.open')
+    @mock.patch('sys.stdout', mock.Mock())
+    def test_username_default(self, mock_open, mock_Github, mock_getpass,
+                              mock_getuser,
+                              mock_enable_console_debug_logging):
+        args = make_args(username=None)
+
+        gen = reports._process_report(args)
+        next(gen)
+
+        self.assertEqual(args.username, 'user')
+        mock_getuser.assert_called_once_with()
+        mock_Github.assert_called_once_with(
+            'user', 'password', 'github_url')
+
     @mock.patch('github.enable_console_debug_logging')
     @mock.patch('getpass.getpass', return_value='prompted')
     @mock.patch('github.Github', return_value='gh')
     @mock.patch('io.open')
     @mock.patch('sys.stdout', mock.Mock())
-    def test_verbosity_verbose(self, mock_open, mock_Github, mock_getpass,
-                               mock_enable_console_debug_logging):
-        args = mock.Mock(username='username', password='password',
-                         github_url='github_url', output='-',
-                         verbose=2, debug=False)
+    def test_prompt(self, mock_open, mock_Github, mock_getpass,
+                    mock_enable_console_debug_logging):
+        args = make_args(password=None)
 
         gen = reports._process_report(args)
         next(gen)
 
         self.assertEqual(args.gh, 'gh')
         self.assertEqual(args.stream, sys.stdout)
-        self.assertEqual(args.repo_callback, reports._verbose_callback)
+        self.assertEqual(args.repo_callback, None)
         self.assertFalse(mock_enable_console_debug_logging.called)
-        self.assertFalse(mock_getpass.called)
+        mock_getpass.assert_called_once_with('Password for username> ')
         mock_Github.assert_called_once_with(
-            'username', 'password', 'github_url')
+            'username', 'prompted', 'github_url')
         self.assertFalse(mock_open.called)
         self.assertFalse(sys.stdout.close.called)
 
@@ -932,6 +1559,139 @@ class ProcessReportTest(unittest.TestCase):
 
         self.assertFalse(sys.stdout.close.called)
 
+    @mock.patch.object(reports.output, 'AtomicFile')
+    @mock.patch('github.enable_console_debug_logging')
+    @mock.patch('getpass.getpass', return_value='prompted')
+    @mock.patch('github.Github', return_value='gh')
+    @mock.patch('sys.stdout', mock.Mock())
+    def test_output(self, mock_Github, mock_getpass,
+                    mock_enable_console_debug_logging, mock_AtomicFile):
+        args = make_args(output='output')
+
+        gen = reports._process_report(args)
+        next(gen)
+
+        self.assertEqual(args.gh, 'gh')
+        self.assertEqual(args.stream, mock_AtomicFile.return_value)
+        self.assertEqual(args.repo_callback, None)
+        self.assertFalse(mock_enable_console_debug_logging.called)
+        self.assertFalse(mock_getpass.called)
+        mock_Github.assert_called_once_with(
+            'username', 'password', 'github_url')
+        mock_AtomicFile.assert_called_once_with('output')
+        self.assertFalse(mock_AtomicFile.return_value.close.called)
+
+        try:
+            next(gen)
+        except StopIteration:
+            pass
+        else:
+            self.fail('Failed to end iteration')
+
+        mock_AtomicFile.return_value.close.assert_called_once_with()
+        self.assertFalse(mock_AtomicFile.return_value.abort.called)
+
+    @mock.patch.object(reports.output, 'AtomicFile')
+    @mock.patch('github.enable_console_debug_logging')
+    @mock.patch('getpass.getpass', return_value='prompted')
+    @mock.patch('github.Github', return_value='gh')
+    @mock.patch('sys.stdout', mock.Mock())
+    def test_output_failure(self, mock_Github, mock_getpass,
+                            mock_enable_console_debug_logging,
+                            mock_AtomicFile):
+        args = make_args(output='output')
+
+        gen = reports._process_report(args)
+        next(gen)
+
+        self.assertRaises(ReportFailure, gen.throw, ReportFailure())
+
+        mock_AtomicFile.return_value.abort.assert_called_once_with()
+        self.assertFalse(mock_AtomicFile.return_value.close.called)
+
+    @mock.patch.object(requester, 'add_middleware')
+    @mock.patch.object(reports.progress, 'JsonLinesSink')
+    @mock.patch.object(reports.progress, 'TerminalSink')
+    @mock.patch.object(reports.progress, 'Progress')
+    @mock.patch('github.enable_console_debug_logging')
+    @mock.patch('getpass.getpass', return_value='prompted')
+    @mock.patch('github.Github', return_value='gh')
+    @mock.patch('sys.stdout', mock.Mock())
+    def test_verbosity_normal(self, mock_Github, mock_getpass,
+                              mock_enable_console_debug_logging,
+                              mock_Progress, mock_TerminalSink,
+                              mock_JsonLinesSink, mock_add_middleware):
+        args = make_args(verbose=1)
+
+        gen = reports._process_report(args)
+        next(gen)
+
+        self.assertEqual(args.repo_callback, None)
+        self.assertEqual(args.progress, mock_Progress.return_value)
+        mock_TerminalSink.assert_called_once_with(sys.stderr, verbose=False)
+        self.assertFalse(mock_JsonLinesSink.called)
+        mock_Progress.assert_called_once_with(
+            [mock_TerminalSink.return_value])
+        mock_add_middleware.assert_called_once_with(
+            'gh', mock_Progress.return_value)
+
+        try:
+            next(gen)
+        except StopIteration:
+            pass
+        else:
+            self.fail('Failed to end iteration')
+
+        mock_Progress.return_value.close.assert_called_once_with()
+
+    @mock.patch.object(requester, 'add_middleware')
+    @mock.patch.object(reports.progress, 'JsonLinesSink')
+    @mock.patch.object(reports.progress, 'TerminalSink')
+    @mock.patch.object(reports.progress, 'Progress')
+    @mock.patch('github.enable_console_debug_logging')
+    @mock.patch('getpass.getpass', return_value='prompted')
+    @mock.patch('github.Github', return_value='gh')
+    @mock.patch('sys.stdout', mock.Mock())
+    def test_verbosity_verbose(self, mock_Github, mock_getpass,
+                               mock_enable_console_debug_logging,
+                               mock_Progress, mock_TerminalSink,
+                               mock_JsonLinesSink, mock_add_middleware):
+        args = make_args(verbose=2, progress_log='events.json')
+
+        gen = reports._process_report(args)
+        next(gen)
+
+        mock_TerminalSink.assert_called_once_with(sys.stderr, verbose=True)
+        mock_JsonLinesSink.assert_called_once_with('events.json')
+        mock_Progress.assert_called_once_with([
+            mock_TerminalSink.return_value,
+            mock_JsonLinesSink.return_value,
+        ])
+
+    @mock.patch.object(requester, 'add_middleware')
+    @mock.patch.object(reports.progress, 'JsonLinesSink')
+    @mock.patch.object(reports.progress, 'TerminalSink')
+    @mock.patch.object(reports.progress, 'Progress')
+    @mock.patch('github.enable_console_debug_logging')
+    @mock.patch('getpass.getpass', return_value='prompted')
+    @mock.patch('github.Github', return_value='gh')
+    @mock.patch('sys.stdout', mock.Mock())
+    def test_progress_log_quiet(self, mock_Github, mock_getpass,
+                                mock_enable_console_debug_logging,
+                                mock_Progress, mock_TerminalSink,
+                                mock_JsonLinesSink, mock_add_middleware):
+        args = make_args(verbose=0, progress_log='events.json')
+
+        gen = reports._process_report(args)
+        next(gen)
+
+        self.assertFalse(mock_TerminalSink.called)
+        mock_Progress.assert_called_once_with(
+            [mock_JsonLinesSink.return_value])
+
+        self.assertRaises(ReportFailure, gen.throw, ReportFailure())
+        mock_Progress.return_value.close.assert_called_once_with()
+
     @mock.patch('github.enable_console_debug_logging')
     @mock.patch('getpass.getpass', return_value='prompted')
     @mock.patch('github.Github', return_value='gh')
@@ -939,9 +1699,7 @@ class ProcessReportTest(unittest.TestCase):
     @mock.patch('sys.stdout', mock.Mock())
     def test_debug(self, mock_open, mock_Github, mock_getpass,
                    mock_enable_console_debug_logging):
-        args = mock.Mock(username='username', password='password',
-                         github_url='github_url', output='-',
-                         verbose=0, debug=True)
+        args = make_args(debug=True)
 
         gen = reports._process_report(args)
         next(gen)
@@ -964,3 +1722,1554 @@ class ProcessReportTest(unittest.TestCase):
             self.fail('Failed to end iteration')
 
         self.assertFalse(sys.stdout.close.called)
+
+    @mock.patch.object(requester, 'add_middleware')
+    @mock.patch.object(reports.stats, 'Stats')
+    @mock.patch('github.enable_console_debug_logging')
+    @mock.patch('getpass.getpass', return_value='prompted')
+    @mock.patch('github.Github', return_value='gh')
+    @mock.patch('io.open')
+    @mock.patch('sys.stdout', mock.Mock())
+    @mock.patch.object(sys, 'stderr', six.StringIO())
+    def test_stats_stderr(self, mock_open, mock_Github, mock_getpass,
+                          mock_enable_console_debug_logging, mock_Stats,
+                          mock_add_middleware):
+        mock_Stats.return_value.format.return_value = ['line1', 'line2']
+        args = make_args(stats_output='-')
+
+        gen = reports._process_report(args)
+        next(gen)
+
+        self.assertEqual(args.stats, mock_Stats.return_value)
+        mock_add_middleware.assert_called_once_with(
+            'gh', mock_Stats.return_value)
+        self.assertEqual(sys.stderr.getvalue(), '')
+
+        try:
+            next(gen)
+        except StopIteration:
+            pass
+        else:
+            self.fail('Failed to end iteration')
+
+        self.assertEqual(sys.stderr.getvalue(), 'line1\nline2\n')
+        self.assertFalse(mock_open.called)
+
+    @mock.patch.object(requester, 'add_middleware')
+    @mock.patch.object(reports.stats, 'Stats')
+    @mock.patch('github.enable_console_debug_logging')
+    @mock.patch('getpass.getpass', return_value='prompted')
+    @mock.patch('github.Github', return_value='gh')
+    @mock.patch('io.open', new_callable=mock.mock_open)
+    @mock.patch('sys.stdout', mock.Mock())
+    def test_stats_file(self, mock_open, mock_Github, mock_getpass,
+                        mock_enable_console_debug_logging, mock_Stats,
+                        mock_add_middleware):
+        mock_Stats.return_value.to_dict.return_value = {'a': 1}
+        args = make_args(stats_output='stats.json')
+
+        gen = reports._process_report(args)
+        next(gen)
+
+        self.assertEqual(args.stats, mock_Stats.return_value)
+        mock_add_middleware.assert_called_once_with(
+            'gh', mock_Stats.return_value)
+
+        try:
+            next(gen)
+        except StopIteration:
+            pass
+        else:
+            self.fail('Failed to end iteration')
+
+        mock_open.assert_called_once_with('stats.json', 'w', encoding='utf-8')
+        mock_open.return_value.write.assert_called_once_with(
+            '{\n  "a": 1\n}\n')
+
+    @mock.patch.object(reports, '_emit_results')
+    @mock.patch.object(requester, 'add_middleware')
+    @mock.patch.object(lazy, 'LazyTracer')
+    @mock.patch('github.enable_console_debug_logging')
+    @mock.patch('getpass.getpass', return_value='prompted')
+    @mock.patch('github.Github', return_value='gh')
+    @mock.patch('io.open')
+    @mock.patch('sys.stdout', mock.Mock())
+    def test_trace_lazy(self, mock_open, mock_Github, mock_getpass,
+                        mock_enable_console_debug_logging, mock_LazyTracer,
+                        mock_add_middleware, mock_emit_results):
+        args = make_args(lazy_output='-')
+
+        gen = reports._process_report(args)
+        next(gen)
+
+        self.assertEqual(args.stats, None)
+        mock_add_middleware.assert_called_once_with(
+            'gh', mock_LazyTracer.return_value)
+        self.assertFalse(mock_emit_results.called)
+
+        try:
+            next(gen)
+        except StopIteration:
+            pass
+        else:
+            self.fail('Failed to end iteration')
+
+        mock_emit_results.assert_called_once_with(
+            mock_LazyTracer.return_value, '-')
+
+    @mock.patch.object(reports, '_emit_results')
+    @mock.patch.dict(reports.profiling.profilers, clear=True)
+    @mock.patch('github.enable_console_debug_logging')
+    @mock.patch('getpass.getpass', return_value='prompted')
+    @mock.patch('github.Github', return_value='gh')
+    @mock.patch('io.open')
+    @mock.patch('sys.stdout', mock.Mock())
+    def test_profile(self, mock_open, mock_Github, mock_getpass,
+                     mock_enable_console_debug_logging, mock_emit_results):
+        profiler = mock.Mock()
+        reports.profiling.profilers['cpu'] = mock.Mock(return_value=profiler)
+        args = make_args(profile='cpu', profile_output='output')
+
+        gen = reports._process_report(args)
+        next(gen)
+
+        reports.profiling.profilers['cpu'].assert_called_once_with('output')
+        self.assertTrue(isinstance(args.stats, reports.stats.Stats))
+        self.assertEqual(args.stats.listeners, [profiler])
+        profiler.start.assert_called_once_with()
+        self.assertFalse(profiler.finish.called)
+
+        try:
+            next(gen)
+        except StopIteration:
+            pass
+        else:
+            self.fail('Failed to end iteration')
+
+        profiler.finish.assert_called_once_with()
+        self.assertFalse(mock_emit_results.called)
+
+    @mock.patch.object(requester, 'add_middleware')
+    @mock.patch.object(metrics, 'Metrics')
+    @mock.patch('github.enable_console_debug_logging')
+    @mock.patch('getpass.getpass', return_value='prompted')
+    @mock.patch('github.Github', return_value='gh')
+    @mock.patch('io.open')
+    @mock.patch('sys.stdout', mock.Mock())
+    def test_metrics(self, mock_open, mock_Github, mock_getpass,
+                     mock_enable_console_debug_logging, mock_Metrics,
+                     mock_add_middleware):
+        mets = mock_Metrics.return_value
+        args = make_args(metrics_output='tugboat.prom')
+
+        gen = reports._process_report(args)
+        next(gen)
+
+        self.assertEqual(args.metrics, mets)
+        mock_add_middleware.assert_called_once_with('gh', mets)
+        mets.start_run.assert_called_once_with()
+        self.assertFalse(mets.end_run.called)
+        self.assertFalse(mets.write.called)
+
+        try:
+            next(gen)
+        except StopIteration:
+            pass
+        else:
+            self.fail('Failed to end iteration')
+
+        mets.end_run.assert_called_once_with()
+        mets.write.assert_called_once_with('tugboat.prom', 'gh')
+
+    @mock.patch.object(requester, 'add_middleware')
+    @mock.patch.object(metrics, 'Metrics')
+    @mock.patch('github.enable_console_debug_logging')
+    @mock.patch('getpass.getpass', return_value='prompted')
+    @mock.patch('github.Github', return_value='gh')
+    @mock.patch('io.open')
+    @mock.patch('sys.stdout', mock.Mock())
+    def test_metrics_failure(self, mock_open, mock_Github, mock_getpass,
+                             mock_enable_console_debug_logging, mock_Metrics,
+                             mock_add_middleware):
+        mets = mock_Metrics.return_value
+        args = make_args(metrics_output='tugboat.prom')
+
+        gen = reports._process_report(args)
+        next(gen)
+
+        self.assertRaises(ReportFailure, gen.throw, ReportFailure())
+        self.assertFalse(mets.end_run.called)
+        self.assertFalse(mets.write.called)
+
+    @mock.patch.object(reports.templates, 'load', return_value='template')
+    @mock.patch('github.enable_console_debug_logging')
+    @mock.patch('getpass.getpass', return_value='prompted')
+    @mock.patch('github.Github', return_value='gh')
+    @mock.patch('io.open')
+    @mock.patch('sys.stdout', mock.Mock())
+    def test_template(self, mock_open, mock_Github, mock_getpass,
+                      mock_enable_console_debug_logging, mock_load):
+        args = make_args(template='{pull.number}')
+
+        gen = reports._process_report(args)
+        next(gen)
+
+        mock_load.assert_called_once_with('{pull.number}', None)
+        self.assertEqual(args.template, 'template')
+
+    @mock.patch.object(reports.templates, 'load',
+                       side_effect=ValueError('Invalid "pull" template'))
+    @mock.patch('github.enable_console_debug_logging')
+    @mock.patch('getpass.getpass', return_value='prompted')
+    @mock.patch('github.Github', return_value='gh')
+    @mock.patch('io.open')
+    @mock.patch('sys.stdout', mock.Mock())
+    def test_template_invalid(self, mock_open, mock_Github, mock_getpass,
+                              mock_enable_console_debug_logging, mock_load):
+        args = make_args(template='{spam}', password=None)
+
+        gen = reports._process_report(args)
+
+        with self.assertRaises(SystemExit) as cm:
+            next(gen)
+        self.assertEqual(cm.exception.code, 'Invalid "pull" template')
+        self.assertFalse(mock_getpass.called)
+        self.assertFalse(mock_Github.called)
+        self.assertFalse(mock_open.called)
+
+    @mock.patch.object(reports.templates, 'load',
+                       side_effect=ValueError('Invalid "pull" template'))
+    @mock.patch('github.Github', return_value='gh')
+    def test_template_invalid_debug(self, mock_Github, mock_load):
+        args = make_args(template='{spam}', debug=True)
+
+        gen = reports._process_report(args)
+
+        self.assertRaises(ValueError, next, gen)
+        self.assertFalse(mock_Github.called)
+
+    @mock.patch.object(reports.snapshot, 'Snapshot')
+    @mock.patch('github.enable_console_debug_logging')
+    @mock.patch('getpass.getpass', return_value='prompted')
+    @mock.patch('github.Github', return_value='gh')
+    @mock.patch('sys.stdout', mock.Mock())
+    def test_snapshot(self, mock_Github, mock_getpass,
+                      mock_enable_console_debug_logging, mock_Snapshot):
+        snap = mock_Snapshot.return_value
+        args = make_args(snapshot_output='snapshot.json')
+
+        gen = reports._process_report(args)
+        next(gen)
+
+        self.assertEqual(args.snapshot, snap)
+        self.assertEqual(args.previous, None)
+        self.assertFalse(snap.write.called)
+
+        try:
+            next(gen)
+        except StopIteration:
+            pass
+        else:
+            self.fail('Failed to end iteration')
+
+        snap.write.assert_called_once_with('snapshot.json')
+
+    @mock.patch.object(reports.snapshot, 'Snapshot')
+    @mock.patch('github.enable_console_debug_logging')
+    @mock.patch('getpass.getpass', return_value='prompted')
+    @mock.patch('github.Github', return_value='gh')
+    @mock.patch('sys.stdout', mock.Mock())
+    def test_snapshot_failure(self, mock_Github, mock_getpass,
+                              mock_enable_console_debug_logging,
+                              mock_Snapshot):
+        snap = mock_Snapshot.return_value
+        args = make_args(snapshot_output='snapshot.json')
+
+        gen = reports._process_report(args)
+        next(gen)
+
+        self.assertRaises(ReportFailure, gen.throw, ReportFailure())
+        self.assertFalse(snap.write.called)
+
+    @mock.patch.object(reports.snapshot, 'load', return_value='previous')
+    @mock.patch('github.enable_console_debug_logging')
+    @mock.patch('getpass.getpass', return_value='prompted')
+    @mock.patch('github.Github', return_value='gh')
+    @mock.patch('sys.stdout', mock.Mock())
+    def test_since_snapshot(self, mock_Github, mock_getpass,
+                            mock_enable_console_debug_logging, mock_load):
+        args = make_args(since_snapshot='snapshot.json')
+
+        gen = reports._process_report(args)
+        next(gen)
+
+        mock_load.assert_called_once_with('snapshot.json')
+        self.assertEqual(args.previous, 'previous')
+        self.assertEqual(args.snapshot, None)
+
+    @mock.patch.object(reports.partial, 'PartialReport')
+    @mock.patch('github.enable_console_debug_logging')
+    @mock.patch('getpass.getpass', return_value='prompted')
+    @mock.patch('github.Github', return_value='gh')
+    @mock.patch('sys.stdout', mock.Mock())
+    def test_partial(self, mock_Github, mock_getpass,
+                     mock_enable_console_debug_logging, mock_PartialReport):
+        part = mock_PartialReport.return_value
+        args = make_args(partial_output='partial.json', shard='shard',
+                         sort_by='updated')
+
+        gen = reports._process_report(args)
+        next(gen)
+
+        mock_PartialReport.assert_called_once_with('updated', 'shard')
+        self.assertEqual(args.partial, part)
+        self.assertFalse(part.write.called)
+
+        try:
+            next(gen)
+        except StopIteration:
+            pass
+        else:
+            self.fail('Failed to end iteration')
+
+        part.write.assert_called_once_with('partial.json')
+
+    @mock.patch.object(reports.partial, 'PartialReport')
+    @mock.patch('github.enable_console_debug_logging')
+    @mock.patch('getpass.getpass', return_value='prompted')
+    @mock.patch('github.Github', return_value='gh')
+    @mock.patch('sys.stdout', mock.Mock())
+    def test_partial_failure(self, mock_Github, mock_getpass,
+                             mock_enable_console_debug_logging,
+                             mock_PartialReport):
+        part = mock_PartialReport.return_value
+        args = make_args(partial_output='partial.json')
+
+        gen = reports._process_report(args)
+        next(gen)
+
+        self.assertRaises(ReportFailure, gen.throw, ReportFailure())
+        self.assertFalse(part.write.called)
+
+    @mock.patch.object(requester, 'add_middleware')
+    @mock.patch.object(reports.retry, 'Retry')
+    @mock.patch('github.enable_console_debug_logging')
+    @mock.patch('getpass.getpass', return_value='prompted')
+    @mock.patch('github.Github', return_value='gh')
+    @mock.patch('sys.stdout', mock.Mock())
+    @mock.patch.object(sys, 'stderr', new_callable=six.StringIO)
+    def test_retries(self, mock_stderr, mock_Github, mock_getpass,
+                     mock_enable_console_debug_logging, mock_Retry,
+                     mock_add_middleware):
+        middleware = mock_Retry.return_value
+        middleware.retried = 2
+        middleware.trips = 1
+        args = make_args(retries=3, backoff=1.5, verbose=1)
+
+        gen = reports._process_report(args)
+        next(gen)
+
+        mock_Retry.assert_called_once_with(3, 1.5, base_url='github_url',
+                                           stats=None)
+        mock_add_middleware.assert_any_call('gh', middleware)
+        self.assertEqual(args.retry, middleware)
+
+        try:
+            gen.send(None)
+        except StopIteration:
+            pass
+        else:
+            self.fail('Failed to end iteration')
+
+        self.assertEqual(mock_stderr.getvalue(),
+                         'Retried 2 requests; circuit breaker tripped 1 '
+                         'times\n')
+
+    @mock.patch.object(requester, 'add_middleware')
+    @mock.patch.object(reports.retry, 'Retry')
+    @mock.patch('github.enable_console_debug_logging')
+    @mock.patch('getpass.getpass', return_value='prompted')
+    @mock.patch('github.Github', return_value='gh')
+    @mock.patch('sys.stdout', mock.Mock())
+    @mock.patch.object(sys, 'stderr', new_callable=six.StringIO)
+    def test_retries_none(self, mock_stderr, mock_Github, mock_getpass,
+                          mock_enable_console_debug_logging, mock_Retry,
+                          mock_add_middleware):
+        middleware = mock_Retry.return_value
+        middleware.retried = 0
+        middleware.trips = 0
+        args = make_args(retries=3, verbose=1)
+
+        gen = reports._process_report(args)
+        next(gen)
+
+        try:
+            gen.send(None)
+        except StopIteration:
+            pass
+        else:
+            self.fail('Failed to end iteration')
+
+        self.assertEqual(mock_stderr.getvalue(), '')
+
+    @mock.patch.object(reports.retry, 'Retry')
+    @mock.patch('github.enable_console_debug_logging')
+    @mock.patch('getpass.getpass', return_value='prompted')
+    @mock.patch('github.Github', return_value='gh')
+    @mock.patch('sys.stdout', mock.Mock())
+    def test_no_retries(self, mock_Github, mock_getpass,
+                        mock_enable_console_debug_logging, mock_Retry):
+        args = make_args(retries=0)
+
+        gen = reports._process_report(args)
+        next(gen)
+
+        self.assertFalse(mock_Retry.called)
+        self.assertEqual(args.retry, None)
+
+    @mock.patch.object(reports.checkpoint, 'Checkpoint')
+    @mock.patch('github.enable_console_debug_logging')
+    @mock.patch('getpass.getpass', return_value='prompted')
+    @mock.patch('github.Github', return_value='gh')
+    @mock.patch('sys.stdout', mock.Mock())
+    def test_checkpoint(self, mock_Github, mock_getpass,
+                        mock_enable_console_debug_logging, mock_Checkpoint):
+        ckpt = mock_Checkpoint.return_value
+        args = make_args(checkpoint_file='ckpt.json', resume=True,
+                         max_age=60.0)
+
+        gen = reports._process_report(args)
+        next(gen)
+
+        mock_Checkpoint.assert_called_once_with('ckpt.json', 60.0)
+        ckpt.open.assert_called_once_with(True)
+        self.assertEqual(args.checkpoint, ckpt)
+
+        try:
+            gen.send(None)
+        except StopIteration:
+            pass
+        else:
+            self.fail('Failed to end iteration')
+
+        ckpt.remove.assert_called_once_with()
+        self.assertFalse(ckpt.close.called)
+
+    @mock.patch.object(reports.checkpoint, 'Checkpoint')
+    @mock.patch('github.enable_console_debug_logging')
+    @mock.patch('getpass.getpass', return_value='prompted')
+    @mock.patch('github.Github', return_value='gh')
+    @mock.patch('sys.stdout', mock.Mock())
+    def test_checkpoint_failure(self, mock_Github, mock_getpass,
+                                mock_enable_console_debug_logging,
+                                mock_Checkpoint):
+        ckpt = mock_Checkpoint.return_value
+        args = make_args(checkpoint_file='ckpt.json')
+
+        gen = reports._process_report(args)
+        next(gen)
+
+        ckpt.open.assert_called_once_with(False)
+        self.assertRaises(ReportFailure, gen.throw, ReportFailure())
+        ckpt.close.assert_called_once_with()
+        self.assertFalse(ckpt.remove.called)
+
+    @mock.patch.object(reports.snapshot, 'load')
+    @mock.patch('github.Github', return_value='gh')
+    def test_since_snapshot_template_unsupported(self, mock_Github,
+                                                 mock_load):
+        args = make_args(since_snapshot='snapshot', template='tmpl')
+        template = reports.templates.Template(
+            {'pull': u'{pull.number} {pull.title}'})
+
+        with mock.patch.object(reports.templates, 'load',
+                               return_value=template):
+            gen = reports._process_report(args)
+            with self.assertRaises(SystemExit) as cm:
+                next(gen)
+
+        self.assertTrue(cm.exception.code.startswith(
+            'The template uses pull.title, which "--since-snapshot" does '
+            'not record'))
+        self.assertFalse(mock_Github.called)
+        self.assertFalse(mock_load.called)
+
+    @mock.patch.object(delta_mod, 'load')
+    @mock.patch('github.Github', return_value='gh')
+    def test_delta_template_unsupported(self, mock_Github, mock_load):
+        args = make_args(delta_file='delta', template='tmpl')
+        template = reports.templates.Template(
+            {'pull': u'{pull.number} {pull.title}'})
+
+        with mock.patch.object(reports.templates, 'load',
+                               return_value=template):
+            gen = reports._process_report(args)
+            with self.assertRaises(SystemExit) as cm:
+                next(gen)
+
+        self.assertTrue(cm.exception.code.startswith(
+            'The template uses pull.title, which "--delta" does not '
+            'record'))
+        self.assertFalse(mock_Github.called)
+        self.assertFalse(mock_load.called)
+
+    @mock.patch.object(reports.checkpoint, 'Checkpoint')
+    @mock.patch('github.Github', return_value='gh')
+    def test_checkpoint_template_unsupported(self, mock_Github,
+                                             mock_Checkpoint):
+        args = make_args(checkpoint_file='checkpoint', template='tmpl',
+                         backend='pygithub')
+        template = reports.templates.Template(
+            {'pull': u'{pull.number} {pull.title}'})
+
+        with mock.patch.object(reports.templates, 'load',
+                               return_value=template):
+            gen = reports._process_report(args)
+            with self.assertRaises(SystemExit) as cm:
+                next(gen)
+
+        self.assertTrue(cm.exception.code.startswith(
+            'The template uses pull.title, which "--checkpoint" does not '
+            'record'))
+        self.assertFalse(mock_Github.called)
+        self.assertFalse(mock_Checkpoint.called)
+
+    @mock.patch.object(reports.checkpoint, 'Checkpoint')
+    @mock.patch('github.Github', return_value='gh')
+    @mock.patch('sys.stdout', mock.Mock())
+    def test_checkpoint_template_supported(self, mock_Github,
+                                           mock_Checkpoint):
+        args = make_args(checkpoint_file='checkpoint', template='tmpl')
+        template = reports.templates.Template(
+            {'pull': u'{pull.repo_name}#{pull.number} {pull.user.name}'})
+
+        with mock.patch.object(reports.templates, 'load',
+                               return_value=template):
+            gen = reports._process_report(args)
+            next(gen)
+
+        self.assertEqual(args.checkpoint, mock_Checkpoint.return_value)
+
+    @mock.patch.object(reports.mergecache, 'load')
+    @mock.patch('github.enable_console_debug_logging')
+    @mock.patch('getpass.getpass', return_value='prompted')
+    @mock.patch('github.Github', return_value='gh')
+    @mock.patch('sys.stdout', mock.Mock())
+    def test_merge_cache(self, mock_Github, mock_getpass,
+                         mock_enable_console_debug_logging, mock_load):
+        cache = mock_load.return_value
+        args = make_args(merge_cache_file='merge.json')
+
+        gen = reports._process_report(args)
+        next(gen)
+
+        mock_load.assert_called_once_with('merge.json', stats=None)
+        self.assertEqual(args.merge_cache, cache)
+        self.assertFalse(cache.write.called)
+
+        try:
+            gen.send(None)
+        except StopIteration:
+            pass
+        else:
+            self.fail('Failed to end iteration')
+
+        cache.write.assert_called_once_with('merge.json')
+
+    @mock.patch.object(reports.mergecache, 'load')
+    @mock.patch('github.enable_console_debug_logging')
+    @mock.patch('getpass.getpass', return_value='prompted')
+    @mock.patch('github.Github', return_value='gh')
+    @mock.patch('sys.stdout', mock.Mock())
+    def test_merge_cache_failure(self, mock_Github, mock_getpass,
+                                 mock_enable_console_debug_logging,
+                                 mock_load):
+        cache = mock_load.return_value
+        args = make_args(merge_cache_file='merge.json')
+
+        gen = reports._process_report(args)
+        next(gen)
+
+        self.assertRaises(ReportFailure, gen.throw, ReportFailure())
+        cache.write.assert_called_once_with('merge.json')
+
+    @mock.patch.object(delta_mod, 'load')
+    @mock.patch('github.enable_console_debug_logging')
+    @mock.patch('getpass.getpass', return_value='prompted')
+    @mock.patch('github.Github', return_value='gh')
+    @mock.patch('sys.stdout', mock.Mock())
+    def test_delta(self, mock_Github, mock_getpass,
+                   mock_enable_console_debug_logging, mock_load):
+        store = mock_load.return_value
+        args = make_args(delta_file='delta.json')
+
+        gen = reports._process_report(args)
+        next(gen)
+
+        mock_load.assert_called_once_with('delta.json', stats=None)
+        self.assertEqual(args.delta, store)
+        self.assertFalse(store.write.called)
+
+        # The store is saved even if the report fails
+        self.assertRaises(ReportFailure, gen.throw, ReportFailure())
+        store.write.assert_called_once_with('delta.json')
+
+    @mock.patch.object(reports.allrepos, 'load')
+    @mock.patch.object(reports.allrepos, 'Enumerator')
+    @mock.patch('github.Github', return_value='gh')
+    @mock.patch('sys.stdout', mock.Mock())
+    def test_all(self, mock_Github, mock_Enumerator, mock_load):
+        index = mock_load.return_value
+        args = make_args(repos=[('all', '')], all_index='index.json',
+                         all_workers=8,
+                         github_url='https://ghe.example.com/api/v3')
+
+        gen = reports._process_report(args)
+        next(gen)
+
+        mock_load.assert_called_once_with('index.json')
+        mock_Enumerator.assert_called_once_with(8, index=index,
+                                                host='ghe.example.com')
+        self.assertEqual(args.enumerator, mock_Enumerator.return_value)
+        self.assertFalse(index.write.called)
+
+        self.assertRaises(ReportFailure, gen.throw, ReportFailure())
+        index.write.assert_called_once_with('index.json')
+
+    @mock.patch.object(reports.allrepos, 'load')
+    @mock.patch.object(reports.allrepos, 'Enumerator')
+    @mock.patch('github.Github', return_value='gh')
+    @mock.patch('sys.stdout', mock.Mock())
+    def test_all_no_index(self, mock_Github, mock_Enumerator, mock_load):
+        args = make_args(repos=[('all', '')])
+
+        gen = reports._process_report(args)
+        next(gen)
+
+        self.assertFalse(mock_load.called)
+        mock_Enumerator.assert_called_once_with(4, index=None,
+                                                host='')
+
+    @mock.patch.object(requester, 'add_middleware')
+    @mock.patch.object(reports.schedule, 'load')
+    @mock.patch.object(reports.schedule, 'Scheduler')
+    @mock.patch('github.Github', return_value='gh')
+    @mock.patch('sys.stdout', mock.Mock())
+    def test_jobs(self, mock_Github, mock_Scheduler, mock_load,
+                  mock_add_middleware):
+        args = make_args(jobs=4, schedule='listed', stats_output='-')
+
+        gen = reports._process_report(args)
+        next(gen)
+
+        self.assertFalse(mock_load.called)
+        mock_Scheduler.assert_called_once_with(4, 'listed', None, args.stats,
+                                               None)
+        self.assertEqual(args.scheduler, mock_Scheduler.return_value)
+
+    @mock.patch.object(reports.schedule, 'load')
+    @mock.patch.object(reports.schedule, 'Scheduler')
+    @mock.patch('github.Github', return_value='gh')
+    @mock.patch('sys.stdout', mock.Mock())
+    def test_history(self, mock_Github, mock_Scheduler, mock_load):
+        history = mock_load.return_value
+        args = make_args(history_file='history.json')
+
+        gen = reports._process_report(args)
+        next(gen)
+
+        mock_load.assert_called_once_with('history.json')
+        mock_Scheduler.assert_called_once_with(1, 'largest', history, None,
+                                               None)
+        self.assertFalse(history.write.called)
+
+        # The history is saved even if the report fails
+        self.assertRaises(ReportFailure, gen.throw, ReportFailure())
+        history.write.assert_called_once_with('history.json')
+
+    @mock.patch.object(reports.schedule, 'Scheduler')
+    @mock.patch('github.Github')
+    def test_no_scheduler(self, mock_Github, mock_Scheduler):
+        args = make_args()
+
+        gen = reports._process_report(args)
+        next(gen)
+
+        self.assertEqual(args.scheduler, None)
+        self.assertFalse(mock_Scheduler.called)
+
+    @mock.patch.object(reports.allrepos, 'Enumerator')
+    @mock.patch('github.Github')
+    def test_no_all(self, mock_Github, mock_Enumerator):
+        args = make_args(all_index='index.json')
+
+        gen = reports._process_report(args)
+        next(gen)
+
+        self.assertEqual(args.enumerator, None)
+        self.assertFalse(mock_Enumerator.called)
+
+    @mock.patch('github.Github')
+    def test_no_merge_cache(self, mock_Github):
+        args = make_args()
+
+        gen = reports._process_report(args)
+        next(gen)
+
+        self.assertEqual(args.merge_cache, None)
+        self.assertEqual(args.delta, None)
+
+    @mock.patch.object(rest, 'Client')
+    @mock.patch('github.enable_console_debug_logging')
+    @mock.patch('github.Github')
+    @mock.patch('sys.stdout', mock.Mock())
+    def test_backend_rest(self, mock_Github,
+                          mock_enable_console_debug_logging, mock_Client):
+        client = mock_Client.return_value
+        args = make_args(backend=None, debug=True)
+
+        gen = reports._process_report(args)
+        next(gen)
+
+        self.assertEqual(args.gh, client)
+        mock_Client.assert_called_once_with(
+            'username', 'password', 'github_url')
+        self.assertFalse(mock_Github.called)
+        self.assertFalse(mock_enable_console_debug_logging.called)
+        self.assertFalse(client.close.called)
+
+        try:
+            gen.send(None)
+        except StopIteration:
+            pass
+        else:
+            self.fail('Failed to end iteration')
+
+        client.close.assert_called_once_with()
+
+    @mock.patch.object(rest, 'Client')
+    @mock.patch('github.Github', return_value='gh')
+    @mock.patch('sys.stdout', mock.Mock())
+    def test_backend_template_fallback(self, mock_Github, mock_Client):
+        args = make_args(backend=None)
+        args.template = reports.templates.Template(
+            {'pull': u'{pull.title}'})
+
+        with mock.patch.object(reports.templates, 'load',
+                               return_value=args.template):
+            gen = reports._process_report(args)
+            next(gen)
+
+        # The REST client doesn't provide the title
+        self.assertEqual(args.gh, 'gh')
+        self.assertFalse(mock_Client.called)
+
+    @mock.patch.object(rest, 'Client')
+    @mock.patch('github.Github', return_value='gh')
+    @mock.patch('sys.stdout', mock.Mock())
+    def test_backend_template_supported(self, mock_Github, mock_Client):
+        args = make_args(backend=None)
+        args.template = reports.templates.Template(
+            {'pull': u'{pull.pr.repo.full_name} {pull.user.name}'})
+
+        with mock.patch.object(reports.templates, 'load',
+                               return_value=args.template):
+            gen = reports._process_report(args)
+            next(gen)
+
+        self.assertEqual(args.gh, mock_Client.return_value)
+        self.assertFalse(mock_Github.called)
+
+    @mock.patch.object(rest, 'Client')
+    @mock.patch('github.Github', return_value='gh')
+    def test_backend_rest_template_unsupported(self, mock_Github,
+                                               mock_Client):
+        args = make_args(backend='rest', template='tmpl')
+        template = reports.templates.Template(
+            {'header': u'{oldest.title}', 'pull': u'{pull.body}'})
+
+        with mock.patch.object(reports.templates, 'load',
+                               return_value=template):
+            gen = reports._process_report(args)
+            with self.assertRaises(SystemExit) as cm:
+                next(gen)
+
+        self.assertEqual(
+            cm.exception.code,
+            'The template uses oldest.title, pull.body, which '
+            '"--backend rest" does not provide; use "--backend pygithub"')
+        self.assertFalse(mock_Client.called)
+        self.assertFalse(mock_Github.called)
+
+    @mock.patch.object(reports, '_emit_results')
+    @mock.patch.object(lazy, 'LazyTracer')
+    @mock.patch.object(requester, 'add_middleware')
+    @mock.patch.object(rest, 'Client')
+    @mock.patch('github.Github', return_value='gh')
+    @mock.patch('sys.stdout', mock.Mock())
+    def test_backend_trace_lazy(self, mock_Github, mock_Client,
+                                mock_add_middleware, mock_LazyTracer,
+                                mock_emit_results):
+        args = make_args(backend=None, lazy_output='lazy.json')
+
+        gen = reports._process_report(args)
+        next(gen)
+        gen.close()
+
+        self.assertEqual(args.gh, 'gh')
+        self.assertFalse(mock_Client.called)
+
+    @mock.patch.object(requester, 'add_middleware')
+    @mock.patch.object(replay, 'Recorder')
+    @mock.patch('github.Github', return_value='gh')
+    @mock.patch('sys.stdout', mock.Mock())
+    def test_record(self, mock_Github, mock_Recorder, mock_add_middleware):
+        recorder = mock_Recorder.return_value
+        args = make_args(record='archive')
+
+        gen = reports._process_report(args)
+        next(gen)
+
+        mock_Recorder.assert_called_once_with('archive')
+        mock_add_middleware.assert_called_once_with('gh', recorder)
+        self.assertFalse(recorder.close.called)
+
+        self.assertRaises(ReportFailure, gen.throw, ReportFailure())
+        recorder.close.assert_called_once_with()
+
+    @mock.patch.object(requester, 'add_middleware')
+    @mock.patch.object(reports.schedule, 'load', side_effect=IOError)
+    @mock.patch.object(reports.sharedcache, 'SharedCache')
+    @mock.patch.object(replay, 'Recorder')
+    @mock.patch.object(rest, 'Client')
+    @mock.patch('getpass.getpass')
+    def test_setup_failure(self, mock_getpass, mock_Client, mock_Recorder,
+                           mock_SharedCache, mock_load,
+                           mock_add_middleware):
+        clients = [mock.Mock(), mock.Mock()]
+        mock_Client.side_effect = clients
+        recorders = [mock.Mock(), mock.Mock()]
+        mock_Recorder.side_effect = recorders
+        args = make_args(repos=[('repo', 'ghe.example.com:acme/repo')],
+                         github_url='https://api.github.com',
+                         backend='rest', record='archive',
+                         shared_cache_file='cache.db', history_file='hist')
+
+        gen = reports._process_report(args)
+
+        # What was set up before the failure is released
+        self.assertRaises(IOError, next, gen)
+        for client in clients:
+            client.close.assert_called_once_with()
+        for recorder in recorders:
+            recorder.close.assert_called_once_with()
+        mock_SharedCache.return_value.close.assert_called_once_with()
+
+    @mock.patch.object(reports.output, 'AtomicFile', side_effect=IOError)
+    @mock.patch.object(reports.checkpoint, 'Checkpoint')
+    @mock.patch('github.Github', return_value='gh')
+    def test_open_outputs_failure(self, mock_Github, mock_Checkpoint,
+                                  mock_AtomicFile):
+        args = make_args(output='report.txt', checkpoint_file='checkpoint')
+
+        gen = reports._process_report(args)
+
+        self.assertRaises(IOError, next, gen)
+        mock_Checkpoint.return_value.close.assert_called_once_with()
+        self.assertFalse(mock_Checkpoint.return_value.remove.called)
+
+    @mock.patch.object(requester, 'add_middleware')
+    @mock.patch.object(replay, 'Replayer')
+    @mock.patch('getpass.getpass')
+    @mock.patch('github.Github', return_value='gh')
+    @mock.patch('sys.stdout', mock.Mock())
+    def test_replay(self, mock_Github, mock_getpass, mock_Replayer,
+                    mock_add_middleware):
+        args = make_args(replay='archive', password=None)
+
+        gen = reports._process_report(args)
+        next(gen)
+
+        self.assertFalse(mock_getpass.called)
+        mock_Github.assert_called_once_with('username', None, 'github_url')
+        mock_Replayer.assert_called_once_with('archive')
+        mock_add_middleware.assert_called_once_with(
+            'gh', mock_Replayer.return_value)
+        self.assertEqual(args.recorder, None)
+
+    @mock.patch.object(requester, 'add_middleware')
+    @mock.patch.object(replay, 'Recorder')
+    @mock.patch.object(reports.retry, 'Retry')
+    @mock.patch.object(reports.hosts, 'load_credentials', return_value={
+        'ghe1.example.com': {'username': 'other', 'password': 'secret'},
+        'ghe2.example.com': {'url': 'https://ghe2.example.com/api'},
+    })
+    @mock.patch('getpass.getpass', return_value='prompted')
+    @mock.patch('github.Github', side_effect=['gh', 'gh1', 'gh2'])
+    @mock.patch('sys.stdout', mock.Mock())
+    def test_hosts(self, mock_Github, mock_getpass, mock_load_credentials,
+                   mock_Retry, mock_Recorder, mock_add_middleware):
+        recorders = [mock.Mock(), mock.Mock(), mock.Mock()]
+        mock_Recorder.side_effect = recorders
+        args = make_args(repos=[
+            ('repo', 'owner/repo'),
+            ('organization', 'ghe2.example.com:acme'),
+            ('repo', 'ghe1.example.com:acme/repo'),
+            ('repo', 'ghe2.example.com:acme/other'),
+        ], github_url='https://api.github.com', credentials='creds.json',
+            record='archive', retries=2)
+
+        gen = reports._process_report(args)
+        next(gen)
+
+        mock_load_credentials.assert_called_once_with('creds.json')
+        mock_getpass.assert_called_once_with(
+            u'Password for username@ghe2.example.com> ')
+        mock_Github.assert_has_calls([
+            mock.call('username', 'password', 'https://api.github.com'),
+            mock.call('other', 'secret', 'https://ghe1.example.com/api/v3'),
+            mock.call('username', 'prompted',
+                      'https://ghe2.example.com/api'),
+        ])
+        self.assertTrue(isinstance(args.gh, reports.hosts.Hosts))
+        self.assertEqual(args.gh.all(), [
+            ('github.com', 'gh'),
+            ('ghe1.example.com', 'gh1'),
+            ('ghe2.example.com', 'gh2'),
+        ])
+        mock_Recorder.assert_has_calls([
+            mock.call('archive'),
+            mock.call(os.path.join('archive', 'ghe1.example.com')),
+            mock.call(os.path.join('archive', 'ghe2.example.com')),
+        ])
+        retry = mock_Retry.return_value
+        retry.bind.assert_has_calls([
+            mock.call('https://ghe1.example.com/api/v3'),
+            mock.call('https://ghe2.example.com/api'),
+        ])
+        mock_add_middleware.assert_has_calls([
+            mock.call('gh', recorders[0]),
+            mock.call('gh1', recorders[1]),
+            mock.call('gh2', recorders[2]),
+            mock.call('gh', retry),
+            mock.call('gh1', retry.bind.return_value),
+            mock.call('gh2', retry.bind.return_value),
+        ])
+
+        self.assertRaises(ReportFailure, gen.throw, ReportFailure())
+        for recorder in recorders:
+            recorder.close.assert_called_once_with()
+
+    @mock.patch.object(requester, 'add_middleware')
+    @mock.patch.object(deadline, 'Deadline')
+    @mock.patch('getpass.getpass')
+    @mock.patch('github.Github', side_effect=['gh', 'gh1'])
+    @mock.patch('sys.stdout', mock.Mock())
+    def test_hosts_deadline(self, mock_Github, mock_getpass, mock_Deadline,
+                            mock_add_middleware):
+        dl = mock_Deadline.return_value
+        args = make_args(repos=[('repo', 'ghe.example.com:acme/repo')],
+                         password=None, replay='archive', deadline=10)
+
+        with mock.patch.object(replay, 'Replayer') as mock_Replayer:
+            gen = reports._process_report(args)
+            next(gen)
+
+        self.assertFalse(mock_getpass.called)
+        mock_Replayer.assert_has_calls([
+            mock.call('archive'),
+            mock.call(os.path.join('archive', 'ghe.example.com')),
+        ])
+        mock_Deadline.assert_called_once_with(
+            10, args.repo_timeout, requester.get_requester('gh'))
+        dl.bind.assert_called_once_with('gh1')
+        mock_add_middleware.assert_any_call('gh', dl)
+        mock_add_middleware.assert_any_call('gh1', dl.bind.return_value)
+
+    @mock.patch.object(reports.templates, 'load', return_value='template')
+    @mock.patch.object(summary_mod, 'Summary')
+    @mock.patch('github.enable_console_debug_logging')
+    @mock.patch('getpass.getpass', return_value='prompted')
+    @mock.patch('github.Github', return_value='gh')
+    @mock.patch('sys.stdout', mock.Mock())
+    def test_summary_only(self, mock_Github, mock_getpass,
+                          mock_enable_console_debug_logging, mock_Summary,
+                          mock_load):
+        args = make_args(summary_only=True, template='{pull.number}')
+
+        gen = reports._process_report(args)
+        next(gen)
+
+        self.assertEqual(args.summary, mock_Summary.return_value)
+        mock_load.assert_called_once_with('{pull.number}',
+                                          reports.templates.summary)
+        self.assertEqual(args.template, 'template')
+
+    @mock.patch('github.Github')
+    def test_no_summary_only(self, mock_Github):
+        args = make_args()
+
+        gen = reports._process_report(args)
+        next(gen)
+
+        self.assertEqual(args.summary, None)
+
+    @mock.patch('getpass.getpass')
+    @mock.patch('github.Github')
+    def test_summary_only_conflicts(self, mock_Github, mock_getpass):
+        for dest, option in [('snapshot_output', '--snapshot'),
+                             ('since_snapshot', '--since-snapshot'),
+                             ('split_dir', '--split-dir'),
+                             ('partial_output', '--partial'),
+                             ('checkpoint_file', '--checkpoint'),
+                             ('delta_file', '--delta')]:
+            args = make_args(summary_only=True, password=None,
+                             **{dest: 'file'})
+
+            gen = reports._process_report(args)
+
+            with self.assertRaises(SystemExit) as cm:
+                next(gen)
+            self.assertEqual(cm.exception.code,
+                             '"--summary-only" cannot be used with "%s"' %
+                             option)
+        self.assertFalse(mock_getpass.called)
+        self.assertFalse(mock_Github.called)
+
+    @mock.patch('github.Github')
+    def test_shared_cache_replay(self, mock_Github):
+        args = make_args(shared_cache_file='cache.db', replay='archive')
+
+        gen = reports._process_report(args)
+
+        with self.assertRaises(SystemExit) as cm:
+            next(gen)
+        self.assertEqual(cm.exception.code,
+                         '"--shared-cache" cannot be used with "--replay"')
+        self.assertFalse(mock_Github.called)
+
+    @mock.patch.object(requester, 'add_middleware')
+    @mock.patch.object(reports.sharedcache, 'SharedCache')
+    @mock.patch('getpass.getpass')
+    @mock.patch('github.Github', side_effect=['gh', 'gh1'])
+    @mock.patch('sys.stdout', mock.Mock())
+    def test_shared_cache(self, mock_Github, mock_getpass, mock_SharedCache,
+                          mock_add_middleware):
+        shared = mock_SharedCache.return_value
+        args = make_args(repos=[('repo', 'ghe.example.com:acme/repo')],
+                         github_url='https://api.github.com',
+                         stats_output='-', shared_cache_file='cache.db',
+                         cache_ttls=[('pulls', 60.0)])
+
+        gen = reports._process_report(args)
+        next(gen)
+
+        mock_SharedCache.assert_called_once_with(
+            'cache.db', {'pulls': 60.0}, 1024,
+            base_url='https://api.github.com', stats=args.stats)
+        shared.bind.assert_called_once_with('https://ghe.example.com/api/v3')
+
+        # The statistics only count the requests which miss the cache
+        mock_add_middleware.assert_has_calls([
+            mock.call('gh', args.stats),
+            mock.call('gh1', args.stats),
+            mock.call('gh', shared),
+            mock.call('gh1', shared.bind.return_value),
+        ])
+        self.assertFalse(shared.close.called)
+
+        self.assertRaises(ReportFailure, gen.throw, ReportFailure())
+        shared.close.assert_called_once_with()
+
+    @mock.patch('github.Github')
+    def test_adaptive_no_jobs(self, mock_Github):
+        args = make_args(adaptive=True)
+
+        gen = reports._process_report(args)
+
+        with self.assertRaises(SystemExit) as cm:
+            next(gen)
+        self.assertEqual(cm.exception.code,
+                         '"--adaptive" requires "--jobs" of at least 2')
+        self.assertFalse(mock_Github.called)
+
+    @mock.patch.object(requester, 'add_middleware')
+    @mock.patch.object(adaptive, 'Limiter')
+    @mock.patch.object(reports.retry, 'Retry')
+    @mock.patch('getpass.getpass')
+    @mock.patch('github.Github', side_effect=['gh', 'gh1'])
+    @mock.patch('sys.stdout', mock.Mock())
+    def test_adaptive(self, mock_Github, mock_getpass, mock_Retry,
+                      mock_Limiter, mock_add_middleware):
+        limiters = [mock.Mock(), mock.Mock()]
+        mock_Limiter.side_effect = limiters
+        args = make_args(repos=[('repo', 'ghe.example.com:acme/repo')],
+                         github_url='https://api.github.com', password='p',
+                         adaptive=True, jobs=4, retries=2)
+
+        gen = reports._process_report(args)
+        next(gen)
+
+        mock_Limiter.assert_has_calls([
+            mock.call(4, host='github.com', stats=None),
+            mock.call(4, host='ghe.example.com', stats=None),
+        ])
+        self.assertEqual(args.limiters, limiters)
+
+        # Each attempt at a request passes through the limiter
+        retry = mock_Retry.return_value
+        mock_add_middleware.assert_has_calls([
+            mock.call('gh', limiters[0]),
+            mock.call('gh1', limiters[1]),
+            mock.call('gh', retry),
+            mock.call('gh1', retry.bind.return_value),
+        ])
+
+    @mock.patch('github.Github')
+    def test_resume_no_checkpoint(self, mock_Github):
+        args = make_args(resume=True)
+
+        gen = reports._process_report(args)
+
+        with self.assertRaises(SystemExit) as cm:
+            next(gen)
+        self.assertEqual(cm.exception.code,
+                         '"--resume" requires "--checkpoint"')
+        self.assertFalse(mock_Github.called)
+
+    @mock.patch.object(requester, 'add_middleware')
+    @mock.patch.object(deadline, 'Deadline')
+    @mock.patch('github.enable_console_debug_logging')
+    @mock.patch('getpass.getpass', return_value='prompted')
+    @mock.patch('github.Github')
+    @mock.patch('sys.stdout', mock.Mock())
+    def test_deadline(self, mock_Github, mock_getpass,
+                      mock_enable_console_debug_logging, mock_Deadline,
+                      mock_add_middleware):
+        gh = mock_Github.return_value
+        args = make_args(deadline=60.0, repo_timeout=5.0)
+
+        gen = reports._process_report(args)
+        next(gen)
+
+        mock_Deadline.assert_called_once_with(60.0, 5.0,
+                                              gh._Github__requester)
+        self.assertEqual(args.deadline, mock_Deadline.return_value)
+        mock_add_middleware.assert_called_once_with(
+            gh, mock_Deadline.return_value)
+
+    @mock.patch.object(deadline, 'Deadline')
+    @mock.patch('github.enable_console_debug_logging')
+    @mock.patch('getpass.getpass', return_value='prompted')
+    @mock.patch('github.Github', return_value='gh')
+    @mock.patch('sys.stdout', mock.Mock())
+    def test_no_deadline(self, mock_Github, mock_getpass,
+                         mock_enable_console_debug_logging, mock_Deadline):
+        args = make_args()
+
+        gen = reports._process_report(args)
+        next(gen)
+
+        self.assertFalse(mock_Deadline.called)
+        self.assertEqual(args.deadline, None)
+
+    @mock.patch('github.enable_console_debug_logging')
+    @mock.patch('getpass.getpass', return_value='prompted')
+    @mock.patch('github.Github', return_value='gh')
+    @mock.patch('sys.stdout', mock.Mock())
+    def test_partial_result(self, mock_Github, mock_getpass,
+                            mock_enable_console_debug_logging):
+        args = make_args()
+
+        gen = reports._process_report(args)
+        next(gen)
+
+        try:
+            gen.send(reports.EXIT_PARTIAL)
+        except StopIteration:
+            pass
+        else:
+            self.fail('Failed to end iteration')
+
+
+class CheckPartialsTest(unittest.TestCase):
+    def test_single(self):
+        result = reports._check_partials({
+            'p0': {'sort_by': 'updated', 'shard': None},
+        })
+
+        self.assertEqual(result, 'updated')
+
+    def test_shards(self):
+        result = reports._check_partials({
+            'p0': {'sort_by': 'repo', 'shard': '0/3'},
+            'p1': {'sort_by': 'repo', 'shard': '2/3'},
+            'p2': {'sort_by': 'repo', 'shard': '1/3'},
+        })
+
+        self.assertEqual(result, 'repo')
+
+    def test_not_shards(self):
+        result = reports._check_partials({
+            'team1': {'sort_by': 'updated', 'shard': None},
+            'team2': {'sort_by': 'updated', 'shard': None},
+        })
+
+        self.assertEqual(result, 'updated')
+
+    def test_unknown_sort(self):
+        self.assertRaises(ValueError, reports._check_partials, {
+            'p0': {'sort_by': 'spam', 'shard': None},
+        })
+
+    def test_sort_mismatch(self):
+        self.assertRaises(ValueError, reports._check_partials, {
+            'p0': {'sort_by': 'repo', 'shard': '0/2'},
+            'p1': {'sort_by': 'created', 'shard': '1/2'},
+        })
+
+    def test_not_shard(self):
+        self.assertRaises(ValueError, reports._check_partials, {
+            'p0': {'sort_by': 'repo', 'shard': '0/2'},
+            'p1': {'sort_by': 'repo', 'shard': None},
+        })
+
+    def test_missing_shard(self):
+        self.assertRaises(ValueError, reports._check_partials, {
+            'p0': {'sort_by': 'repo', 'shard': '0/3'},
+            'p1': {'sort_by': 'repo', 'shard': '1/3'},
+        })
+
+    def test_duplicate_shard(self):
+        self.assertRaises(ValueError, reports._check_partials, {
+            'p0': {'sort_by': 'repo', 'shard': '0/2'},
+            'p1': {'sort_by': 'repo', 'shard': '0/2'},
+        })
+
+
+class MergeRecordsTest(unittest.TestCase):
+    def test_streaming(self):
+        consumed = []
+
+        def reader(name, numbers):
+            for number in numbers:
+                consumed.append((name, number))
+                yield make_record(number, name, created=number)
+
+        result = reports._merge_records([
+            ('p0', reader('owner/a', [1, 3, 5])),
+            ('p1', reader('owner/b', [2, 4])),
+        ], reports.sort_keys['created'])
+
+        # Only the head of each input is read ahead
+        self.assertEqual(next(result).key, ('owner/a', 1))
+        self.assertEqual(consumed, [('owner/a', 1), ('owner/b', 2)])
+        self.assertEqual([r.key for r in result], [
+            ('owner/b', 2), ('owner/a', 3), ('owner/b', 4), ('owner/a', 5),
+        ])
+
+    def test_duplicates(self):
+        result = reports._merge_records([
+            ('p0', iter([make_record(1), make_record(2)])),
+            ('p1', iter([make_record(1, mergeable=False)])),
+        ], reports.sort_keys['repo'])
+
+        records = list(result)
+
+        self.assertEqual([r.key for r in records],
+                         [('owner/repo', 1), ('owner/repo', 2)])
+        self.assertEqual(records[0].mergeable, True)
+
+    def test_unsorted(self):
+        result = reports._merge_records([
+            ('p0', iter([make_record(2), make_record(1)])),
+        ], reports.sort_keys['repo'])
+
+        self.assertRaises(ValueError, list, result)
+
+
+def make_record(number, repo_name='owner/repo', created=0, mergeable=True):
+    return reports.records.PullRecord(
+        repo_name=repo_name,
+        number=number,
+        created_at=datetime.datetime(2014, 1, 1, 0, 0, created),
+        updated_at=datetime.datetime(2014, 1, 2, 0, 0, created),
+        user_login='user',
+        user_name='User',
+        mergeable=mergeable,
+    )
+
+
+class MergeTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpl = reports.templates.Template({
+            'header': u'{total} open ({mergeable} mergeable), oldest '
+            u'{oldest.repo.full_name}#{oldest.number}',
+            'pull': u'{pull.repo.full_name}#{pull.number} {username}',
+            'breakdown': u'',
+            'repo': u'{repo.name}: {repo.pulls}',
+            'footer': u'as of {start}',
+        })
+
+    @mock.patch.object(reports.partial, 'read')
+    def test_merge(self, mock_read):
+        parts = {
+            'p0': ({'sort_by': 'created', 'shard': '0/2',
+                    'generated': '2014-02-01T00:00:05Z'},
+                   iter([make_record(1, 'owner/b', 1),
+                         make_record(2, 'owner/b', 3, False)])),
+            'p1': ({'sort_by': 'created', 'shard': '1/2',
+                    'generated': '2014-02-01T00:00:00Z'},
+                   iter([make_record(7, 'owner/a', 1),
+                         make_record(5, 'owner/a', 2)])),
+        }
+        mock_read.side_effect = lambda x: parts[x]
+        stream = six.StringIO()
+        snap = mock.Mock()
+
+        reports.merge(['p0', 'p1'], stream, self.tmpl, snapshot=snap)
+
+        self.assertEqual(stream.getvalue(),
+                         '4 open (3 mergeable), oldest owner/a#7\n'
+                         'owner/a#7 User\n'
+                         'owner/b#1 User\n'
+                         'owner/a#5 User\n'
+                         'owner/b#2 User\n'
+                         'owner/a: 2\n'
+                         'owner/b: 2\n'
+                         'as of 2014-02-01 00:00:00\n')
+        self.assertEqual(snap.generated,
+                         datetime.datetime(2014, 2, 1, 0, 0, 0))
+        self.assertEqual(snap.add.call_count, 4)
+
+    @mock.patch.object(reports.partial, 'read')
+    def test_overlap(self, mock_read):
+        parts = {
+            'team1': ({'sort_by': 'repo', 'shard': None},
+                      iter([make_record(1, 'owner/a'),
+                            make_record(2, 'owner/b')])),
+            'team2': ({'sort_by': 'repo', 'shard': None},
+                      iter([make_record(1, 'owner/a'),
+                            make_record(1, 'owner/c', mergeable=False)])),
+        }
+        mock_read.side_effect = lambda x: parts[x]
+        stream = six.StringIO()
+
+        reports.merge(['team1', 'team2'], stream, self.tmpl)
+
+        self.assertEqual(stream.getvalue().split('\n')[:4], [
+            '3 open (2 mergeable), oldest owner/a#1',
+            'owner/a#1 User',
+            'owner/b#2 User',
+            'owner/c#1 User',
+        ])
+
+    @mock.patch.object(reports.partial, 'read')
+    def test_skipped(self, mock_read):
+        parts = {
+            'p0': ({'sort_by': 'repo', 'shard': '0/2',
+                    'skipped': [['owner/b', 'timed out']]},
+                   iter([make_record(1, 'owner/a')])),
+            'p1': ({'sort_by': 'repo', 'shard': '1/2', 'skipped': []},
+                   iter([])),
+        }
+        mock_read.side_effect = lambda x: parts[x]
+        stream = six.StringIO()
+
+        result = reports.merge(['p0', 'p1'], stream, self.tmpl)
+
+        self.assertEqual(result, reports.EXIT_PARTIAL)
+        self.assertIn('\nIncomplete report: 1 repositories skipped or timed '
+                      'out\n    owner/b (timed out)\n', stream.getvalue())
+
+    @mock.patch.object(reports.partial, 'read')
+    def test_unsorted(self, mock_read):
+        parts = {
+            'p0': ({'sort_by': 'created', 'shard': None},
+                   iter([make_record(1, created=2),
+                         make_record(2, created=1)])),
+        }
+        mock_read.side_effect = lambda x: parts[x]
+        stream = six.StringIO()
+
+        self.assertRaises(ValueError, reports.merge, ['p0'], stream,
+                          self.tmpl)
+        self.assertEqual(stream.getvalue(), '')
+
+    @mock.patch.object(reports.partial, 'read')
+    def test_empty(self, mock_read):
+        mock_read.return_value = ({'sort_by': 'created', 'shard': None},
+                                  iter([]))
+        stream = six.StringIO()
+
+        reports.merge(['p0'], stream, self.tmpl)
+
+        self.assertEqual(stream.getvalue(), 'No open pull requests\n')
+
+    @mock.patch.object(reports.partial, 'read')
+    @mock.patch.object(reports.output, 'write_files')
+    @mock.patch.object(reports.output, 'repo_path',
+                       side_effect=lambda x, y: '%s/%s.txt' % (x, y))
+    def test_split_dir(self, mock_repo_path, mock_write_files, mock_read):
+        mock_read.return_value = ({'sort_by': 'repo', 'shard': None},
+                                  iter([make_record(1, 'owner/a'),
+                                        make_record(2, 'owner/a'),
+                                        make_record(1, 'owner/b')]))
+        stream = six.StringIO()
+
+        reports.merge(['p0'], stream, self.tmpl, split_dir='split')
+
+        self.assertEqual(stream.getvalue().split('\n')[:3], [
+            '3 open (3 mergeable), oldest owner/a#1',
+            'owner/a: 2',
+            'owner/b: 1',
+        ])
+        mock_write_files.assert_called_once_with({
+            'split/owner/a.txt': u'owner/a#1 User\nowner/a#2 User\n',
+            'split/owner/b.txt': u'owner/b#1 User\n',
+        })
+
+    @mock.patch.object(reports.partial, 'read')
+    def test_mismatch(self, mock_read):
+        parts = {
+            'p0': ({'sort_by': 'created', 'shard': '0/2'}, iter([])),
+            'p1': ({'sort_by': 'updated', 'shard': '1/2'}, iter([])),
+        }
+        mock_read.side_effect = lambda x: parts[x]
+        stream = six.StringIO()
+
+        self.assertRaises(ValueError, reports.merge, ['p0', 'p1'], stream,
+                          self.tmpl)
+        self.assertEqual(stream.getvalue(), '')
+
+
+def make_merge_args(**kwargs):
+    defaults = dict(inputs=['p0', 'p1'], output='-', template=None,
+                    snapshot_output=None, split_dir=None, verbose=False,
+                    debug=False)
+    defaults.update(kwargs)
+    return mock.Mock(**defaults)
+
+
+class ProcessMergeTest(unittest.TestCase):
+    @mock.patch.object(reports.output, 'AtomicFile')
+    @mock.patch('sys.stdout', mock.Mock())
+    def test_basic(self, mock_AtomicFile):
+        args = make_merge_args()
+
+        gen = reports._process_merge(args)
+        next(gen)
+
+        self.assertEqual(args.stream, sys.stdout)
+        self.assertEqual(args.template, None)
+        self.assertEqual(args.snapshot, None)
+        self.assertFalse(mock_AtomicFile.called)
+
+        try:
+            next(gen)
+        except StopIteration:
+            pass
+        else:
+            self.fail('Failed to end iteration')
+
+        self.assertFalse(sys.stdout.close.called)
+
+    @mock.patch.object(reports.snapshot, 'Snapshot')
+    @mock.patch.object(reports.templates, 'load', return_value='tmpl')
+    @mock.patch.object(reports.output, 'AtomicFile')
+    @mock.patch('sys.stdout', mock.Mock())
+    def test_output(self, mock_AtomicFile, mock_load, mock_Snapshot):
+        snap = mock_Snapshot.return_value
+        args = make_merge_args(output='output', template='{pull.number}',
+                               snapshot_output='snapshot.json')
+
+        gen = reports._process_merge(args)
+        next(gen)
+
+        mock_load.assert_called_once_with('{pull.number}')
+        self.assertEqual(args.template, 'tmpl')
+        self.assertEqual(args.stream, mock_AtomicFile.return_value)
+        mock_AtomicFile.assert_called_once_with('output')
+        self.assertEqual(args.snapshot, snap)
+        self.assertFalse(snap.write.called)
+
+        try:
+            next(gen)
+        except StopIteration:
+            pass
+        else:
+            self.fail('Failed to end iteration')
+
+        mock_AtomicFile.return_value.close.assert_called_once_with()
+        snap.write.assert_called_once_with('snapshot.json')
+
+    @mock.patch.object(reports.snapshot, 'Snapshot')
+    @mock.patch.object(reports.output, 'AtomicFile')
+    @mock.patch('sys.stdout', mock.Mock())
+    def test_output_failure(self, mock_AtomicFile, mock_Snapshot):
+        snap = mock_Snapshot.return_value
+        args = make_merge_args(output='output',
+                               snapshot_output='snapshot.json')
+
+        gen = reports._process_merge(args)
+        next(gen)
+
+        self.assertRaises(ReportFailure, gen.throw, ReportFailure())
+
+        mock_AtomicFile.return_value.abort.assert_called_once_with()
+        self.assertFalse(mock_AtomicFile.return_value.close.called)
+        self.assertFalse(snap.write.called)
+
+
+class CacheTest(unittest.TestCase):
+    def test_cache(self):
+        self.assertEqual(reports.cache(),
+                         'Specify a subcommand: "stats" or "prune"')
+
+    def test_subcommands(self):
+        self.assertEqual(reports.cache.get_subcommands(), {
+            'stats': reports.cache_stats,
+            'prune': reports.cache_prune,
+        })
+
+    @mock.patch.object(reports.sharedcache, 'SharedCache')
+    def test_stats(self, mock_SharedCache):
+        shared = mock_SharedCache.return_value
+        shared.summary.return_value = {
+            'users': {'entries': 1, 'expired': 0, 'size': 4, 'hits': 2},
+            'pulls': {'entries': 2, 'expired': 1, 'size': 9, 'hits': 0},
+        }
+        stream = six.StringIO()
+
+        reports.cache_stats('cache.db', [('pulls', 60.0)], stream)
+
+        mock_SharedCache.assert_called_once_with('cache.db', {'pulls': 60.0})
+        shared.close.assert_called_once_with()
+        self.assertEqual(stream.getvalue(),
+                         'Shared cache "cache.db": 3 entries, 13 bytes\n'
+                         '    pulls: 2 entries (1 expired), 9 bytes, 0 hits\n'
+                         '    users: 1 entries (0 expired), 4 bytes, 2 hits\n')
+
+    @mock.patch.object(reports.sharedcache, 'SharedCache')
+    def test_prune(self, mock_SharedCache):
+        shared = mock_SharedCache.return_value
+        shared.prune.return_value = (3, 120)
+        stream = six.StringIO()
+
+        reports.cache_prune('cache.db', None, 100, stream)
+
+        mock_SharedCache.assert_called_once_with('cache.db', {}, 100)
+        shared.close.assert_called_once_with()
+        self.assertEqual(stream.getvalue(),
+                         'Removed 3 entries (120 bytes) from shared cache '
+                         '"cache.db"\n')
+
+    @mock.patch.object(reports.sharedcache, 'SharedCache')
+    def test_prune_failure(self, mock_SharedCache):
+        shared = mock_SharedCache.return_value
+        shared.prune.side_effect = IOError('locked')
+
+        self.assertRaises(IOError, reports.cache_prune, 'cache.db',
+                          stream=six.StringIO())
+
+        shared.close.assert_called_once_with()
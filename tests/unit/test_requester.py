@@ -0,0 +1,160 @@
+# Copyright 2014 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the
+#    License. You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing,
+#    software distributed under the License is distributed on an "AS
+#    IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+#    express or implied. See the License for the specific language
+#    governing permissions and limitations under the License.
+
+import threading
+import unittest
+
+import mock
+
+from tugboat import requester
+from tugboat import rest
+
+
+class GetRequesterTest(unittest.TestCase):
+    def test_github(self):
+        gh = mock.Mock(_Github__requester='requester')
+
+        result = requester.get_requester(gh)
+
+        self.assertEqual(result, 'requester')
+
+    def test_other(self):
+        gh = mock.Mock(spec=['requestJsonAndCheck'])
+
+        result = requester.get_requester(gh)
+
+        self.assertEqual(result, gh)
+
+
+class FakeConnection(object):
+    def __init__(self, timeout):
+        self.timeout = timeout
+
+
+class FakeRequester(object):
+    def __init__(self, connection=None):
+        self._Requester__connectionClass = FakeConnection
+        self._Requester__connection = connection
+
+
+class CapTimeoutTest(unittest.TestCase):
+    def test_basic(self):
+        req = FakeRequester(FakeConnection(15))
+
+        result = requester.cap_timeout(req, 2.5)
+
+        self.assertEqual(result, None)
+        self.assertEqual(req._Requester__connection.timeout, 2.5)
+
+        # Other threads see the connection's own timeout
+        seen = []
+        thread = threading.Thread(
+            target=lambda: seen.append(req._Requester__connection.timeout))
+        thread.start()
+        thread.join()
+        self.assertEqual(seen, [15])
+
+        result = requester.cap_timeout(req, None)
+
+        self.assertEqual(result, 2.5)
+        self.assertEqual(req._Requester__connection.timeout, 15)
+
+    def test_longer(self):
+        req = FakeRequester(FakeConnection(1))
+
+        requester.cap_timeout(req, 2.5)
+
+        self.assertEqual(req._Requester__connection.timeout, 1)
+
+    def test_no_connection(self):
+        req = FakeRequester()
+
+        requester.cap_timeout(req, 2.5)
+        connection = req._Requester__connectionClass(15)
+
+        self.assertEqual(connection.timeout, 2.5)
+        self.assertEqual(connection.__class__.__name__, 'FakeConnection')
+        self.assertTrue(isinstance(connection, FakeConnection))
+
+    def test_rest_client(self):
+        client = rest.Client(timeout=15)
+
+        result = requester.cap_timeout(client, 2.5)
+
+        self.assertEqual(result, None)
+        self.assertEqual(client.timeout, 15)
+        self.assertEqual(client._timeout(), 2.5)
+
+
+class AddMiddlewareTest(unittest.TestCase):
+    def test_basic(self):
+        orig = mock.Mock(return_value=('headers', 'data'))
+        gh = mock.Mock(**{'_Github__requester.requestJsonAndCheck': orig})
+        middleware = mock.Mock(return_value='result')
+
+        result = requester.add_middleware(gh, middleware)
+
+        self.assertEqual(result, middleware)
+        self.assertNotEqual(gh._Github__requester.requestJsonAndCheck, orig)
+        self.assertEqual(
+            gh._Github__requester.requestJsonAndCheck('GET', 'url', a=1),
+            'result')
+        middleware.assert_called_once_with(orig, 'GET', 'url', a=1)
+
+    def test_order(self):
+        calls = []
+        gh = mock.Mock(**{
+            '_Github__requester.requestJsonAndCheck.side_effect':
+            lambda verb, url: calls.append('orig') or 'data',
+        })
+
+        def middleware(name):
+            def inner(call, verb, url):
+                calls.append(name)
+                return call(verb, url)
+            return inner
+
+        requester.add_middleware(gh, middleware('first'))
+        requester.add_middleware(gh, middleware('second'))
+        result = gh._Github__requester.requestJsonAndCheck('GET', 'url')
+
+        self.assertEqual(result, 'data')
+        self.assertEqual(calls, ['second', 'first', 'orig'])
+
+
+class RequestCounterTest(unittest.TestCase):
+    def test_init(self):
+        result = requester.RequestCounter()
+
+        self.assertEqual(result.requests, [])
+        self.assertEqual(len(result), 0)
+
+    def test_call(self):
+        call = mock.Mock(return_value=('headers', 'data'))
+        counter = requester.RequestCounter()
+
+        result = counter(call, 'GET', 'url', parameters={'a': 1})
+
+        self.assertEqual(result, ('headers', 'data'))
+        self.assertEqual(counter.requests, [('GET', 'url')])
+        self.assertEqual(len(counter), 1)
+        call.assert_called_once_with('GET', 'url', parameters={'a': 1})
+
+    def test_call_failure(self):
+        call = mock.Mock(side_effect=ValueError)
+        counter = requester.RequestCounter()
+
+        self.assertRaises(ValueError, counter, call, 'GET', 'url')
+        self.assertEqual(counter.requests, [('GET', 'url')])
@@ -0,0 +1,622 @@
+# Copyright 2014 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the
+#    License. You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing,
+#    software distributed under the License is distributed on an "AS
+#    IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+#    express or implied. See the License for the specific language
+#    governing permissions and limitations under the License.
+
+import datetime
+import errno
+import gzip
+import io
+import json
+import socket
+import threading
+import unittest
+
+import mock
+
+from tugboat import records
+from tugboat import rest
+
+
+def make_response(status=200, data=None, headers=None, compress=False,
+                  will_close=False):
+    body = b'' if data is None else json.dumps(data).encode('utf-8')
+    headers = dict(headers or {})
+    if compress:
+        buf = io.BytesIO()
+        with gzip.GzipFile(fileobj=buf, mode='wb') as f:
+            f.write(body)
+        body = buf.getvalue()
+        headers['Content-Encoding'] = 'gzip'
+    return mock.Mock(status=status, will_close=will_close, **{
+        'read.return_value': body,
+        'getheaders.return_value': list(headers.items()),
+    })
+
+
+def make_pull(number=1, **kwargs):
+    data = {
+        'number': number,
+        'html_url': 'https://github.com/a/b/pull/%d' % number,
+        'created_at': '2014-01-01T00:00:00Z',
+        'updated_at': '2014-01-02T00:00:00Z',
+        'user': {'login': 'author'},
+        'head': {'label': 'author:branch', 'sha': 'head1'},
+        'base': {'label': 'a:master', 'sha': 'base1'},
+    }
+    data.update(kwargs)
+    return data
+
+
+class ParseLinksTest(unittest.TestCase):
+    def test_none(self):
+        self.assertEqual(rest.parse_links(None), {})
+
+    def test_links(self):
+        result = rest.parse_links(
+            '<https://api.github.com/x?page=2>; rel="next", '
+            '<https://api.github.com/x?page=5>; rel="last"')
+
+        self.assertEqual(result, {
+            'next': 'https://api.github.com/x?page=2',
+            'last': 'https://api.github.com/x?page=5',
+        })
+
+
+class ParseTimeTest(unittest.TestCase):
+    def test_none(self):
+        self.assertEqual(rest.parse_time(None), None)
+
+    def test_time(self):
+        result = rest.parse_time('2014-01-02T03:04:05Z')
+
+        self.assertEqual(result, datetime.datetime(2014, 1, 2, 3, 4, 5,
+                                                   tzinfo=records.UTC))
+
+
+class RestErrorTest(unittest.TestCase):
+    def test_str(self):
+        exc = rest.RestError(404, {'message': 'Not Found'})
+
+        self.assertEqual(exc.status, 404)
+        self.assertEqual(str(exc), '404 Not Found')
+
+
+class ClientTest(unittest.TestCase):
+    def test_init(self):
+        result = rest.Client('user', 'pass')
+
+        self.assertEqual(result.base_url, rest.DEFAULT_BASE_URL)
+        self.assertEqual(result.timeout, rest.DEFAULT_TIMEOUT)
+        self.assertEqual(result.rate_limiting, (-1, -1))
+        self.assertEqual(result._headers['Authorization'],
+                         'Basic dXNlcjpwYXNz')
+        self.assertEqual(result._headers['Accept-Encoding'], 'gzip')
+
+    def test_init_anonymous(self):
+        result = rest.Client(base_url='https://github.example.com/api/v3/')
+
+        self.assertEqual(result.base_url, 'https://github.example.com/api/v3')
+        self.assertNotIn('Authorization', result._headers)
+
+    def test_request(self):
+        client = rest.Client(base_url='https://github.example.com/api/v3')
+        client._request = mock.Mock(return_value=(200, {
+            'x-ratelimit-remaining': '4999',
+            'x-ratelimit-limit': '5000',
+        }, ['data']))
+
+        result = client.requestJsonAndCheck('GET', '/orgs/a/repos',
+                                            {'per_page': 100, 'a': 'b'})
+
+        self.assertEqual(result[1], ['data'])
+        client._request.assert_called_once_with(
+            'GET', 'https://github.example.com/api/v3/orgs/a/repos'
+            '?a=b&per_page=100', None, client._headers)
+        self.assertEqual(client.rate_limiting, (4999, 5000))
+
+    def test_request_absolute(self):
+        client = rest.Client()
+        client._request = mock.Mock(return_value=(200, {}, None))
+
+        client.requestJsonAndCheck('POST', 'https://other.example.com/x?a=b',
+                                   {'c': 'd'}, {'X-Spam': 'spam'},
+                                   {'key': 'value'})
+
+        args = client._request.call_args[0]
+        self.assertEqual(args[:3], ('POST',
+                                    'https://other.example.com/x?a=b&c=d',
+                                    b'{"key": "value"}'))
+        self.assertEqual(args[3]['X-Spam'], 'spam')
+        self.assertEqual(args[3]['Content-Type'], 'application/json')
+
+    def test_request_error(self):
+        client = rest.Client()
+        client._request = mock.Mock(return_value=(
+            502, {}, {'message': 'Bad Gateway'}))
+
+        try:
+            client.requestJsonAndCheck('GET', '/repos/a/b/pulls')
+        except rest.RestError as exc:
+            self.assertEqual(exc.status, 502)
+            self.assertEqual(exc.data, {'message': 'Bad Gateway'})
+        else:
+            self.fail('Failed to raise RestError')
+
+    def test_request_redirect(self):
+        client = rest.Client('user', 'pass')
+        client._request = mock.Mock(side_effect=[
+            (301, {'location': 'https://api.github.com/repositories/7/pulls'
+                               '?per_page=100'}, {'message': 'Moved'}),
+            (200, {}, ['pull']),
+        ])
+
+        result = client.requestJsonAndCheck('GET', '/repos/a/b/pulls',
+                                            {'per_page': 100})
+
+        self.assertEqual(result, ({}, ['pull']))
+        self.assertEqual(client._request.call_args_list, [
+            mock.call('GET', 'https://api.github.com/repos/a/b/pulls'
+                      '?per_page=100', None, client._headers),
+            mock.call('GET', 'https://api.github.com/repositories/7/pulls'
+                      '?per_page=100', None, client._headers),
+        ])
+
+    def test_request_redirect_relative(self):
+        client = rest.Client()
+        client._request = mock.Mock(side_effect=[
+            (307, {'location': '/repositories/7'}, None),
+            (200, {}, {'id': 7}),
+        ])
+
+        result = client.requestJsonAndCheck('GET', '/repos/a/b')
+
+        self.assertEqual(result, ({}, {'id': 7}))
+        self.assertEqual(client._request.call_args[0][1],
+                         'https://api.github.com/repositories/7')
+
+    def test_request_redirect_other_host(self):
+        client = rest.Client('user', 'pass')
+        client._request = mock.Mock(side_effect=[
+            (302, {'location': 'https://other.example.com/x'}, None),
+            (200, {}, None),
+        ])
+
+        client.requestJsonAndCheck('GET', '/repos/a/b')
+
+        # The credentials aren't sent to the other host
+        self.assertIn('Authorization', client._request.call_args_list[0][0][3])
+        self.assertNotIn('Authorization',
+                         client._request.call_args_list[1][0][3])
+        self.assertIn('Authorization', client._headers)
+
+    def test_request_redirect_loop(self):
+        client = rest.Client()
+        client._request = mock.Mock(return_value=(
+            301, {'location': '/repos/a/b'}, {'message': 'Moved'}))
+
+        try:
+            client.requestJsonAndCheck('GET', '/repos/a/b')
+        except rest.RestError as exc:
+            self.assertEqual(exc.status, 301)
+        else:
+            self.fail('Failed to raise RestError')
+        self.assertEqual(client._request.call_count, rest.MAX_REDIRECTS + 1)
+
+    def test_request_not_success(self):
+        client = rest.Client()
+        client._request = mock.Mock(return_value=(304, {}, None))
+
+        self.assertRaises(rest.RestError, client.requestJsonAndCheck,
+                          'GET', '/repos/a/b/pulls')
+
+    def test_request_redirect_no_location(self):
+        client = rest.Client()
+        client._request = mock.Mock(return_value=(301, {}, {'a': 1}))
+
+        self.assertRaises(rest.RestError, client.requestJsonAndCheck,
+                          'GET', '/repos/a/b/pulls')
+        self.assertEqual(client._request.call_count, 1)
+
+
+class StaleTest(unittest.TestCase):
+    def test_bad_status_line(self):
+        self.assertTrue(rest._stale(rest.http_client.BadStatusLine('')))
+
+    def test_reset(self):
+        self.assertTrue(rest._stale(IOError(errno.ECONNRESET, 'reset')))
+        self.assertTrue(rest._stale(IOError(errno.EPIPE, 'broken pipe')))
+
+    def test_timeout(self):
+        self.assertFalse(rest._stale(socket.timeout('timed out')))
+
+    def test_other(self):
+        self.assertFalse(rest._stale(IOError(errno.ECONNREFUSED,
+                                             'refused')))
+
+
+@mock.patch.object(rest.http_client, 'HTTPConnection')
+@mock.patch.object(rest.http_client, 'HTTPSConnection')
+class RequestTest(unittest.TestCase):
+    def test_basic(self, mock_HTTPSConnection, mock_HTTPConnection):
+        conn = mock_HTTPSConnection.return_value
+        conn.getresponse.return_value = make_response(
+            data={'a': 1}, headers={'Link': 'links'}, compress=True)
+        client = rest.Client(timeout=5)
+
+        result = client._request('GET', 'https://api.github.com/x?y=z',
+                                 None, {'Accept': 'json'})
+
+        self.assertEqual(result, (200, {
+            'link': 'links',
+            'content-encoding': 'gzip',
+        }, {'a': 1}))
+        mock_HTTPSConnection.assert_called_once_with('api.github.com',
+                                                     timeout=5)
+        conn.request.assert_called_once_with('GET', '/x?y=z', None,
+                                             {'Accept': 'json'})
+        self.assertFalse(conn.close.called)
+        self.assertEqual(client._pool, {('https', 'api.github.com'): [conn]})
+
+    def test_reuse(self, mock_HTTPSConnection, mock_HTTPConnection):
+        conn = mock_HTTPConnection.return_value
+        conn.getresponse.return_value = make_response(data=[])
+        client = rest.Client()
+
+        client._request('GET', 'http://localhost:8080/a', None, {})
+        client.timeout = 2.5
+        client._request('GET', 'http://localhost:8080/b', None, {})
+
+        mock_HTTPConnection.assert_called_once_with(
+            'localhost:8080', timeout=rest.DEFAULT_TIMEOUT)
+        self.assertEqual(conn.request.call_count, 2)
+        self.assertEqual(conn.timeout, 2.5)
+        conn.sock.settimeout.assert_called_once_with(2.5)
+
+    def test_cap_timeout(self, mock_HTTPSConnection, mock_HTTPConnection):
+        conn = mock_HTTPConnection.return_value
+        conn.getresponse.return_value = make_response(data=[])
+        client = rest.Client(timeout=15)
+
+        previous = client.cap_timeout(2.5)
+        client._request('GET', 'http://localhost:8080/a', None, {})
+        thread = threading.Thread(target=client._request,
+                                  args=('GET', 'http://localhost:8080/b',
+                                        None, {}))
+        thread.start()
+        thread.join()
+
+        # The cap only applies to the thread which set it
+        self.assertEqual(previous, None)
+        mock_HTTPConnection.assert_called_once_with('localhost:8080',
+                                                    timeout=2.5)
+        self.assertEqual(conn.timeout, 15)
+        self.assertEqual(client.timeout, 15)
+        self.assertEqual(client.cap_timeout(None), 2.5)
+
+    def test_will_close(self, mock_HTTPSConnection, mock_HTTPConnection):
+        conn = mock_HTTPSConnection.return_value
+        conn.getresponse.return_value = make_response(will_close=True)
+        client = rest.Client()
+
+        result = client._request('GET', 'https://api.github.com/', None, {})
+
+        self.assertEqual(result, (200, {}, None))
+        conn.close.assert_called_once_with()
+        self.assertEqual(client._pool, {})
+
+    def test_stale(self, mock_HTTPSConnection, mock_HTTPConnection):
+        stale = mock.Mock(**{
+            'getresponse.side_effect': rest.http_client.BadStatusLine(''),
+        })
+        fresh = mock.Mock(**{'getresponse.return_value': make_response()})
+        mock_HTTPSConnection.return_value = fresh
+        client = rest.Client()
+        client._pool[('https', 'api.github.com')] = [stale]
+
+        result = client._request('GET', 'https://api.github.com/', None, {})
+
+        self.assertEqual(result, (200, {}, None))
+        stale.close.assert_called_once_with()
+        fresh.request.assert_called_once_with('GET', '/', None, {})
+
+    def test_stale_reset(self, mock_HTTPSConnection, mock_HTTPConnection):
+        stale = mock.Mock(**{
+            'request.side_effect': IOError(errno.EPIPE, 'broken pipe'),
+        })
+        fresh = mock.Mock(**{'getresponse.return_value': make_response()})
+        mock_HTTPSConnection.return_value = fresh
+        client = rest.Client()
+        client._pool[('https', 'api.github.com')] = [stale]
+
+        result = client._request('GET', 'https://api.github.com/', None, {})
+
+        self.assertEqual(result, (200, {}, None))
+        stale.close.assert_called_once_with()
+
+    def test_reused_timeout(self, mock_HTTPSConnection, mock_HTTPConnection):
+        conn = mock.Mock(**{
+            'getresponse.side_effect': socket.timeout('timed out'),
+        })
+        client = rest.Client()
+        client._pool[('https', 'api.github.com')] = [conn]
+
+        # A slow request isn't sent again
+        self.assertRaises(socket.timeout, client._request, 'GET',
+                          'https://api.github.com/', None, {})
+        conn.close.assert_called_once_with()
+        self.assertEqual(conn.request.call_count, 1)
+        self.assertFalse(mock_HTTPSConnection.called)
+
+    def test_read_fails(self, mock_HTTPSConnection, mock_HTTPConnection):
+        response = make_response()
+        response.read.side_effect = IOError(errno.ECONNRESET, 'reset')
+        conn = mock.Mock(**{'getresponse.return_value': response})
+        client = rest.Client()
+        client._pool[('https', 'api.github.com')] = [conn]
+
+        # Once the response has begun, the request isn't sent again
+        self.assertRaises(IOError, client._request, 'GET',
+                          'https://api.github.com/', None, {})
+        conn.close.assert_called_once_with()
+        self.assertFalse(mock_HTTPSConnection.called)
+        self.assertEqual(client._pool[('https', 'api.github.com')], [])
+
+    def test_fresh_fails(self, mock_HTTPSConnection, mock_HTTPConnection):
+        conn = mock_HTTPSConnection.return_value
+        conn.request.side_effect = IOError('connection refused')
+        client = rest.Client()
+
+        self.assertRaises(IOError, client._request, 'GET',
+                          'https://api.github.com/', None, {})
+        conn.close.assert_called_once_with()
+        self.assertEqual(mock_HTTPSConnection.call_count, 1)
+
+    def test_pool_full(self, mock_HTTPSConnection, mock_HTTPConnection):
+        conn = mock_HTTPSConnection.return_value
+        conn.getresponse.return_value = make_response()
+        client = rest.Client(pool_size=0)
+
+        client._request('GET', 'https://api.github.com/', None, {})
+
+        conn.close.assert_called_once_with()
+
+    def test_close(self, mock_HTTPSConnection, mock_HTTPConnection):
+        conns = [mock.Mock(), mock.Mock()]
+        client = rest.Client()
+        client._pool = {('https', 'a'): conns[:1], ('https', 'b'): conns[1:]}
+
+        client.close()
+
+        self.assertEqual(client._pool, {})
+        for conn in conns:
+            conn.close.assert_called_once_with()
+
+
+class ApiTest(unittest.TestCase):
+    def setUp(self):
+        self.client = rest.Client()
+        self.client.requestJsonAndCheck = mock.Mock()
+
+    def test_paginate(self):
+        self.client.requestJsonAndCheck.side_effect = [
+            ({'link': '<https://api.github.com/x?page=2>; rel="next"'},
+             [1, 2]),
+            ({}, [3]),
+        ]
+
+        result = list(self.client.paginate('/x', {'state': 'open'}))
+
+        self.assertEqual(result, [1, 2, 3])
+        self.client.requestJsonAndCheck.assert_has_calls([
+            mock.call('GET', '/x', {'state': 'open', 'per_page': 100}),
+            mock.call('GET', 'https://api.github.com/x?page=2', None),
+        ])
+
+    def test_get_repo(self):
+        result = self.client.get_repo('a/b')
+
+        self.assertEqual(result.full_name, 'a/b')
+        self.assertFalse(self.client.requestJsonAndCheck.called)
+
+    def test_get_organization(self):
+        self.client.requestJsonAndCheck.return_value = (
+            {}, [{'full_name': 'a/b'}, {'full_name': 'a/c'}])
+
+        result = self.client.get_organization('a')
+
+        self.assertFalse(self.client.requestJsonAndCheck.called)
+        self.assertEqual([r.full_name for r in result.get_repos()],
+                         ['a/b', 'a/c'])
+        self.client.requestJsonAndCheck.assert_called_once_with(
+            'GET', '/orgs/a/repos', {'per_page': 100})
+
+    def test_get_organization_open_issues(self):
+        self.client.requestJsonAndCheck.return_value = (
+            {}, [{'full_name': 'a/b', 'open_issues_count': 7},
+                 {'full_name': 'a/c'}])
+
+        result = self.client.get_organization('a')
+
+        self.assertEqual([r.open_issues_count for r in result.get_repos()],
+                         [7, None])
+
+    def test_get_user(self):
+        self.client.requestJsonAndCheck.return_value = (
+            {}, [{'full_name': 'u/b'}])
+
+        result = self.client.get_user('u')
+
+        self.assertEqual([r.full_name for r in result.get_repos()], ['u/b'])
+        self.client.requestJsonAndCheck.assert_called_once_with(
+            'GET', '/users/u/repos', {'per_page': 100})
+
+    def test_get_repos(self):
+        self.client.requestJsonAndCheck.return_value = (
+            {}, [{'full_name': 'a/b'}])
+
+        result = list(self.client.get_repos())
+
+        self.assertEqual([r.full_name for r in result], ['a/b'])
+        self.client.requestJsonAndCheck.assert_called_once_with(
+            'GET', '/repositories', {'per_page': 100})
+
+    def test_get_repos_since(self):
+        self.client.requestJsonAndCheck.return_value = (
+            {}, [{'full_name': 'a/b', 'id': 12}])
+
+        result = list(self.client.get_repos(since=10))
+
+        self.assertEqual([(r.full_name, r.id) for r in result], [('a/b', 12)])
+        self.client.requestJsonAndCheck.assert_called_once_with(
+            'GET', '/repositories', {'since': 10, 'per_page': 100})
+
+    def test_get_pulls(self):
+        self.client.requestJsonAndCheck.return_value = (
+            {}, [make_pull(1), make_pull(2)])
+        repo = self.client.get_repo('a/b')
+
+        result = list(repo.get_pulls())
+
+        self.assertEqual([p.number for p in result], [1, 2])
+        self.assertEqual(result[0].repo, repo)
+        self.client.requestJsonAndCheck.assert_called_once_with(
+            'GET', '/repos/a/b/pulls', {'per_page': 100})
+
+    def test_get_pulls_parameters(self):
+        self.client.requestJsonAndCheck.return_value = ({}, [make_pull(1)])
+        repo = self.client.get_repo('a/b')
+
+        result = list(repo.get_pulls(state='closed', sort='updated',
+                                     direction='desc'))
+
+        self.assertEqual([p.number for p in result], [1])
+        self.client.requestJsonAndCheck.assert_called_once_with(
+            'GET', '/repos/a/b/pulls', {'state': 'closed', 'sort': 'updated',
+                                        'direction': 'desc',
+                                        'per_page': 100})
+
+    def test_get_pulls_lazy(self):
+        self.client.requestJsonAndCheck.return_value = (
+            {'link': '<https://api.github.com/next>; rel="next"'},
+            [make_pull(1), make_pull(2)])
+        repo = self.client.get_repo('a/b')
+
+        result = next(iter(repo.get_pulls()))
+
+        # The next page isn't requested until it's needed
+        self.assertEqual(result.number, 1)
+        self.assertEqual(self.client.requestJsonAndCheck.call_count, 1)
+
+    def test_get_pulls_page(self):
+        self.client.requestJsonAndCheck.return_value = (
+            {'link': '<https://api.github.com/last>; rel="last"'},
+            [make_pull(1)])
+        repo = self.client.get_repo('a/b')
+
+        result, links = repo.get_pulls_page({'per_page': 1})
+
+        self.assertEqual([p.number for p in result], [1])
+        self.assertEqual(result[0].repo, repo)
+        self.assertEqual(links, {'last': 'https://api.github.com/last'})
+        self.client.requestJsonAndCheck.assert_called_once_with(
+            'GET', '/repos/a/b/pulls', {'per_page': 1})
+
+    def test_get_pull(self):
+        self.client.requestJsonAndCheck.return_value = ({}, 'pull')
+
+        result = self.client.get_pull('a/b', 5)
+
+        self.assertEqual(result, 'pull')
+        self.client.requestJsonAndCheck.assert_called_once_with(
+            'GET', '/repos/a/b/pulls/5')
+
+    def test_user_name(self):
+        self.client.requestJsonAndCheck.return_value = (
+            {}, {'login': 'u', 'name': 'User'})
+
+        self.assertEqual(self.client.user_name('u'), 'User')
+        self.assertEqual(self.client.user_name('u'), 'User')
+        self.client.requestJsonAndCheck.assert_called_once_with(
+            'GET', '/users/u')
+
+    def test_user_name_concurrent(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def request(verb, url):
+            started.set()
+            release.wait(5)
+            return {}, {'login': 'u', 'name': 'User'}
+
+        self.client.requestJsonAndCheck.side_effect = request
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(
+            self.client.user_name('u'))) for _i in range(2)]
+
+        # The second thread asks while the first is still looking up
+        threads[0].start()
+        started.wait(5)
+        threads[1].start()
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, ['User', 'User'])
+        self.assertEqual(self.client.requestJsonAndCheck.call_count, 1)
+        self.assertEqual(self.client._lookups, {})
+
+
+class PullTest(unittest.TestCase):
+    def setUp(self):
+        self.client = mock.Mock()
+        self.repo = rest.Repository(self.client, 'a/b')
+
+    def test_init(self):
+        result = rest.Pull(self.client, self.repo, make_pull(3))
+
+        self.assertEqual(result.repo, self.repo)
+        self.assertEqual(result.number, 3)
+        self.assertEqual(result.html_url, 'https://github.com/a/b/pull/3')
+        self.assertEqual(result.head.label, 'author:branch')
+        self.assertEqual(result.head.sha, 'head1')
+        self.assertEqual(result.base.label, 'a:master')
+        self.assertEqual(result.base.sha, 'base1')
+        self.assertEqual(result.created_at,
+                         datetime.datetime(2014, 1, 1, tzinfo=records.UTC))
+        self.assertEqual(result.updated_at,
+                         datetime.datetime(2014, 1, 2, tzinfo=records.UTC))
+        self.assertEqual(result.user.login, 'author')
+
+    def test_user_name(self):
+        self.client.user_name.return_value = 'Author'
+        pull = rest.Pull(self.client, self.repo, make_pull())
+
+        self.assertEqual(pull.user.name, 'Author')
+        self.client.user_name.assert_called_once_with('author')
+
+    def test_mergeable(self):
+        self.client.get_pull.return_value = make_pull(
+            mergeable=True, base={'label': 'a:master', 'sha': 'base2'})
+        pull = rest.Pull(self.client, self.repo, make_pull())
+
+        self.assertEqual(pull.mergeable, True)
+        self.assertEqual(pull.mergeable, True)
+        self.client.get_pull.assert_called_once_with('a/b', 1)
+        self.assertEqual(pull.base.sha, 'base2')
+
+    def test_mergeable_complete(self):
+        pull = rest.Pull(self.client, self.repo, make_pull(mergeable=False))
+
+        self.assertEqual(pull.mergeable, False)
+        self.assertFalse(self.client.get_pull.called)
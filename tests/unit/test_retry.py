@@ -0,0 +1,274 @@
+# Copyright 2014 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the
+#    License. You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing,
+#    software distributed under the License is distributed on an "AS
+#    IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+#    express or implied. See the License for the specific language
+#    governing permissions and limitations under the License.
+
+import socket
+import unittest
+
+import mock
+
+from tugboat import retry
+
+
+class ServerError(Exception):
+    def __init__(self, status):
+        super(ServerError, self).__init__(status)
+        self.status = status
+
+
+class FakeClock(object):
+    def __init__(self, now=100.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TransientTest(unittest.TestCase):
+    def test_server_error(self):
+        self.assertTrue(retry.transient(ServerError(502)))
+        self.assertTrue(retry.transient(ServerError(500)))
+
+    def test_client_error(self):
+        self.assertFalse(retry.transient(ServerError(404)))
+        self.assertFalse(retry.transient(ServerError(403)))
+
+    def test_network_error(self):
+        self.assertTrue(retry.transient(IOError('connection reset')))
+        self.assertTrue(retry.transient(socket.timeout('timed out')))
+
+    def test_other(self):
+        self.assertFalse(retry.transient(ValueError('bad')))
+        self.assertFalse(retry.transient(mock.Mock(status=None)))
+
+
+class BreakerTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.object(retry.stats_mod, 'clock', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_init(self):
+        result = retry.Breaker()
+
+        self.assertEqual(result.threshold, retry.DEFAULT_THRESHOLD)
+        self.assertEqual(result.reset, retry.DEFAULT_RESET)
+        self.assertEqual(result.failures, 0)
+        self.assertFalse(result.open)
+        self.assertTrue(result.allow())
+
+    def test_opens(self):
+        breaker = retry.Breaker(3, 10)
+
+        self.assertFalse(breaker.failure())
+        self.assertFalse(breaker.failure())
+        self.assertTrue(breaker.failure())
+
+        self.assertTrue(breaker.open)
+        self.assertFalse(breaker.allow())
+
+    def test_success_resets(self):
+        breaker = retry.Breaker(3, 10)
+        breaker.failure()
+        breaker.failure()
+
+        breaker.success()
+
+        self.assertEqual(breaker.failures, 0)
+        self.assertFalse(breaker.failure())
+
+    def test_trial(self):
+        breaker = retry.Breaker(1, 10)
+        breaker.failure()
+
+        self.clock.now += 9.9
+        self.assertFalse(breaker.allow())
+        self.clock.now += 0.1
+        self.assertTrue(breaker.allow())
+
+        # Only one trial request is let through
+        self.assertFalse(breaker.allow())
+
+        breaker.success()
+        self.assertFalse(breaker.open)
+        self.assertTrue(breaker.allow())
+
+    def test_trial_fails(self):
+        breaker = retry.Breaker(2, 10)
+        breaker.failure()
+        breaker.failure()
+        self.clock.now += 10
+        self.assertTrue(breaker.allow())
+
+        self.assertTrue(breaker.failure())
+
+        self.assertTrue(breaker.open)
+        self.assertFalse(breaker.allow())
+        self.clock.now += 10
+        self.assertTrue(breaker.allow())
+
+
+@mock.patch.object(retry.random, 'uniform', side_effect=lambda a, b: b)
+@mock.patch.object(retry.time, 'sleep')
+class RetryTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.object(retry.stats_mod, 'clock', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_init(self, mock_sleep, mock_uniform):
+        result = retry.Retry()
+
+        self.assertEqual(result.retries, retry.DEFAULT_RETRIES)
+        self.assertEqual(result.backoff, retry.DEFAULT_BACKOFF)
+        self.assertEqual(result.max_backoff, retry.DEFAULT_MAX_BACKOFF)
+        self.assertEqual(result.host, None)
+        self.assertEqual(result.retried, 0)
+        self.assertEqual(result.trips, 0)
+        self.assertEqual(result.breakers, {})
+
+    def test_init_base_url(self, mock_sleep, mock_uniform):
+        result = retry.Retry(base_url='https://github.example.com/api/v3')
+
+        self.assertEqual(result.host, 'github.example.com')
+
+    def test_success(self, mock_sleep, mock_uniform):
+        call = mock.Mock(return_value='result')
+        middleware = retry.Retry()
+
+        result = middleware(call, 'GET', '/repos/a/b', 'x', y='z')
+
+        self.assertEqual(result, 'result')
+        call.assert_called_once_with('GET', '/repos/a/b', 'x', y='z')
+        self.assertFalse(mock_sleep.called)
+        self.assertEqual(middleware.retried, 0)
+
+    def test_retries(self, mock_sleep, mock_uniform):
+        call = mock.Mock(side_effect=[
+            ServerError(502),
+            IOError('connection reset'),
+            'result',
+        ])
+        stats = mock.Mock()
+        middleware = retry.Retry(backoff=1.0, stats=stats)
+
+        result = middleware(call, 'GET', '/repos/a/b')
+
+        self.assertEqual(result, 'result')
+        self.assertEqual(call.call_count, 3)
+        mock_sleep.assert_has_calls([mock.call(1.0), mock.call(2.0)])
+        self.assertEqual(middleware.retried, 2)
+        stats.count.assert_has_calls([
+            mock.call('retries'),
+            mock.call('retries'),
+        ])
+        self.assertEqual(middleware.breakers[None].failures, 0)
+
+    def test_gives_up(self, mock_sleep, mock_uniform):
+        exc = ServerError(503)
+        call = mock.Mock(side_effect=exc)
+        middleware = retry.Retry(retries=2, threshold=10)
+
+        try:
+            middleware(call, 'GET', '/repos/a/b')
+        except ServerError as caught:
+            self.assertEqual(caught, exc)
+        else:
+            self.fail('Failed to raise ServerError')
+
+        self.assertEqual(call.call_count, 3)
+        self.assertEqual(middleware.retried, 2)
+
+    def test_not_transient(self, mock_sleep, mock_uniform):
+        call = mock.Mock(side_effect=ServerError(404))
+        middleware = retry.Retry()
+
+        self.assertRaises(ServerError, middleware, call, 'GET', '/repos/a/b')
+        self.assertEqual(call.call_count, 1)
+        self.assertEqual(middleware.breakers[None].failures, 0)
+
+    def test_not_idempotent(self, mock_sleep, mock_uniform):
+        call = mock.Mock(side_effect=ServerError(502))
+        middleware = retry.Retry()
+
+        self.assertRaises(ServerError, middleware, call, 'POST', '/graphql')
+        self.assertEqual(call.call_count, 1)
+        self.assertEqual(middleware.breakers[None].failures, 1)
+
+    def test_breaker(self, mock_sleep, mock_uniform):
+        call = mock.Mock(side_effect=ServerError(502))
+        stats = mock.Mock()
+        middleware = retry.Retry(retries=5, threshold=3, stats=stats)
+
+        self.assertRaises(ServerError, middleware, call, 'GET', '/repos/a/b')
+        self.assertEqual(call.call_count, 3)
+        self.assertEqual(middleware.retried, 2)
+        self.assertEqual(middleware.trips, 1)
+        stats.count.assert_called_with('breaker_trips')
+
+        # Further requests fail fast
+        self.assertRaises(retry.CircuitOpen, middleware, call, 'GET',
+                          '/repos/a/c')
+        self.assertEqual(call.call_count, 3)
+
+    def test_breaker_per_host(self, mock_sleep, mock_uniform):
+        call = mock.Mock(side_effect=ServerError(502))
+        middleware = retry.Retry(retries=0, threshold=1,
+                                 base_url='https://api.github.com')
+        self.assertRaises(ServerError, middleware, call, 'GET', '/repos/a/b')
+
+        call.side_effect = None
+        call.return_value = 'result'
+        result = middleware(call, 'GET', 'https://other.example.com/x')
+
+        self.assertEqual(result, 'result')
+        self.assertRaises(retry.CircuitOpen, middleware, call, 'GET',
+                          'https://api.github.com/repos/a/b')
+        self.assertEqual(sorted(middleware.breakers),
+                         ['api.github.com', 'other.example.com'])
+
+    def test_bind(self, mock_sleep, mock_uniform):
+        call = mock.Mock(side_effect=ServerError(502))
+        middleware = retry.Retry(retries=1, threshold=10,
+                                 base_url='https://api.github.com')
+        bound = middleware.bind('https://ghe.example.com/api/v3')
+
+        self.assertRaises(ServerError, bound, call, 'GET', '/repos/a/b')
+
+        self.assertEqual(call.call_count, 2)
+        self.assertEqual(middleware.retried, 1)
+        self.assertEqual(list(middleware.breakers), ['ghe.example.com'])
+        self.assertEqual(middleware.breakers['ghe.example.com'].failures, 2)
+
+    def test_breaker_recovers(self, mock_sleep, mock_uniform):
+        call = mock.Mock(side_effect=ServerError(502))
+        middleware = retry.Retry(retries=0, threshold=1, reset=30)
+        self.assertRaises(ServerError, middleware, call, 'GET', '/repos/a/b')
+        self.clock.now += 30
+
+        call.side_effect = None
+        call.return_value = 'result'
+        result = middleware(call, 'GET', '/repos/a/b')
+
+        self.assertEqual(result, 'result')
+        self.assertFalse(middleware.breakers[None].open)
+
+    def test_delay(self, mock_sleep, mock_uniform):
+        middleware = retry.Retry(backoff=0.5, max_backoff=3.0)
+
+        self.assertEqual([middleware.delay(i) for i in range(1, 6)],
+                         [0.5, 1.0, 2.0, 3.0, 3.0])
+        mock_uniform.assert_called_with(0, 3.0)
@@ -0,0 +1,246 @@
+# Copyright 2014 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the
+#    License. You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing,
+#    software distributed under the License is distributed on an "AS
+#    IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+#    express or implied. See the License for the specific language
+#    governing permissions and limitations under the License.
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import mock
+
+from tugboat import schedule
+
+
+class HistoryTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'history.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_init(self):
+        result = schedule.History()
+
+        self.assertEqual(result.repos, {})
+        self.assertEqual(result.rate(), None)
+
+    def test_add_get(self):
+        history = schedule.History()
+
+        history.add('a/b', 5, 2.5)
+
+        self.assertEqual(history.get('a/b'), (5, 2.5))
+        self.assertEqual(history.get('a/c'), None)
+
+    def test_rate(self):
+        history = schedule.History()
+        history.add('a/b', 5, 2.5)
+        history.add('a/c', 3, 1.5)
+
+        # Each repository counts as one more pull request
+        self.assertEqual(history.rate(), 0.4)
+
+    def test_round_trip(self):
+        history = schedule.History()
+        history.add('a/b', 5, 2.5)
+        history.write(self.path)
+
+        with open(self.path) as f:
+            data = json.load(f)
+        result = schedule.load(self.path)
+
+        self.assertEqual(data, {
+            'version': schedule.VERSION,
+            'repos': {'a/b': {'pulls': 5, 'time': 2.5}},
+        })
+        self.assertEqual(result.repos, {'a/b': (5, 2.5)})
+
+    def test_load_missing(self):
+        result = schedule.load(self.path)
+
+        self.assertEqual(result.repos, {})
+
+    def test_load_bad_version(self):
+        with open(self.path, 'w') as f:
+            json.dump({'version': 0}, f)
+
+        self.assertRaises(ValueError, schedule.load, self.path)
+
+
+class SchedulerTest(unittest.TestCase):
+    def test_init(self):
+        result = schedule.Scheduler()
+
+        self.assertEqual(result.jobs, schedule.DEFAULT_JOBS)
+        self.assertEqual(result.policy, 'largest')
+        self.assertEqual(result.history, None)
+        self.assertEqual(result.stats, None)
+        self.assertEqual(result.progress, None)
+        self.assertEqual(result.lookups, ())
+
+    def test_init_bad_policy(self):
+        self.assertRaises(ValueError, schedule.Scheduler, policy='random')
+
+    def test_cost_open_issues(self):
+        scheduler = schedule.Scheduler()
+
+        self.assertEqual(scheduler.cost(mock.Mock(open_issues_count=4)), 5.0)
+        self.assertEqual(scheduler.cost(mock.Mock(open_issues_count=4), 0.5),
+                         2.5)
+        self.assertEqual(scheduler.cost(mock.Mock(spec=['full_name'])), 1.0)
+
+    def test_cost_history(self):
+        history = schedule.History()
+        history.add('a/b', 5, 7.0)
+        scheduler = schedule.Scheduler(history=history)
+
+        result = scheduler.cost(mock.Mock(full_name='a/b',
+                                          open_issues_count=100))
+
+        self.assertEqual(result, 7.0)
+
+    def test_order_largest(self):
+        repos = [mock.Mock(full_name='a/%d' % idx, open_issues_count=count)
+                 for idx, count in enumerate([1, 9, 3, 9, 0])]
+        progress = mock.Mock()
+        scheduler = schedule.Scheduler(progress=progress)
+
+        result = scheduler.order(repos)
+
+        # Ties are kept in the order listed
+        self.assertEqual([repo.full_name for repo in result],
+                         ['a/1', 'a/3', 'a/2', 'a/0', 'a/4'])
+        progress.emit.assert_called_once_with(
+            'schedule', policy='largest',
+            order=['a/1', 'a/3', 'a/2', 'a/0', 'a/4'],
+            costs=[10.0, 10.0, 4.0, 2.0, 1.0])
+
+    def test_order_history(self):
+        history = schedule.History()
+        history.add('a/slow', 1, 6.0)
+        history.add('a/fast', 9, 4.0)
+        repos = [
+            mock.Mock(full_name='a/fast', open_issues_count=9),
+            mock.Mock(full_name='a/new', open_issues_count=9),
+            mock.Mock(full_name='a/slow', open_issues_count=1),
+        ]
+        scheduler = schedule.Scheduler(history=history)
+
+        result = scheduler.order(repos)
+
+        # The new repository is costed at 10s per 12 pull requests
+        self.assertEqual([repo.full_name for repo in result],
+                         ['a/new', 'a/slow', 'a/fast'])
+
+    def test_order_listed(self):
+        repos = [mock.Mock(full_name='a/%d' % idx, open_issues_count=count)
+                 for idx, count in enumerate([1, 9, 3])]
+        scheduler = schedule.Scheduler(policy='listed')
+
+        result = scheduler.order(repos)
+
+        self.assertEqual(result, repos)
+
+    def test_run_serial(self):
+        scheduler = schedule.Scheduler()
+        calls = []
+
+        def func(idx, repo):
+            calls.append((idx, repo))
+            return repo.upper()
+
+        result = scheduler.run(iter(['a', 'b', 'c']), func)
+
+        self.assertEqual(result, ['A', 'B', 'C'])
+        self.assertEqual(calls, [(0, 'a'), (1, 'b'), (2, 'c')])
+
+    def test_run_parallel(self):
+        scheduler = schedule.Scheduler(jobs=3)
+        barrier = threading.Event()
+        started = []
+        lock = threading.Lock()
+
+        # The first three calls wait until all three are in flight
+        def func(idx, repo):
+            with lock:
+                started.append(idx)
+                if len(started) == 3:
+                    barrier.set()
+            if idx < 3:
+                self.assertTrue(barrier.wait(5))
+            return repo * 2
+
+        result = scheduler.run(['a', 'b', 'c', 'd'], func)
+
+        self.assertEqual(result, ['aa', 'bb', 'cc', 'dd'])
+        self.assertEqual(sorted(started), [0, 1, 2, 3])
+
+    def test_run_error(self):
+        scheduler = schedule.Scheduler()
+        calls = []
+
+        def func(idx, repo):
+            calls.append(idx)
+            if idx == 1:
+                raise IOError('failed')
+            return repo
+
+        self.assertRaises(IOError, scheduler.run, iter(['a', 'b', 'c']),
+                          func)
+
+        # No more repositories are started once one has failed
+        self.assertEqual(calls, [0, 1])
+
+    def test_run_error_parallel(self):
+        scheduler = schedule.Scheduler(jobs=2)
+
+        def func(idx, repo):
+            if repo == 'b':
+                raise IOError('failed')
+            return repo
+
+        self.assertRaises(IOError, scheduler.run, ['a', 'b', 'c'], func)
+
+    @mock.patch.object(schedule.stats_mod, 'clock',
+                       side_effect=[10.0, 10.5, 12.5])
+    def test_fetch(self, mock_clock):
+        history = schedule.History()
+        stats = mock.Mock()
+        scheduler = schedule.Scheduler(history=history, stats=stats)
+        scheduler.order([mock.Mock(full_name='a/b', open_issues_count=2)])
+        scheduler.run([], None)
+        func = mock.Mock(return_value=['pr1', 'pr2'])
+
+        result = scheduler.fetch('a/b', func, 'repo', 'cache')
+
+        self.assertEqual(result, ['pr1', 'pr2'])
+        func.assert_called_once_with('repo', 'cache')
+        self.assertEqual(history.get('a/b'), (2, 2.0))
+        stats.fetched.assert_called_once_with('a/b', 3.0, 0.5, 2.0)
+
+    @mock.patch.object(schedule.stats_mod, 'clock', side_effect=[1.0, 2.0])
+    def test_fetch_skipped(self, mock_clock):
+        history = schedule.History()
+        stats = mock.Mock()
+        scheduler = schedule.Scheduler(history=history, stats=stats)
+
+        result = scheduler.fetch('a/b', mock.Mock(return_value=None))
+
+        self.assertEqual(result, None)
+        self.assertEqual(history.repos, {})
+        self.assertFalse(stats.fetched.called)
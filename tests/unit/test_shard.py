@@ -0,0 +1,59 @@
+# Copyright 2014 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the
+#    License. You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing,
+#    software distributed under the License is distributed on an "AS
+#    IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+#    express or implied. See the License for the specific language
+#    governing permissions and limitations under the License.
+
+
+import argparse
+import unittest
+
+from tugboat import shard
+
+
+class ShardTest(unittest.TestCase):
+    def test_parse(self):
+        result = shard.Shard.parse('2/5')
+
+        self.assertEqual(result.index, 2)
+        self.assertEqual(result.count, 5)
+        self.assertEqual(str(result), '2/5')
+
+    def test_parse_invalid(self):
+        for text in ('', '2', '2/5/6', 'a/b', '5/5', '-1/5', '0/0'):
+            self.assertRaises(argparse.ArgumentTypeError,
+                              shard.Shard.parse, text)
+
+    def test_contains_partition(self):
+        names = ['owner%d/repo%d' % (i % 7, i) for i in range(200)]
+        shards = [shard.Shard(i, 4) for i in range(4)]
+
+        for name in names:
+            self.assertEqual(sum(1 for s in shards if name in s), 1)
+        for s in shards:
+            self.assertTrue(any(name in s for name in names))
+
+    def test_contains_stable(self):
+        # The assignment must not change between runs or hosts
+        self.assertTrue('owner/repo' in shard.Shard(1, 3))
+        self.assertTrue('klmitch/tugboat' in shard.Shard(0, 3))
+
+    def test_contains_case(self):
+        for i in range(3):
+            s = shard.Shard(i, 3)
+            self.assertEqual('Owner/Repo' in s, 'owner/repo' in s)
+
+    def test_single(self):
+        s = shard.Shard(0, 1)
+
+        self.assertTrue('owner/repo' in s)
+        self.assertTrue('other/repo' in s)
@@ -0,0 +1,315 @@
+# Copyright 2014 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the
+#    License. You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing,
+#    software distributed under the License is distributed on an "AS
+#    IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+#    express or implied. See the License for the specific language
+#    governing permissions and limitations under the License.
+
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+import mock
+
+from tugboat import sharedcache
+
+
+class KindTest(unittest.TestCase):
+    def test_repos(self):
+        for url in ('https://api.github.com/repos/a/b',
+                    '/orgs/acme/repos', '/users/user/repos',
+                    '/repositories'):
+            self.assertEqual(sharedcache.kind('GET', url), 'repos')
+
+    def test_users(self):
+        self.assertEqual(sharedcache.kind('GET', '/users/user'), 'users')
+
+    def test_pulls(self):
+        self.assertEqual(sharedcache.kind('GET', '/repos/a/b/pulls'),
+                         'pulls')
+        self.assertEqual(sharedcache.kind('GET', '/repos/a/b/pulls/1'),
+                         'pulls')
+
+    def test_other(self):
+        self.assertEqual(sharedcache.kind('GET', '/repos/a/b/issues'), None)
+        self.assertEqual(sharedcache.kind('POST', '/repos/a/b/pulls'), None)
+
+
+class ParseTtlTest(unittest.TestCase):
+    def test_parse(self):
+        self.assertEqual(sharedcache.parse_ttl('pulls=60'), ('pulls', 60.0))
+
+    def test_bad(self):
+        self.assertRaises(ValueError, sharedcache.parse_ttl, 'pulls')
+        self.assertRaises(ValueError, sharedcache.parse_ttl, 'issues=60')
+        self.assertRaises(ValueError, sharedcache.parse_ttl, 'pulls=soon')
+
+
+class SharedCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'cache.db')
+        self.now = 1000.0
+        patcher = mock.patch.object(sharedcache.time, 'time',
+                                    side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def cache(self, **kwargs):
+        kwargs.setdefault('base_url', 'https://api.github.com')
+        result = sharedcache.SharedCache(self.path, **kwargs)
+        self.addCleanup(result.close)
+        return result
+
+    def test_init(self):
+        result = self.cache(ttls={'pulls': 10})
+
+        self.assertEqual(result.ttls, {
+            'repos': sharedcache.DEFAULT_TTLS['repos'],
+            'users': sharedcache.DEFAULT_TTLS['users'],
+            'pulls': 10,
+        })
+        self.assertEqual(result.max_size, sharedcache.DEFAULT_MAX_SIZE)
+        self.assertEqual(result.host, 'api.github.com')
+        mode = result._db.execute('PRAGMA journal_mode').fetchone()[0]
+        self.assertEqual(mode, 'wal')
+
+    def test_bad_version(self):
+        self.cache()
+        db = sqlite3.connect(self.path)
+        db.execute('UPDATE meta SET value = 0')
+        db.commit()
+        db.close()
+
+        self.assertRaises(ValueError, sharedcache.SharedCache, self.path)
+
+    def test_miss_hit(self):
+        stats = mock.Mock()
+        shared = self.cache(stats=stats)
+        call = mock.Mock(return_value=({'etag': 'x'}, {'login': 'user'}))
+
+        first = shared(call, 'GET', '/users/user')
+        second = shared(call, 'GET', '/users/user')
+
+        self.assertEqual(first, ({'etag': 'x'}, {'login': 'user'}))
+        self.assertEqual(second, first)
+        call.assert_called_once_with('GET', '/users/user', None, None, None)
+        stats.cache.assert_has_calls([
+            mock.call('shared', False),
+            mock.call('shared', True),
+        ])
+
+    def test_shared_between_instances(self):
+        call = mock.Mock(return_value=({}, [{'number': 1}]))
+        self.cache()(call, 'GET', '/repos/a/b/pulls', {'state': 'open'})
+
+        # A second process sees the first's entry, whether the URL
+        # is relative or absolute
+        result = self.cache()(
+            call, 'GET', 'https://api.github.com/repos/a/b/pulls?state=open')
+
+        self.assertEqual(result, ({}, [{'number': 1}]))
+        self.assertEqual(call.call_count, 1)
+
+    def test_hosts(self):
+        shared = self.cache()
+        other = shared.bind('https://ghe.example.com/api/v3')
+        call = mock.Mock(side_effect=[({}, {'login': 'a'}),
+                                      ({}, {'login': 'b'})])
+
+        shared(call, 'GET', '/users/user')
+        result = other(call, 'GET', '/users/user')
+
+        self.assertEqual(result, ({}, {'login': 'b'}))
+        self.assertEqual(call.call_count, 2)
+
+    def test_expired(self):
+        shared = self.cache(ttls={'pulls': 60})
+        call = mock.Mock(return_value=({}, {'mergeable': True}))
+        shared(call, 'GET', '/repos/a/b/pulls/1')
+
+        self.now += 59
+        shared(call, 'GET', '/repos/a/b/pulls/1')
+        self.assertEqual(call.call_count, 1)
+
+        self.now += 2
+        shared(call, 'GET', '/repos/a/b/pulls/1')
+        self.assertEqual(call.call_count, 2)
+
+    def test_not_cached(self):
+        shared = self.cache(ttls={'users': 0})
+        call = mock.Mock(return_value=({}, {}))
+
+        for _i in range(2):
+            shared(call, 'GET', '/repos/a/b/issues')
+            shared(call, 'GET', '/users/user')
+            shared(call, 'PATCH', '/repos/a/b/pulls/1', input={})
+
+        self.assertEqual(call.call_count, 6)
+
+    def test_mergeable_unknown(self):
+        shared = self.cache()
+        call = mock.Mock(return_value=({}, {'mergeable': None}))
+
+        shared(call, 'GET', '/repos/a/b/pulls/1')
+        shared(call, 'GET', '/repos/a/b/pulls/1')
+
+        self.assertEqual(call.call_count, 2)
+
+    def test_error(self):
+        shared = self.cache()
+        call = mock.Mock(side_effect=[IOError('failed'), ({}, {})])
+
+        self.assertRaises(IOError, shared, call, 'GET', '/users/user')
+        shared(call, 'GET', '/users/user')
+
+        self.assertEqual(call.call_count, 2)
+
+    def test_evict(self):
+        shared = self.cache(max_size=50)
+        data = {'login': 'x' * 10}
+
+        shared.put('a', 'users', {}, data)
+        self.now += 1
+        shared.put('b', 'users', {}, data)
+        self.now += 1
+        shared.get('a', 'users')
+        self.now += 1
+        shared.put('c', 'users', {}, data)
+
+        # The least recently used entry was evicted
+        self.assertEqual(shared.get('a', 'users'), ({}, data))
+        self.assertEqual(shared.get('b', 'users'), None)
+        self.assertEqual(shared.get('c', 'users'), ({}, data))
+
+    def query(self, sql, *args):
+        db = sqlite3.connect(self.path)
+        try:
+            return db.execute(sql, args).fetchall()
+        finally:
+            db.close()
+
+    def test_size(self):
+        shared = self.cache(ttls={'pulls': 60}, max_size=50)
+        data = {'login': 'x' * 10}
+        size = "SELECT value FROM meta WHERE name = 'size'"
+
+        shared.put('a', 'users', {}, data)
+        shared.put('a', 'users', {}, {})
+        self.assertEqual(self.query(size), [(4,)])
+
+        shared.put('b', 'users', {}, data)
+        shared.put('c', 'users', {}, data)
+        self.assertEqual(self.query(size), [(48,)])
+
+        # Evicting keeps the total
+        self.now += 1
+        shared.put('d', 'pulls', {}, data)
+        self.assertEqual(self.query(size), [(48,)])
+
+        # So does pruning
+        self.now += 61
+        shared.prune()
+        self.assertEqual(self.query(size), [(24,)])
+        self.assertEqual(self.query(size),
+                         self.query('SELECT SUM(size) FROM entries'))
+
+    def test_size_existing(self):
+        shared = self.cache()
+        shared.put('a', 'users', {}, {})
+        shared.close()
+        db = sqlite3.connect(self.path)
+        db.execute("DELETE FROM meta WHERE name = 'size'")
+        db.commit()
+        db.close()
+
+        # The total is summed for a cache created without it
+        self.cache()
+
+        self.assertEqual(
+            self.query("SELECT value FROM meta WHERE name = 'size'"), [(4,)])
+
+    def test_touch(self):
+        shared = self.cache()
+        shared.put('a', 'users', {}, {})
+        touched = 'SELECT used, hits FROM entries'
+
+        self.now += 1
+        shared.get('a', 'users')
+        self.now += 1
+        shared.get('a', 'users')
+
+        # The use is only noted in memory
+        self.assertEqual(self.query(touched), [(1000.0, 0)])
+
+        self.now += sharedcache.TOUCH_INTERVAL
+        shared.get('a', 'users')
+
+        self.assertEqual(self.query(touched),
+                         [(1002.0 + sharedcache.TOUCH_INTERVAL, 3)])
+
+    def test_touch_close(self):
+        shared = self.cache()
+        shared.put('a', 'users', {}, {})
+        self.now += 1
+        shared.get('a', 'users')
+
+        shared.close()
+
+        self.assertEqual(self.query('SELECT used, hits FROM entries'),
+                         [(1001.0, 1)])
+
+    def test_prune(self):
+        shared = self.cache(ttls={'pulls': 60})
+        shared.put('old', 'pulls', {}, [])
+        shared.put('user', 'users', {}, {})
+        self.now += 61
+        shared.put('new', 'pulls', {}, [])
+
+        result = shared.prune()
+
+        self.assertEqual(result, (1, 4))
+        self.assertEqual(shared.get('new', 'pulls'), ({}, []))
+        self.assertEqual(shared.get('user', 'users'), ({}, {}))
+
+    def test_prune_size(self):
+        shared = self.cache()
+        shared.put('a', 'users', {}, {})
+        self.now += 1
+        shared.put('b', 'users', {}, {})
+        shared.max_size = 4
+
+        result = shared.prune()
+
+        self.assertEqual(result, (1, 4))
+        self.assertEqual(shared.get('a', 'users'), None)
+
+    def test_summary(self):
+        shared = self.cache(ttls={'pulls': 60})
+        shared.put('old', 'pulls', {}, [])
+        self.now += 61
+        shared.put('new', 'pulls', {}, [1])
+        shared.put('user', 'users', {}, {})
+        shared.get('user', 'users')
+        shared.get('user', 'users')
+
+        result = shared.summary()
+
+        self.assertEqual(result, {
+            'pulls': {'entries': 2, 'expired': 1, 'size': 9, 'hits': 0},
+            'repos': {'entries': 0, 'expired': 0, 'size': 0, 'hits': 0},
+            'users': {'entries': 1, 'expired': 0, 'size': 4, 'hits': 2},
+        })
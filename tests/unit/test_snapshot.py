@@ -0,0 +1,161 @@
+# Copyright 2014 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the
+#    License. You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing,
+#    software distributed under the License is distributed on an "AS
+#    IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+#    express or implied. See the License for the specific language
+#    governing permissions and limitations under the License.
+
+import datetime
+import json
+import unittest
+
+import mock
+
+from tugboat import records
+from tugboat import snapshot
+
+
+def make_record(number, repo_name='owner/repo', updated=1, mergeable=True):
+    return records.PullRecord(
+        repo_name=repo_name,
+        number=number,
+        created_at=datetime.datetime(2014, 1, 1, 0, 0, 0),
+        updated_at=datetime.datetime(2014, 1, 1, 0, 0, updated),
+        head_sha='head',
+        base_sha='base',
+        mergeable=mergeable,
+    )
+
+
+class SnapshotTest(unittest.TestCase):
+    def test_init(self):
+        result = snapshot.Snapshot('generated')
+
+        self.assertEqual(result.generated, 'generated')
+        self.assertEqual(result.pulls, {})
+        self.assertEqual(len(result), 0)
+
+    def test_add(self):
+        snap = snapshot.Snapshot()
+        record = make_record(1)
+
+        snap.add(record)
+
+        self.assertEqual(len(snap), 1)
+        self.assertTrue(('owner/repo', 1) in snap)
+        self.assertFalse(('owner/repo', 2) in snap)
+        self.assertEqual(snap.get(('owner/repo', 1)), record)
+        self.assertEqual(snap.get(('owner/repo', 2)), None)
+
+    @mock.patch.object(snapshot, 'Diff', return_value='diff')
+    def test_diff(self, mock_Diff):
+        snap = snapshot.Snapshot()
+
+        result = snap.diff('current')
+
+        self.assertEqual(result, 'diff')
+        mock_Diff.assert_called_once_with(snap, 'current', None)
+
+    def test_to_dict(self):
+        snap = snapshot.Snapshot(datetime.datetime(2014, 2, 1, 0, 0, 0))
+        snap.add(make_record(2))
+        snap.add(make_record(1))
+
+        result = snap.to_dict()
+
+        self.assertEqual(result['version'], snapshot.VERSION)
+        self.assertEqual(result['generated'], '2014-02-01T00:00:00Z')
+        self.assertEqual([pull['number'] for pull in result['pulls']],
+                         [1, 2])
+
+    @mock.patch.object(snapshot.output, 'atomic_write')
+    @mock.patch.object(snapshot.Snapshot, 'to_dict',
+                       return_value={'b': 2, 'a': 1})
+    def test_write(self, mock_to_dict, mock_atomic_write):
+        snap = snapshot.Snapshot()
+
+        snap.write('path')
+
+        mock_atomic_write.assert_called_once_with('path',
+                                                  '{"a":1,"b":2}\n')
+
+
+class LoadTest(unittest.TestCase):
+    @mock.patch('io.open', new_callable=mock.mock_open)
+    def test_load(self, mock_open):
+        snap = snapshot.Snapshot(datetime.datetime(2014, 2, 1, 0, 0, 0))
+        snap.add(make_record(1))
+        snap.add(make_record(2, mergeable=False))
+        mock_open.return_value.read.return_value = json.dumps(snap.to_dict())
+
+        result = snapshot.load('path')
+
+        mock_open.assert_called_once_with('path', encoding='utf-8')
+        self.assertEqual(result.generated,
+                         datetime.datetime(2014, 2, 1, 0, 0, 0))
+        self.assertEqual(sorted(result.pulls), [('owner/repo', 1),
+                                                ('owner/repo', 2)])
+        self.assertEqual(result.get(('owner/repo', 2)).mergeable, False)
+
+    @mock.patch('io.open', new_callable=mock.mock_open)
+    def test_load_version(self, mock_open):
+        mock_open.return_value.read.return_value = '{"version": 99}'
+
+        self.assertRaises(ValueError, snapshot.load, 'path')
+
+
+class DiffTest(unittest.TestCase):
+    def test_diff(self):
+        previous = snapshot.Snapshot()
+        for record in [make_record(1), make_record(2), make_record(3),
+                       make_record(4), make_record(5, mergeable=False),
+                       make_record(1, repo_name='owner/other')]:
+            previous.add(record)
+        current = [
+            make_record(6),
+            make_record(1),
+            make_record(3, updated=2),
+            make_record(4, mergeable=False),
+            make_record(5, updated=2, mergeable=True),
+        ]
+
+        result = snapshot.Diff(previous, current)
+
+        self.assertTrue(result)
+        self.assertEqual(result.previous, previous)
+        self.assertEqual([r.key for r in result.new], [('owner/repo', 6)])
+        self.assertEqual([r.key for r in result.updated],
+                         [('owner/repo', 3), ('owner/repo', 5)])
+        self.assertEqual([r.key for r in result.flipped],
+                         [('owner/repo', 4), ('owner/repo', 5)])
+        self.assertEqual([r.key for r in result.closed],
+                         [('owner/other', 1), ('owner/repo', 2)])
+        self.assertEqual(result.unchanged, 1)
+
+    def test_incomplete(self):
+        previous = snapshot.Snapshot()
+        for record in [make_record(1), make_record(1, repo_name='owner/b'),
+                       make_record(2, repo_name='owner/c')]:
+            previous.add(record)
+
+        result = snapshot.Diff(previous, [make_record(1)],
+                               lambda x: x == 'owner/b')
+
+        self.assertEqual([r.key for r in result.closed], [('owner/c', 2)])
+
+    def test_no_changes(self):
+        previous = snapshot.Snapshot()
+        previous.add(make_record(1))
+
+        result = snapshot.Diff(previous, [make_record(1)])
+
+        self.assertFalse(result)
+        self.assertEqual(result.unchanged, 1)
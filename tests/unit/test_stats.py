@@ -0,0 +1,325 @@
+# Copyright 2014 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the
+#    License. You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing,
+#    software distributed under the License is distributed on an "AS
+#    IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+#    express or implied. See the License for the specific language
+#    governing permissions and limitations under the License.
+
+import unittest
+
+import mock
+
+from tugboat import stats
+
+
+class EndpointTest(unittest.TestCase):
+    def test_repo(self):
+        result = stats.endpoint('GET', 'https://api.github.com/repos/o/r')
+
+        self.assertEqual(result, 'GET /repos/:/:')
+
+    def test_pull(self):
+        result = stats.endpoint(
+            'GET', 'https://api.github.com/repos/o/r/pulls/5?page=2')
+
+        self.assertEqual(result, 'GET /repos/:/:/pulls/:')
+
+    def test_pulls(self):
+        result = stats.endpoint('GET', '/repos/o/r/pulls')
+
+        self.assertEqual(result, 'GET /repos/:/:/pulls')
+
+    def test_user(self):
+        result = stats.endpoint('GET', '/users/spam/repos')
+
+        self.assertEqual(result, 'GET /users/:/repos')
+
+    def test_enterprise(self):
+        result = stats.endpoint('GET', 'https://ghe/api/v3/orgs/spam')
+
+        self.assertEqual(result, 'GET /orgs/:')
+
+
+class PercentileTest(unittest.TestCase):
+    def test_empty(self):
+        self.assertEqual(stats.percentile([], 50), None)
+
+    def test_one(self):
+        self.assertEqual(stats.percentile([5], 50), 5)
+        self.assertEqual(stats.percentile([5], 99), 5)
+
+    def test_many(self):
+        samples = list(range(1, 101))
+
+        self.assertEqual(stats.percentile(samples, 0), 1)
+        self.assertEqual(stats.percentile(samples, 50), 50)
+        self.assertEqual(stats.percentile(samples, 95), 95)
+        self.assertEqual(stats.percentile(samples, 99), 99)
+        self.assertEqual(stats.percentile(samples, 100), 100)
+
+
+class StatsTest(unittest.TestCase):
+    def test_init(self):
+        result = stats.Stats()
+
+        self.assertEqual(result.phases, [])
+        self.assertEqual(result.phase_times, {})
+        self.assertEqual(result.requests, {})
+        self.assertEqual(result.errors, {})
+        self.assertEqual(result.caches, {})
+        self.assertEqual(result.counters, {})
+        self.assertEqual(result.fetches, [])
+        self.assertEqual(result.limits, {})
+        self.assertEqual(result.listeners, [])
+        self.assertEqual(result._current, None)
+
+    @mock.patch.object(stats, 'clock', side_effect=[1.0, 1.5])
+    def test_call(self, mock_clock):
+        call = mock.Mock(return_value=('headers', 'data'))
+        st = stats.Stats()
+
+        result = st(call, 'GET', '/repos/o/r', parameters={})
+
+        self.assertEqual(result, ('headers', 'data'))
+        call.assert_called_once_with('GET', '/repos/o/r', parameters={})
+        self.assertEqual(st.requests, {'GET /repos/:/:': [0.5]})
+        self.assertEqual(st.errors, {})
+
+    @mock.patch.object(stats, 'clock', side_effect=[1.0, 1.5])
+    def test_call_error(self, mock_clock):
+        call = mock.Mock(side_effect=ValueError)
+        st = stats.Stats()
+
+        self.assertRaises(ValueError, st, call, 'GET', '/repos/o/r')
+        self.assertEqual(st.requests, {'GET /repos/:/:': [0.5]})
+        self.assertEqual(st.errors, {'GET /repos/:/:': 1})
+
+    @mock.patch.object(stats, 'clock', side_effect=[1.0, 2.0, 2.5, 4.5,
+                                                    5.0, 6.0, 7.0, 7.5])
+    def test_phase(self, mock_clock):
+        st = stats.Stats()
+
+        st.phase('one')
+        st.phase('two')
+        st.phase('three')
+        st.phase('two')
+        st.stop()
+
+        self.assertEqual(st.phases, ['one', 'two', 'three'])
+        self.assertEqual(st.phase_times, {
+            'one': 1.0,
+            'two': 2.5,
+            'three': 1.0,
+        })
+        self.assertEqual(st._current, None)
+
+    @mock.patch.object(stats, 'clock', side_effect=[1.0, 2.0, 2.5, 4.5])
+    def test_phase_listeners(self, mock_clock):
+        listener = mock.Mock()
+        st = stats.Stats()
+        st.listeners.append(listener)
+
+        st.phase('one')
+        st.phase('two')
+        st.stop()
+
+        listener.assert_has_calls([
+            mock.call.phase_start('one'),
+            mock.call.phase_end('one'),
+            mock.call.phase_start('two'),
+            mock.call.phase_end('two'),
+        ])
+        self.assertEqual(len(listener.method_calls), 4)
+
+    def test_stop_idle(self):
+        st = stats.Stats()
+
+        st.stop()
+
+        self.assertEqual(st.phases, [])
+
+    @mock.patch.object(stats.Stats, 'phase')
+    def test_repo_callback(self, mock_phase):
+        inner = mock.Mock()
+        st = stats.Stats()
+
+        callback = st.repo_callback(inner)
+        callback(0, 2, 'repo1')
+        st._current = 'fetch'
+        callback(0, 2, 'repo1', ['pulls'])
+        callback(1, 2, 'repo2')
+
+        mock_phase.assert_called_once_with('fetch')
+        inner.assert_has_calls([
+            mock.call(0, 2, 'repo1'),
+            mock.call(0, 2, 'repo1', ['pulls']),
+            mock.call(1, 2, 'repo2'),
+        ])
+
+    @mock.patch.object(stats.Stats, 'phase')
+    def test_repo_callback_none(self, mock_phase):
+        st = stats.Stats()
+
+        callback = st.repo_callback(None)
+        callback(0, 2, 'repo1')
+
+        mock_phase.assert_called_once_with('fetch')
+
+    def test_cache(self):
+        st = stats.Stats()
+
+        st.cache('spam', True)
+        st.cache('spam', False)
+        st.cache('spam', True)
+
+        self.assertEqual(st.caches, {'spam': [2, 1]})
+
+    def test_count(self):
+        st = stats.Stats()
+
+        st.count('retries')
+        st.count('retries', 3)
+
+        self.assertEqual(st.counters, {'retries': 4})
+
+    def test_fetched(self):
+        st = stats.Stats()
+
+        st.fetched('a/big', 9.0, 0.0, 8.5)
+        st.fetched('a/small', None, 0.1, 0.2)
+
+        self.assertEqual(st.fetches, [
+            (0.0, 'a/big', 9.0, 8.5),
+            (0.1, 'a/small', None, 0.2),
+        ])
+
+    def test_to_dict(self):
+        st = stats.Stats()
+        st.phases = ['one', 'two']
+        st.phase_times = {'one': 1.0, 'two': 2.0}
+        st.requests = {'GET /spam': [0.3, 0.1, 0.2, 0.4]}
+        st.errors = {'GET /spam': 1}
+        st.caches = {'cache': [3, 1]}
+        st.counters = {'retries': 2}
+
+        result = st.to_dict()
+
+        self.assertEqual(result, {
+            'phases': [
+                {'name': 'one', 'time': 1.0},
+                {'name': 'two', 'time': 2.0},
+            ],
+            'requests': {
+                'GET /spam': {
+                    'count': 4,
+                    'errors': 1,
+                    'total': 0.1 + 0.2 + 0.3 + 0.4,
+                    'p50': 0.2,
+                    'p95': 0.4,
+                    'p99': 0.4,
+                },
+            },
+            'total_requests': 4,
+            'caches': {
+                'cache': {'hits': 3, 'misses': 1, 'hit_rate': 0.75},
+            },
+            'counters': {'retries': 2},
+        })
+
+    def test_format(self):
+        st = stats.Stats()
+        st.phases = ['one', 'two']
+        st.phase_times = {'one': 1.0, 'two': 2.0}
+        st.requests = {'GET /spam': [0.3, 0.1, 0.2, 0.4]}
+        st.errors = {'GET /spam': 1}
+        st.caches = {'cache': [3, 1]}
+        st.counters = {'retries': 2}
+
+        result = st.format()
+
+        self.assertEqual(result, [
+            'Run statistics:',
+            '    Phases:',
+            '        one: 1.000s',
+            '        two: 2.000s',
+            '    Requests: 4',
+            '        GET /spam: 4 (1 errors), 1.000s total, p50 0.200s, '
+            'p95 0.400s, p99 0.400s',
+            '    Caches:',
+            '        cache: 3 hits, 1 misses (75.0%)',
+            '    Counters:',
+            '        retries: 2',
+        ])
+
+    def test_schedule(self):
+        st = stats.Stats()
+        st.fetches = [(0.5, 'a/small', 1.0, 0.25), (0.0, 'a/big', 5.0, 2.0)]
+
+        result = st.to_dict()
+
+        self.assertEqual(result['schedule'], {
+            'makespan': 2.0,
+            'repos': [
+                {'repo': 'a/big', 'cost': 5.0, 'start': 0.0, 'time': 2.0},
+                {'repo': 'a/small', 'cost': 1.0, 'start': 0.5, 'time': 0.25},
+            ],
+        })
+        self.assertEqual(st.format()[3:], [
+            '    Schedule: 2 repositories, makespan 2.000s',
+            '        a/big: started 0.000s, took 2.000s',
+            '        a/small: started 0.500s, took 0.250s',
+        ])
+
+    @mock.patch.object(stats, 'SCHEDULE_LINES', 1)
+    def test_schedule_truncated(self):
+        st = stats.Stats()
+        st.fetches = [(0.0, 'a/one', 1.0, 1.0), (0.0, 'a/two', 1.0, 1.0),
+                      (1.0, 'a/three', 1.0, 1.0)]
+
+        result = st.format()
+
+        self.assertEqual(result[3:], [
+            '    Schedule: 3 repositories, makespan 2.000s',
+            '        a/one: started 0.000s, took 1.000s',
+            '        ... and 2 more',
+        ])
+
+    def test_concurrency(self):
+        st = stats.Stats()
+        st.concurrency('github.com', 0.0, 2)
+        st.concurrency('github.com', 1.5, 3)
+        st.concurrency('github.com', 2.0, 1)
+
+        result = st.to_dict()
+
+        self.assertEqual(result['concurrency'], {
+            'github.com': {
+                'final': 1,
+                'min': 1,
+                'max': 3,
+                'changes': [[0.0, 2], [1.5, 3], [2.0, 1]],
+            },
+        })
+        self.assertEqual(st.format()[3:], [
+            '    Concurrency:',
+            '        github.com: 1 to 3, finally 1, 2 changes',
+        ])
+
+    def test_format_minimal(self):
+        st = stats.Stats()
+
+        result = st.format()
+
+        self.assertEqual(result, [
+            'Run statistics:',
+            '    Phases:',
+            '    Requests: 0',
+        ])
@@ -0,0 +1,171 @@
+# Copyright 2014 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the
+#    License. You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing,
+#    software distributed under the License is distributed on an "AS
+#    IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+#    express or implied. See the License for the specific language
+#    governing permissions and limitations under the License.
+
+import unittest
+
+import mock
+
+from tugboat import summary
+
+
+def make_pr(number, created, updated, mergeable=True):
+    return mock.Mock(number=number, created_at=created, updated_at=updated,
+                     mergeable=mergeable)
+
+
+LAST = '<https://api.github.com/repos/a/b/pulls?page=3&per_page=100>'
+
+
+class PullsPageTest(unittest.TestCase):
+    def test_getter(self):
+        repo = mock.Mock(**{'get_pulls_page.return_value': (['pr'], {})})
+
+        result = summary.pulls_page(repo, {'per_page': 1})
+
+        self.assertEqual(result, (['pr'], {}))
+        repo.get_pulls_page.assert_called_once_with({'per_page': 1})
+
+    @mock.patch('github.PullRequest.PullRequest',
+                side_effect=lambda r, h, item, c: item['number'])
+    def test_pygithub(self, mock_PullRequest):
+        repo = mock.Mock(spec=['_requester', 'url'],
+                         url='https://api.github.com/repos/a/b')
+        repo._requester.requestJsonAndCheck.return_value = (
+            {'link': '%s; rel="last"' % LAST}, [{'number': 1}, {'number': 2}])
+
+        result, links = summary.pulls_page(repo, {'per_page': 1})
+
+        self.assertEqual(result, [1, 2])
+        self.assertEqual(links, {'last': LAST[1:-1]})
+        repo._requester.requestJsonAndCheck.assert_called_once_with(
+            'GET', 'https://api.github.com/repos/a/b/pulls',
+            parameters={'per_page': 1})
+        mock_PullRequest.assert_called_with(
+            repo._requester, {'link': '%s; rel="last"' % LAST},
+            {'number': 2}, False)
+
+
+class PageNumberTest(unittest.TestCase):
+    def test_page(self):
+        self.assertEqual(summary._page_number(LAST[1:-1]), 3)
+
+    def test_no_page(self):
+        self.assertEqual(summary._page_number('https://api.github.com/x'), 1)
+
+
+class RepoCountTest(unittest.TestCase):
+    def test_init(self):
+        result = summary.RepoCount(mock.Mock(full_name='a/b'), 3, 'oldest')
+
+        self.assertEqual(result.name, 'a/b')
+        self.assertEqual(result.pulls, 3)
+        self.assertEqual(result.oldest, 'oldest')
+
+    @mock.patch.object(summary.pulls.PullRequest, '_fetch')
+    def test_mergeable_listed(self, mock_fetch):
+        listed = [mock.Mock(mergeable=True), mock.Mock(mergeable=False)]
+        count = summary.RepoCount(mock.Mock(full_name='a/b'), 2, 'oldest',
+                                  listed=listed)
+
+        self.assertEqual(count.mergeable, 1)
+        self.assertFalse(mock_fetch.called)
+
+    @mock.patch.object(summary.pulls.PullRequest, '_fetch', return_value=[
+        mock.Mock(mergeable=True), mock.Mock(mergeable=True),
+        mock.Mock(mergeable=False),
+    ])
+    def test_mergeable_fetched(self, mock_fetch):
+        repo = mock.Mock(full_name='a/b')
+        count = summary.RepoCount(repo, 3, 'oldest', 'cache')
+
+        self.assertEqual(count.mergeable, 2)
+        self.assertEqual(count.mergeable, 2)
+        mock_fetch.assert_called_once_with(repo, 'cache')
+
+
+class SummaryTest(unittest.TestCase):
+    def test_init(self):
+        result = summary.Summary()
+
+        self.assertEqual(result.repos, {})
+        self.assertEqual(result.total, 0)
+
+    def test_fetch_empty(self):
+        repo = mock.Mock(full_name='a/b', **{
+            'get_pulls_page.return_value': ([], {}),
+        })
+        collector = summary.Summary()
+
+        result = collector.fetch(repo)
+
+        self.assertEqual(result, [])
+        self.assertEqual(collector.repos, {})
+        repo.get_pulls_page.assert_called_once_with({
+            'state': 'open', 'sort': 'created', 'direction': 'asc',
+            'per_page': 100,
+        })
+
+    def test_fetch_single_page(self):
+        prs = [make_pr(2, 10, 50), make_pr(1, 20, 30, False)]
+        repo = mock.Mock(full_name='a/b', **{
+            'get_pulls_page.return_value': (prs, {}),
+        })
+        collector = summary.Summary()
+
+        result = collector.fetch(repo, 'cache')
+
+        self.assertEqual([pull.number for pull in result], [1, 2])
+        self.assertEqual(result[0].repo, repo)
+        self.assertEqual(result[0].pr, prs[1])
+        self.assertEqual(repo.get_pulls_page.call_count, 1)
+        count = collector.repos['a/b']
+        self.assertEqual((count.name, count.pulls, count.oldest),
+                         ('a/b', 2, 10))
+        self.assertEqual(collector.total, 2)
+
+        # The pull requests listed are counted without listing again
+        self.assertEqual(count.mergeable, 1)
+        self.assertEqual(repo.get_pulls_page.call_count, 1)
+
+    def test_fetch_pages(self):
+        first = [make_pr(1, 10, 90)] + [make_pr(idx, 20, 30)
+                                        for idx in range(2, 101)]
+        repo = mock.Mock(full_name='a/b', **{
+            'get_pulls_page.side_effect': [
+                (first, {'next': 'next', 'last': LAST[1:-1]}),
+                ([make_pr(250, 80, 85), make_pr(251, 95, 96)], {}),
+                ([make_pr(50, 40, 5)], {}),
+                ([make_pr(251, 95, 96)], {}),
+            ],
+        })
+        collector = summary.Summary()
+
+        result = collector.fetch(repo)
+
+        # The extremes are found without duplicates
+        self.assertEqual([pull.number for pull in result], [1, 50, 251])
+        params = {'state': 'open', 'sort': 'created', 'direction': 'asc',
+                  'per_page': 100}
+        repo.get_pulls_page.assert_has_calls([
+            mock.call(params),
+            mock.call(dict(params, page=3)),
+            mock.call(dict(params, sort='updated', direction='asc',
+                           per_page=1)),
+            mock.call(dict(params, sort='updated', direction='desc',
+                           per_page=1)),
+        ])
+        count = collector.repos['a/b']
+        self.assertEqual((count.pulls, count.oldest), (202, 10))
+        self.assertEqual(count._listed, None)
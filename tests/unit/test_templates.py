@@ -0,0 +1,246 @@
+# Copyright 2014 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the
+#    License. You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing,
+#    software distributed under the License is distributed on an "AS
+#    IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+#    express or implied. See the License for the specific language
+#    governing permissions and limitations under the License.
+
+import unittest
+
+import mock
+
+from tugboat import templates
+
+
+class SplitFieldTest(unittest.TestCase):
+    def test_plain(self):
+        self.assertEqual(templates._split_field('pull'), ('pull', ''))
+
+    def test_attr(self):
+        self.assertEqual(templates._split_field('pull.user.login'),
+                         ('pull', '.user.login'))
+
+    def test_index(self):
+        self.assertEqual(templates._split_field('pull[0].name'),
+                         ('pull', '[0].name'))
+
+
+class GetterTest(unittest.TestCase):
+    def test_plain(self):
+        getter = templates._getter('pull', 'pull', '')
+
+        self.assertEqual(getter('value'), 'value')
+
+    def test_attr(self):
+        getter = templates._getter('pull.user.login', 'pull', '.user.login')
+
+        self.assertEqual(getter(mock.Mock(**{'user.login': 'me'})), 'me')
+
+    def test_index(self):
+        getter = templates._getter('pull.labels[1].name', 'pull',
+                                   '.labels[1].name')
+        labels = [mock.Mock(), mock.Mock()]
+        labels[1].name = 'bug'
+
+        self.assertEqual(getter(mock.Mock(labels=labels)), 'bug')
+
+
+class SectionTest(unittest.TestCase):
+    def test_init(self):
+        result = templates.Section('pull', u'#{pull.number}: {age}')
+
+        self.assertEqual(result.name, 'pull')
+        self.assertEqual(result.text, u'#{pull.number}: {age}')
+        self.assertEqual(result.names, set(['pull', 'age']))
+        self.assertEqual(result.fields, set(['pull.number', 'age']))
+        self.assertEqual(len(result.parts), 2)
+
+    def test_init_literal(self):
+        result = templates.Section('pull', u'no fields')
+
+        self.assertEqual(result.names, set())
+        self.assertEqual(result.parts, [
+            (u'no fields', None, None, None, None),
+        ])
+
+    def test_init_unknown_field(self):
+        self.assertRaises(ValueError, templates.Section, 'pull', u'{spam}')
+
+    def test_init_wrong_section(self):
+        self.assertRaises(ValueError, templates.Section, 'header',
+                          u'{pull.number}')
+
+    def test_init_nested(self):
+        self.assertRaises(ValueError, templates.Section, 'pull',
+                          u'{pull.number:{age}}')
+
+    def test_init_conversion(self):
+        self.assertRaises(ValueError, templates.Section, 'pull',
+                          u'{pull.number!x}')
+
+    def test_init_syntax(self):
+        self.assertRaises(ValueError, templates.Section, 'pull', u'{pull')
+
+    def test_render(self):
+        section = templates.Section(
+            'pull', u'{pull.number:>4}|{pull.title!r}|{pull.number}|{age}')
+        pull = mock.Mock(number=5, title='title')
+        values = {
+            'pull': mock.Mock(return_value=pull),
+            'age': mock.Mock(return_value=' (age: 1)'),
+            'username': mock.Mock(),
+        }
+
+        result = section.render(values)
+
+        self.assertEqual(result, u"   5|'title'|5| (age: 1)")
+        values['pull'].assert_called_once_with()
+        values['age'].assert_called_once_with()
+        self.assertFalse(values['username'].called)
+
+
+class TemplateTest(unittest.TestCase):
+    def test_init_default(self):
+        result = templates.Template()
+
+        self.assertEqual(set(result.sections), set(templates.sections))
+        for name, section in result.sections.items():
+            self.assertEqual(section.text, templates.default[name])
+
+    def test_init_override(self):
+        result = templates.Template({'pull': u'{pull.number}'})
+
+        self.assertEqual(result.sections['pull'].text, u'{pull.number}')
+        self.assertEqual(result.sections['header'].text,
+                         templates.default['header'])
+
+    def test_init_defaults(self):
+        result = templates.Template({'pull': u'{pull.number}'},
+                                    templates.summary)
+
+        self.assertEqual(result.sections['pull'].text, u'{pull.number}')
+        self.assertEqual(result.sections['header'].text,
+                         templates.summary['header'])
+        self.assertFalse(result.uses('header', 'mergeable'))
+
+    def test_init_unknown_section(self):
+        self.assertRaises(ValueError, templates.Template, {'spam': u''})
+
+    def test_uses(self):
+        tmpl = templates.Template({'pull': u'{pull.number}'})
+
+        self.assertTrue(tmpl.uses('pull', 'pull'))
+        self.assertFalse(tmpl.uses('pull', 'mergeable'))
+        self.assertTrue(tmpl.uses('header', 'mergeable'))
+        self.assertTrue(tmpl.uses('pull', 'pull.number'))
+        self.assertFalse(tmpl.uses('pull', 'pull.user.name'))
+        self.assertTrue(tmpl.uses('repo', 'repo.mergeable'))
+
+    def test_unsupported(self):
+        tmpl = templates.Template({
+            'pull': u'{pull.number} {pull.title} {pull.user.login} '
+            u'{pull.user.email} {pull.created_at.year} {pull.labels[0]} '
+            u'{pull} {mergeable}',
+        })
+        attributes = {
+            'number': None,
+            'created_at': None,
+            'user': {'login': None},
+        }
+
+        result = tmpl.unsupported('pull', 'pull', attributes)
+
+        self.assertEqual(result, ['pull.labels[0]', 'pull.title',
+                                  'pull.user.email'])
+        self.assertEqual(tmpl.unsupported('header', 'oldest', attributes),
+                         ['oldest.repo.full_name'])
+
+    def test_render(self):
+        tmpl = templates.Template({'breakdown': u'Repos: {repos}'})
+
+        result = tmpl.render('breakdown', {'repos': lambda: 3})
+
+        self.assertEqual(result, u'Repos: 3')
+
+
+class ParseTest(unittest.TestCase):
+    def test_bare(self):
+        result = templates.parse(u'{pull.number}\n')
+
+        self.assertEqual(result, {'pull': u'{pull.number}'})
+
+    def test_sections(self):
+        result = templates.parse(
+            u'\n'
+            u'[header]\n'
+            u'Total: {total}\n'
+            u'\n'
+            u'[pull]\n'
+            u'\n'
+            u'{pull.number}\n'
+            u'[footer]\n'
+        )
+
+        self.assertEqual(result, {
+            'header': u'Total: {total}\n',
+            'pull': u'\n{pull.number}',
+            'footer': u'',
+        })
+
+    def test_leading_pull(self):
+        result = templates.parse(
+            u'{pull.number}\n'
+            u'[repo]\n'
+            u'{repo.name}\n'
+        )
+
+        self.assertEqual(result, {
+            'pull': u'{pull.number}',
+            'repo': u'{repo.name}',
+        })
+
+
+class LoadTest(unittest.TestCase):
+    @mock.patch.object(templates, 'Template', return_value='template')
+    @mock.patch.object(templates, 'parse', return_value={'pull': u'text'})
+    @mock.patch('io.open', new_callable=mock.mock_open,
+                read_data=u'file text')
+    @mock.patch('os.path.isfile', return_value=True)
+    def test_file(self, mock_isfile, mock_open, mock_parse, mock_Template):
+        result = templates.load('template.txt')
+
+        self.assertEqual(result, 'template')
+        mock_isfile.assert_called_once_with('template.txt')
+        mock_open.assert_called_once_with('template.txt', encoding='utf-8')
+        mock_parse.assert_called_once_with(u'file text')
+        mock_Template.assert_called_once_with({'pull': u'text'}, None)
+
+    @mock.patch.object(templates, 'Template', return_value='template')
+    @mock.patch.object(templates, 'parse')
+    @mock.patch('io.open')
+    @mock.patch('os.path.isfile', return_value=False)
+    def test_inline(self, mock_isfile, mock_open, mock_parse, mock_Template):
+        result = templates.load('{pull.number}')
+
+        self.assertEqual(result, 'template')
+        self.assertFalse(mock_open.called)
+        self.assertFalse(mock_parse.called)
+        mock_Template.assert_called_once_with({'pull': '{pull.number}'},
+                                              None)
+
+    @mock.patch.object(templates, 'Template', return_value='template')
+    @mock.patch('os.path.isfile', return_value=False)
+    def test_defaults(self, mock_isfile, mock_Template):
+        result = templates.load('{pull.number}', templates.summary)
+
+        self.assertEqual(result, 'template')
+        mock_Template.assert_called_once_with({'pull': '{pull.number}'},
+                                              templates.summary)
@@ -0,0 +1,223 @@
+# Copyright 2014 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the
+#    License. You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing,
+#    software distributed under the License is distributed on an "AS
+#    IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+#    express or implied. See the License for the specific language
+#    governing permissions and limitations under the License.
+
+import threading
+
+from tugboat import stats as stats_mod
+
+
+# The default number of requests allowed in flight at the start
+DEFAULT_INITIAL = 2
+
+# The default factor the limit is cut by when the host pushes back
+DEFAULT_DECREASE = 0.5
+
+# The default factor by which the smoothed latency may exceed its
+# baseline before it's taken as a sign of overload
+DEFAULT_TOLERANCE = 2.0
+
+# The weight of each new sample in the smoothed latency, and the
+# weight with which the baseline follows the smoothed latency up
+SMOOTHING = 0.2
+DRIFT = 0.01
+
+
+def throttled(exc):
+    """
+    Determine whether a request failure means the host is throttling
+    the client: a 429 response, or a 403 response citing Github's
+    abuse detection or secondary rate limits.
+
+    :param exc: The exception raised by the request.
+
+    :returns: ``True`` if the client is being throttled, ``False``
+              otherwise.
+    """
+
+    # PyGithub is expensive to import, so its exceptions are
+    # recognized by their status attribute
+    status = getattr(exc, 'status', None)
+    if status == 429:
+        return True
+    if status != 403:
+        return False
+
+    data = getattr(exc, 'data', None)
+    message = data.get('message') if isinstance(data, dict) else None
+    message = (message or '').lower()
+    return 'abuse' in message or 'secondary rate limit' in message
+
+
+class Limiter(object):
+    """
+    A middleware which limits the number of requests in flight to a
+    Github host, adapting the limit to how the host responds.  The
+    right concurrency varies from host to host, and over time; too
+    little leaves the host underused, and too much trips its
+    secondary rate limits.  The limit is adapted as TCP adapts its
+    congestion window: while the latency of requests stays flat, the
+    limit grows by one for each limit's worth of successful requests;
+    once the host throttles a request, or the latency spikes, it's
+    cut by a constant factor.  Requests which were already in flight
+    when the limit was cut don't cut it again.
+
+    The latency is smoothed, so a single slow request isn't taken as
+    a spike, and compared with a baseline: the lowest smoothed latency
+    seen, slowly following the latency up, so a host which has become
+    slower for good is eventually taken at its new speed.
+    """
+
+    def __init__(self, maximum, initial=DEFAULT_INITIAL, minimum=1,
+                 decrease=DEFAULT_DECREASE, tolerance=DEFAULT_TOLERANCE,
+                 host=None, stats=None):
+        """
+        Initialize a ``Limiter`` object.
+
+        :param maximum: The most requests ever allowed in flight.
+        :param initial: The number of requests allowed in flight at
+                        the start.
+        :param minimum: The fewest requests ever allowed in flight.
+        :param decrease: The factor the limit is cut by.
+        :param tolerance: The factor by which the smoothed latency
+                          may exceed the baseline before the limit is
+                          cut.
+        :param host: The name of the host, under which the limit is
+                     reported to ``stats``.
+        :param stats: An optional ``tugboat.stats.Stats`` object to
+                      receive each change in the limit.
+        """
+
+        self.maximum = maximum
+        self.minimum = minimum
+        self.decrease = decrease
+        self.tolerance = tolerance
+        self.host = host
+        self.stats = stats
+
+        self.limit = float(max(minimum, min(initial, maximum)))
+        self.in_flight = 0
+        self.latency = None
+        self.baseline = None
+        self.throttles = 0
+
+        # A list of tuples of the time, in seconds since the limiter
+        # was created, and the limit from then on
+        self.changes = []
+
+        self._start = stats_mod.clock()
+        self._cut = None
+        self._cond = threading.Condition()
+
+        self._record()
+
+    def __call__(self, call, verb, url, *args, **kwargs):
+        """
+        Issue a request once the limit allows, and adapt the limit to
+        the result.
+
+        :param call: The next handler in the chain.
+        :param verb: The HTTP verb of the request.
+        :param url: The URL of the request.
+
+        :returns: The result of the next handler.
+        """
+
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+        start = stats_mod.clock()
+        try:
+            result = call(verb, url, *args, **kwargs)
+        except Exception as exc:
+            with self._cond:
+                self.in_flight -= 1
+                if throttled(exc):
+                    self.throttles += 1
+                    self._backoff(start)
+                self._cond.notify_all()
+            raise
+
+        elapsed = stats_mod.clock() - start
+        with self._cond:
+            self.in_flight -= 1
+            self._observe(start, elapsed)
+            self._cond.notify_all()
+
+        return result
+
+    def _observe(self, start, elapsed):
+        """
+        Adapt the limit to the latency of a successful request.  The
+        caller must hold the lock.
+
+        :param start: The time the request was issued.
+        :param elapsed: The time the request took, in seconds.
+        """
+
+        if self.latency is None:
+            self.latency = elapsed
+        else:
+            self.latency += SMOOTHING * (elapsed - self.latency)
+        if self.baseline is None or self.latency < self.baseline:
+            self.baseline = self.latency
+        else:
+            self.baseline += DRIFT * (self.latency - self.baseline)
+
+        if self.latency > self.baseline * self.tolerance:
+            self._backoff(start)
+        else:
+            self._adjust(min(self.maximum, self.limit + 1.0 / self.limit))
+
+    def _backoff(self, start):
+        """
+        Cut the limit, unless it has been cut since the request was
+        issued.  The caller must hold the lock.
+
+        :param start: The time the request was issued.
+        """
+
+        if self._cut is not None and start < self._cut:
+            return
+
+        self._cut = stats_mod.clock()
+        self._adjust(max(self.minimum, self.limit * self.decrease))
+
+        # The latency is measured afresh at the new limit
+        self.latency = None
+
+    def _adjust(self, limit):
+        """
+        Change the limit, recording the change if the number of
+        requests allowed in flight changed.  The caller must hold the
+        lock.
+
+        :param limit: The new limit.
+        """
+
+        old, self.limit = int(self.limit), limit
+        if int(limit) != old:
+            self._record()
+
+    def _record(self):
+        """
+        Record the current limit.
+        """
+
+        offset = stats_mod.clock() - self._start
+        self.changes.append((offset, int(self.limit)))
+        if self.stats is not None:
+            self.stats.concurrency(self.host, offset, int(self.limit))
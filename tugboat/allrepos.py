@@ -0,0 +1,503 @@
+# Copyright 2014 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the
+#    License. You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing,
+#    software distributed under the License is distributed on an "AS
+#    IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+#    express or implied. See the License for the specific language
+#    governing permissions and limitations under the License.
+
+import functools
+import io
+import json
+import os
+import threading
+import time
+
+try:
+    import queue
+except ImportError:  # pragma: no cover
+    import Queue as queue
+
+from tugboat import hosts
+from tugboat import output
+
+
+# The version of the index file format
+VERSION = 1
+
+# The number of repository IDs in each range enumerated by a worker
+DEFAULT_CHUNK = 10000
+
+# The number of ranges enumerated in parallel
+DEFAULT_WORKERS = 4
+
+# The age, in seconds, beyond which the index is discarded and every
+# repository enumerated again, so deleted and renamed repositories
+# are eventually noticed: 7 days
+DEFAULT_MAX_AGE = 7 * 24 * 60 * 60
+
+
+def _missing(exc):
+    """
+    Determine whether an exception reports that an object doesn't
+    exist.
+
+    :param exc: The exception.
+
+    :returns: ``True`` if the exception is a 404 from the Github API.
+    """
+
+    return getattr(exc, 'status', None) == 404
+
+
+class RepoIndex(object):
+    """
+    A persistent index of the repositories on each Github host, as
+    found by enumerating every repository.  The index records the
+    name of each repository by ID, and the highest ID seen; since
+    Github assigns IDs in increasing order, a later run need only
+    enumerate the repositories created since, which are those with
+    higher IDs.  Once the index is older than its maximum age, it's
+    discarded, and every repository enumerated again.
+    """
+
+    def __init__(self, max_age=DEFAULT_MAX_AGE):
+        """
+        Initialize a ``RepoIndex`` object.
+
+        :param max_age: The age, in seconds, beyond which the index
+                        for a host is discarded.
+        """
+
+        self.max_age = max_age
+
+        # A dictionary mapping host names to dictionaries with the
+        # keys "walked", the time every repository was last
+        # enumerated, "last_id", the highest ID seen, and "repos", a
+        # dictionary mapping IDs to repository names
+        self.hosts = {}
+
+        self._lock = threading.Lock()
+
+    def known(self, host):
+        """
+        Look up the repositories known on a host.
+
+        :param host: The host name.
+
+        :returns: A tuple of the highest repository ID seen and a
+                  dictionary mapping repository IDs to names.  If the
+                  index for the host is missing or too old, the ID is
+                  0 and the dictionary is empty.
+        """
+
+        with self._lock:
+            entry = self.hosts.get(host)
+            if entry is None or entry['walked'] < time.time() - self.max_age:
+                return 0, {}
+
+            return entry['last_id'], dict(entry['repos'])
+
+    def discard(self, host, repo_id):
+        """
+        Drop a repository from the index for a host, as when it's found
+        to have been deleted.
+
+        :param host: The host name.
+        :param repo_id: The ID of the repository.
+        """
+
+        with self._lock:
+            entry = self.hosts.get(host)
+            if entry is not None:
+                entry['repos'].pop(repo_id, None)
+
+    def update(self, host, repos, last_id, walked=None):
+        """
+        Update the repositories known on a host.
+
+        :param host: The host name.
+        :param repos: A dictionary mapping repository IDs to names.
+        :param last_id: The highest repository ID seen.
+        :param walked: The time every repository was enumerated.  If
+                       ``None``, the time of the last such enumeration
+                       is kept.
+        """
+
+        with self._lock:
+            entry = self.hosts.get(host)
+            if walked is None:
+                walked = entry['walked'] if entry else time.time()
+            self.hosts[host] = {
+                'walked': walked,
+                'last_id': last_id,
+                'repos': dict(repos),
+            }
+
+    def to_dict(self):
+        """
+        Serialize the index.
+
+        :returns: A dictionary suitable for serializing as JSON.
+        """
+
+        with self._lock:
+            return {
+                'version': VERSION,
+                'hosts': dict(
+                    (host, {
+                        'walked': entry['walked'],
+                        'last_id': entry['last_id'],
+                        'repos': sorted([repo_id, name] for repo_id, name
+                                        in entry['repos'].items()),
+                    })
+                    for host, entry in self.hosts.items()
+                ),
+            }
+
+    def write(self, path):
+        """
+        Atomically write the index to a file.
+
+        :param path: The name of the file to write.
+        """
+
+        output.atomic_write(path, u'%s\n' % json.dumps(
+            self.to_dict(), sort_keys=True, separators=(',', ':')))
+
+
+def load(path, max_age=DEFAULT_MAX_AGE):
+    """
+    Load the repository index from a file.  If the file doesn't exist
+    yet, the index starts out empty.
+
+    :param path: The name of the file to read.
+    :param max_age: The age, in seconds, beyond which the index for a
+                    host is discarded.
+
+    :returns: A ``RepoIndex`` object.
+    """
+
+    index = RepoIndex(max_age)
+    if not os.path.exists(path):
+        return index
+
+    with io.open(path, encoding='utf-8') as f:
+        data = json.load(f)
+
+    if data.get('version') != VERSION:
+        raise ValueError('Unsupported repository index version %r in "%s"' %
+                         (data.get('version'), path))
+
+    for host, entry in data.get('hosts', {}).items():
+        index.update(host, dict((repo_id, name)
+                                for repo_id, name in entry['repos']),
+                     entry['last_id'], entry['walked'])
+
+    return index
+
+
+def _indexed_repo(gh, repo_id, name):
+    """
+    Build the object for a repository in the index, without looking
+    it up.  A repository which has been deleted since it was indexed
+    is noticed when its pull requests are listed.
+
+    :param gh: A ``github.Github`` handle, ``tugboat.rest.Client``,
+               or ``tugboat.hosts.HostHandle``.
+    :param repo_id: The ID of the repository.
+    :param name: The full name of the repository on the host.
+
+    :returns: The repository object.
+    """
+
+    if isinstance(gh, hosts.HostHandle):
+        return hosts.HostRepository(gh.host,
+                                    _indexed_repo(gh.gh, repo_id, name))
+
+    # The REST client makes no request to look up a repository
+    requester = getattr(gh, '_Github__requester', None)
+    if requester is None:
+        return gh.get_repo(name)
+
+    # PyGithub looks up each repository with a request of its own, so
+    # the object is built from what the index holds; the pull
+    # requests are listed from its URL
+    import github
+
+    return github.Repository.Repository(requester, {}, {
+        'id': repo_id,
+        'full_name': name,
+        'name': name.partition('/')[2],
+        'url': '%s/repos/%s' % (requester.base_url, name),
+    }, False)
+
+
+class _Failure(object):
+    """
+    Carries an exception raised by a worker to the consumer.
+    """
+
+    def __init__(self, exc):
+        self.exc = exc
+
+
+# Placed on the queue by each worker when it's done
+_DONE = object()
+
+
+class Enumerator(object):
+    """
+    Enumerate every repository on a Github host.  Github lists all
+    repositories in order of ID, starting after a given ID; walking
+    that list from the start takes one request per page, one after
+    the other.  The ``Enumerator`` instead divides the ID space into
+    ranges, which a number of workers claim in order and enumerate in
+    parallel, each starting from the ID at the start of its range.
+    Repositories are produced as soon as they're found, so their pull
+    requests may be fetched while enumeration continues.
+
+    The highest ID is not known in advance.  A worker which finds no
+    repositories at all after the start of its range marks the end of
+    the ID space, and no further ranges are claimed; one which finds
+    the first repository well past its range marks the ranges in
+    between as empty, so they aren't requested.
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, chunk=DEFAULT_CHUNK,
+                 index=None, host=hosts.DEFAULT_HOST):
+        """
+        Initialize an ``Enumerator`` object.
+
+        :param workers: The number of ranges enumerated in parallel.
+        :param chunk: The number of repository IDs in each range.
+        :param index: An optional ``RepoIndex`` object.  The
+                      repositories it holds are produced without
+                      enumerating them again, and it's updated once
+                      every repository has been produced.
+        :param host: The name of the host the repositories are
+                     enumerated on, under which they're indexed,
+                     unless the handle names its own host.
+        """
+
+        self.workers = workers
+        self.chunk = chunk
+        self.index = index
+        self.host = host
+
+    def repos(self, gh):
+        """
+        Enumerate every repository visible through a handle.  The
+        repositories are produced in no particular order.
+
+        :param gh: A ``github.Github`` handle, ``tugboat.rest.Client``,
+                   or ``tugboat.hosts.HostHandle``.
+
+        :returns: An iterator over the repositories.
+        """
+
+        host = getattr(gh, 'host', self.host)
+        since, known = 0, {}
+        if self.index is not None:
+            since, known = self.index.known(host)
+        walked = None if known else time.time()
+
+        # The repositories created since the index was updated are
+        # enumerated in the background while those already in the
+        # index are produced
+        walk, stop = self._walk(gh, since)
+        try:
+            # Repositories which have been deleted since they were
+            # indexed are dropped once that's noticed
+            found = dict(known)
+
+            def drop(repo_id):
+                found.pop(repo_id, None)
+                if self.index is not None:
+                    self.index.discard(host, repo_id)
+
+            for repo_id, name in sorted(known.items()):
+                yield _KnownRepository(_indexed_repo(gh, repo_id, name),
+                                       functools.partial(drop, repo_id))
+
+            last_id = since
+            for repo in walk:
+                found[repo.id] = hosts.split_target(repo.full_name)[1]
+                last_id = max(last_id, repo.id)
+                yield repo
+        finally:
+            stop()
+
+        if self.index is not None:
+            self.index.update(host, found, last_id, walked)
+
+    def _walk(self, gh, since):
+        """
+        Start enumerating the repositories with IDs above a given ID,
+        in parallel.
+
+        :param gh: The handle to enumerate the repositories through.
+        :param since: The ID to enumerate repositories after.
+
+        :returns: A tuple of an iterator over the repositories, and a
+                  function of no arguments which stops the workers
+                  once they've finished their current page.
+        """
+
+        results = queue.Queue()
+        lock = threading.Lock()
+
+        # The number of the next range to claim; the start of the
+        # first range with nothing after it, if known; the highest ID
+        # below which the ranges not yet claimed are known to be
+        # empty; and whether to stop claiming ranges
+        state = {'next': 0, 'end': None, 'floor': since, 'stop': False}
+
+        def claim():
+            with lock:
+                while not state['stop']:
+                    start = since + state['next'] * self.chunk
+                    state['next'] += 1
+                    if state['end'] is not None and start >= state['end']:
+                        return None
+                    if start + self.chunk > state['floor']:
+                        return start
+            return None
+
+        def work():
+            try:
+                while True:
+                    start = claim()
+                    if start is None:
+                        break
+
+                    empty = True
+                    for repo in gh.get_repos(since=start):
+                        empty = False
+                        if state['stop']:
+                            break
+
+                        # Past the end of the range; there's nothing
+                        # between its end and this repository
+                        if repo.id > start + self.chunk:
+                            with lock:
+                                state['floor'] = max(state['floor'],
+                                                     repo.id - 1)
+                            break
+
+                        results.put(repo)
+
+                    # Nothing at all after the start of this range
+                    if empty:
+                        with lock:
+                            if state['end'] is None or start < state['end']:
+                                state['end'] = start
+            except Exception as exc:
+                results.put(_Failure(exc))
+            finally:
+                results.put(_DONE)
+
+        def drain():
+            done = 0
+            while done < len(threads):
+                item = results.get()
+                if item is _DONE:
+                    done += 1
+                elif isinstance(item, _Failure):
+                    raise item.exc
+                else:
+                    yield item
+
+        def stop():
+            with lock:
+                state['stop'] = True
+
+        threads = [threading.Thread(target=work)
+                   for _i in range(self.workers)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        return drain(), stop
+
+
+class _KnownRepository(object):
+    """
+    Wrap a repository produced from the index.  If it turns out to
+    have been deleted since it was indexed, it has no pull requests,
+    and is dropped from the index.
+    """
+
+    def __init__(self, repo, drop):
+        """
+        Initialize a ``_KnownRepository`` object.
+
+        :param repo: The repository object.
+        :param drop: A function of no arguments which drops the
+                     repository from the index.
+        """
+
+        self._repo = repo
+        self._drop = drop
+
+    def __getattr__(self, name):
+        """
+        Delegate attribute access to the underlying repository object.
+
+        :param name: The name of the desired attribute.
+
+        :returns: The value of the desired attribute.
+        """
+
+        return getattr(self._repo, name)
+
+    def get_pulls(self, **kwargs):
+        """
+        List the pull requests in the repository.  The list may be
+        fetched lazily, so a missing repository is noticed as it's
+        iterated over.
+
+        :param kwargs: Keyword arguments for the underlying
+                       ``get_pulls()``, such as ``state`` and
+                       ``sort``.
+
+        :returns: An iterator over the pull requests.
+        """
+
+        try:
+            for pull in self._repo.get_pulls(**kwargs):
+                yield pull
+        except Exception as exc:
+            if not _missing(exc):
+                raise
+            self._drop()
+
+    def get_pulls_page(self, parameters):
+        """
+        Retrieve a single page of the pull requests in the repository.
+        See ``tugboat.summary.pulls_page()``.
+
+        :param parameters: A dictionary of query parameters.
+
+        :returns: A tuple of a list of the pull requests on the page
+                  and a dictionary mapping link relations to URLs.
+        """
+
+        # This pulls in the REST client, so it's imported only when a
+        # summary-only report asks for a page
+        from tugboat import summary
+
+        try:
+            return summary.pulls_page(self._repo, parameters)
+        except Exception as exc:
+            if not _missing(exc):
+                raise
+            self._drop()
+            return [], {}
@@ -0,0 +1,205 @@
+# Copyright 2014 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the
+#    License. You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing,
+#    software distributed under the License is distributed on an "AS
+#    IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+#    express or implied. See the License for the specific language
+#    governing permissions and limitations under the License.
+
+import datetime
+import io
+import json
+import os
+import threading
+
+from tugboat import records
+
+
+# The version of the checkpoint file format
+VERSION = 1
+
+# The default age, in seconds, beyond which a checkpointed repository
+# is fetched again
+DEFAULT_MAX_AGE = 3600.0
+
+
+class Checkpoint(object):
+    """
+    A record of the repositories whose pull requests have been
+    fetched, so that an interrupted run may be resumed without
+    fetching them again.  A checkpoint is a file of JSON lines: the
+    first line is a header giving the format version, and each
+    following line gives the full name of a repository, the time its
+    pull requests were fetched, and the pull requests, as
+    ``tugboat.records.PullRecord`` objects.  A line is appended, and
+    synced to disk, as soon as each repository is fetched, so a crash
+    loses at most the repository being fetched at the time.
+    """
+
+    def __init__(self, path, max_age=DEFAULT_MAX_AGE):
+        """
+        Initialize a ``Checkpoint`` object.
+
+        :param path: The name of the checkpoint file.
+        :param max_age: The age, in seconds, beyond which a
+                        checkpointed repository is considered stale
+                        and is fetched again.  If ``None``,
+                        checkpointed repositories are never stale.
+                        Defaults to ``DEFAULT_MAX_AGE``.
+        """
+
+        self.path = path
+        self.max_age = max_age
+
+        # A dictionary mapping repository names to tuples of the time
+        # the repository was fetched and the list of records
+        self.repos = {}
+
+        self._file = None
+        self._lock = threading.Lock()
+
+    def open(self, resume=False):
+        """
+        Open the checkpoint file for writing.
+
+        :param resume: If ``True``, the repositories recorded in an
+                       existing checkpoint file are loaded, and new
+                       repositories are appended to it.  Otherwise,
+                       any existing checkpoint file is replaced.
+        """
+
+        if resume and os.path.exists(self.path):
+            complete = self.load()
+            self._file = io.open(self.path, 'a', encoding='utf-8')
+
+            # Don't run on from a line cut short by a crash
+            if not complete:
+                self._file.write(u'\n')
+        else:
+            self.repos = {}
+            self._file = io.open(self.path, 'w', encoding='utf-8')
+            self._append({'version': VERSION})
+
+    def load(self):
+        """
+        Load the repositories recorded in the checkpoint file.  A line
+        which can't be parsed, such as one cut short by a crash, is
+        ignored, and its repository will be fetched again.
+
+        :returns: ``True`` if the last line of the file is complete,
+                  ``False`` if it was cut short.
+        """
+
+        self.repos = {}
+        with io.open(self.path, encoding='utf-8') as f:
+            line = f.readline()
+            header = json.loads(line or '{}')
+            if header.get('version') != VERSION:
+                raise ValueError('Unsupported checkpoint version %r in '
+                                 '"%s"' % (header.get('version'), self.path))
+
+            for line in f:
+                try:
+                    data = json.loads(line)
+                except ValueError:
+                    continue
+
+                self.repos[data['repo']] = (
+                    records.parse_time(data['fetched']),
+                    [records.PullRecord.from_dict(pull)
+                     for pull in data['pulls']],
+                )
+
+        return line.endswith(u'\n')
+
+    def get(self, repo_name):
+        """
+        Look up the pull requests checkpointed for a repository.
+
+        :param repo_name: The full name of the repository.
+
+        :returns: A list of ``tugboat.records.PullRecord`` objects, or
+                  ``None`` if the repository hasn't been checkpointed
+                  or its checkpoint is stale.
+        """
+
+        if repo_name not in self.repos:
+            return None
+
+        fetched, pulls = self.repos[repo_name]
+        if self.max_age is not None:
+            age = datetime.datetime.utcnow() - fetched
+            if age.total_seconds() > self.max_age:
+                return None
+
+        return pulls
+
+    def add(self, repo_name, pulls):
+        """
+        Checkpoint the pull requests for a repository.  The
+        mergeability and author's name of each pull request are looked
+        up, so that they're available on resumption.
+
+        :param repo_name: The full name of the repository.
+        :param pulls: A list of ``tugboat.pulls.PullRequest`` objects.
+
+        :returns: A list of ``tugboat.records.PullRecord`` objects for
+                  the pull requests.  These should be reported in
+                  place of the pull requests, so that a resumed run
+                  reports exactly what an uninterrupted one would,
+                  and nothing is looked up twice.
+        """
+
+        fetched = datetime.datetime.utcnow()
+        pull_records = [records.PullRecord.from_pull(pull) for pull in pulls]
+        self.repos[repo_name] = (fetched, pull_records)
+
+        if self._file is not None:
+            self._append({
+                'repo': repo_name,
+                'fetched': records.format_time(fetched),
+                'pulls': [record.to_dict() for record in pull_records],
+            })
+
+        return pull_records
+
+    def _append(self, data):
+        """
+        Append a line to the checkpoint file and sync it to disk.
+
+        :param data: A dictionary to serialize as JSON.
+        """
+
+        line = u'%s\n' % json.dumps(data, sort_keys=True,
+                                    separators=(',', ':'))
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        """
+        Close the checkpoint file, leaving it in place so the run may
+        be resumed.
+        """
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def remove(self):
+        """
+        Close and remove the checkpoint file.  This is done once the
+        report has been generated, so a later run starts afresh.
+        """
+
+        self.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
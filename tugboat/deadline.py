@@ -0,0 +1,270 @@
+# Copyright 2014 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the
+#    License. You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing,
+#    software distributed under the License is distributed on an "AS
+#    IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+#    express or implied. See the License for the specific language
+#    governing permissions and limitations under the License.
+
+
+import threading
+
+from tugboat import requester as requester_mod
+from tugboat import stats
+
+
+class DeadlineExceeded(Exception):
+    """
+    Raised when a request would be issued after the time budget for
+    the run, or for the current repository, has run out.
+    """
+
+    pass
+
+
+class Deadline(object):
+    """
+    A middleware which enforces a time budget while pull requests are
+    being fetched.  Once the budget for the whole run has run out, no
+    further requests are issued, and repositories which haven't been
+    fetched yet are skipped; a repository which takes longer than the
+    per-repository timeout is abandoned.  The timeout of each request
+    is capped at the time remaining, so a hanging request is cut off
+    rather than stalling the run.  The repositories which were skipped
+    or timed out are recorded, so the report can say it's incomplete.
+    """
+
+    def __init__(self, budget=None, repo_timeout=None, requester=None):
+        """
+        Initialize a ``Deadline`` object.
+
+        :param budget: The time budget for fetching, in seconds, or
+                       ``None`` for no overall limit.
+        :param repo_timeout: The time budget for fetching each
+                             repository, in seconds, or ``None`` for
+                             no per-repository limit.
+        :param requester: The requester object whose request timeouts
+                          are capped; see
+                          ``tugboat.requester.get_requester()``.
+        """
+
+        self.budget = budget
+        self.repo_timeout = repo_timeout
+        self.requester = requester
+
+        # A list of tuples of the name of each repository or target
+        # which was not fetched and the reason, "skipped" or "timed
+        # out"
+        self.skipped = []
+
+        self._end = None
+        self._active = False
+
+        # The per-repository budget is tracked for each thread, so
+        # hosts may be fetched concurrently
+        self._local = threading.local()
+
+    @property
+    def _repo_end(self):
+        return getattr(self._local, 'repo_end', None)
+
+    @_repo_end.setter
+    def _repo_end(self, value):
+        self._local.repo_end = value
+
+    def __call__(self, call, verb, url, *args, **kwargs):
+        """
+        Issue a request, if there's time remaining.
+
+        :param call: The next handler in the chain.
+        :param verb: The HTTP verb of the request.
+        :param url: The URL of the request.
+
+        :returns: The result of the next handler.
+        """
+
+        return self._request(self.requester, call, verb, url, *args,
+                             **kwargs)
+
+    def bind(self, requester):
+        """
+        Construct a middleware enforcing this deadline on the requests
+        of another requester, such as that of a second Github host.
+        The time budget is shared, but the timeout capped is that of
+        the given requester.
+
+        :param requester: The requester object whose request timeout
+                          is capped.
+
+        :returns: A middleware callable.
+        """
+
+        def middleware(call, verb, url, *args, **kwargs):
+            return self._request(requester, call, verb, url, *args,
+                                 **kwargs)
+
+        return middleware
+
+    def _request(self, requester, call, verb, url, *args, **kwargs):
+        """
+        Issue a request, if there's time remaining.
+
+        :param requester: The requester object whose request timeout
+                          is capped, or ``None``.
+        :param call: The next handler in the chain.
+        :param verb: The HTTP verb of the request.
+        :param url: The URL of the request.
+
+        :returns: The result of the next handler.
+        """
+
+        remaining = self.remaining()
+        if remaining is None:
+            return call(verb, url, *args, **kwargs)
+        if remaining <= 0:
+            raise DeadlineExceeded('Deadline exceeded before %s %s' %
+                                   (verb, url))
+
+        # Cap the timeout of this thread's requests at the time
+        # remaining; the requester is shared by every worker, so its
+        # own timeout is left alone
+        previous = None
+        if requester is not None:
+            previous = requester_mod.cap_timeout(requester, remaining)
+            if previous is not None and previous < remaining:
+                requester_mod.cap_timeout(requester, previous)
+        try:
+            return call(verb, url, *args, **kwargs)
+        except DeadlineExceeded:
+            raise
+        except Exception:
+            # If the request failed because it ran out of time,
+            # report that instead
+            remaining = self.remaining()
+            if remaining is not None and remaining <= 0:
+                raise DeadlineExceeded('Deadline exceeded during %s %s' %
+                                       (verb, url))
+            raise
+        finally:
+            if requester is not None:
+                requester_mod.cap_timeout(requester, previous)
+
+    def start(self):
+        """
+        Start enforcing the time budget.
+        """
+
+        self._active = True
+        if self.budget is not None:
+            self._end = stats.clock() + self.budget
+
+    def stop(self):
+        """
+        Stop enforcing the time budget.  This is called once fetching
+        is complete, so that rendering the report from the
+        repositories which were fetched isn't cut short.
+        """
+
+        self._active = False
+
+    def remaining(self):
+        """
+        Compute the time remaining before the budget for the run, or
+        for the current repository, runs out.
+
+        :returns: The time remaining, in seconds, or ``None`` if there
+                  is no limit.
+        """
+
+        if not self._active:
+            return None
+
+        ends = [end for end in (self._end, self._repo_end)
+                if end is not None]
+        if not ends:
+            return None
+
+        return min(ends) - stats.clock()
+
+    @property
+    def expired(self):
+        """
+        ``True`` if the budget for the run has run out.
+        """
+
+        return (self._active and self._end is not None and
+                self._end <= stats.clock())
+
+    def fetch(self, name, func, *args, **kwargs):
+        """
+        Fetch a repository, within the time budget.  If the budget for
+        the run has already run out, the repository is skipped; if
+        the budget for the run or the repository runs out while it's
+        being fetched, it's abandoned.
+
+        :param name: The full name of the repository.
+        :param func: A function to call to fetch the repository.
+        :param args: Positional arguments for ``func``.
+        :param kwargs: Keyword arguments for ``func``.
+
+        :returns: The result of ``func``, or ``None`` if the
+                  repository was skipped or abandoned.
+        """
+
+        if self._active and self.repo_timeout is not None:
+            self._repo_end = stats.clock() + self.repo_timeout
+        try:
+            return self.guard(name, func, *args, **kwargs)
+        finally:
+            self._repo_end = None
+
+    def guard(self, name, func, *args, **kwargs):
+        """
+        Call a function within the time budget for the run.  This is
+        like ``fetch()``, but the per-repository timeout doesn't
+        apply; it's used for looking up the repositories of a user or
+        organization.
+
+        :param name: The name of the repository, user, or
+                     organization.
+        :param func: The function to call.
+        :param args: Positional arguments for ``func``.
+        :param kwargs: Keyword arguments for ``func``.
+
+        :returns: The result of ``func``, or ``None`` if the budget
+                  ran out.
+        """
+
+        if self.expired:
+            self.skipped.append((name, 'skipped'))
+            return None
+
+        try:
+            return func(*args, **kwargs)
+        except DeadlineExceeded:
+            self.skipped.append((name, 'timed out'))
+            return None
+
+    def covers(self, repo_name):
+        """
+        Determine whether a repository was skipped or timed out.  A
+        skipped user or organization covers all its repositories.
+
+        :param repo_name: The full name of the repository.
+
+        :returns: ``True`` if the repository was skipped or timed out,
+                  ``False`` otherwise.
+        """
+
+        for name, _reason in self.skipped:
+            if repo_name == name or repo_name.startswith(name + '/'):
+                return True
+
+        return False
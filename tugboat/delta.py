@@ -0,0 +1,209 @@
+# Copyright 2014 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the
+#    License. You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing,
+#    software distributed under the License is distributed on an "AS
+#    IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+#    express or implied. See the License for the specific language
+#    governing permissions and limitations under the License.
+
+import io
+import json
+import os
+import threading
+import time
+
+from tugboat import output
+from tugboat import records
+
+
+# The version of the delta store file format
+VERSION = 1
+
+# The age, in seconds, beyond which the pull requests stored for a
+# repository are discarded and listed in full again, so anything the
+# incremental listing missed, such as a change in mergeability when
+# the base branch moved, is eventually noticed: 1 day
+DEFAULT_MAX_AGE = 24 * 60 * 60
+
+
+class DeltaStore(object):
+    """
+    A persistent store of the open pull requests in each repository,
+    so a later run need only list those which changed since.  Github
+    can list pull requests by when they were last updated, most
+    recent first; the store records, for each repository, the latest
+    update time seen, or watermark, and the listing stops at the
+    first pull request updated before it.  Closing a pull request
+    updates it too, so the closed pull requests are listed the same
+    way, and those closed since are dropped from the store.  The cost
+    of a repository is then proportional to its activity, rather than
+    to the number of open pull requests.
+
+    Once the pull requests stored for a repository are older than the
+    maximum age, they're discarded, and the repository is listed in
+    full again.
+    """
+
+    def __init__(self, max_age=DEFAULT_MAX_AGE, stats=None):
+        """
+        Initialize a ``DeltaStore`` object.
+
+        :param max_age: The age, in seconds, beyond which the pull
+                        requests stored for a repository are listed in
+                        full again.
+        :param stats: An optional ``tugboat.stats.Stats`` object to
+                      receive counts of the repositories listed in
+                      full and incrementally, as the "delta_full" and
+                      "delta_incremental" counters, and of the changed
+                      and closed pull requests found.
+        """
+
+        self.max_age = max_age
+        self.stats = stats
+
+        # A dictionary mapping repository names to dictionaries with
+        # the keys "listed", the time the repository was last listed
+        # in full, "watermark", the latest update time seen, and
+        # "pulls", a dictionary mapping pull request numbers to
+        # ``tugboat.records.PullRecord`` objects
+        self.repos = {}
+
+        self._lock = threading.Lock()
+
+    def get(self, repo_name):
+        """
+        Look up the pull requests stored for a repository.
+
+        :param repo_name: The full name of the repository.
+
+        :returns: A tuple of the watermark and a dictionary mapping
+                  pull request numbers to
+                  ``tugboat.records.PullRecord`` objects, or ``None``
+                  if the repository isn't stored or must be listed in
+                  full again.
+        """
+
+        with self._lock:
+            entry = self.repos.get(repo_name)
+            if (entry is None or entry['watermark'] is None or
+                    entry['listed'] < time.time() - self.max_age):
+                return None
+
+            return entry['watermark'], dict(entry['pulls'])
+
+    def update(self, repo_name, pulls, watermark=None, listed=None):
+        """
+        Store the pull requests of a repository.
+
+        :param repo_name: The full name of the repository.
+        :param pulls: A list of ``tugboat.records.PullRecord`` objects
+                      for the open pull requests.
+        :param watermark: The latest update time seen, as a
+                          timezone-aware ``datetime.datetime``.  The
+                          latest update time of the pull requests is
+                          used if it's later.
+        :param listed: The time the repository was listed in full.
+                       If ``None``, the time of the last full listing
+                       is kept.
+        """
+
+        times = [pull.updated_at for pull in pulls
+                 if pull.updated_at is not None]
+        if watermark is not None:
+            times.append(watermark)
+
+        with self._lock:
+            entry = self.repos.get(repo_name)
+            if listed is None:
+                listed = entry['listed'] if entry else time.time()
+            self.repos[repo_name] = {
+                'listed': listed,
+                'watermark': max(times) if times else None,
+                'pulls': dict((pull.number, pull) for pull in pulls),
+            }
+
+    def count(self, name, value=1):
+        """
+        Increment a statistics counter, if statistics are being
+        collected.
+
+        :param name: The name of the counter.
+        :param value: The amount to increment the counter by.
+        """
+
+        if self.stats is not None and value:
+            self.stats.count(name, value)
+
+    def to_dict(self):
+        """
+        Serialize the store.
+
+        :returns: A dictionary suitable for serializing as JSON.
+        """
+
+        with self._lock:
+            return {
+                'version': VERSION,
+                'repos': dict(
+                    (name, {
+                        'listed': entry['listed'],
+                        'watermark': records.format_time(
+                            entry['watermark']),
+                        'pulls': [pull.to_dict() for _number, pull
+                                  in sorted(entry['pulls'].items())],
+                    })
+                    for name, entry in self.repos.items()
+                ),
+            }
+
+    def write(self, path):
+        """
+        Atomically write the store to a file.
+
+        :param path: The name of the file to write.
+        """
+
+        output.atomic_write(path, u'%s\n' % json.dumps(
+            self.to_dict(), sort_keys=True, separators=(',', ':')))
+
+
+def load(path, max_age=DEFAULT_MAX_AGE, stats=None):
+    """
+    Load the delta store from a file.  If the file doesn't exist yet,
+    the store starts out empty.
+
+    :param path: The name of the file to read.
+    :param max_age: The age, in seconds, beyond which the pull
+                    requests stored for a repository are listed in
+                    full again.
+    :param stats: An optional ``tugboat.stats.Stats`` object to
+                  receive the delta counters.
+
+    :returns: A ``DeltaStore`` object.
+    """
+
+    store = DeltaStore(max_age, stats)
+    if not os.path.exists(path):
+        return store
+
+    with io.open(path, encoding='utf-8') as f:
+        data = json.load(f)
+
+    if data.get('version') != VERSION:
+        raise ValueError('Unsupported delta store version %r in "%s"' %
+                         (data.get('version'), path))
+
+    for name, entry in data.get('repos', {}).items():
+        store.update(name, [records.PullRecord.from_dict(pull)
+                            for pull in entry['pulls']],
+                     records.aware(records.parse_time(entry['watermark'])),
+                     entry['listed'])
+
+    return store
@@ -0,0 +1,417 @@
+# Copyright 2014 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the
+#    License. You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing,
+#    software distributed under the License is distributed on an "AS
+#    IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+#    express or implied. See the License for the specific language
+#    governing permissions and limitations under the License.
+
+import io
+import json
+import threading
+
+try:
+    from urllib import parse
+except ImportError:  # pragma: no cover
+    import urlparse as parse
+
+
+# The host of the public Github
+DEFAULT_HOST = 'github.com'
+
+# The API URL of the public Github
+DEFAULT_URL = 'https://api.github.com'
+
+
+def split_target(name):
+    """
+    Split the name of a repository, user, or organization into the
+    host it's on and the name on that host.  A target on a host other
+    than the default is named with the host as a prefix, e.g.,
+    "ghe.example.com:acme/widgets".
+
+    :param name: The name of the target, as given on the command
+                 line.
+
+    :returns: A tuple of the host, or ``None`` if the name has no
+              host prefix, and the name on that host.
+    """
+
+    host, sep, rest = name.partition(':')
+    if not sep or not host or '/' in host:
+        return None, name
+
+    return host, rest
+
+
+def api_url(host):
+    """
+    Determine the API URL of a host.  The public Github has its own
+    API host; Github Enterprise serves its API under "/api/v3".
+
+    :param host: The host name.
+
+    :returns: The API URL.
+    """
+
+    if host == DEFAULT_HOST:
+        return DEFAULT_URL
+
+    return 'https://%s/api/v3' % host
+
+
+def url_host(url):
+    """
+    Determine the host a given API URL belongs to; this is the
+    inverse of ``api_url()``.
+
+    :param url: The API URL.
+
+    :returns: The host name.
+    """
+
+    if url.rstrip('/') == DEFAULT_URL:
+        return DEFAULT_HOST
+
+    return parse.urlparse(url).netloc
+
+
+def load_credentials(path):
+    """
+    Load the credentials for each host from a file.  The file is a
+    JSON object mapping each host name to an object with the optional
+    keys "username", "password", and "url", the API URL of the host.
+
+    :param path: The name of the file to read.
+
+    :returns: A dictionary mapping host names to dictionaries of
+              credentials.
+    """
+
+    with io.open(path, encoding='utf-8') as f:
+        data = json.load(f)
+
+    if (not isinstance(data, dict) or
+            not all(isinstance(creds, dict) for creds in data.values())):
+        raise ValueError('Credentials file "%s" must map host names to '
+                         'objects' % path)
+
+    return data
+
+
+class HostRepository(object):
+    """
+    Wrap a repository on a host other than the default.  Its full
+    name carries the host as a prefix, so repositories with the same
+    name on different hosts are kept apart in the report, snapshots,
+    checkpoints, and caches.
+    """
+
+    def __init__(self, host, repo):
+        """
+        Initialize a ``HostRepository`` object.
+
+        :param host: The host name.
+        :param repo: The repository object.
+        """
+
+        self._host = host
+        self._repo = repo
+        self.full_name = u'%s:%s' % (host, repo.full_name)
+
+    def __getattr__(self, name):
+        """
+        Delegate attribute access to the underlying repository object.
+
+        :param name: The name of the desired attribute.
+
+        :returns: The value of the desired attribute.
+        """
+
+        return getattr(self._repo, name)
+
+
+class HostOwner(object):
+    """
+    Wrap a user or organization on a host other than the default, so
+    its repositories are wrapped by ``HostRepository``.
+    """
+
+    def __init__(self, host, owner):
+        """
+        Initialize a ``HostOwner`` object.
+
+        :param host: The host name.
+        :param owner: The user or organization object.
+        """
+
+        self._host = host
+        self._owner = owner
+
+    def __getattr__(self, name):
+        """
+        Delegate attribute access to the underlying owner object.
+
+        :param name: The name of the desired attribute.
+
+        :returns: The value of the desired attribute.
+        """
+
+        return getattr(self._owner, name)
+
+    def get_repos(self):
+        """
+        List the repositories of the user or organization.
+
+        :returns: An iterator over ``HostRepository`` objects.
+        """
+
+        for repo in self._owner.get_repos():
+            yield HostRepository(self._host, repo)
+
+
+class HostHandle(object):
+    """
+    Wrap the handle for a host other than the default.  The
+    repositories looked up through it are wrapped by
+    ``HostRepository``, so their names carry the host.
+    """
+
+    def __init__(self, host, gh):
+        """
+        Initialize a ``HostHandle`` object.
+
+        :param host: The host name.
+        :param gh: A ``github.Github`` handle or
+                   ``tugboat.rest.Client`` for the host.
+        """
+
+        self.host = host
+        self.gh = gh
+
+    def get_repo(self, full_name):
+        """
+        Look up a repository.
+
+        :param full_name: The full name of the repository on the host.
+
+        :returns: A ``HostRepository`` object.
+        """
+
+        return HostRepository(self.host, self.gh.get_repo(full_name))
+
+    def get_organization(self, login):
+        """
+        Look up an organization.
+
+        :param login: The name of the organization.
+
+        :returns: A ``HostOwner`` object.
+        """
+
+        return HostOwner(self.host, self.gh.get_organization(login))
+
+    def get_user(self, login):
+        """
+        Look up a user.
+
+        :param login: The login name of the user.
+
+        :returns: A ``HostOwner`` object.
+        """
+
+        return HostOwner(self.host, self.gh.get_user(login))
+
+    def get_repos(self, **kwargs):
+        """
+        List all repositories on the host visible to the user.
+
+        :param kwargs: Keyword arguments for the handle's
+                       ``get_repos()``, such as ``since``.
+
+        :returns: An iterator over ``HostRepository`` objects.
+        """
+
+        for repo in self.gh.get_repos(**kwargs):
+            yield HostRepository(self.host, repo)
+
+
+class Hosts(object):
+    """
+    The handles for each Github host a report covers.  Targets with
+    no host prefix, or prefixed with the default host, are looked up
+    through the default handle; each other host has its own handle,
+    with its own credentials, connections, and rate limit.
+    """
+
+    def __init__(self, default, default_host=DEFAULT_HOST):
+        """
+        Initialize a ``Hosts`` object.
+
+        :param default: The ``github.Github`` handle or
+                        ``tugboat.rest.Client`` for the default host.
+        :param default_host: The name of the default host.
+        """
+
+        self.default = default
+        self.default_host = default_host
+
+        # A dictionary mapping the names of the other hosts to their
+        # handles
+        self.handles = {}
+
+    def add(self, host, gh):
+        """
+        Add the handle for a host.
+
+        :param host: The host name.
+        :param gh: A ``github.Github`` handle or
+                   ``tugboat.rest.Client`` for the host.
+        """
+
+        self.handles[host] = gh
+
+    def all(self):
+        """
+        List the handles for every host, the default first.
+
+        :returns: A list of tuples of the host name and handle.
+        """
+
+        return [(self.default_host, self.default)] + sorted(
+            self.handles.items(), key=lambda x: x[0])
+
+    def group(self, repos):
+        """
+        Group the targets of a report by host.
+
+        :param repos: A list of tuples of the target kind and the
+                      name of the target, as given on the command
+                      line.
+
+        :returns: A list of tuples of the handle to look the targets
+                  up through and a list of the targets on that host,
+                  as tuples of the target kind, the name as given,
+                  and the name on the host.  The default host's
+                  prefix, if given, is dropped from the names of
+                  its targets.  The default host comes
+                  first, followed by the other hosts in the order
+                  they were first named.
+        """
+
+        groups = {}
+        order = []
+        for target, name in repos:
+            host, bare = split_target(name)
+            if host is None or host == self.default_host:
+                host = None
+                name = bare
+            if host not in groups:
+                groups[host] = []
+                order.append(host)
+            groups[host].append((target, name, bare))
+
+        # The sort is stable, so the other hosts stay in order
+        result = []
+        for host in sorted(order, key=lambda x: x is not None):
+            if host is None:
+                handle = self.default
+            else:
+                handle = HostHandle(host, self.handles[host])
+            result.append((handle, groups[host]))
+
+        return result
+
+
+def group(gh, repos):
+    """
+    Group the targets of a report by host.  This is like
+    ``Hosts.group()``, but also accepts a single handle, through which
+    every target is looked up.
+
+    :param gh: A ``Hosts`` object, ``github.Github`` handle, or
+               ``tugboat.rest.Client``.
+    :param repos: A list of tuples of the target kind and the name of
+                  the target.
+
+    :returns: A list of tuples of the handle to look the targets up
+              through and the list of targets; see ``Hosts.group()``.
+    """
+
+    if isinstance(gh, Hosts):
+        return gh.group(repos)
+
+    # With a single handle, a host prefix can only name its host, and
+    # is dropped, as Hosts.group() does for the default host
+    targets = []
+    handle_host = None
+    for target, name in repos:
+        host, bare = split_target(name)
+        if host is not None:
+            if handle_host is None:
+                handle_host = _handle_host(gh)
+            if host == handle_host:
+                name = bare
+        targets.append((target, name, name))
+
+    return [(gh, targets)]
+
+
+def _handle_host(gh):
+    """
+    Determine the host a handle looks targets up on.
+
+    :param gh: A ``github.Github`` handle or ``tugboat.rest.Client``.
+
+    :returns: The host name.
+    """
+
+    from tugboat import requester
+
+    return url_host(requester.get_requester(gh).base_url)
+
+
+def concurrently(func, items):
+    """
+    Call a function on each of a list of items, each in its own
+    thread, and wait for them all to finish.  If any of the calls
+    raises an exception, the first to do so, in the order of the
+    items, is re-raised once all have finished.
+
+    :param func: The function to call.  It is passed the elements of
+                 an item as positional arguments.
+    :param items: A list of tuples of arguments.
+
+    :returns: A list of the results of the calls, in the order of the
+              items.
+    """
+
+    results = [None] * len(items)
+    errors = [None] * len(items)
+
+    def run(idx, args):
+        try:
+            results[idx] = func(*args)
+        except Exception as exc:
+            errors[idx] = exc
+
+    threads = [threading.Thread(target=run, args=(idx, args))
+               for idx, args in enumerate(items)]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for error in errors:
+        if error is not None:
+            raise error
+
+    return results
@@ -0,0 +1,166 @@
+# Copyright 2014 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the
+#    License. You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing,
+#    software distributed under the License is distributed on an "AS
+#    IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+#    express or implied. See the License for the specific language
+#    governing permissions and limitations under the License.
+
+import sys
+import threading
+
+
+# The PyGithub routines which complete a lazy object
+_completers = set(['_completeIfNotSet', '_completeIfNeeded'])
+
+# Modules which only pass attribute accesses through; these are
+# skipped when looking for the call site of an attribute access
+_passthrough = set(['tugboat.pulls'])
+
+
+def _module(frame):
+    """
+    Return the name of the module a frame is executing in.
+    """
+
+    return frame.f_globals.get('__name__', '')
+
+
+def _is_github(frame):
+    """
+    Determine whether a frame is executing in PyGithub.
+    """
+
+    name = _module(frame)
+    return name == 'github' or name.startswith('github.')
+
+
+def find_access(frame):
+    """
+    Given the frame issuing a request, determine whether the request
+    completes a lazy PyGithub object, and if so, which attribute
+    access triggered it and from where.
+
+    :param frame: The frame issuing the request.
+
+    :returns: ``None`` if the request is not a lazy completion.
+              Otherwise, a tuple of the attribute name, qualified by
+              the class name, e.g., "NamedUser.name", and the call
+              site, e.g., "tugboat.reports:435 (report)".
+    """
+
+    # Find the outermost completion routine
+    completer = None
+    while frame is not None:
+        if frame.f_code.co_name in _completers and _is_github(frame):
+            completer = frame
+        elif completer is not None:
+            break
+        frame = frame.f_back
+
+    if completer is None:
+        return None
+
+    # The caller of the completion routine is the attribute accessor;
+    # if that was itself called by PyGithub, as when ``get_repo()``
+    # completes the repository it returns, it's not an attribute
+    # access
+    accessor = completer.f_back
+    if (accessor is None or accessor.f_back is None or
+            _is_github(accessor.f_back)):
+        return None
+    obj = accessor.f_locals.get('self')
+    attr = accessor.f_code.co_name
+    if obj is not None:
+        attr = '%s.%s' % (type(obj).__name__, attr)
+
+    # Now find the call site
+    frame = accessor
+    while frame is not None and (_is_github(frame) or
+                                 _module(frame) in _passthrough):
+        frame = frame.f_back
+    if frame is None:
+        return attr, '<unknown>'
+
+    return attr, '%s:%d (%s)' % (_module(frame), frame.f_lineno,
+                                 frame.f_code.co_name)
+
+
+class LazyTracer(object):
+    """
+    A middleware which records every request issued to complete a
+    lazy PyGithub object.  Accessing an attribute which was not
+    included in a list response causes PyGithub to silently fetch the
+    whole object; in a loop over pull requests, this results in one
+    extra request per pull request.  The tracer groups these requests
+    by attribute name and call site, so they can be found and
+    eliminated.
+    """
+
+    def __init__(self):
+        """
+        Initialize a ``LazyTracer`` object.
+        """
+
+        self.accesses = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, call, verb, url, *args, **kwargs):
+        """
+        Record a request if it completes a lazy object, then pass it
+        on to the next handler.
+
+        :param call: The next handler in the chain.
+        :param verb: The HTTP verb of the request.
+        :param url: The URL of the request.
+
+        :returns: The result of the next handler.
+        """
+
+        access = find_access(sys._getframe(1))
+        if access:
+            with self._lock:
+                sites = self.accesses.setdefault(access[0], {})
+                sites[access[1]] = sites.get(access[1], 0) + 1
+
+        return call(verb, url, *args, **kwargs)
+
+    def to_dict(self):
+        """
+        Summarize the recorded accesses as a dictionary suitable for
+        serializing as JSON.
+
+        :returns: A dictionary mapping attribute names to dictionaries
+                  mapping call sites to request counts.
+        """
+
+        return dict((attr, dict(sites))
+                    for attr, sites in self.accesses.items())
+
+    def format(self):
+        """
+        Format the recorded accesses for human consumption.  The
+        attributes responsible for the most requests are listed
+        first.
+
+        :returns: A list of lines.
+        """
+
+        totals = dict((attr, sum(sites.values()))
+                      for attr, sites in self.accesses.items())
+
+        lines = [u'Lazy completion requests: %d' % sum(totals.values())]
+        for attr in sorted(totals, key=lambda x: (-totals[x], x)):
+            lines.append(u'    %s: %d' % (attr, totals[attr]))
+            sites = self.accesses[attr]
+            for site in sorted(sites, key=lambda x: (-sites[x], x)):
+                lines.append(u'        %s: %d' % (site, sites[site]))
+
+        return lines
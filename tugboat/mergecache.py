@@ -0,0 +1,186 @@
+# Copyright 2014 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the
+#    License. You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing,
+#    software distributed under the License is distributed on an "AS
+#    IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+#    express or implied. See the License for the specific language
+#    governing permissions and limitations under the License.
+
+import io
+import json
+import os
+import threading
+import time
+
+from tugboat import output
+
+
+# The version of the cache file format
+VERSION = 1
+
+# The default age, in seconds, beyond which an unused cache entry is
+# dropped: 30 days
+DEFAULT_MAX_AGE = 30 * 24 * 60 * 60
+
+
+class MergeCache(object):
+    """
+    A persistent cache of the mergeability of pull requests.  Whether
+    a pull request is mergeable depends only on its head commit and
+    the commit at the tip of its base branch, so the answer is keyed
+    on the repository and those two commit IDs.  As long as neither
+    has moved since the answer was cached, it remains correct, and no
+    request need be made to look it up again.
+
+    Each entry records when it was last used; entries which haven't
+    been used for a while, such as those for pull requests which have
+    since been closed or pushed to, are dropped when the cache is
+    saved.
+    """
+
+    def __init__(self, max_age=DEFAULT_MAX_AGE, stats=None):
+        """
+        Initialize a ``MergeCache`` object.
+
+        :param max_age: The age, in seconds, beyond which an unused
+                        entry is dropped when the cache is saved.
+        :param stats: An optional ``tugboat.stats.Stats`` object to
+                      receive the cache hit rate, as the "mergeable"
+                      cache.
+        """
+
+        self.max_age = max_age
+        self.stats = stats
+
+        # A dictionary mapping keys to lists of the mergeability and
+        # the time the entry was last used
+        self.entries = {}
+
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(repo_name, head_sha, base_sha):
+        """
+        Compute the key for a cache entry.
+
+        :param repo_name: The full name of the repository.
+        :param head_sha: The commit ID of the head of the pull
+                         request.
+        :param base_sha: The commit ID of the tip of the base branch.
+
+        :returns: The key.
+        """
+
+        return u'%s %s %s' % (repo_name, head_sha, base_sha)
+
+    def get(self, repo_name, head_sha, base_sha):
+        """
+        Look up the mergeability of a pull request.
+
+        :param repo_name: The full name of the repository.
+        :param head_sha: The commit ID of the head of the pull
+                         request.
+        :param base_sha: The commit ID of the tip of the base branch.
+
+        :returns: ``True`` or ``False`` if the mergeability is cached,
+                  or ``None`` if it isn't.
+        """
+
+        with self._lock:
+            entry = self.entries.get(self.key(repo_name, head_sha,
+                                              base_sha))
+            if entry is not None:
+                entry[1] = int(time.time())
+
+        if self.stats is not None:
+            self.stats.cache('mergeable', entry is not None)
+
+        return None if entry is None else entry[0]
+
+    def set(self, repo_name, head_sha, base_sha, mergeable):
+        """
+        Cache the mergeability of a pull request.  Github reports the
+        mergeability as ``None`` while it's still being computed;
+        that isn't cached.
+
+        :param repo_name: The full name of the repository.
+        :param head_sha: The commit ID of the head of the pull
+                         request.
+        :param base_sha: The commit ID of the tip of the base branch.
+        :param mergeable: Whether the pull request is mergeable.
+        """
+
+        if mergeable is None:
+            return
+
+        with self._lock:
+            self.entries[self.key(repo_name, head_sha, base_sha)] = [
+                bool(mergeable), int(time.time()),
+            ]
+
+    def to_dict(self):
+        """
+        Serialize the cache, dropping entries which haven't been used
+        within the maximum age.
+
+        :returns: A dictionary suitable for serializing as JSON.
+        """
+
+        cutoff = time.time() - self.max_age
+        with self._lock:
+            entries = dict((key, entry)
+                           for key, entry in self.entries.items()
+                           if entry[1] >= cutoff)
+
+        return {
+            'version': VERSION,
+            'entries': entries,
+        }
+
+    def write(self, path):
+        """
+        Atomically write the cache to a file.
+
+        :param path: The name of the file to write.
+        """
+
+        output.atomic_write(path, u'%s\n' % json.dumps(
+            self.to_dict(), sort_keys=True, separators=(',', ':')))
+
+
+def load(path, max_age=DEFAULT_MAX_AGE, stats=None):
+    """
+    Load the mergeability cache from a file.  If the file doesn't
+    exist yet, the cache starts out empty.
+
+    :param path: The name of the file to read.
+    :param max_age: The age, in seconds, beyond which an unused entry
+                    is dropped when the cache is saved.
+    :param stats: An optional ``tugboat.stats.Stats`` object to
+                  receive the cache hit rate.
+
+    :returns: A ``MergeCache`` object.
+    """
+
+    cache = MergeCache(max_age, stats)
+    if not os.path.exists(path):
+        return cache
+
+    with io.open(path, encoding='utf-8') as f:
+        data = json.load(f)
+
+    if data.get('version') != VERSION:
+        raise ValueError('Unsupported mergeability cache version %r in '
+                         '"%s"' % (data.get('version'), path))
+
+    cache.entries = dict((key, list(entry))
+                         for key, entry in data.get('entries', {}).items())
+
+    return cache
@@ -0,0 +1,198 @@
+# Copyright 2014 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the
+#    License. You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing,
+#    software distributed under the License is distributed on an "AS
+#    IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+#    express or implied. See the License for the specific language
+#    governing permissions and limitations under the License.
+
+import threading
+import time
+
+from tugboat import output
+from tugboat import requester
+
+
+# Per-repository gauges: the metric name, the help text, and the
+# name of the attribute holding the value
+_repo_gauges = [
+    ('tugboat_open_pulls', 'Number of open pull requests.', 'pulls'),
+    ('tugboat_mergeable_pulls', 'Number of mergeable open pull requests.',
+     'mergeable'),
+    ('tugboat_oldest_pull_age_seconds',
+     'Age of the oldest open pull request.', 'oldest_age'),
+]
+
+
+def _escape(value):
+    """
+    Escape a label value for the OpenMetrics text format.
+
+    :param value: The label value.
+
+    :returns: The escaped label value.
+    """
+
+    return (value.replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+class RepoMetrics(object):
+    """
+    Hold the metrics for a single repository.
+    """
+
+    def __init__(self, name, pulls, mergeable, oldest_age):
+        """
+        Initialize a ``RepoMetrics`` object.
+
+        :param name: The full name of the repository.
+        :param pulls: The number of open pull requests.
+        :param mergeable: The number of mergeable open pull requests.
+        :param oldest_age: The age of the oldest open pull request, in
+                           seconds.
+        """
+
+        self.name = name
+        self.pulls = pulls
+        self.mergeable = mergeable
+        self.oldest_age = oldest_age
+
+
+class Metrics(object):
+    """
+    Collect metrics for export in the OpenMetrics text format, e.g.,
+    to the Prometheus node exporter's textfile collector.  Per
+    repository, the number of open pull requests, the number of
+    mergeable pull requests, and the age of the oldest pull request
+    are exported.  For the run as a whole, the duration, the number of
+    API requests, and the remaining rate limit are exported.  A
+    ``Metrics`` object is a middleware; install it with
+    ``tugboat.requester.add_middleware()`` to count API requests.
+    """
+
+    def __init__(self):
+        """
+        Initialize a ``Metrics`` object.
+        """
+
+        self.repos = []
+        self.requests = 0
+        self.start = None
+        self.end = None
+
+        self._lock = threading.Lock()
+
+    def __call__(self, call, verb, url, *args, **kwargs):
+        """
+        Count a request and pass it on to the next handler.
+
+        :param call: The next handler in the chain.
+        :param verb: The HTTP verb of the request.
+        :param url: The URL of the request.
+
+        :returns: The result of the next handler.
+        """
+
+        with self._lock:
+            self.requests += 1
+
+        return call(verb, url, *args, **kwargs)
+
+    def start_run(self):
+        """
+        Mark the start of the run.
+        """
+
+        self.start = time.time()
+
+    def end_run(self):
+        """
+        Mark the end of the run.
+        """
+
+        self.end = time.time()
+
+    def add_repo(self, name, pulls, mergeable, oldest_age):
+        """
+        Add the metrics for a repository.
+
+        :param name: The full name of the repository.
+        :param pulls: The number of open pull requests.
+        :param mergeable: The number of mergeable open pull requests.
+        :param oldest_age: The age of the oldest open pull request, in
+                           seconds.
+        """
+
+        self.repos.append(RepoMetrics(name, pulls, mergeable, oldest_age))
+
+    def format(self, gh=None):
+        """
+        Format the metrics in the OpenMetrics text format.
+
+        :param gh: An optional ``github.Github`` handle.  If provided,
+                   the remaining rate limit last reported by the
+                   Github API is exported.  No request is made to
+                   determine the rate limit.
+
+        :returns: A list of lines.
+        """
+
+        lines = []
+        for metric, help_text, attr in _repo_gauges:
+            lines.append(u'# TYPE %s gauge' % metric)
+            lines.append(u'# HELP %s %s' % (metric, help_text))
+            for repo in sorted(self.repos, key=lambda x: x.name):
+                lines.append(u'%s{repo="%s"} %s' %
+                             (metric, _escape(repo.name),
+                              getattr(repo, attr)))
+
+        run_gauges = [
+            ('tugboat_run_duration_seconds', 'Duration of the run.',
+             (self.end - self.start) if self.end else None),
+            ('tugboat_run_timestamp_seconds', 'Time the run ended.',
+             self.end),
+            ('tugboat_api_requests', 'Number of API requests made by the run.',
+             self.requests),
+        ]
+        if gh is not None:
+            remaining = requester.get_requester(gh).rate_limiting[0]
+            if remaining >= 0:
+                run_gauges.append((
+                    'tugboat_rate_limit_remaining',
+                    'Remaining API rate limit at the end of the run.',
+                    remaining,
+                ))
+
+        for metric, help_text, value in run_gauges:
+            if value is None:
+                continue
+            lines.append(u'# TYPE %s gauge' % metric)
+            lines.append(u'# HELP %s %s' % (metric, help_text))
+            lines.append(u'%s %s' % (metric, value))
+
+        lines.append(u'# EOF')
+
+        return lines
+
+    def write(self, path, gh=None):
+        """
+        Atomically write the metrics to a file.
+
+        :param path: The name of the file to write.  For the
+                     Prometheus node exporter's textfile collector,
+                     this should be a file with a ".prom" extension
+                     in the collector's directory.
+        :param gh: An optional ``github.Github`` handle.  See
+                   ``format()``.
+        """
+
+        output.atomic_write(path, u''.join(u'%s\n' % line
+                                           for line in self.format(gh)))
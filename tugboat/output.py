@@ -0,0 +1,214 @@
+# Copyright 2014 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the
+#    License. You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing,
+#    software distributed under the License is distributed on an "AS
+#    IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+#    express or implied. See the License for the specific language
+#    governing permissions and limitations under the License.
+
+import io
+import os
+import tempfile
+
+
+# The size of the buffer used when writing output files; writes are
+# batched into chunks of this size
+BUFSIZE = 1024 * 1024
+
+
+class AtomicFile(object):
+    """
+    A text file which is written atomically.  The text is written,
+    through a large buffer, to a temporary file in the same directory
+    as the target file; when the file is closed, the temporary file is
+    renamed into place, so readers never see a partially written file.
+    If writing fails, ``abort()`` discards the temporary file, leaving
+    any existing file untouched.  An ``AtomicFile`` may be used as a
+    context manager, in which case it is closed if the ``with`` block
+    succeeds and aborted otherwise.
+    """
+
+    def __init__(self, path, bufsize=BUFSIZE, binary=False):
+        """
+        Initialize an ``AtomicFile`` object.
+
+        :param path: The name of the file to write.
+        :param bufsize: The size of the write buffer.  Defaults to
+                        ``BUFSIZE``.
+        :param binary: If ``True``, the file is written as bytes,
+                       rather than text.
+        """
+
+        self.path = path
+
+        dirname, basename = os.path.split(os.path.abspath(path))
+        fd, self.tmp = tempfile.mkstemp(prefix='.%s.' % basename,
+                                        dir=dirname)
+        try:
+            if binary:
+                self._file = io.open(fd, 'wb', buffering=bufsize)
+            else:
+                self._file = io.open(fd, 'w', encoding='utf-8',
+                                     buffering=bufsize)
+        except Exception:
+            os.close(fd)
+            os.unlink(self.tmp)
+            raise
+
+    def __enter__(self):
+        """
+        Enter the context.
+
+        :returns: The ``AtomicFile`` object.
+        """
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        """
+        Exit the context.  The file is closed, and thus renamed into
+        place, if no exception occurred; otherwise, it is aborted.
+
+        :param exc_type: The type of the exception, if any.
+        :param exc_value: The exception, if any.
+        :param exc_tb: The traceback of the exception, if any.
+
+        :returns: ``None``, so that any exception is propagated.
+        """
+
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    @property
+    def closed(self):
+        """
+        ``True`` if the file has been closed or aborted.
+        """
+
+        return self._file.closed
+
+    def write(self, text):
+        """
+        Write text, or bytes, to the file.
+
+        :param text: The text to write.
+
+        :returns: The number of characters written.
+        """
+
+        return self._file.write(text)
+
+    def flush(self):
+        """
+        Flush the write buffer to the temporary file.
+        """
+
+        self._file.flush()
+
+    def close(self):
+        """
+        Close the file.  The text is synced to disk, then the temporary
+        file is renamed into place.  Does nothing if the file has
+        already been closed or aborted.
+        """
+
+        if self._file.closed:
+            return
+
+        try:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            os.chmod(self.tmp, 0o644)
+            os.rename(self.tmp, self.path)
+        except Exception:
+            self.abort()
+            raise
+
+    def abort(self):
+        """
+        Abandon the file.  The temporary file is removed, leaving any
+        existing file untouched.
+        """
+
+        if not self._file.closed:
+            self._file.close()
+        if os.path.exists(self.tmp):
+            os.unlink(self.tmp)
+
+
+def atomic_write(path, text):
+    """
+    Write a file atomically.  See ``AtomicFile``.
+
+    :param path: The name of the file to write.
+    :param text: The text to write to the file.
+    """
+
+    with AtomicFile(path) as f:
+        f.write(text)
+
+
+def repo_path(directory, full_name, ext='.txt'):
+    """
+    Compute the name of the file a repository's part of a split report
+    is written to.  Each owner gets a subdirectory, which is created
+    if necessary.
+
+    :param directory: The directory containing the split report.
+    :param full_name: The full name of the repository, e.g.,
+                      "owner/repo".
+    :param ext: The extension for the file name.  Defaults to ".txt".
+
+    :returns: The name of the file.
+    """
+
+    owner, _sep, name = full_name.rpartition('/')
+    dirname = os.path.join(directory, owner) if owner else directory
+    try:
+        os.makedirs(dirname)
+    except OSError:
+        if not os.path.isdir(dirname):
+            raise
+
+    return os.path.join(dirname, name + ext)
+
+
+def write_files(files, workers=8):
+    """
+    Atomically write several files in parallel.  Writing is dominated
+    by I/O, particularly on network file systems, so a pool of threads
+    is used.
+
+    :param files: A dictionary mapping file names to the text to write
+                  to them.
+    :param workers: The maximum number of files to write at once.
+                    Defaults to 8.
+    """
+
+    if not files:
+        return
+
+    from multiprocessing import pool
+
+    workers = min(workers, len(files))
+    if workers <= 1:
+        for path, text in files.items():
+            atomic_write(path, text)
+        return
+
+    threads = pool.ThreadPool(workers)
+    try:
+        threads.map(lambda item: atomic_write(*item), list(files.items()))
+    finally:
+        threads.close()
+        threads.join()
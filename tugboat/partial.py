@@ -0,0 +1,137 @@
+# Copyright 2014 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the
+#    License. You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing,
+#    software distributed under the License is distributed on an "AS
+#    IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+#    express or implied. See the License for the specific language
+#    governing permissions and limitations under the License.
+
+import io
+import json
+
+from tugboat import output
+from tugboat import records
+
+
+# The version of the partial report file format
+VERSION = 1
+
+
+class PartialReport(object):
+    """
+    A machine-readable partial report, for combining the results of
+    several runs, such as one per shard, into a single report.  A
+    partial report is a file of JSON lines: the first line is a header
+    giving the format version, the order the pull requests are sorted
+    in, the shard the report covers, and any repositories which were
+    skipped, and each following line is a
+    ``tugboat.records.PullRecord`` in that order.
+    """
+
+    def __init__(self, sort_by='created', shard=None, generated=None):
+        """
+        Initialize a ``PartialReport`` object.
+
+        :param sort_by: The order the pull requests are sorted in; see
+                        ``tugboat.reports.sort_keys``.
+        :param shard: An optional ``tugboat.shard.Shard`` object
+                      identifying the shard the report covers.
+        :param generated: The time the report was generated, as a
+                          naive UTC ``datetime.datetime``.
+        """
+
+        self.sort_by = sort_by
+        self.shard = shard
+        self.generated = generated
+        self.records = []
+
+        # A list of tuples of the names of the repositories which were
+        # skipped or timed out and the reasons
+        self.skipped = []
+
+    def add(self, record):
+        """
+        Add a pull request to the partial report.  Pull requests must
+        be added in order.
+
+        :param record: A ``tugboat.records.PullRecord`` object.
+        """
+
+        self.records.append(record)
+
+    def header(self):
+        """
+        Construct the header of the partial report.
+
+        :returns: A dictionary suitable for serializing as JSON.
+        """
+
+        return {
+            'version': VERSION,
+            'sort_by': self.sort_by,
+            'shard': str(self.shard) if self.shard else None,
+            'generated': records.format_time(self.generated),
+            'skipped': [list(item) for item in self.skipped],
+            'pulls': len(self.records),
+        }
+
+    def write(self, path):
+        """
+        Atomically write the partial report to a file.
+
+        :param path: The name of the file to write.
+        """
+
+        with output.AtomicFile(path) as f:
+            f.write(u'%s\n' % _dumps(self.header()))
+            for record in self.records:
+                f.write(u'%s\n' % _dumps(record.to_dict()))
+
+
+def _dumps(data):
+    """
+    Serialize a dictionary as a compact JSON line.
+
+    :param data: The dictionary.
+
+    :returns: The JSON text.
+    """
+
+    return json.dumps(data, sort_keys=True, separators=(',', ':'))
+
+
+def read(path):
+    """
+    Read a partial report.  The records are read lazily, one at a
+    time, so the size of the file doesn't matter.
+
+    :param path: The name of the file to read.
+
+    :returns: A tuple of the header, as a dictionary, and an iterator
+              over the ``tugboat.records.PullRecord`` objects.
+    """
+
+    f = io.open(path, encoding='utf-8')
+    try:
+        header = json.loads(f.readline() or '{}')
+        if header.get('version') != VERSION:
+            raise ValueError('Unsupported partial report version %r in '
+                             '"%s"' % (header.get('version'), path))
+    except Exception:
+        f.close()
+        raise
+
+    def _records():
+        with f:
+            for line in f:
+                if line.strip():
+                    yield records.PullRecord.from_dict(json.loads(line))
+
+    return header, _records()
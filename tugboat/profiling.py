@@ -0,0 +1,273 @@
+# Copyright 2014 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the
+#    License. You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing,
+#    software distributed under the License is distributed on an "AS
+#    IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+#    express or implied. See the License for the specific language
+#    governing permissions and limitations under the License.
+
+from __future__ import print_function
+
+import io
+import sys
+import threading
+
+
+class CPUProfiler(object):
+    """
+    Profile CPU usage with ``cProfile``.  The profiler is a listener
+    for a ``tugboat.stats.Stats`` object; a separate profile is
+    collected for each phase of the run.  When the run finishes, the
+    profiles are dumped in ``pstats`` format: each phase to a file
+    named by appending the phase name to the output file name, e.g.,
+    "tugboat.pstats.render", and all the phases combined to the output
+    file itself.
+
+    ``cProfile`` only sees the thread which enabled it, so each thread
+    started during a phase, such as the workers fetching repositories
+    concurrently, is given a profile of its own, which is merged into
+    the profile of that phase.  Where ``cProfile`` already sees every
+    thread, as it does from Python 3.12, this isn't needed.
+    """
+
+    default_output = 'tugboat.pstats'
+
+    def __init__(self, output=None):
+        """
+        Initialize a ``CPUProfiler`` object.
+
+        :param output: The name of the file to dump the combined
+                       profile to.  Defaults to "tugboat.pstats".
+        """
+
+        self.output = output or self.default_output
+        self.phases = []
+        self.profiles = {}
+
+        # The profiles of the threads started during each phase, and
+        # the phase running now
+        self.threads = {}
+        self._current = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """
+        Start profiling.  Profiling only occurs within phases, so this
+        does nothing.
+        """
+
+        pass
+
+    def phase_start(self, name):
+        """
+        Called when a phase starts.  Enables the profile for the phase.
+
+        :param name: The name of the phase.
+        """
+
+        import cProfile
+
+        if name not in self.profiles:
+            self.phases.append(name)
+            self.profiles[name] = cProfile.Profile()
+            self.threads[name] = []
+        self._current = name
+        if not hasattr(sys, 'monitoring'):
+            threading.setprofile(self._thread_start)
+        self.profiles[name].enable()
+
+    def phase_end(self, name):
+        """
+        Called when a phase ends.  Disables the profile for the phase.
+        Threads already started keep adding to their profiles.
+
+        :param name: The name of the phase.
+        """
+
+        self.profiles[name].disable()
+        self._current = None
+        if not hasattr(sys, 'monitoring'):
+            threading.setprofile(None)
+
+    def _thread_start(self, frame, event, arg):
+        """
+        The profile function installed in each thread started during a
+        phase.  It's called once, on the thread's first event, and
+        replaces itself with a profile of the thread's own.
+
+        :param frame: The current stack frame.
+        :param event: The name of the event.
+        :param arg: The event argument.
+        """
+
+        import cProfile
+
+        sys.setprofile(None)
+        name = self._current
+        if name is None:
+            return
+
+        profile = cProfile.Profile()
+        with self._lock:
+            self.threads[name].append(profile)
+        profile.enable()
+
+    def finish(self):
+        """
+        Finish profiling and dump the collected profiles.
+        """
+
+        import pstats
+
+        combined = None
+        for name in self.phases:
+            phase = pstats.Stats(self.profiles[name])
+            with self._lock:
+                for profile in self.threads[name]:
+                    phase.add(profile)
+            phase.dump_stats('%s.%s' % (self.output, name))
+            if combined is None:
+                combined = phase
+            else:
+                combined.add(phase)
+
+        if combined is not None:
+            combined.dump_stats(self.output)
+
+
+class MemoryProfiler(object):
+    """
+    Profile memory usage with ``tracemalloc``.  The profiler is a
+    listener for a ``tugboat.stats.Stats`` object; a snapshot is taken
+    at the end of each phase of the run, and the top allocators at
+    that point, along with the allocators which grew the most during
+    the phase, are reported when the run finishes.  If a phase is
+    entered several times, the last snapshot for the phase is
+    reported.
+    """
+
+    default_output = '-'
+
+    def __init__(self, output=None, limit=10):
+        """
+        Initialize a ``MemoryProfiler`` object.
+
+        :param output: The name of the file to write the report to.
+                       If "-", which is the default, the report is
+                       emitted to standard error.
+        :param limit: The number of allocators to report for each
+                      phase.  Defaults to 10.
+        """
+
+        self.output = output or self.default_output
+        self.limit = limit
+        self.phases = []
+        self.results = {}
+
+        self._tracemalloc = None
+        self._last = None
+
+    def start(self):
+        """
+        Start tracing memory allocations.
+        """
+
+        import tracemalloc
+
+        self._tracemalloc = tracemalloc
+        tracemalloc.start()
+        self._last = self._snapshot()
+
+    def _snapshot(self):
+        """
+        Take a snapshot, excluding the allocations made by
+        ``tracemalloc`` itself.
+
+        :returns: A ``tracemalloc.Snapshot`` object.
+        """
+
+        return self._tracemalloc.take_snapshot().filter_traces([
+            self._tracemalloc.Filter(False, self._tracemalloc.__file__),
+        ])
+
+    def phase_start(self, name):
+        """
+        Called when a phase starts.  Nothing needs to be done.
+
+        :param name: The name of the phase.
+        """
+
+        pass
+
+    def phase_end(self, name):
+        """
+        Called when a phase ends.  Takes a snapshot and records the
+        top allocators.
+
+        :param name: The name of the phase.
+        """
+
+        snapshot = self._snapshot()
+        current, peak = self._tracemalloc.get_traced_memory()
+
+        if name not in self.results:
+            self.phases.append(name)
+        self.results[name] = {
+            'current': current,
+            'peak': peak,
+            'top': snapshot.statistics('lineno')[:self.limit],
+            'growth': snapshot.compare_to(self._last,
+                                          'lineno')[:self.limit],
+        }
+        self._last = snapshot
+
+    def finish(self):
+        """
+        Stop tracing memory allocations and emit the report.
+        """
+
+        self._tracemalloc.stop()
+
+        lines = self.format()
+        if self.output == '-':
+            for line in lines:
+                print(line, file=sys.stderr)
+        else:
+            with io.open(self.output, 'w', encoding='utf-8') as f:
+                for line in lines:
+                    f.write(u'%s\n' % line)
+
+    def format(self):
+        """
+        Format the memory profile for human consumption.
+
+        :returns: A list of lines.
+        """
+
+        lines = [u'Memory profile:']
+        for name in self.phases:
+            result = self.results[name]
+            lines.append(u'    After %s: %d bytes current, %d bytes peak' %
+                         (name, result['current'], result['peak']))
+            lines.append(u'        Top allocators:')
+            for stat in result['top']:
+                lines.append(u'            %s' % stat)
+            lines.append(u'        Largest growth during phase:')
+            for stat in result['growth']:
+                lines.append(u'            %s' % stat)
+
+        return lines
+
+
+# Used to translate the profile type into a profiler class
+profilers = {
+    'cpu': CPUProfiler,
+    'mem': MemoryProfiler,
+}
@@ -0,0 +1,409 @@
+# Copyright 2014 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the
+#    License. You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing,
+#    software distributed under the License is distributed on an "AS
+#    IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+#    express or implied. See the License for the specific language
+#    governing permissions and limitations under the License.
+
+from __future__ import print_function
+
+import io
+import json
+import sys
+import threading
+import time
+
+from tugboat import stats
+
+
+# The default minimum interval between redraws of the status line, in
+# seconds
+DEFAULT_INTERVAL = 0.5
+
+# The number of repositories named when the schedule is displayed
+SCHEDULE_REPOS = 3
+
+
+def format_eta(seconds):
+    """
+    Format an estimated time remaining.
+
+    :param seconds: The estimated time remaining, in seconds, or
+                    ``None`` if it can't be estimated.
+
+    :returns: The formatted time, e.g., "1h02m", "3m07s", or "12s".
+    """
+
+    if seconds is None:
+        return u'?'
+
+    seconds = int(round(seconds))
+    if seconds >= 3600:
+        return u'%dh%02dm' % (seconds // 3600, seconds % 3600 // 60)
+    if seconds >= 60:
+        return u'%dm%02ds' % (seconds // 60, seconds % 60)
+    return u'%ds' % seconds
+
+
+def format_status(event):
+    """
+    Format the status line for a progress event.
+
+    :param event: The progress event; see ``Progress.emit()``.
+
+    :returns: The status line.
+    """
+
+    position = u''
+    if event.get('count'):
+        position = u'[%d/%d] ' % (event['index'] + 1, event['count'])
+
+    return (u'%s%d repos, %d pulls | %.1f repos/s, %.1f pulls/s | '
+            u'%d in flight | ETA %s' %
+            (position, event['repos'], event['pulls'],
+             event['repos_per_sec'], event['pulls_per_sec'],
+             event['in_flight'], format_eta(event['eta'])))
+
+
+class Progress(object):
+    """
+    Track the progress of a run and deliver it as a stream of
+    structured events.  Each event is a dictionary giving the kind of
+    event, the time since the run started, the repositories and pull
+    requests fetched so far and the rate at which they're being
+    fetched, the number of requests in flight, and an estimate of the
+    time remaining for the current target; see ``emit()``.  Events are
+    delivered to each of a list of sinks, such as ``TerminalSink`` and
+    ``JsonLinesSink`` objects.
+
+    Progress is only ever computed from data already at hand, such as
+    the number of pull requests in a repository; nothing is ever
+    looked up to report it.  A ``Progress`` object is a middleware;
+    install it with ``tugboat.requester.add_middleware()`` to track
+    the requests in flight.
+    """
+
+    def __init__(self, sinks=None):
+        """
+        Initialize a ``Progress`` object.
+
+        :param sinks: A list of callables, each of which is passed
+                      every event.
+        """
+
+        self.sinks = sinks or []
+        self.repos = 0
+        self.pulls = 0
+        self.requests = 0
+        self.in_flight = 0
+
+        # The position within the current target: a tuple of the
+        # index of the repository and the number of repositories
+        self._position = None
+        self._start = None
+        self._lock = threading.Lock()
+
+    def __call__(self, call, verb, url, *args, **kwargs):
+        """
+        Track a request while it's in flight.
+
+        :param call: The next handler in the chain.
+        :param verb: The HTTP verb of the request.
+        :param url: The URL of the request.
+
+        :returns: The result of the next handler.
+        """
+
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+        try:
+            return call(verb, url, *args, **kwargs)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def start(self):
+        """
+        Mark the start of the run, and emit a "start" event.
+        """
+
+        self._start = stats.clock()
+        self.emit('start')
+
+    def finish(self):
+        """
+        Mark the end of fetching, and emit a "finish" event.
+        """
+
+        self.emit('finish')
+
+    def target(self, target, name):
+        """
+        Emit a "target" event, when a target, such as an organization,
+        is about to be looked up.
+
+        :param target: The kind of target: "repo", "user", or
+                       "organization".
+        :param name: The name of the target.
+        """
+
+        self._position = None
+        self.emit('target', target=target, name=name)
+
+    def message(self, text):
+        """
+        Emit a "message" event, carrying a status message.
+
+        :param text: The status message.
+        """
+
+        self.emit('message', message=text)
+
+    def repo_callback(self, idx, count, repo, pulls=None):
+        """
+        A ``repo_callback`` which emits a "repo_start" event before
+        each repository is fetched, and a "repo_done" event after.
+
+        :param idx: The index of the repository in the list being
+                    processed.
+        :param count: The number of repositories in the list being
+                      processed, or ``None`` if it isn't known.
+        :param repo: The repository being processed.
+        :param pulls: The list of pull requests for the repository;
+                      only their number is used.
+        """
+
+        self._position = (idx, count)
+        if pulls is None:
+            self.emit('repo_start', repo=repo.full_name)
+            return
+
+        with self._lock:
+            self.repos += 1
+            self.pulls += len(pulls)
+        self.emit('repo_done', repo=repo.full_name, repo_pulls=len(pulls))
+
+    def emit(self, kind, **data):
+        """
+        Emit an event to each of the sinks.  The event is a dictionary
+        containing ``data`` and the keys "event", the kind of event;
+        "time", the wall clock time; "elapsed", the number of seconds
+        since the run started; "repos" and "pulls", the number of
+        repositories and pull requests fetched; "repos_per_sec" and
+        "pulls_per_sec", the rates at which they're being fetched;
+        "requests" and "in_flight", the number of requests issued and
+        in flight; "index" and "count", the position within the
+        current target, if known; and "eta", the estimated number of
+        seconds until the current target is fetched, or ``None``.
+
+        :param kind: The kind of event, e.g., "repo_done".
+        :param data: Additional data for the event.
+        """
+
+        if self._start is None:
+            self._start = stats.clock()
+        elapsed = stats.clock() - self._start
+
+        with self._lock:
+            event = dict(data, event=kind, time=time.time(),
+                         elapsed=elapsed, repos=self.repos,
+                         pulls=self.pulls, requests=self.requests,
+                         in_flight=self.in_flight)
+
+        rate = event['repos'] / elapsed if elapsed > 0 else 0.0
+        event['repos_per_sec'] = rate
+        event['pulls_per_sec'] = (event['pulls'] / elapsed
+                                  if elapsed > 0 else 0.0)
+
+        event['index'] = event['count'] = event['eta'] = None
+        if self._position is not None:
+            event['index'], event['count'] = self._position
+        if event['count'] is not None:
+            remaining = event['count'] - event['index']
+            if kind == 'repo_done':
+                remaining -= 1
+            if rate > 0:
+                event['eta'] = remaining / rate
+
+        for sink in self.sinks:
+            sink(event)
+
+    def close(self):
+        """
+        Close any sinks which need closing.
+        """
+
+        for sink in self.sinks:
+            if hasattr(sink, 'close'):
+                sink.close()
+
+
+class TerminalSink(object):
+    """
+    A progress sink which displays a status line on a terminal.  To
+    keep the cost of drawing down, the status line is redrawn at most
+    once per interval; on a terminal, it's redrawn in place, and
+    otherwise, it's emitted as a new line.  Status messages, and the
+    targets being looked up, are emitted on lines of their own.
+    Events may be emitted from several threads at once, so they're
+    displayed one at a time.
+    """
+
+    def __init__(self, stream=None, interval=DEFAULT_INTERVAL,
+                 verbose=False):
+        """
+        Initialize a ``TerminalSink`` object.
+
+        :param stream: The stream to draw on.  Defaults to
+                       ``sys.stderr``.
+        :param interval: The minimum interval between redraws, in
+                         seconds.
+        :param verbose: If ``True``, a line is also emitted as each
+                        repository is fetched.
+        """
+
+        self.stream = stream or sys.stderr
+        self.interval = interval
+        self.verbose = verbose
+
+        isatty = getattr(self.stream, 'isatty', None)
+        self.tty = bool(isatty and isatty())
+
+        self._last = None
+        self._drawn = False
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        """
+        Display a progress event.
+
+        :param event: The progress event; see ``Progress.emit()``.
+        """
+
+        with self._lock:
+            self._display(event)
+
+    def _display(self, event):
+        """
+        Display a progress event.  The caller must hold the lock.
+
+        :param event: The progress event; see ``Progress.emit()``.
+        """
+
+        kind = event['event']
+        if kind == 'message':
+            self._line(event['message'])
+        elif kind == 'target':
+            self._line(u'Looking up %s "%s"...' %
+                       (event['target'], event['name']))
+        elif kind == 'schedule':
+            if self.verbose:
+                names = event['order'][:SCHEDULE_REPOS]
+                if len(event['order']) > SCHEDULE_REPOS:
+                    names.append(u'...')
+                self._line(u'Fetching %d repositories in "%s" order: %s' %
+                           (len(event['order']), event['policy'],
+                            u', '.join(names)))
+        elif kind == 'finish':
+            self._draw(event, True)
+            if self._drawn:
+                self.stream.write(u'\n')
+                self._drawn = False
+        elif kind in ('repo_start', 'repo_done'):
+            if kind == 'repo_done' and self.verbose:
+                # When streaming, e.g., with "--all", the number of
+                # repositories isn't known
+                if event['count'] is None:
+                    position = u'%d/?' % (event['index'] + 1)
+                else:
+                    position = u'%d/%d' % (event['index'] + 1,
+                                           event['count'])
+                self._line(u'Fetched repository "%s" (%s): %d pulls' %
+                           (event['repo'], position, event['repo_pulls']))
+            self._draw(event)
+
+    def _line(self, text):
+        """
+        Emit a line, clearing any status line first.
+
+        :param text: The text of the line.
+        """
+
+        if self._drawn:
+            self.stream.write(u'\r\x1b[K')
+            self._drawn = False
+        print(text, file=self.stream)
+
+        # Redraw the status line after the message
+        self._last = None
+
+    def _draw(self, event, force=False):
+        """
+        Draw the status line, unless it was drawn too recently.
+
+        :param event: The progress event.
+        :param force: If ``True``, draw the status line regardless.
+        """
+
+        if (not force and self._last is not None and
+                event['elapsed'] - self._last < self.interval):
+            return
+        self._last = event['elapsed']
+
+        text = format_status(event)
+        if self.tty:
+            self.stream.write(u'\r%s\x1b[K' % text)
+            self.stream.flush()
+            self._drawn = True
+        else:
+            print(text, file=self.stream)
+
+
+class JsonLinesSink(object):
+    """
+    A progress sink which writes each event to a file as a line of
+    JSON, for consumption by other programs, such as a job scheduler.
+    Each line is flushed as it's written, so the file may be followed
+    while the run is in progress.
+    """
+
+    def __init__(self, path):
+        """
+        Initialize a ``JsonLinesSink`` object.
+
+        :param path: The name of the file to write.
+        """
+
+        self.path = path
+        self._file = io.open(path, 'w', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        """
+        Write a progress event.
+
+        :param event: The progress event; see ``Progress.emit()``.
+        """
+
+        line = u'%s\n' % json.dumps(event, sort_keys=True,
+                                    separators=(',', ':'))
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        """
+        Close the file.
+        """
+
+        if not self._file.closed:
+            self._file.close()
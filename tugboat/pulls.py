@@ -13,6 +13,12 @@
 #    express or implied. See the License for the specific language
 #    governing permissions and limitations under the License.
 
+import operator
+import threading
+import time
+
+from tugboat import records
+
 
 class PullRequest(object):
     """
@@ -22,7 +28,10 @@ class PullRequest(object):
     """
 
     @classmethod
-    def _from_repos(cls, repos, repo_callback):
+    def _from_repos(cls, repos, repo_callback, repo_filter=None,
+                    deadline=None, checkpoint=None, merge_cache=None,
+                    stream=False, scheduler=None, delta=None,
+                    summary=None):
         """
         Given a list of repositories, builds and returns a list of all
         pull requests in those repositories.
@@ -40,29 +49,233 @@ class PullRequest(object):
                               retrieving the list of pull requests,
                               and will include that list as the fourth
                               argument.
+        :param repo_filter: An optional function which is passed the
+                            full name of each repository, and returns
+                            ``True`` if the repository should be
+                            visited.
+        :param deadline: An optional ``tugboat.deadline.Deadline``
+                         object.  Each repository is fetched within
+                         its time budget; repositories which are
+                         skipped or time out are left out.
+        :param checkpoint: An optional
+                           ``tugboat.checkpoint.Checkpoint`` object.
+                           Repositories it holds are not fetched
+                           again, and each repository fetched is
+                           added to it; the pull requests are then
+                           returned as ``tugboat.records.PullRecord``
+                           objects.
+        :param merge_cache: An optional
+                            ``tugboat.mergecache.MergeCache`` object
+                            consulted for the mergeability of each
+                            pull request.
+        :param stream: If ``True``, each repository is fetched as soon
+                       as it's produced by ``repos``, rather than once
+                       all have been; the number of repositories isn't
+                       known, so ``repo_callback`` is passed ``None``
+                       for it.
+        :param scheduler: An optional
+                          ``tugboat.schedule.Scheduler`` object.  If
+                          provided, the repositories are fetched in
+                          the order it chooses, several at a time;
+                          ``repo_callback`` is passed the index of
+                          each repository in that order.  In stream
+                          mode, the repositories are fetched in the
+                          order they're produced.  The attributes of
+                          the pull requests named by its ``lookups``
+                          are looked up by the worker which fetched
+                          the repository.
+        :param delta: An optional ``tugboat.delta.DeltaStore`` object.
+                      If provided, only the pull requests which
+                      changed since the last run are listed, and they
+                      are returned as ``tugboat.records.PullRecord``
+                      objects.
+        :param summary: An optional ``tugboat.summary.Summary``
+                        object.  If provided, the open pull requests
+                        of each repository are only counted, and only
+                        the oldest, youngest, least recently updated,
+                        and most recently updated are returned.
 
         :returns: A list of ``PullRequest`` objects.
         """
 
-        repos = list(repos)
-        pulls = []
-        for idx, repo in enumerate(repos):
+        repos = (repo for repo in repos
+                 if not repo_filter or repo_filter(repo.full_name))
+        count = None
+        if not stream:
+            repos = list(repos)
+            count = len(repos)
+            if scheduler is not None:
+                repos = scheduler.order(repos)
+
+        # The callback may be called from several threads
+        lock = threading.Lock()
+
+        def visit(idx, repo):
             # Emit a status update
             if repo_callback:
-                repo_callback(idx, len(repos), repo)
-
-            repo_pulls = [cls(repo, pr) for pr in repo.get_pulls()]
+                with lock:
+                    repo_callback(idx, count, repo)
+
+            # Use the checkpointed pull requests, if they're fresh
+            repo_pulls = None
+            if checkpoint is not None:
+                repo_pulls = checkpoint.get(repo.full_name)
+
+            if repo_pulls is None:
+                if summary is not None:
+                    fetch, args = summary.fetch, (repo, merge_cache)
+                elif delta is not None:
+                    fetch, args = cls._fetch_delta, (repo, delta, merge_cache)
+                else:
+                    fetch, args = cls._fetch, (repo, merge_cache)
+                if scheduler is not None and scheduler.lookups:
+                    fetch, args = cls._look_up, (scheduler.lookups,
+                                                 fetch) + args
+                if deadline is not None:
+                    fetch, args = deadline.fetch, (repo.full_name,
+                                                   fetch) + args
+                if scheduler is not None:
+                    fetch, args = scheduler.fetch, (repo.full_name,
+                                                    fetch) + args
+
+                repo_pulls = fetch(*args)
+                if repo_pulls is None:
+                    return None
+
+                if checkpoint is not None:
+                    repo_pulls = checkpoint.add(repo.full_name, repo_pulls)
 
             # Emit a second status update with the pulls
             if repo_callback:
-                repo_callback(idx, len(repos), repo, repo_pulls)
+                with lock:
+                    repo_callback(idx, count, repo, repo_pulls)
+
+            return repo_pulls
+
+        if scheduler is None:
+            fetched = [visit(idx, repo) for idx, repo in enumerate(repos)]
+        else:
+            fetched = scheduler.run(repos, visit)
 
-            pulls.extend(repo_pulls)
+        pulls = []
+        for repo_pulls in fetched:
+            if repo_pulls is not None:
+                pulls.extend(repo_pulls)
 
         return pulls
 
     @classmethod
-    def from_repo(cls, gh, repo_name, repo_callback=None):
+    def _fetch(cls, repo, merge_cache=None):
+        """
+        Retrieve the open pull requests in a repository.
+
+        :param repo: The ``github.Repository.Repository`` object.
+        :param merge_cache: An optional
+                            ``tugboat.mergecache.MergeCache`` object
+                            consulted for the mergeability of each
+                            pull request.
+
+        :returns: A list of ``PullRequest`` objects.
+        """
+
+        return [cls(repo, pr, merge_cache) for pr in repo.get_pulls()]
+
+    @staticmethod
+    def _look_up(lookups, fetch, *args):
+        """
+        Fetch the pull requests in a repository, and look up those of
+        their attributes which take requests of their own, such as
+        their mergeability, so the requests are made by the worker
+        fetching the repository rather than one at a time as the
+        report is rendered.
+
+        :param lookups: A sequence of the names of the attributes to
+                        look up, such as "mergeable" or "user.name".
+        :param fetch: A function to call to fetch the repository.  It
+                      returns a list of pull requests, or ``None`` if
+                      the repository wasn't fetched.
+        :param args: Positional arguments for ``fetch``.
+
+        :returns: The result of ``fetch``.
+        """
+
+        repo_pulls = fetch(*args)
+        if repo_pulls is not None:
+            getters = [operator.attrgetter(name) for name in lookups]
+            for pull in repo_pulls:
+                for getter in getters:
+                    getter(pull)
+
+        return repo_pulls
+
+    @classmethod
+    def _fetch_delta(cls, repo, delta, merge_cache=None):
+        """
+        Retrieve the open pull requests in a repository, listing only
+        those which changed since the last run.  Both lists are in
+        order of update time, most recent first, so each is only read
+        as far as the watermark; the changed pull requests are merged
+        into those stored, and those closed since are dropped.
+
+        :param repo: The ``github.Repository.Repository`` object.
+        :param delta: The ``tugboat.delta.DeltaStore`` object.
+        :param merge_cache: An optional
+                            ``tugboat.mergecache.MergeCache`` object
+                            consulted for the mergeability of each
+                            pull request.
+
+        :returns: A list of ``tugboat.records.PullRecord`` objects.
+        """
+
+        stored = delta.get(repo.full_name)
+        if stored is None:
+            pull_records = [records.PullRecord.from_pull(pull)
+                            for pull in cls._fetch(repo, merge_cache)]
+            delta.update(repo.full_name, pull_records, listed=time.time())
+            delta.count('delta_full')
+            return pull_records
+
+        # A pull request updated in the same second as the watermark
+        # may not have been seen, so those are looked at again; if
+        # they haven't changed, nothing is looked up
+        watermark, pulls = stored
+        latest = watermark
+        changed = 0
+        for pr in repo.get_pulls(sort='updated', direction='desc'):
+            updated = records.aware(pr.updated_at)
+            if updated < watermark:
+                break
+            latest = max(latest, updated)
+            previous = pulls.get(pr.number)
+            record = records.PullRecord.from_pull(cls(repo, pr, merge_cache),
+                                                  previous)
+            if previous is None or not record.same_as(previous):
+                changed += 1
+            pulls[pr.number] = record
+
+        closed = 0
+        for pr in repo.get_pulls(state='closed', sort='updated',
+                                 direction='desc'):
+            updated = records.aware(pr.updated_at)
+            if updated < watermark:
+                break
+            latest = max(latest, updated)
+            if pulls.pop(pr.number, None) is not None:
+                closed += 1
+
+        pull_records = [record for _number, record in sorted(pulls.items())]
+        delta.update(repo.full_name, pull_records, latest)
+        delta.count('delta_incremental')
+        delta.count('delta_changed', changed)
+        delta.count('delta_closed', closed)
+
+        return pull_records
+
+    @classmethod
+    def from_repo(cls, gh, repo_name, repo_callback=None,
+                  repo_filter=None, deadline=None, checkpoint=None,
+                  merge_cache=None, scheduler=None, delta=None,
+                  summary=None):
         """
         Retrieve all open pull requests from the named repository.
 
@@ -80,17 +293,58 @@ class PullRequest(object):
                               retrieving the list of pull requests,
                               and will include that list as the fourth
                               argument.
+        :param repo_filter: An optional function which is passed the
+                            full name of each repository, and returns
+                            ``True`` if the repository should be
+                            visited.
+        :param deadline: An optional ``tugboat.deadline.Deadline``
+                         object.  Each repository is fetched within
+                         its time budget; repositories which are
+                         skipped or time out are left out.
+        :param checkpoint: An optional
+                           ``tugboat.checkpoint.Checkpoint`` object.
+                           Repositories it holds are not fetched
+                           again, and each repository fetched is
+                           added to it; the pull requests are then
+                           returned as ``tugboat.records.PullRecord``
+                           objects.
+        :param merge_cache: An optional
+                            ``tugboat.mergecache.MergeCache`` object
+                            consulted for the mergeability of each
+                            pull request.
+        :param scheduler: An optional
+                          ``tugboat.schedule.Scheduler`` object
+                          controlling the order the repositories are
+                          fetched in, and how many at once.
+        :param delta: An optional ``tugboat.delta.DeltaStore`` object.
+                      If provided, only the pull requests which
+                      changed since the last run are listed.
+        :param summary: An optional ``tugboat.summary.Summary``
+                        object.  If provided, the open pull requests
+                        of each repository are only counted, and only
+                        the oldest, youngest, least recently updated,
+                        and most recently updated are returned.
 
         :returns: A list of ``PullRequest`` objects for each open pull
                   request against the named repository.  The list is
                   not sorted.
         """
 
+        # Don't even look up the repository if it's filtered out
+        if repo_filter and not repo_filter(repo_name):
+            return []
+
         # This is pretty simple...
-        return cls._from_repos([gh.get_repo(repo_name)], repo_callback)
+        return cls._from_repos([gh.get_repo(repo_name)], repo_callback,
+                               deadline=deadline, checkpoint=checkpoint,
+                               merge_cache=merge_cache, scheduler=scheduler,
+                               delta=delta, summary=summary)
 
     @classmethod
-    def from_organization(cls, gh, org_name, repo_callback=None):
+    def from_organization(cls, gh, org_name, repo_callback=None,
+                          repo_filter=None, deadline=None, checkpoint=None,
+                          merge_cache=None, scheduler=None, delta=None,
+                          summary=None):
         """
         Retrieve all open pull requests from all repositories in a given
         organization.
@@ -109,6 +363,37 @@ class PullRequest(object):
                               retrieving the list of pull requests,
                               and will include that list as the fourth
                               argument.
+        :param repo_filter: An optional function which is passed the
+                            full name of each repository, and returns
+                            ``True`` if the repository should be
+                            visited.
+        :param deadline: An optional ``tugboat.deadline.Deadline``
+                         object.  Each repository is fetched within
+                         its time budget; repositories which are
+                         skipped or time out are left out.
+        :param checkpoint: An optional
+                           ``tugboat.checkpoint.Checkpoint`` object.
+                           Repositories it holds are not fetched
+                           again, and each repository fetched is
+                           added to it; the pull requests are then
+                           returned as ``tugboat.records.PullRecord``
+                           objects.
+        :param merge_cache: An optional
+                            ``tugboat.mergecache.MergeCache`` object
+                            consulted for the mergeability of each
+                            pull request.
+        :param scheduler: An optional
+                          ``tugboat.schedule.Scheduler`` object
+                          controlling the order the repositories are
+                          fetched in, and how many at once.
+        :param delta: An optional ``tugboat.delta.DeltaStore`` object.
+                      If provided, only the pull requests which
+                      changed since the last run are listed.
+        :param summary: An optional ``tugboat.summary.Summary``
+                        object.  If provided, the open pull requests
+                        of each repository are only counted, and only
+                        the oldest, youngest, least recently updated,
+                        and most recently updated are returned.
 
         :returns: A list of ``PullRequest`` objects for each open pull
                   request against all repositories in the named
@@ -119,10 +404,16 @@ class PullRequest(object):
         org = gh.get_organization(org_name)
 
         # Now build and return the list of pull requests
-        return cls._from_repos(org.get_repos(), repo_callback)
+        return cls._from_repos(org.get_repos(), repo_callback,
+                               repo_filter, deadline, checkpoint,
+                               merge_cache, scheduler=scheduler, delta=delta,
+                               summary=summary)
 
     @classmethod
-    def from_user(cls, gh, user_name, repo_callback=None):
+    def from_user(cls, gh, user_name, repo_callback=None,
+                  repo_filter=None, deadline=None, checkpoint=None,
+                  merge_cache=None, scheduler=None, delta=None,
+                  summary=None):
         """
         Retrieve all open pull requests from all repositories belonging to
         a given user.
@@ -141,6 +432,37 @@ class PullRequest(object):
                               retrieving the list of pull requests,
                               and will include that list as the fourth
                               argument.
+        :param repo_filter: An optional function which is passed the
+                            full name of each repository, and returns
+                            ``True`` if the repository should be
+                            visited.
+        :param deadline: An optional ``tugboat.deadline.Deadline``
+                         object.  Each repository is fetched within
+                         its time budget; repositories which are
+                         skipped or time out are left out.
+        :param checkpoint: An optional
+                           ``tugboat.checkpoint.Checkpoint`` object.
+                           Repositories it holds are not fetched
+                           again, and each repository fetched is
+                           added to it; the pull requests are then
+                           returned as ``tugboat.records.PullRecord``
+                           objects.
+        :param merge_cache: An optional
+                            ``tugboat.mergecache.MergeCache`` object
+                            consulted for the mergeability of each
+                            pull request.
+        :param scheduler: An optional
+                          ``tugboat.schedule.Scheduler`` object
+                          controlling the order the repositories are
+                          fetched in, and how many at once.
+        :param delta: An optional ``tugboat.delta.DeltaStore`` object.
+                      If provided, only the pull requests which
+                      changed since the last run are listed.
+        :param summary: An optional ``tugboat.summary.Summary``
+                        object.  If provided, the open pull requests
+                        of each repository are only counted, and only
+                        the oldest, youngest, least recently updated,
+                        and most recently updated are returned.
 
         :returns: A list of ``PullRequest`` objects for each open pull
                   request against all repositories belonging to the
@@ -151,10 +473,16 @@ class PullRequest(object):
         user = gh.get_user(user_name)
 
         # Now build and return the list of pull requests
-        return cls._from_repos(user.get_repos(), repo_callback)
+        return cls._from_repos(user.get_repos(), repo_callback,
+                               repo_filter, deadline, checkpoint,
+                               merge_cache, scheduler=scheduler, delta=delta,
+                               summary=summary)
 
     @classmethod
-    def from_all(cls, gh, repo_callback=None):
+    def from_all(cls, gh, repo_callback=None, repo_filter=None,
+                 deadline=None, checkpoint=None, merge_cache=None,
+                 enumerator=None, scheduler=None, delta=None,
+                 summary=None):
         """
         Retrieve all open pull requests from all repositories on Github.
 
@@ -171,6 +499,42 @@ class PullRequest(object):
                               retrieving the list of pull requests,
                               and will include that list as the fourth
                               argument.
+        :param repo_filter: An optional function which is passed the
+                            full name of each repository, and returns
+                            ``True`` if the repository should be
+                            visited.
+        :param deadline: An optional ``tugboat.deadline.Deadline``
+                         object.  Each repository is fetched within
+                         its time budget; repositories which are
+                         skipped or time out are left out.
+        :param checkpoint: An optional
+                           ``tugboat.checkpoint.Checkpoint`` object.
+                           Repositories it holds are not fetched
+                           again, and each repository fetched is
+                           added to it; the pull requests are then
+                           returned as ``tugboat.records.PullRecord``
+                           objects.
+        :param merge_cache: An optional
+                            ``tugboat.mergecache.MergeCache`` object
+                            consulted for the mergeability of each
+                            pull request.
+        :param enumerator: An optional
+                           ``tugboat.allrepos.Enumerator`` object.  If
+                           provided, the repositories are enumerated
+                           in parallel, and the pull requests in each
+                           are fetched as soon as it's found.
+        :param scheduler: An optional
+                          ``tugboat.schedule.Scheduler`` object
+                          controlling the order the repositories are
+                          fetched in, and how many at once.
+        :param delta: An optional ``tugboat.delta.DeltaStore`` object.
+                      If provided, only the pull requests which
+                      changed since the last run are listed.
+        :param summary: An optional ``tugboat.summary.Summary``
+                        object.  If provided, the open pull requests
+                        of each repository are only counted, and only
+                        the oldest, youngest, least recently updated,
+                        and most recently updated are returned.
 
         :returns: A list of ``PullRequest`` objects for each open pull
                   request against all repositories on Github which are
@@ -178,10 +542,20 @@ class PullRequest(object):
                   ``gh``.
         """
 
+        if enumerator is not None:
+            return cls._from_repos(enumerator.repos(gh), repo_callback,
+                                   repo_filter, deadline, checkpoint,
+                                   merge_cache, stream=True,
+                                   scheduler=scheduler, delta=delta,
+                                   summary=summary)
+
         # Build and return the list of all pull requests
-        return cls._from_repos(gh.get_repos(), repo_callback)
+        return cls._from_repos(gh.get_repos(), repo_callback,
+                               repo_filter, deadline, checkpoint,
+                               merge_cache, scheduler=scheduler, delta=delta,
+                               summary=summary)
 
-    def __init__(self, repo, pr):
+    def __init__(self, repo, pr, merge_cache=None):
         """
         Initialize a ``PullRequest`` object.
 
@@ -190,10 +564,15 @@ class PullRequest(object):
                      against.
         :param pr: The ``github.PullRequest.PullRequest`` object
                    describing the pull request.
+        :param merge_cache: An optional
+                            ``tugboat.mergecache.MergeCache`` object
+                            consulted for the mergeability of the pull
+                            request.
         """
 
         self._repo = repo
         self._pr = pr
+        self._merge_cache = merge_cache
 
         self._mergeable = None
 
@@ -214,13 +593,26 @@ class PullRequest(object):
         """
         Determine if the pull request is mergeable.  This is cached to
         inhibit round-tripping.  Use ``del x.mergeable`` to force a
-        cache invalidation.
+        cache invalidation.  If a mergeability cache was provided, and
+        it has the answer for the current head and base commits, no
+        round trip is needed at all.
         """
 
         # Do we have the value cached?
+        if self._mergeable is None and self._merge_cache is not None:
+            self._mergeable = self._merge_cache.get(
+                self._repo.full_name, self._pr.head.sha, self._pr.base.sha)
+
         if self._mergeable is None:
             self._mergeable = self._pr.mergeable
 
+            # Looking up the mergeability refreshes the pull request,
+            # so the answer is cached under the commits it's for
+            if self._merge_cache is not None:
+                self._merge_cache.set(
+                    self._repo.full_name, self._pr.head.sha,
+                    self._pr.base.sha, self._mergeable)
+
         return self._mergeable
 
     @mergeable.deleter
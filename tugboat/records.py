@@ -0,0 +1,317 @@
+# Copyright 2014 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the
+#    License. You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing,
+#    software distributed under the License is distributed on an "AS
+#    IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+#    express or implied. See the License for the specific language
+#    governing permissions and limitations under the License.
+
+import datetime
+
+
+# The format used for times in serialized records
+TIME_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+
+def naive(time):
+    """
+    Convert a time to a naive UTC time.  Newer versions of PyGithub
+    return timezone-aware times, while ``tugboat`` works with naive
+    UTC times.
+
+    :param time: A ``datetime.datetime`` object.
+
+    :returns: A naive ``datetime.datetime`` object.
+    """
+
+    if time.tzinfo is None:
+        return time
+    return time.replace(tzinfo=None) - time.utcoffset()
+
+
+class _UTC(datetime.tzinfo):
+    """
+    The UTC timezone.  (Python 2 has no ``datetime.timezone``.)
+    """
+
+    def utcoffset(self, dt):
+        return datetime.timedelta(0)
+
+    def tzname(self, dt):
+        return 'UTC'
+
+    def dst(self, dt):
+        return datetime.timedelta(0)
+
+    def __repr__(self):
+        return 'UTC'
+
+
+UTC = _UTC()
+
+
+def aware(time):
+    """
+    Convert a time to a timezone-aware UTC time, as returned by newer
+    versions of PyGithub.  Naive times are assumed to be UTC.
+
+    :param time: A ``datetime.datetime`` object, or ``None``.
+
+    :returns: A timezone-aware ``datetime.datetime`` object, or
+              ``None``.
+    """
+
+    if time is None:
+        return None
+    if time.tzinfo is None:
+        return time.replace(tzinfo=UTC)
+    return time.astimezone(UTC)
+
+
+def format_time(time):
+    """
+    Format a time for serialization.
+
+    :param time: A ``datetime.datetime`` object, or ``None``.
+
+    :returns: The formatted time, or ``None``.
+    """
+
+    if time is None:
+        return None
+    return naive(time).strftime(TIME_FORMAT)
+
+
+def parse_time(text):
+    """
+    Parse a serialized time.
+
+    :param text: The formatted time, or ``None``.
+
+    :returns: A naive ``datetime.datetime`` object, or ``None``.
+    """
+
+    if text is None:
+        return None
+    return datetime.datetime.strptime(text, TIME_FORMAT)
+
+
+class Ref(object):
+    """
+    A minimal stand-in for the PyGithub objects a pull request refers
+    to, such as its repository, its head and base branches, and its
+    author.  Only the attributes needed for a report are provided.
+    """
+
+    def __init__(self, **kwargs):
+        """
+        Initialize a ``Ref`` object.
+
+        :param kwargs: The attributes of the object.
+        """
+
+        self.__dict__.update(kwargs)
+
+
+class PullRecord(object):
+    """
+    A compact record of a pull request.  A ``PullRecord`` holds only
+    the data a report needs, with any lazily looked up data, such as
+    mergeability and the author's name, already resolved.  It provides
+    the same attributes as a ``tugboat.pulls.PullRequest`` as far as
+    a report is concerned, so either may be rendered; unlike a
+    ``tugboat.pulls.PullRequest``, it can be serialized, and accessing
+    it never requires a request to the Github API.
+    """
+
+    # The fields of a record, in serialization order
+    fields = ('repo_name', 'number', 'html_url', 'head_label', 'head_sha',
+              'base_label', 'base_sha', 'created_at', 'updated_at',
+              'user_login', 'user_name', 'mergeable')
+
+    # The fields holding times
+    time_fields = ('created_at', 'updated_at')
+
+    __slots__ = fields
+
+    # The attributes a report may look up; see
+    # ``tugboat.templates.Template.unsupported()``
+    attributes = dict((field, None) for field in fields)
+    attributes.update({
+        'key': None,
+        'repo': {'full_name': None},
+        'head': {'label': None, 'sha': None},
+        'base': {'label': None, 'sha': None},
+        'user': {'login': None, 'name': None},
+    })
+
+    @classmethod
+    def from_pull(cls, pull, previous=None):
+        """
+        Construct a ``PullRecord`` from a pull request.
+
+        :param pull: A ``tugboat.pulls.PullRequest`` object.
+        :param previous: An optional ``PullRecord`` for the same pull
+                         request from an earlier run.  If the pull
+                         request has not changed since, its
+                         mergeability and author's name are reused
+                         from the earlier record instead of being
+                         looked up.
+
+        :returns: A ``PullRecord`` object.
+        """
+
+        record = cls(
+            repo_name=pull.repo.full_name,
+            number=pull.number,
+            html_url=pull.html_url,
+            head_label=pull.head.label,
+            head_sha=pull.head.sha,
+            base_label=pull.base.label,
+            base_sha=pull.base.sha,
+            created_at=aware(pull.created_at),
+            updated_at=aware(pull.updated_at),
+            user_login=pull.user.login,
+        )
+
+        if previous is not None and previous.same_as(record):
+            record.user_name = previous.user_name
+            record.mergeable = previous.mergeable
+        else:
+            record.user_name = pull.user.name
+            record.mergeable = pull.mergeable
+
+        return record
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Construct a ``PullRecord`` from its serialized form.
+
+        :param data: A dictionary, as returned by ``to_dict()``.
+
+        :returns: A ``PullRecord`` object.
+        """
+
+        kwargs = dict((field, data.get(field)) for field in cls.fields)
+        for field in cls.time_fields:
+            kwargs[field] = aware(parse_time(kwargs[field]))
+
+        return cls(**kwargs)
+
+    def __init__(self, repo_name, number, html_url=None, head_label=None,
+                 head_sha=None, base_label=None, base_sha=None,
+                 created_at=None, updated_at=None, user_login=None,
+                 user_name=None, mergeable=None):
+        """
+        Initialize a ``PullRecord`` object.
+
+        :param repo_name: The full name of the repository.
+        :param number: The pull request number.
+        :param html_url: The URL of the pull request.
+        :param head_label: The label of the head branch.
+        :param head_sha: The commit ID of the head branch.
+        :param base_label: The label of the base branch.
+        :param base_sha: The commit ID of the base branch.
+        :param created_at: The creation time, as a timezone-aware
+                           UTC ``datetime.datetime``, so it is
+                           rendered just as PyGithub's would be.
+        :param updated_at: The last update time, as a timezone-aware
+                           UTC ``datetime.datetime``.
+        :param user_login: The login name of the author.
+        :param user_name: The name of the author.
+        :param mergeable: Whether the pull request is mergeable.
+        """
+
+        self.repo_name = repo_name
+        self.number = number
+        self.html_url = html_url
+        self.head_label = head_label
+        self.head_sha = head_sha
+        self.base_label = base_label
+        self.base_sha = base_sha
+        self.created_at = created_at
+        self.updated_at = updated_at
+        self.user_login = user_login
+        self.user_name = user_name
+        self.mergeable = mergeable
+
+    def to_dict(self):
+        """
+        Serialize the record.
+
+        :returns: A dictionary suitable for serializing as JSON.
+        """
+
+        data = dict((field, getattr(self, field)) for field in self.fields)
+        for field in self.time_fields:
+            data[field] = format_time(data[field])
+
+        return data
+
+    def same_as(self, other):
+        """
+        Determine whether another record describes the same state of
+        the same pull request.  The state is unchanged if the pull
+        request has not been updated and neither its head nor its base
+        has moved; mergeability can change when the base moves, even
+        if the pull request itself is not updated.
+
+        :param other: Another ``PullRecord`` object.
+
+        :returns: ``True`` if the state is the same, ``False``
+                  otherwise.
+        """
+
+        return (self.key == other.key and
+                self.updated_at == other.updated_at and
+                self.head_sha == other.head_sha and
+                self.base_sha == other.base_sha)
+
+    @property
+    def key(self):
+        """
+        A key identifying the pull request: a tuple of the repository
+        name and the pull request number.
+        """
+
+        return (self.repo_name, self.number)
+
+    @property
+    def repo(self):
+        """
+        The repository the pull request is against.
+        """
+
+        return Ref(full_name=self.repo_name)
+
+    @property
+    def head(self):
+        """
+        The head branch of the pull request.
+        """
+
+        return Ref(label=self.head_label, sha=self.head_sha)
+
+    @property
+    def base(self):
+        """
+        The base branch of the pull request.
+        """
+
+        return Ref(label=self.base_label, sha=self.base_sha)
+
+    @property
+    def user(self):
+        """
+        The author of the pull request.
+        """
+
+        return Ref(login=self.user_login, name=self.user_name)
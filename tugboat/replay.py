@@ -0,0 +1,245 @@
+# Copyright 2014 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the
+#    License. You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing,
+#    software distributed under the License is distributed on an "AS
+#    IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+#    express or implied. See the License for the specific language
+#    governing permissions and limitations under the License.
+
+import gzip
+import io
+import json
+import os
+import threading
+
+try:
+    from urllib import parse
+except ImportError:  # pragma: no cover
+    import urlparse as parse
+
+from tugboat import output
+from tugboat import rest
+
+
+# The version of the archive format
+VERSION = 1
+
+# The name of the archive file within the archive directory
+ARCHIVE = 'exchanges.json.gz'
+
+
+class NotRecorded(Exception):
+    """
+    Raised when a request being replayed isn't in the archive.
+    """
+
+    pass
+
+
+def request_key(verb, url, parameters=None):
+    """
+    Compute the key identifying a request in an archive.  The key is
+    made of the verb, the path, and the query parameters, whether
+    they're in the URL or passed separately, in sorted order; the
+    host is left out, so an archive may be replayed with any API URL.
+
+    :param verb: The HTTP verb of the request.
+    :param url: The URL of the request.
+    :param parameters: An optional dictionary of query parameters.
+
+    :returns: The key, e.g., "GET /repos/a/b/pulls?page=2&per_page=100".
+    """
+
+    parsed = parse.urlparse(url)
+    query = parse.parse_qsl(parsed.query)
+    query.extend((key, u'%s' % value)
+                 for key, value in (parameters or {}).items())
+
+    key = u'%s %s' % (verb, parsed.path)
+    if query:
+        key = u'%s?%s' % (key, u'&'.join(u'%s=%s' % item
+                                         for item in sorted(query)))
+    return key
+
+
+class Recorder(object):
+    """
+    A middleware which records every API exchange to an archive, so
+    the run may later be replayed by a ``Replayer``.  For each
+    request, the archive holds the verb and URL, and the headers and
+    decoded body of the response; errors returned by the API, such as
+    a 404 or a 502, are recorded with their status.  Requests which
+    never got a response, such as those which timed out, are not
+    recorded.  Request headers, which carry the credentials, are not
+    recorded either.
+
+    The archive is a gzipped file of JSON lines, written as the run
+    progresses, and put in place when the recorder is closed.
+    Install the recorder as the innermost middleware, so it records
+    exactly what crosses the network.
+    """
+
+    def __init__(self, directory):
+        """
+        Initialize a ``Recorder`` object.
+
+        :param directory: The archive directory.  It's created if it
+                          doesn't exist.
+        """
+
+        self.directory = directory
+        self.exchanges = 0
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        self._file = output.AtomicFile(os.path.join(directory, ARCHIVE),
+                                       binary=True)
+        self._gzip = gzip.GzipFile(fileobj=self._file, mode='wb', mtime=0)
+        self._lock = threading.Lock()
+
+        self._write({'version': VERSION})
+
+    def __call__(self, call, verb, url, parameters=None, headers=None,
+                 input=None, **kwargs):
+        """
+        Issue a request, and record the exchange.
+
+        :param call: The next handler in the chain.
+        :param verb: The HTTP verb of the request.
+        :param url: The URL of the request.
+        :param parameters: An optional dictionary of query parameters.
+        :param headers: An optional dictionary of request headers.
+        :param input: An optional request body.
+
+        :returns: The result of the next handler.
+        """
+
+        exchange = {
+            'key': request_key(verb, url, parameters),
+            'url': url,
+        }
+        try:
+            response_headers, data = call(verb, url, parameters, headers,
+                                          input, **kwargs)
+        except Exception as exc:
+            status = getattr(exc, 'status', None)
+            if isinstance(status, int):
+                exchange['status'] = status
+                exchange['headers'] = dict(getattr(exc, 'headers', None) or
+                                           {})
+                exchange['data'] = getattr(exc, 'data', None)
+                self._write(exchange)
+            raise
+
+        exchange['status'] = 200
+        exchange['headers'] = dict(response_headers or {})
+        exchange['data'] = data
+        self._write(exchange)
+
+        return response_headers, data
+
+    def _write(self, data):
+        """
+        Write a line to the archive.
+
+        :param data: The data to write, as a dictionary.
+        """
+
+        line = (u'%s\n' % json.dumps(
+            data, sort_keys=True, separators=(',', ':'))).encode('utf-8')
+        with self._lock:
+            if self._gzip is None:
+                return
+            self._gzip.write(line)
+            if 'key' in data:
+                self.exchanges += 1
+
+    def close(self):
+        """
+        Finish the archive and put it in place.
+        """
+
+        with self._lock:
+            if self._gzip is None:
+                return
+            self._gzip.close()
+            self._gzip = None
+        self._file.close()
+
+
+class Replayer(object):
+    """
+    A middleware which serves requests from an archive written by a
+    ``Recorder``, rather than passing them on, so a report may be run
+    with no network access, against exactly the data of the recorded
+    run.  Recorded errors are raised as ``tugboat.rest.RestError``.
+    If the same request was recorded more than once, as when it was
+    retried, the responses are served in the order they were
+    recorded, with the last served again once they're used up.
+    """
+
+    def __init__(self, directory):
+        """
+        Initialize a ``Replayer`` object, loading the archive.
+
+        :param directory: The archive directory.
+        """
+
+        self.directory = directory
+
+        # A dictionary mapping request keys to lists of exchanges, and
+        # the number of exchanges served for each
+        self.exchanges = {}
+        self._served = {}
+        self._lock = threading.Lock()
+
+        path = os.path.join(directory, ARCHIVE)
+        with gzip.GzipFile(path, 'rb') as f:
+            lines = io.TextIOWrapper(f, encoding='utf-8')
+            header = json.loads(next(lines))
+            if header.get('version') != VERSION:
+                raise ValueError('Unsupported archive version %r in "%s"' %
+                                 (header.get('version'), path))
+            for line in lines:
+                exchange = json.loads(line)
+                self.exchanges.setdefault(exchange['key'], []).append(
+                    exchange)
+
+    def __call__(self, call, verb, url, parameters=None, headers=None,
+                 input=None, **kwargs):
+        """
+        Serve a request from the archive.  The ``call`` argument is
+        ignored; no request ever proceeds past this middleware.
+
+        :param call: The next handler in the chain.
+        :param verb: The HTTP verb of the request.
+        :param url: The URL of the request.
+        :param parameters: An optional dictionary of query parameters.
+        :param headers: An optional dictionary of request headers.
+        :param input: An optional request body.
+
+        :returns: A tuple of the recorded response headers and body.
+        """
+
+        key = request_key(verb, url, parameters)
+        with self._lock:
+            recorded = self.exchanges.get(key)
+            if not recorded:
+                raise NotRecorded('No recorded response for %s' % key)
+            idx = min(self._served.get(key, 0), len(recorded) - 1)
+            self._served[key] = idx + 1
+
+        exchange = recorded[idx]
+        if exchange['status'] >= 400:
+            raise rest.RestError(exchange['status'], exchange['data'],
+                                 exchange['headers'])
+
+        return exchange['headers'], exchange['data']
@@ -18,14 +18,33 @@ from __future__ import print_function
 import argparse
 import datetime
 import getpass
+import heapq
 import io
+import json
 import os
+import shutil
 import sys
+import tempfile
 
 import cli_tools
-import github
 
+from tugboat import allrepos
+from tugboat import checkpoint
+from tugboat import hosts
+from tugboat import mergecache
+from tugboat import output
+from tugboat import partial
+from tugboat import profiling
+from tugboat import progress
 from tugboat import pulls
+from tugboat import records
+from tugboat import retry
+from tugboat import schedule
+from tugboat import shard
+from tugboat import sharedcache
+from tugboat import snapshot
+from tugboat import stats
+from tugboat import templates
 
 
 class PullSummary(object):
@@ -52,22 +71,28 @@ class PullSummary(object):
         :param pull: The pull request to add.
         """
 
+        # Ties are broken by the repository name and pull request
+        # number, so the summary doesn't depend on the order the pull
+        # requests are added in
+        created = sort_keys['created']
+        updated = sort_keys['updated']
+
         # Is it older?
-        if self.oldest is None or self.oldest.created_at > pull.created_at:
+        if self.oldest is None or created(self.oldest) > created(pull):
             self.oldest = pull
 
         # How about younger?
-        if self.youngest is None or self.youngest.created_at < pull.created_at:
+        if self.youngest is None or created(self.youngest) < created(pull):
             self.youngest = pull
 
         # How about least recently updated?
         if (self.least_recent is None or
-                self.least_recent.updated_at > pull.updated_at):
+                updated(self.least_recent) > updated(pull)):
             self.least_recent = pull
 
         # How about most recently updated?
         if (self.most_recent is None or
-                self.most_recent.updated_at < pull.updated_at):
+                updated(self.most_recent) < updated(pull)):
             self.most_recent = pull
 
     def add_pulls(self, pulls):
@@ -90,7 +115,11 @@ class RepoSummary(object):
     """
     A container for information about repositories.  This is used by
     ``report()`` to maintain a count of pull requests and mergeable
-    pull requests for reporting in the final summary data.
+    pull requests for reporting in the final summary data.  The
+    creation time of the oldest pull request is also maintained.
+    Since looking up the mergeability of a pull request may require a
+    request to the Github API, the mergeable pull requests are only
+    counted when the count is needed.
     """
 
     def __init__(self, name):
@@ -102,7 +131,23 @@ class RepoSummary(object):
 
         self.name = name
         self.pulls = 0
-        self.mergeable = 0
+        self.oldest = None
+
+        self._mergeable = 0
+        self._unchecked = []
+
+    @property
+    def mergeable(self):
+        """
+        The number of mergeable pull requests.
+        """
+
+        if self._unchecked:
+            self._mergeable += sum(1 for pull in self._unchecked
+                                   if pull.mergeable)
+            self._unchecked = []
+
+        return self._mergeable
 
     def __iadd__(self, other):
         """
@@ -116,9 +161,12 @@ class RepoSummary(object):
         # Count it
         self.pulls += 1
 
-        # Is it mergeable?
-        if other.mergeable:
-            self.mergeable += 1
+        # Check its mergeability later
+        self._unchecked.append(other)
+
+        # Is it older?
+        if self.oldest is None or self.oldest > other.created_at:
+            self.oldest = other.created_at
 
         return self
 
@@ -141,7 +189,7 @@ def format_age(now, time, fmt):
     """
 
     # Compute the age
-    age = now - time
+    age = now - records.naive(time)
 
     # If it's less than zero, it has no age, so return an empty string
     if age <= td_zero:
@@ -151,12 +199,31 @@ def format_age(now, time, fmt):
     return fmt % age
 
 
+def _from_all(gh, name, repo_callback=None, **kwargs):
+    """
+    Retrieve all open pull requests from all repositories on Github.
+    This adapts ``tugboat.pulls.PullRequest.from_all()`` to the
+    calling convention of the ``targets`` dictionary.
+
+    :param gh: A ``github.Github`` handle.
+    :param name: Ignored; the "all" target has no name.
+    :param repo_callback: A callback to invoke for each repository
+                          visited.
+    :param kwargs: Additional keyword arguments for ``from_all()``.
+
+    :returns: A list of ``PullRequest`` objects.
+    """
+
+    return pulls.PullRequest.from_all(gh, repo_callback, **kwargs)
+
+
 # This maps the target name used in an argument declaration to the
 # routine used to find the open pull requests for that target
 targets = {
     'repo': pulls.PullRequest.from_repo,
     'organization': pulls.PullRequest.from_organization,
     'user': pulls.PullRequest.from_user,
+    'all': _from_all,
 }
 
 
@@ -177,16 +244,21 @@ class RepoAction(argparse.Action):
         :param target: The target the option specifies.  Must be one
                        of the keys from the ``targets`` dictionary.
                        Defaults to "repo" if not provided.
+
+        An option which takes no value, with ``nargs=0``, names its
+        target with the ``const`` value.
         """
 
         # Need the target information
         target = kwargs.pop('target', 'repo')
+        no_value = kwargs.get('nargs') == 0
 
         # Initialize the Action
         super(RepoAction, self).__init__(option_strings, dest, **kwargs)
 
         # Save the target information
         self.target = target
+        self.no_value = no_value
 
     def __call__(self, parser, namespace, values, option_string=None):
         """
@@ -200,20 +272,84 @@ class RepoAction(argparse.Action):
         :param option_string: The string used to invoke the option.
         """
 
+        if self.no_value:
+            values = self.const
+
         # Append the appropriate value to the namespace
         items = getattr(namespace, self.dest, [])
         items.append((self.target, values))
         setattr(namespace, self.dest, items)
 
 
-# Key routines for accomplishing the PR sort
+# The exit code used when the report is incomplete because some
+# repositories were skipped or timed out
+EXIT_PARTIAL = 3
+
+
+# Key routines for accomplishing the PR sort.  Ties are broken by the
+# repository name and pull request number, so the order doesn't
+# depend on the order the pull requests were retrieved in; this keeps
+# reports merged from several shards identical to a single report.
 sort_keys = {
-    'created': lambda x: x.created_at,
-    'updated': lambda x: x.updated_at,
+    'created': lambda x: (x.created_at, x.repo.full_name, x.number),
+    'updated': lambda x: (x.updated_at, x.repo.full_name, x.number),
     'repo': lambda x: (x.repo.full_name, x.number),
 }
 
 
+def _emit(stream, template, section, values):
+    """
+    Render a template section and emit it to the output stream.
+    Sections with no text are not emitted at all.
+
+    :param stream: The output stream.
+    :param template: A ``tugboat.templates.Template`` object.
+    :param section: The name of the section to render.
+    :param values: A dictionary mapping field names to functions of no
+                   arguments returning the field values.  See
+                   ``tugboat.templates.Section.render()``.
+    """
+
+    if template.sections[section].text:
+        print(template.render(section, values), file=stream)
+
+
+def _report_diff(stream, template, diff, now, verbose=False):
+    """
+    Emit the differences between a snapshot and the current set of
+    open pull requests.  Each changed pull request is rendered with
+    the "pull" section of the template.
+
+    :param stream: The output stream.
+    :param template: A ``tugboat.templates.Template`` object.
+    :param diff: A ``tugboat.snapshot.Diff`` object.
+    :param now: The current time, as a naive UTC
+                ``datetime.datetime``.
+    :param verbose: If ``True``, emit status messages to standard
+                    error.
+    """
+
+    print(u"Changes since snapshot of %s: %d new, %d closed, %d updated, "
+          u"%d mergeability changed (%d unchanged)" %
+          (diff.previous.generated, len(diff.new), len(diff.closed),
+           len(diff.updated), len(diff.flipped), diff.unchanged),
+          file=stream)
+
+    for title, changed in [(u'New pull requests', diff.new),
+                           (u'Closed pull requests', diff.closed),
+                           (u'Updated pull requests', diff.updated),
+                           (u'Mergeability changed', diff.flipped)]:
+        if not changed:
+            continue
+
+        if verbose:
+            print("Emitting %s: %d" % (title.lower(), len(changed)),
+                  file=sys.stderr)
+        print(u"\n%s: %d" % (title, len(changed)), file=stream)
+        for record in changed:
+            _emit(stream, template, 'pull', _pull_values(record, now))
+
+
 @cli_tools.argument_group(
     'auth',
     title='Authentication-related Options',
@@ -221,8 +357,8 @@ sort_keys = {
 )
 @cli_tools.argument(
     '--username', '-u',
-    default=getpass.getuser(),
-    help='Username for accessing the Github API.  Defaults to "%(default)s".',
+    help='Username for accessing the Github API.  Defaults to the name of '
+    'the current user.',
     group='auth',
 )
 @cli_tools.argument(
@@ -237,11 +373,26 @@ sort_keys = {
     help='API URL for accessing the Github API.  Defaults to "%(default)s".',
     group='auth',
 )
+@cli_tools.argument(
+    '--credentials',
+    metavar='FILE',
+    help='Specify a JSON file holding the credentials for Github hosts '
+    'other than the one identified by "--github-url", such as Github '
+    'Enterprise hosts.  The file maps each host name to an object with '
+    'the optional keys "username", "password", and "url", the API URL '
+    'of the host.  The username defaults to that given by "--username", '
+    'the URL to "https://<host>/api/v3", and the password will be '
+    'prompted for if not provided.',
+    group='auth',
+)
 @cli_tools.argument_group(
     'repo',
     title='Repositories to Report on',
     description='Options used to identify specific repositories to generate '
-    'reports on.  These options may be used multiple times.',
+    'reports on.  These options may be used multiple times.  Names may be '
+    'prefixed by the Github host they are on, e.g., '
+    '"ghe.example.com:acme/widgets"; the repositories on each host are '
+    'fetched concurrently, and reported on together.',
 )
 @cli_tools.argument(
     '--repo', '-r',
@@ -272,6 +423,36 @@ sort_keys = {
     group='repo',
     target='organization',
 )
+@cli_tools.argument(
+    '--all', '-A',
+    dest='repos',
+    action=RepoAction,
+    nargs=0,
+    const=u'',
+    help='Generate a report for every visible repository.  The repositories '
+    'are enumerated in parallel ranges of repository IDs, and their pull '
+    'requests are fetched as they are found.  See "--all-index" to avoid '
+    'enumerating every repository on every run.',
+    group='repo',
+    target='all',
+)
+@cli_tools.argument(
+    '--all-index',
+    metavar='FILE',
+    help='Specify a file in which to keep the repositories found by "--all", '
+    'and the highest repository ID seen.  Later runs only enumerate the '
+    'repositories created since; every repository is enumerated again once '
+    'the index is a week old.',
+    group='repo',
+)
+@cli_tools.argument(
+    '--all-workers',
+    type=int,
+    default=allrepos.DEFAULT_WORKERS,
+    help='Specify the number of ranges of repository IDs "--all" enumerates '
+    'in parallel.  Defaults to %(default)s.',
+    group='repo',
+)
 @cli_tools.mutually_exclusive_group(
     'sorting',
 )
@@ -309,13 +490,242 @@ sort_keys = {
     'provided, or if specified as "-", the report will be emitted to '
     'standard output.',
 )
+@cli_tools.argument(
+    '--snapshot', '-s',
+    dest='snapshot_output',
+    metavar='FILE',
+    help='Save a snapshot of the open pull requests to the specified file.  '
+    'The snapshot may be used with "--since-snapshot" by a later run.  The '
+    'snapshot is only saved if the report succeeds.',
+)
+@cli_tools.argument(
+    '--since-snapshot', '-B',
+    metavar='FILE',
+    help='Report only the differences from the snapshot saved in the '
+    'specified file: new pull requests, closed pull requests, pull requests '
+    'with new activity, and pull requests whose mergeability changed.  Pull '
+    'requests which have not changed since the snapshot are not looked up '
+    'again.  This may be combined with "--snapshot" to update the snapshot '
+    'for the next run.',
+)
+@cli_tools.argument(
+    '--split-dir', '-D',
+    metavar='DIR',
+    help='Split the report by repository.  The pull requests for each '
+    'repository are written to a separate file in the specified directory, '
+    'named "OWNER/REPO.txt", instead of to the report, which retains the '
+    'summary and the repository breakdown.  The files are written in '
+    'parallel.',
+)
+@cli_tools.argument(
+    '--template', '-t',
+    metavar='TEMPLATE',
+    help='Specify a template controlling the layout of the report.  This '
+    'may be the name of a template file or, if no such file exists, the '
+    'template for each pull request, e.g., "{pull.html_url} {age}".  A '
+    'template file is divided into "[header]", "[pull]", "[breakdown]", '
+    '"[repo]", and "[footer]" sections; sections which are omitted keep '
+    'their default layout.  Fields use the same syntax as Python\'s '
+    'str.format(); only the fields referenced are looked up, so leaving '
+    'out fields such as "mergeable" and "username" avoids the requests '
+    'needed to look them up.',
+)
+@cli_tools.argument(
+    '--summary-only',
+    action='store_true',
+    help='Report only the summary and the repository breakdown, leaving out '
+    'the pull requests.  The open pull requests of each repository are '
+    'counted from the page links of their list, so each repository costs '
+    'at most four requests however many pull requests it has, and no pull '
+    'request or author is looked up.  The mergeable pull requests are not '
+    'counted, unless the "[header]" or "[repo]" section of the template '
+    'refers to them or "--metrics" is given; each repository is then '
+    'listed in full.  Cannot be used with "--snapshot", "--since-snapshot", '
+    '"--split-dir", "--partial", "--checkpoint", or "--delta".',
+)
+@cli_tools.argument(
+    '--shard', '-n',
+    type=shard.Shard.parse,
+    metavar='I/N',
+    help='Report only on shard I of N, counting from 0.  Repositories are '
+    'divided among the shards by a hash of their names, so N independent '
+    'runs, on one host or several, each given a different shard and the same '
+    'options, together cover every repository exactly once.  Use with '
+    '"--partial", then combine the partial reports with "tugboat-merge".',
+)
+@cli_tools.argument(
+    '--partial', '-m',
+    dest='partial_output',
+    metavar='FILE',
+    help='Save a partial report to the specified file, for combining with '
+    'other partial reports, such as those for the other shards, with '
+    '"tugboat-merge".  The partial report is only saved if the report '
+    'succeeds.',
+)
+@cli_tools.argument(
+    '--deadline',
+    type=float,
+    metavar='SECONDS',
+    help='Limit the time spent fetching pull requests.  Once the deadline '
+    'passes, no further repositories are fetched and requests in progress '
+    'are cut off; the report is generated from the repositories which were '
+    'fetched, and lists those which were skipped or timed out.  An '
+    'incomplete report exits with status %d.' % EXIT_PARTIAL,
+)
+@cli_tools.argument(
+    '--repo-timeout',
+    type=float,
+    metavar='SECONDS',
+    help='Limit the time spent fetching the pull requests for each '
+    'repository.  A repository which takes longer is abandoned and listed '
+    'in the report as timed out.  See "--deadline".',
+)
+@cli_tools.argument(
+    '--retries',
+    type=int,
+    default=retry.DEFAULT_RETRIES,
+    metavar='COUNT',
+    help='Retry requests which fail transiently, with a server error, a '
+    'connection reset, or a timeout, up to the specified number of times.  '
+    'Only GET requests are retried, after a random delay which doubles with '
+    'each retry.  Once %d requests in a row to the Github host have failed, '
+    'further requests fail immediately, until a trial request succeeds.  '
+    'Use 0 to disable retries and the circuit breaker.  Defaults to '
+    '%%(default)s.' % retry.DEFAULT_THRESHOLD,
+)
+@cli_tools.argument(
+    '--backoff',
+    type=float,
+    default=retry.DEFAULT_BACKOFF,
+    metavar='SECONDS',
+    help='Specify the base delay before retrying a request.  See '
+    '"--retries".  Defaults to %(default)s.',
+)
+@cli_tools.argument(
+    '--checkpoint', '-k',
+    dest='checkpoint_file',
+    metavar='FILE',
+    help='Record the pull requests for each repository in the specified '
+    'file as soon as they are fetched, so an interrupted run may be '
+    'continued with "--resume".  The file is removed once the report '
+    'succeeds.',
+)
+@cli_tools.argument(
+    '--resume', '-R',
+    action='store_true',
+    help='Continue an interrupted run from the file given by '
+    '"--checkpoint".  Repositories recorded in the checkpoint are not '
+    'fetched again, unless they were fetched longer ago than '
+    '"--max-age".',
+)
+@cli_tools.argument(
+    '--max-age',
+    type=float,
+    default=checkpoint.DEFAULT_MAX_AGE,
+    metavar='SECONDS',
+    help='When resuming, fetch again any repository recorded in the '
+    'checkpoint more than the specified number of seconds ago.  Defaults '
+    'to %(default)s.',
+)
+@cli_tools.argument(
+    '--merge-cache',
+    dest='merge_cache_file',
+    metavar='FILE',
+    help='Cache the mergeability of pull requests in the specified file, '
+    'keyed by repository and the head and base commits of each pull '
+    'request.  On later runs, pull requests whose head and base have not '
+    'moved are not looked up again to determine whether they are '
+    'mergeable.  Entries unused for %d days are dropped.' %
+    (mergecache.DEFAULT_MAX_AGE // (24 * 60 * 60)),
+)
+@cli_tools.argument(
+    '--delta',
+    dest='delta_file',
+    metavar='FILE',
+    help='Keep the open pull requests of each repository in the specified '
+    'file, and on later runs list only the pull requests updated since, '
+    'stopping at the latest update seen by the last run; those closed since '
+    'are dropped.  The cost of a repository is then proportional to its '
+    'activity rather than to its number of open pull requests.  Every pull '
+    'request is looked up in full, as with "--checkpoint", and each '
+    'repository is listed in full again once a day.',
+)
+@cli_tools.argument(
+    '--shared-cache',
+    dest='shared_cache_file',
+    metavar='FILE',
+    help='Cache the repositories, users, and pull requests fetched in the '
+    'specified SQLite database, which any number of tugboat runs may share '
+    'at once; runs which overlap then need not fetch the same objects '
+    'again.  The cache is not specific to the user, so only share it '
+    'between runs which may see the same repositories.  See also '
+    '"tugboat-cache".',
+)
+@cli_tools.argument(
+    '--cache-ttl',
+    dest='cache_ttls',
+    action='append',
+    type=sharedcache.parse_ttl,
+    metavar='KIND=SECONDS',
+    help='Serve the specified kind of object, one of %s, from the shared '
+    'cache for up to the specified number of seconds after it was fetched; '
+    '0 disables caching it.  May be given once for each kind.  Defaults to '
+    '%s.' % (', '.join(sorted(sharedcache.DEFAULT_TTLS)),
+             ', '.join('%s=%d' % item
+                       for item in sorted(sharedcache.DEFAULT_TTLS.items()))),
+)
+@cli_tools.argument(
+    '--cache-size',
+    type=int,
+    default=sharedcache.DEFAULT_MAX_SIZE,
+    metavar='BYTES',
+    help='Evict the least recently used entries from the shared cache once '
+    'it grows beyond the specified size.  Defaults to %(default)s.',
+)
+@cli_tools.argument(
+    '--jobs', '-j',
+    type=int,
+    default=schedule.DEFAULT_JOBS,
+    metavar='COUNT',
+    help='Fetch the pull requests of up to the specified number of '
+    'repositories of each target at once.  Defaults to %(default)s.',
+)
+@cli_tools.argument(
+    '--schedule',
+    choices=schedule.POLICIES,
+    default='largest',
+    help='Select the order repositories are fetched in with "--jobs".  '
+    '"largest" fetches the repositories expected to take longest first, '
+    'so a large repository does not hold up the end of the run; their cost '
+    'is estimated from the time they took on earlier runs, as recorded by '
+    '"--history", or from their count of open issues.  "listed" fetches '
+    'them in the order Github lists them.  Defaults to %(default)s.',
+)
+@cli_tools.argument(
+    '--history',
+    dest='history_file',
+    metavar='FILE',
+    help='Record the number of pull requests in each repository, and the '
+    'time it took to fetch them, in the specified file, and consult it '
+    'to estimate the cost of each repository for "--schedule".',
+)
+@cli_tools.argument(
+    '--adaptive',
+    action='store_true',
+    help='Adapt the number of requests in flight to each Github host, '
+    'up to the number given by "--jobs".  The number grows while the '
+    'latency of requests stays flat, and is cut back sharply when the '
+    'host throttles a request or the latency spikes.  The number chosen '
+    'over time is reported in the run statistics.',
+)
 @cli_tools.argument(
     '--verbose', '-v',
     action='store_const',
     default=1,
     const=2,
-    help='Request verbose output.  This will cause status messages to be '
-    'emitted while producing the report.',
+    help='Request verbose output.  In addition to the status line showing '
+    'the progress of the run, a line will be emitted as each repository is '
+    'fetched.',
 )
 @cli_tools.argument(
     '--quiet', '-q',
@@ -325,6 +735,99 @@ sort_keys = {
     help='Request quiet output.  This will suppress all status messages, '
     'emitting only the final report.',
 )
+@cli_tools.argument(
+    '--progress-log',
+    metavar='FILE',
+    help='Write progress events to the specified file, one JSON object per '
+    'line, as the run progresses.  Each event gives the repositories and '
+    'pull requests fetched so far, the rates at which they are being '
+    'fetched, the number of requests in flight, and an estimate of the time '
+    'remaining.',
+)
+@cli_tools.argument(
+    '--metrics', '-M',
+    dest='metrics_output',
+    metavar='FILE',
+    help='Write metrics in the OpenMetrics text format to the specified '
+    'file.  The file is replaced atomically, so it may be placed in the '
+    'directory of the Prometheus node exporter textfile collector.  The '
+    'metrics include, for each repository, the number of open pull '
+    'requests, the number of mergeable pull requests, and the age of the '
+    'oldest pull request, as well as the duration of the run, the number of '
+    'API requests, and the remaining API rate limit.',
+)
+@cli_tools.argument(
+    '--stats', '-S',
+    dest='stats_output',
+    nargs='?',
+    const='-',
+    metavar='FILE',
+    help='Collect run statistics: the time spent in each phase of the '
+    'report, request counts and latencies for each API endpoint, cache hit '
+    'rates, and retries.  If FILE is given, the statistics are written to it '
+    'as JSON; otherwise, they are emitted to standard error.',
+)
+@cli_tools.argument(
+    '--trace-lazy', '-L',
+    dest='lazy_output',
+    nargs='?',
+    const='-',
+    metavar='FILE',
+    help='Trace requests issued by PyGithub to complete lazily loaded '
+    'objects.  Each such request is attributed to the attribute access '
+    'which triggered it and the call site of that access.  If FILE is '
+    'given, the trace is written to it as JSON; otherwise, it is emitted to '
+    'standard error.',
+)
+@cli_tools.argument(
+    '--profile',
+    choices=sorted(profiling.profilers),
+    help='Profile the run.  With "cpu", a cProfile profile is collected for '
+    'each phase of the report, and dumped in pstats format to the profile '
+    'output file, with the phase name appended; the combined profile is '
+    'dumped to the profile output file itself, which defaults to '
+    '"tugboat.pstats".  With "mem", memory allocations are traced with '
+    'tracemalloc, and the top allocators at the end of each phase are '
+    'written to the profile output file, which defaults to standard error.',
+)
+@cli_tools.argument(
+    '--profile-output',
+    metavar='FILE',
+    help='Specify the file the profile should be written to.  See '
+    '"--profile" for the defaults.',
+)
+@cli_tools.mutually_exclusive_group(
+    'archive',
+)
+@cli_tools.argument(
+    '--record',
+    metavar='DIR',
+    help='Record every exchange with the Github API--the URL, and the '
+    'headers and body of the response--in a compressed archive in the '
+    'specified directory.  The run may then be repeated offline, against '
+    'exactly the same data, with "--replay".',
+    group='archive',
+)
+@cli_tools.argument(
+    '--replay',
+    metavar='DIR',
+    help='Serve every request from the archive in the specified directory, '
+    'written by "--record", rather than from the Github API.  No network '
+    'access is needed, and no password is prompted for.',
+    group='archive',
+)
+@cli_tools.argument(
+    '--backend',
+    choices=['rest', 'pygithub'],
+    help='Select the client used to access the Github API.  The "rest" '
+    'client keeps connections open between requests, requests compressed '
+    'responses and the largest pages Github allows, and looks up each '
+    'author only once; the "pygithub" client uses PyGithub, and allows '
+    'templates to refer to any attribute PyGithub provides.  Defaults to '
+    '"rest", or "pygithub" with "--trace-lazy", which traces PyGithub\'s '
+    'lazy completion, or with a template referring to pull request '
+    'attributes the "rest" client doesn\'t provide.',
+)
 @cli_tools.argument(
     '--debug', '-d',
     action='store_true',
@@ -332,20 +835,28 @@ sort_keys = {
     'will be emitted.  This does not affect verbosity.'
 )
 def report(gh, repos, stream=sys.stdout, repo_callback=None,
-           sort_by='created'):
+           sort_by='created', stats=None, metrics=None, template=None,
+           split_dir=None, snapshot=None, previous=None, shard=None,
+           partial=None, deadline=None, checkpoint=None, progress=None,
+           merge_cache=None, enumerator=None, scheduler=None, delta=None,
+           summary=None):
     """
     Generate a report of all open pull requests on the specified
     repositories (see the "--repo", "--user", and "--org" options for
     how to specify repositories).
 
     :param gh: A ``github.Github`` handle for accessing the Github
-               API.
+               API, or a ``tugboat.hosts.Hosts`` object holding a
+               handle for each Github host.
     :param repos: A list of tuples specifying repositories to obtain
                   the report on.  For each element of the list, the
                   first element of the tuple is one of "repo", "user",
                   or "organization", and the second element is the
                   name of that repository, user, or organization,
-                  respectively.
+                  respectively.  With a ``tugboat.hosts.Hosts``
+                  object, the name may be prefixed by the host it's
+                  on, e.g., "ghe.example.com:acme"; the targets on
+                  each host are fetched concurrently.
     :param stream: The output stream to receive the report.  Defaults
                    to ``sys.stdout``.
     :param repo_callback: A callback to invoke for each repository
@@ -364,171 +875,1123 @@ def report(gh, repos, stream=sys.stdout, repo_callback=None,
                     time; "updated", to indicate sorting by update
                     time; or "repo", to indicate sorting by repository
                     name and pull request number.
+    :param stats: An optional ``tugboat.stats.Stats`` object to
+                  receive the time spent in each phase of the report.
+    :param metrics: An optional ``tugboat.metrics.Metrics`` object to
+                    receive the per-repository metrics.
+    :param template: An optional ``tugboat.templates.Template`` object
+                     controlling the layout of the report.  Only the
+                     fields the template references are looked up.
+                     Defaults to the traditional layout.
+    :param split_dir: If provided, the name of a directory to split
+                      the report into.  The pull requests for each
+                      repository are written to a separate file in the
+                      directory, rather than to ``stream``.
+    :param snapshot: An optional ``tugboat.snapshot.Snapshot`` object
+                     to receive a record of each open pull request.
+    :param previous: An optional ``tugboat.snapshot.Snapshot`` object
+                     from an earlier run.  If provided, only the
+                     differences from it are reported.  Pull requests
+                     which have not changed since are not looked up
+                     again.
+    :param shard: An optional ``tugboat.shard.Shard`` object.  If
+                  provided, only the repositories in the shard are
+                  reported on.
+    :param partial: An optional ``tugboat.partial.PartialReport``
+                    object to receive a record of each open pull
+                    request, in report order, for later merging with
+                    ``merge()``.
+    :param deadline: An optional ``tugboat.deadline.Deadline`` object
+                     limiting the time spent fetching pull requests.
+                     If it runs out, the report is rendered from the
+                     repositories which were fetched, and lists the
+                     repositories which were skipped or timed out.
+    :param checkpoint: An optional ``tugboat.checkpoint.Checkpoint``
+                       object.  The pull requests for each repository
+                       are added to it as soon as they are fetched,
+                       and repositories it already holds are not
+                       fetched again, so an interrupted run may be
+                       resumed.
+    :param progress: An optional ``tugboat.progress.Progress`` object
+                     to receive progress events, including the status
+                     messages which are otherwise emitted to standard
+                     error if ``repo_callback`` is provided.
+    :param merge_cache: An optional ``tugboat.mergecache.MergeCache``
+                        object.  The mergeability of pull requests
+                        whose head and base commits it holds is taken
+                        from it, rather than looked up.
+    :param enumerator: An optional ``tugboat.allrepos.Enumerator``
+                       object used to enumerate the repositories of
+                       the "all" target in parallel.
+    :param scheduler: An optional ``tugboat.schedule.Scheduler``
+                      object controlling the order the repositories of
+                      each target are fetched in, and how many at
+                      once.
+    :param delta: An optional ``tugboat.delta.DeltaStore`` object.  If
+                  provided, only the pull requests of each repository
+                  which changed since the last run are listed, and
+                  merged into those it holds.
+    :param summary: An optional ``tugboat.summary.Summary`` object.
+                    If provided, the open pull requests of each
+                    repository are only counted, and only the summary
+                    and the repository breakdown are reported; the
+                    default template then leaves out the counts of
+                    mergeable pull requests.
+
+    :returns: ``EXIT_PARTIAL`` if any repositories were skipped or
+              timed out, ``None`` otherwise.
     """
 
+    if template is None:
+        template = templates.Template(
+            None if summary is None else templates.summary)
+
+    # With a scheduler, what the report needs of each pull request is
+    # looked up by the worker fetching its repository; a diff report
+    # only looks up the pull requests which changed, and a summary
+    # report only the counts
+    if scheduler is not None and previous is None and summary is None:
+        scheduler.lookups = _lookups(
+            template, metrics is not None,
+            snapshot is not None or partial is not None)
+
     # How verbose should we be?
-    verbose = (repo_callback and stream != sys.stdout)
+    verbose = bool((repo_callback or progress) and stream != sys.stdout)
+
+    def status(message):
+        if progress is not None:
+            progress.message(message)
+        elif repo_callback:
+            print(message, file=sys.stderr)
 
     start = datetime.datetime.utcnow()
+    if snapshot is not None:
+        snapshot.generated = start
+    if partial is not None:
+        partial.generated = start
+
+    # Stats will track the phase changes
+    callback = repo_callback
+    if progress is not None:
+        callback = progress.repo_callback
+        progress.start()
+    if stats is not None:
+        callback = stats.repo_callback(callback)
+
+    # Only fetch the repositories in our shard, within the deadline,
+    # and only if they haven't been checkpointed; mergeability comes
+    # from the cache where it can
+    fetch_kwargs = {}
+    if shard is not None:
+        fetch_kwargs['repo_filter'] = shard.__contains__
+    if deadline is not None:
+        fetch_kwargs['deadline'] = deadline
+        deadline.start()
+    if checkpoint is not None:
+        fetch_kwargs['checkpoint'] = checkpoint
+    if merge_cache is not None:
+        fetch_kwargs['merge_cache'] = merge_cache
+    if scheduler is not None:
+        fetch_kwargs['scheduler'] = scheduler
+    if delta is not None:
+        fetch_kwargs['delta'] = delta
+    if summary is not None:
+        fetch_kwargs['summary'] = summary
+
+    def fetch(handle, items, callback, phases):
+        fetched = []
+        for target, name, bare in items:
+            # Emit some status information
+            if progress is not None:
+                progress.target(target, name)
+            elif repo_callback:
+                print(u'Looking up %s "%s"...' % (target, name),
+                      file=sys.stderr)
+
+            if phases:
+                stats.phase('enumerate')
+
+            kwargs = fetch_kwargs
+            if target == 'all' and enumerator is not None:
+                kwargs = dict(fetch_kwargs, enumerator=enumerator)
+
+            if deadline is None:
+                repo_pulls = targets[target](handle, bare, callback,
+                                             **kwargs)
+            else:
+                repo_pulls = deadline.guard(name, targets[target], handle,
+                                            bare, callback, **kwargs)
+                if repo_pulls is None:
+                    continue
+
+            fetched.extend(repo_pulls)
+
+        return fetched
+
+    # Build the list of pull requests.  Each Github host has its own
+    # rate limit, so the targets on different hosts are fetched
+    # concurrently; the phases of the run can't be told apart then,
+    # so it's all counted as fetching
+    groups = hosts.group(gh, repos)
+    if len(groups) == 1:
+        fetched = [fetch(groups[0][0], groups[0][1], callback,
+                         stats is not None)]
+    else:
+        if stats is not None:
+            stats.phase('fetch')
+        host_callback = (repo_callback if progress is None else
+                         progress.repo_callback)
+        fetched = hosts.concurrently(fetch, [
+            (handle, items, host_callback, False)
+            for handle, items in groups
+        ])
 
-    # Build the list of pull requests
     pr_summary = PullSummary()
     pulls = []
-    for target, name in repos:
-        # Emit some status information
-        if repo_callback:
-            print(u'Looking up %s "%s"...' % (target, name),
-                  file=sys.stderr)
-
-        repo_pulls = targets[target](gh, name, repo_callback)
-
+    for repo_pulls in fetched:
         # This uses the convenience return of add_pulls()
         pulls.extend(pr_summary.add_pulls(repo_pulls))
 
+    # Rendering the report from the repositories which were fetched
+    # isn't subject to the deadline
+    skipped = []
+    incomplete = None
+    if deadline is not None:
+        deadline.stop()
+        skipped = deadline.skipped
+        if skipped:
+            incomplete = deadline.covers
+            status(u'Deadline exceeded; %d repositories skipped or timed '
+                   u'out' % len(skipped))
+    if partial is not None:
+        partial.skipped = list(skipped)
+    if progress is not None:
+        progress.finish()
+
     # Now we need to sort the list of pulls...
+    if stats is not None:
+        stats.phase('sort')
     if sort_by in sort_keys:
         pulls.sort(key=sort_keys[sort_by])
 
     # Emit one last piece of status information
-    if repo_callback:
-        print(u'Generating report...', file=sys.stderr)
+    status(u'Generating report...')
+
+    # A summary-only report leaves out the pull requests.  In diff
+    # mode, only the differences from the previous snapshot are
+    # reported; pull requests which haven't changed reuse the
+    # mergeability and author data from the snapshot
+    if summary is not None:
+        _render_summary(stream, summary, pr_summary, start, template,
+                        verbose, stats, metrics, skipped)
+    elif previous is not None:
+        if stats is not None:
+            stats.phase('mergeable')
+        current = [
+            records.PullRecord.from_pull(
+                pull, previous.get((pull.repo.full_name, pull.number)))
+            for pull in pulls
+        ]
+        for record in current:
+            if snapshot is not None:
+                snapshot.add(record)
+            if partial is not None:
+                partial.add(record)
+
+        # Pull requests in repositories which weren't fetched are
+        # carried over from the previous snapshot
+        if snapshot is not None and incomplete is not None:
+            for key, record in previous.pulls.items():
+                if key not in snapshot and incomplete(record.repo_name):
+                    snapshot.add(record)
+
+        if stats is not None:
+            stats.phase('render')
+        _report_diff(stream, template, previous.diff(current, incomplete),
+                     start, verbose)
+        _emit_skipped(stream, skipped)
+
+        if stats is not None:
+            stats.stop()
+        _emit_footer(stream, template, start)
+    else:
+        _render(stream, pulls, pr_summary, start, template, verbose, stats,
+                metrics, split_dir, snapshot, partial, skipped)
+
+    if skipped:
+        return EXIT_PARTIAL
+
+
+def _lookups(template, metrics=False, records=False):
+    """
+    Determine the attributes of each pull request a report needs
+    which take requests of their own to look up.
+
+    :param template: A ``tugboat.templates.Template`` object.
+    :param metrics: If ``True``, the mergeable pull requests in each
+                    repository are counted for the metrics.
+    :param records: If ``True``, a record of each pull request is
+                    kept, which needs every attribute.
+
+    :returns: A tuple of the names of the attributes, such as
+              "mergeable" or "user.name".
+    """
+
+    def uses(attr):
+        # Check the fields which look the attribute up on a pull
+        # request directly
+        return any(template.uses(section, '%s.%s' % (root, attr))
+                   for section, root in _pull_fields)
+
+    lookups = []
+    if (metrics or records or template.uses('header', 'mergeable') or
+            template.uses('pull', 'mergeable') or
+            template.uses('repo', 'repo.mergeable') or uses('mergeable')):
+        lookups.append('mergeable')
+    if records or template.uses('pull', 'username') or uses('user.name'):
+        lookups.append('user.name')
+
+    return tuple(lookups)
+
+
+def _pull_values(pull, start):
+    """
+    Construct the values available to the "pull" section of a
+    template.
+
+    :param pull: The pull request.
+    :param start: The time the report was started, as a naive UTC
+                  ``datetime.datetime``.
+
+    :returns: A dictionary mapping field names to functions of no
+              arguments returning the field values.
+    """
+
+    return {
+        'pull': lambda: pull,
+        'mergeable': lambda: 'yes' if pull.mergeable else 'no',
+        'username': lambda: pull.user.name or '<unknown>',
+        'age': lambda: format_age(start, pull.created_at, ' (age: %s)'),
+        'update': lambda: format_age(start, pull.updated_at, ' (%s ago)'),
+    }
+
+
+def _emit_header(stream, template, total, mergeable, pr_summary, start,
+                 verbose=False):
+    """
+    Emit the summary at the head of a report.
+
+    :param stream: The output stream.
+    :param template: A ``tugboat.templates.Template`` object.
+    :param total: The number of pull requests.
+    :param mergeable: The number of mergeable pull requests, or
+                      ``None`` if it wasn't counted.
+    :param pr_summary: A ``PullSummary`` object summarizing the pull
+                       requests.
+    :param start: The time the report was started, as a naive UTC
+                  ``datetime.datetime``.
+    :param verbose: If ``True``, emit status messages to standard
+                    error.
+    """
+
+    if verbose:
+        if mergeable is None:
+            print("Emitting summary: Open PRs: %d" % total, file=sys.stderr)
+        else:
+            print("Emitting summary: Open PRs: %d (%d mergeable)" %
+                  (total, mergeable), file=sys.stderr)
+    _emit(stream, template, 'header', {
+        'total': lambda: total,
+        'mergeable': lambda: mergeable,
+        'oldest': lambda: pr_summary.oldest,
+        'youngest': lambda: pr_summary.youngest,
+        'least_recent': lambda: pr_summary.least_recent,
+        'most_recent': lambda: pr_summary.most_recent,
+        'start': lambda: start,
+    })
+
+
+def _write_splits(split_dir, splits, verbose=False):
+    """
+    Write the files of a split report.
+
+    :param split_dir: The directory to split the report into.
+    :param splits: A dictionary mapping repository names to
+                   ``io.StringIO`` objects containing the text for the
+                   repository.
+    :param verbose: If ``True``, emit status messages to standard
+                    error.
+    """
+
+    if not splits:
+        return
+
+    if verbose:
+        print("Writing split report files: %d" % len(splits),
+              file=sys.stderr)
+    output.write_files(dict(
+        (output.repo_path(split_dir, name), buf.getvalue())
+        for name, buf in splits.items()
+    ))
+
+
+def _emit_breakdown(stream, template, repos, start, verbose=False,
+                    metrics=None):
+    """
+    Emit the repository breakdown of a report.
+
+    :param stream: The output stream.
+    :param template: A ``tugboat.templates.Template`` object.
+    :param repos: A dictionary mapping repository names to
+                  ``RepoSummary`` objects.
+    :param start: The time the report was started, as a naive UTC
+                  ``datetime.datetime``.
+    :param verbose: If ``True``, emit status messages to standard
+                    error.
+    :param metrics: An optional ``tugboat.metrics.Metrics`` object to
+                    receive the per-repository metrics.
+    """
+
+    if verbose:
+        print("Emitting repositories with open pull requests: %d" % len(repos),
+              file=sys.stderr)
+    _emit(stream, template, 'breakdown', {
+        'repos': lambda: len(repos),
+    })
+    for summary in sorted(repos.values(), key=lambda x: x.name):
+        _emit(stream, template, 'repo', {
+            'repo': lambda: summary,
+        })
+
+        if metrics is not None:
+            age = start - records.naive(summary.oldest)
+            metrics.add_repo(summary.name, summary.pulls, summary.mergeable,
+                             age.days * 86400 + age.seconds)
+
+
+def _emit_skipped(stream, skipped):
+    """
+    Emit the list of repositories which were skipped or timed out, if
+    any, so it's clear the report is incomplete.
+
+    :param stream: The output stream.
+    :param skipped: A list of tuples of the names of the repositories
+                    and the reasons they were left out, or ``None``.
+    """
+
+    if not skipped:
+        return
+
+    print(u"\nIncomplete report: %d repositories skipped or timed out" %
+          len(skipped), file=stream)
+    for name, reason in skipped:
+        print(u"    %s (%s)" % (name, reason), file=stream)
+
+
+def _emit_footer(stream, template, start, verbose=False):
+    """
+    Emit the time data at the foot of a report.
+
+    :param stream: The output stream.
+    :param template: A ``tugboat.templates.Template`` object.
+    :param start: The time the report was started, as a naive UTC
+                  ``datetime.datetime``.
+    :param verbose: If ``True``, emit status messages to standard
+                    error.
+    """
+
+    end = datetime.datetime.utcnow()
+    _emit(stream, template, 'footer', {
+        'elapsed': lambda: end - start,
+        'start': lambda: start,
+        'end': lambda: end,
+    })
+    if verbose:
+        print("Report generated in %s at %s" % (end - start, start),
+              file=sys.stderr)
+
+
+def _render(stream, pulls, pr_summary, start, template, verbose=False,
+            stats=None, metrics=None, split_dir=None, snapshot=None,
+            partial=None, skipped=None):
+    """
+    Render a report on a sorted list of pull requests.
+
+    :param stream: The output stream to receive the report.
+    :param pulls: The sorted list of pull requests.
+    :param pr_summary: A ``PullSummary`` object summarizing the pull
+                       requests.
+    :param start: The time the report was started, as a naive UTC
+                  ``datetime.datetime``.
+    :param template: A ``tugboat.templates.Template`` object.
+    :param verbose: If ``True``, emit status messages to standard
+                    error.
+    :param stats: An optional ``tugboat.stats.Stats`` object.  See
+                  ``report()``.
+    :param metrics: An optional ``tugboat.metrics.Metrics`` object.
+                    See ``report()``.
+    :param split_dir: An optional directory to split the report into.
+                      See ``report()``.
+    :param snapshot: An optional ``tugboat.snapshot.Snapshot`` object.
+                     See ``report()``.
+    :param partial: An optional ``tugboat.partial.PartialReport``
+                    object.  See ``report()``.
+    :param skipped: An optional list of tuples of the names of the
+                    repositories which were skipped or timed out and
+                    the reasons.
+    """
 
     # Don't do anything if there are no pulls
     if not pulls:
         print(u"No open pull requests", file=stream)
+        _emit_skipped(stream, skipped)
+        if stats is not None:
+            stats.stop()
         return
 
+    # Count the mergeable pulls, if the header needs the count; this
+    # looks up mergeability of all the pulls
+    if stats is not None:
+        stats.phase('mergeable')
+    mergeable = None
+    if template.uses('header', 'mergeable'):
+        mergeable = sum(1 for pull in pulls if pull.mergeable)
+
     # Emit a summary
-    if verbose:
-        print("Emitting summary: Open PRs: %d (%d mergeable)" %
-              (len(pulls), sum(1 for pull in pulls if pull.mergeable)),
-              file=sys.stderr)
-    print(u"Open PRs: %d (%d mergeable)" %
-          (len(pulls), sum(1 for pull in pulls if pull.mergeable)),
-          file=stream)
-    print(u"    Oldest PR, from %s: %s#%d" %
-          (pr_summary.oldest.created_at, pr_summary.oldest.repo.full_name,
-           pr_summary.oldest.number), file=stream)
-    print(u"    Youngest PR, from %s: %s#%d" %
-          (pr_summary.youngest.created_at, pr_summary.youngest.repo.full_name,
-           pr_summary.youngest.number), file=stream)
-    print(u"    Least recently updated PR, at %s: %s#%d" %
-          (pr_summary.least_recent.updated_at,
-           pr_summary.least_recent.repo.full_name,
-           pr_summary.least_recent.number), file=stream)
-    print(u"    Most recently updated PR, at %s: %s#%d" %
-          (pr_summary.most_recent.updated_at,
-           pr_summary.most_recent.repo.full_name,
-           pr_summary.most_recent.number), file=stream)
+    if stats is not None:
+        stats.phase('render')
+    _emit_header(stream, template, len(pulls), mergeable, pr_summary, start,
+                 verbose)
 
     # Generate the report of pulls
     repos = {}
+    splits = {}
+    pull_stream = stream
     for pull in pulls:
         if verbose:
             print("Emitting pull request {pull.repo.full_name}"
                   "#{pull.number}".format(pull=pull), file=sys.stderr)
-        print(u"\n"
-              u"Pull request {pull.repo.full_name}#{pull.number}:\n"
-              u"    URL: {pull.html_url}\n"
-              u"    Merge {pull.head.label} -> {pull.base.label}\n"
-              u"    Proposed {pull.created_at}{age}\n"
-              u"    Proposed by {username} ({pull.user.login})\n"
-              u"    Last updated: {pull.updated_at}{update}\n"
-              u"    Mergeable: {mergeable}".format(
-                  pull=pull,
-                  mergeable=('yes' if pull.mergeable else 'no'),
-                  username=(pull.user.name or '<unknown>'),
-                  age=format_age(start, pull.created_at, ' (age: %s)'),
-                  update=format_age(start, pull.updated_at, ' (%s ago)'),
-              ),
-              file=stream)
+        if split_dir:
+            pull_stream = splits.setdefault(pull.repo.full_name,
+                                            io.StringIO())
+        _emit(pull_stream, template, 'pull', _pull_values(pull, start))
 
         # Add repository breakdown data
         repos.setdefault(pull.repo.full_name, RepoSummary(pull.repo.full_name))
         repos[pull.repo.full_name] += pull
 
-    # Generate the repository breakdown
-    if verbose:
-        print("Emitting repositories with open pull requests: %d" % len(repos),
-              file=sys.stderr)
-    print(u"\nRepositories with open pull requests: %d\n"
-          u"Breakdown by repository:" % len(repos),
-          file=stream)
-    for summary in sorted(repos.values(), key=lambda x: x.name):
-        print(u"    Open PRs for %s: %d (%d mergeable)" %
-              (summary.name, summary.pulls, summary.mergeable),
-              file=stream)
+    # Write the split report, then generate the repository breakdown
+    _write_splits(split_dir, splits, verbose)
+    _emit_breakdown(stream, template, repos, start, verbose, metrics)
+
+    # Record the pulls in the snapshot and the partial report
+    if snapshot is not None or partial is not None:
+        for pull in pulls:
+            record = records.PullRecord.from_pull(pull)
+            if snapshot is not None:
+                snapshot.add(record)
+            if partial is not None:
+                partial.add(record)
 
     # Emit the time data
-    end = datetime.datetime.utcnow()
-    print(u"\nReport generated in %s at %s" % (end - start, start),
-          file=stream)
-    if verbose:
-        print("Report generated in %s at %s" % (end - start, start),
-              file=sys.stderr)
+    _emit_skipped(stream, skipped)
+    if stats is not None:
+        stats.stop()
+    _emit_footer(stream, template, start, verbose)
 
 
-def _normal_callback(idx, count, repo, pulls=None):
+def _render_summary(stream, summary, pr_summary, start, template,
+                    verbose=False, stats=None, metrics=None, skipped=None):
+    """
+    Render a summary-only report: the summary and the repository
+    breakdown, without the pull requests.
+
+    :param stream: The output stream to receive the report.
+    :param summary: The ``tugboat.summary.Summary`` object holding the
+                    counts of the pull requests in each repository.
+    :param pr_summary: A ``PullSummary`` object summarizing the pull
+                       requests.
+    :param start: The time the report was started, as a naive UTC
+                  ``datetime.datetime``.
+    :param template: A ``tugboat.templates.Template`` object.
+    :param verbose: If ``True``, emit status messages to standard
+                    error.
+    :param stats: An optional ``tugboat.stats.Stats`` object.  See
+                  ``report()``.
+    :param metrics: An optional ``tugboat.metrics.Metrics`` object.
+                    See ``report()``.
+    :param skipped: An optional list of tuples of the names of the
+                    repositories which were skipped or timed out and
+                    the reasons.
     """
-    A ``repo_callback`` callback to implement "normal" behavior.  This
-    implementation emits a status line indicating the name of the
-    repository being processed.
 
-    :param idx: The index of the repository in the list being
-                processed.
-    :param count: The number of repositories in the list being
-                  processed.
-    :param repo: The repository being processed.
-    :param pulls: The list of ``tugboat.pulls.PullRequest`` objects
-                  for all open pull requests on the repository.
+    total = summary.total
+    if not total:
+        print(u"No open pull requests", file=stream)
+        _emit_skipped(stream, skipped)
+        if stats is not None:
+            stats.stop()
+        return
+
+    # Count the mergeable pulls, if the header needs the count; this
+    # lists every pull request and looks up its mergeability
+    if stats is not None:
+        stats.phase('mergeable')
+    mergeable = None
+    if template.uses('header', 'mergeable'):
+        mergeable = sum(count.mergeable for count in summary.repos.values())
+
+    # Emit the summary and the repository breakdown
+    if stats is not None:
+        stats.phase('render')
+    _emit_header(stream, template, total, mergeable, pr_summary, start,
+                 verbose)
+    _emit_breakdown(stream, template, summary.repos, start, verbose, metrics)
+
+    # Emit the time data
+    _emit_skipped(stream, skipped)
+    if stats is not None:
+        stats.stop()
+    _emit_footer(stream, template, start, verbose)
+
+
+def _emit_results(collector, output):
+    """
+    Emit the results collected by a collector, such as a
+    ``tugboat.stats.Stats`` object.
+
+    :param collector: The collector.  It must have a ``format()``
+                      method, returning a list of lines, and a
+                      ``to_dict()`` method, returning a dictionary
+                      suitable for serializing as JSON.
+    :param output: The name of the file to write the results to as
+                   JSON.  If "-", the formatted results are emitted to
+                   standard error instead.
     """
 
-    if pulls is None:
-        print(u'Processing repository "%s" (%d/%d)...' %
-              (repo.full_name, idx + 1, count), file=sys.stderr)
+    if output == '-':
+        for line in collector.format():
+            print(line, file=sys.stderr)
+    else:
+        with io.open(output, 'w', encoding='utf-8') as f:
+            f.write(u'%s\n' % json.dumps(collector.to_dict(), indent=2,
+                                         sort_keys=True))
 
 
-def _verbose_callback(idx, count, repo, pulls=None):
+def _check_options(args):
     """
-    A ``repo_callback`` callback to implement "verbose" ("-v")
-    behavior.  This implementation emits a status line indicating the
-    name of the repository being processed, then indicates the total
-    number of pull requests and counts the number of mergeable pull
-    requests.
+    Check the options for conflicts, compile the template, and load
+    the snapshot to report differences from, if either was given.
+    The template is compiled first, so errors in it are reported
+    before prompting for a password.
 
-    :param idx: The index of the repository in the list being
-                processed.
-    :param count: The number of repositories in the list being
-                  processed.
-    :param repo: The repository being processed.
-    :param pulls: The list of ``tugboat.pulls.PullRequest`` objects
-                  for all open pull requests on the repository.
+    :param args: The ``argparse.Namespace`` object constructed by
+                 ``cli_tools``.
     """
 
-    if pulls is None:
-        print(u'Processing repository "%s" (%d/%d)...' %
-              (repo.full_name, idx + 1, count), file=sys.stderr, end=' ')
-    else:
-        print(u'%d pulls' % len(pulls), file=sys.stderr, end=' ')
-        print(u'(%d mergeable)' % sum(1 for pull in pulls if pull.mergeable),
-              file=sys.stderr)
+    if args.template:
+        args.template = templates.load(
+            args.template, templates.summary if args.summary_only else None)
+    if args.resume and not args.checkpoint_file:
+        raise ValueError('"--resume" requires "--checkpoint"')
+    if args.adaptive and args.jobs < 2:
+        raise ValueError('"--adaptive" requires "--jobs" of at least 2')
+    if args.shared_cache_file and args.replay:
+        raise ValueError('"--shared-cache" cannot be used with "--replay"')
+    if args.summary_only:
+        for option, value in [('--snapshot', args.snapshot_output),
+                              ('--since-snapshot', args.since_snapshot),
+                              ('--split-dir', args.split_dir),
+                              ('--partial', args.partial_output),
+                              ('--checkpoint', args.checkpoint_file),
+                              ('--delta', args.delta_file)]:
+            if value:
+                raise ValueError('"--summary-only" cannot be used with "%s"' %
+                                 option)
+
+    # These render the pull requests from records, which only hold
+    # what the default template needs
+    if args.template:
+        for option, value in [('--checkpoint', args.checkpoint_file),
+                              ('--delta', args.delta_file),
+                              ('--since-snapshot', args.since_snapshot)]:
+            if not value:
+                continue
+            missing = _unsupported(args.template,
+                                   records.PullRecord.attributes)
+            if missing:
+                raise ValueError(
+                    'The template uses %s, which "%s" does not record; '
+                    'pull requests provide only: %s' %
+                    (', '.join(missing), option,
+                     ', '.join(sorted(records.PullRecord.attributes))))
+
+    # Load the snapshot to report differences from
+    args.previous = None
+    if args.since_snapshot:
+        args.previous = snapshot.load(args.since_snapshot)
+
+
+# The template fields whose values are pull requests, as tuples of
+# the section and the root name
+_pull_fields = [
+    ('pull', 'pull'),
+    ('header', 'oldest'),
+    ('header', 'youngest'),
+    ('header', 'least_recent'),
+    ('header', 'most_recent'),
+]
+
+
+def _unsupported(template, attributes):
+    """
+    Find the fields of a template which look up attributes of a pull
+    request that it doesn't provide.
 
+    :param template: The compiled ``tugboat.templates.Template``.
+    :param attributes: A dictionary describing the attributes the
+                       pull requests provide; see
+                       ``tugboat.templates.Template.unsupported()``.
 
-# Used to translate the verbosity level into an appropriate verbosity
-# callback
-verbosity = [None, _normal_callback, _verbose_callback]
+    :returns: A sorted list of the full names of the fields which
+              aren't supported.
+    """
+
+    result = set()
+    for section, root in _pull_fields:
+        result.update(template.unsupported(section, root, attributes))
+
+    return sorted(result)
+
+
+def _select_backend(args):
+    """
+    Select the client for the Github API.  The lean REST client is
+    the default, but it only provides the pull request attributes the
+    default template uses, so a template which looks up any others,
+    such as "pull.title", is served by PyGithub instead; lazy
+    completion tracing is only meaningful for PyGithub.
+
+    :param args: The ``argparse.Namespace`` object constructed by
+                 ``cli_tools``.
+
+    :returns: The name of the backend, "rest" or "pygithub".
+    """
+
+    if args.backend == 'pygithub' or (not args.backend and
+                                      args.lazy_output):
+        return 'pygithub'
+
+    missing = []
+    if args.template:
+        from tugboat import rest
+        missing = _unsupported(args.template, dict(
+            rest.Pull.attributes, pr=rest.Pull.attributes))
+    if not missing:
+        return 'rest'
+
+    if args.backend == 'rest':
+        raise ValueError('The template uses %s, which "--backend rest" '
+                         'does not provide; use "--backend pygithub"' %
+                         ', '.join(missing))
+    return 'pygithub'
+
+
+def _connect(args, backend):
+    """
+    Obtain a ``tugboat.rest.Client`` or ``github.Github`` object, for
+    the selected backend, using the authentication data collected by
+    the argument processor, with another for each further Github host
+    the targets name.  The handle for all the targets is stored as
+    ``args.gh``.
+
+    :param args: The ``argparse.Namespace`` object constructed by
+                 ``cli_tools``.
+    :param backend: The name of the backend, "rest" or "pygithub".
+
+    :returns: A tuple of the handle for the default host; a sorted
+              list of tuples of the name and handle of each other
+              host; and a dictionary mapping the name of each other
+              host to the URL of its API.
+    """
+
+    # PyGithub is expensive to import, so it's not imported until a
+    # report is actually going to be generated with it
+    if backend == 'pygithub':
+        import github
+
+        # Enable debugging output
+        if args.debug:
+            github.enable_console_debug_logging()
+
+    # Default the username; this is deferred to avoid looking it up
+    # when it won't be needed
+    if not args.username:
+        args.username = getpass.getuser()
+
+    # Get the user's password; none is needed to replay a run
+    password = args.password
+    if not password and not args.replay:
+        password = getpass.getpass(u'Password for %s> ' % args.username)
+
+    def connect(username, password, url):
+        if backend == 'pygithub':
+            return github.Github(username, password, url)
+
+        # The client's HTTP support pulls in the ssl module, so it's
+        # not imported until a report is actually going to be
+        # generated with it
+        from tugboat import rest
+        return rest.Client(username, password, url)
+
+    # Create a github handle
+    default = connect(args.username, password, args.github_url)
+
+    # Targets on other Github hosts, such as Github Enterprise hosts,
+    # are looked up through handles of their own
+    default_host = hosts.url_host(args.github_url)
+    others = sorted(set(
+        host for host, _name in (hosts.split_target(name)
+                                 for _target, name in args.repos)
+        if host is not None and host != default_host))
+    if not others:
+        args.gh = default
+        return default, [], {}
+
+    credentials = {}
+    if args.credentials:
+        credentials = hosts.load_credentials(args.credentials)
+
+    args.gh = hosts.Hosts(default, default_host)
+    urls = {}
+    for host in others:
+        creds = credentials.get(host, {})
+        username = creds.get('username') or args.username
+        host_password = creds.get('password')
+        if not host_password and not args.replay:
+            host_password = getpass.getpass(u'Password for %s@%s> ' %
+                                            (username, host))
+        urls[host] = creds.get('url') or hosts.api_url(host)
+        args.gh.add(host, connect(username, host_password, urls[host]))
+
+    return default, sorted(args.gh.handles.items()), urls
+
+
+def _install_middleware(args, default, extra, urls, recorders):
+    """
+    Install the requested middleware on the handle for each host:
+    recording or replaying the API exchanges, statistics and metrics
+    collection, the shared cache, the deadline, adaptive concurrency,
+    retries, progress reporting, and lazy completion tracing.  Each is
+    installed outside those before it, so the order matters.  The
+    middleware is stored in ``args``, apart from that which only the
+    processor needs.
+
+    :param args: The ``argparse.Namespace`` object constructed by
+                 ``cli_tools``.
+    :param default: The handle for the default host.
+    :param extra: A list of tuples of the name and handle of each
+                  other host.
+    :param urls: A dictionary mapping the name of each other host to
+                 the URL of its API.
+    :param recorders: A list to which the recorders for the other
+                      hosts are added as they're created, so they're
+                      closed even if a later step fails.
+
+    :returns: The lazy completion tracer, or ``None``.
+    """
+
+    # The optional features are imported only when they're requested;
+    # the middleware support is needed by most of them
+    from tugboat import requester
+
+    def install(middleware):
+        requester.add_middleware(default, middleware)
+        for _host, gh in extra:
+            requester.add_middleware(gh, middleware)
+
+    # Record or replay the API exchanges; this is the innermost
+    # middleware, so it sees exactly what crosses the network.  The
+    # exchanges with other hosts are kept in a subdirectory per host
+    args.recorder = None
+    if args.record:
+        from tugboat import replay
+        args.recorder = replay.Recorder(args.record)
+        requester.add_middleware(default, args.recorder)
+        for host, gh in extra:
+            recorders.append(replay.Recorder(os.path.join(args.record, host)))
+            requester.add_middleware(gh, recorders[-1])
+    elif args.replay:
+        from tugboat import replay
+        requester.add_middleware(default, replay.Replayer(args.replay))
+        for host, gh in extra:
+            requester.add_middleware(
+                gh, replay.Replayer(os.path.join(args.replay, host)))
+
+    # Set up statistics collection
+    args.stats = None
+    if args.stats_output:
+        args.stats = stats.Stats()
+        install(args.stats)
+
+    # Set up metrics collection
+    args.metrics = None
+    if args.metrics_output:
+        from tugboat import metrics
+        args.metrics = metrics.Metrics()
+        install(args.metrics)
+        args.metrics.start_run()
+
+    # Set up the shared cache; this wraps the statistics and metrics
+    # collection, so only the requests which miss it are counted
+    args.shared_cache = None
+    if args.shared_cache_file:
+        args.shared_cache = sharedcache.SharedCache(
+            args.shared_cache_file, dict(args.cache_ttls or []),
+            args.cache_size, base_url=args.github_url, stats=args.stats)
+        requester.add_middleware(default, args.shared_cache)
+        for host, gh in extra:
+            requester.add_middleware(gh, args.shared_cache.bind(urls[host]))
+
+    # Set up the deadline; it's shared by all the hosts, but caps the
+    # timeout of each host's requests
+    if args.deadline is not None or args.repo_timeout is not None:
+        from tugboat import deadline
+        args.deadline = deadline.Deadline(
+            args.deadline, args.repo_timeout,
+            requester.get_requester(default))
+        requester.add_middleware(default, args.deadline)
+        for _host, gh in extra:
+            requester.add_middleware(
+                gh, args.deadline.bind(requester.get_requester(gh)))
+
+    # Set up adaptive concurrency; each host has its own limit, which
+    # applies to each attempt at a request
+    args.limiters = []
+    if args.adaptive:
+        from tugboat import adaptive
+        default_host = hosts.url_host(args.github_url)
+        for host, gh in [(default_host, default)] + extra:
+            args.limiters.append(adaptive.Limiter(args.jobs, host=host,
+                                                  stats=args.stats))
+            requester.add_middleware(gh, args.limiters[-1])
+
+    # Set up retries; these wrap the deadline, so nothing is retried
+    # once it has run out
+    args.retry = None
+    if args.retries > 0:
+        args.retry = retry.Retry(args.retries, args.backoff,
+                                 base_url=args.github_url, stats=args.stats)
+        requester.add_middleware(default, args.retry)
+        for host, gh in extra:
+            requester.add_middleware(gh, args.retry.bind(urls[host]))
+
+    # Set up progress reporting: a status line for the verbosity
+    # level, and an event log if requested.  Progress is reported
+    # through events, rather than a callback
+    args.repo_callback = None
+    args.progress = None
+    if args.verbose or args.progress_log:
+        sinks = []
+        if args.verbose:
+            sinks.append(progress.TerminalSink(sys.stderr,
+                                               verbose=args.verbose > 1))
+        if args.progress_log:
+            sinks.append(progress.JsonLinesSink(args.progress_log))
+        args.progress = progress.Progress(sinks)
+        install(args.progress)
+
+    # Set up lazy completion tracing
+    tracer = None
+    if args.lazy_output:
+        from tugboat import lazy
+        tracer = lazy.LazyTracer()
+        install(tracer)
+
+    return tracer
+
+
+def _close_middleware(args, backend, default, extra, recorders):
+    """
+    Close the middleware and connections which need closing, once the
+    report is done, whether or not it succeeded, and report any
+    retries.
+
+    :param args: The ``argparse.Namespace`` object constructed by
+                 ``cli_tools``.
+    :param backend: The name of the backend, "rest" or "pygithub".
+    :param default: The handle for the default host, or ``None`` if
+                    connecting failed.
+    :param extra: A list of tuples of the name and handle of each
+                  other host.
+    :param recorders: A list of the recorders for the other hosts.
+    """
+
+    # Close the progress event log and any pooled connections
+    if args.progress is not None:
+        args.progress.close()
+    if backend == 'rest' and default is not None:
+        default.close()
+        for _host, gh in extra:
+            gh.close()
+
+    # A failed run is as worth replaying as a successful one, so
+    # the archive is always put in place
+    if args.recorder is not None:
+        args.recorder.close()
+    for recorder in recorders:
+        recorder.close()
+    if args.shared_cache is not None:
+        args.shared_cache.close()
+
+    # Report any retries and circuit breaker trips
+    if args.retry and args.verbose and (args.retry.retried or
+                                        args.retry.trips):
+        print(u'Retried %d requests; circuit breaker tripped %d times' %
+              (args.retry.retried, args.retry.trips), file=sys.stderr)
+
+
+def _select_sources(args):
+    """
+    Set up the sources the repositories and pull requests are drawn
+    from: the checkpoint, the mergeability cache, the delta store,
+    the counting of pull requests for a summary-only report, the
+    enumeration of every repository, and the scheduling of repository
+    fetches.  These are stored in ``args``.
+
+    :param args: The ``argparse.Namespace`` object constructed by
+                 ``cli_tools``.
+
+    :returns: A tuple of the repository index and the fetch history,
+              either of which may be ``None``.
+    """
+
+    # Set up checkpointing
+    args.checkpoint = None
+    if args.checkpoint_file:
+        args.checkpoint = checkpoint.Checkpoint(args.checkpoint_file,
+                                                args.max_age)
+        args.checkpoint.open(args.resume)
+
+    # Load the mergeability cache
+    args.merge_cache = None
+    if args.merge_cache_file:
+        args.merge_cache = mergecache.load(args.merge_cache_file,
+                                           stats=args.stats)
+
+    # Load the pull requests stored by the last run
+    args.delta = None
+    if args.delta_file:
+        from tugboat import delta as delta_mod
+        args.delta = delta_mod.load(args.delta_file, stats=args.stats)
+
+    # Set up counting the pull requests of each repository, for a
+    # summary-only report
+    args.summary = None
+    if args.summary_only:
+        from tugboat import summary as summary_mod
+        args.summary = summary_mod.Summary()
+
+    # Set up enumeration of every repository
+    args.enumerator = None
+    repo_index = None
+    if any(target == 'all' for target, _name in args.repos):
+        if args.all_index:
+            repo_index = allrepos.load(args.all_index)
+        args.enumerator = allrepos.Enumerator(
+            args.all_workers, index=repo_index,
+            host=hosts.url_host(args.github_url))
+
+    # Set up the scheduling of repository fetches
+    args.scheduler = None
+    history = None
+    if args.jobs > 1 or args.history_file:
+        if args.history_file:
+            history = schedule.load(args.history_file)
+        args.scheduler = schedule.Scheduler(args.jobs, args.schedule,
+                                            history, args.stats,
+                                            args.progress)
+
+    return repo_index, history
+
+
+def _save_sources(args, succeeded, repo_index, history):
+    """
+    Save what the sources learned, once the report is done, whether
+    or not it succeeded.
+
+    :param args: The ``argparse.Namespace`` object constructed by
+                 ``cli_tools``.
+    :param succeeded: ``True`` if the report succeeded.
+    :param repo_index: The repository index, or ``None``.
+    :param history: The fetch history, or ``None``.
+    """
+
+    # A successful run no longer needs its checkpoint; otherwise,
+    # keep it so the run may be resumed
+    if args.checkpoint is not None:
+        if succeeded:
+            args.checkpoint.remove()
+        else:
+            args.checkpoint.close()
+
+    # Whatever was learned about mergeability remains true even if
+    # the report failed, so the cache is always saved, as are the
+    # pull requests of the repositories which were fetched
+    if args.merge_cache is not None:
+        args.merge_cache.write(args.merge_cache_file)
+    if args.delta is not None:
+        args.delta.write(args.delta_file)
+    if repo_index is not None:
+        repo_index.write(args.all_index)
+    if history is not None:
+        history.write(args.history_file)
+
+
+def _open_outputs(args):
+    """
+    Set up the outputs the report is rendered to: the output stream,
+    and snapshot and partial report collection.  These are stored in
+    ``args``.
+
+    :param args: The ``argparse.Namespace`` object constructed by
+                 ``cli_tools``.
+
+    :returns: ``True`` if the output stream must be closed once the
+              report is done.
+    """
+
+    # Set up snapshot collection
+    args.snapshot = None
+    if args.snapshot_output:
+        args.snapshot = snapshot.Snapshot()
+
+    # Set up partial report collection
+    args.partial = None
+    if args.partial_output:
+        args.partial = partial.PartialReport(args.sort_by, args.shard)
+
+    # Select the correct output stream
+    if args.output == '-':
+        args.stream = sys.stdout
+        return False
+
+    args.stream = output.AtomicFile(args.output)
+    return True
 
 
 @report.processor
 def _process_report(args):
     """
     A ``cli_tools`` processor that adapts between the command line
-    interface and the ``report()`` function.  The processor obtains a
-    ``github.Github`` object, using the authentication data collected
-    by the argument processor; it then selects the correct output
-    stream and ``repo_callback`` function for the verbosity level.
-    After ``report()`` returns, it ensures that the output stream is
-    closed, if required.
+    interface and the ``report()`` function.  The processor checks
+    the options, connects to each Github host the targets name,
+    installs the requested middleware, sets up the sources of the
+    repositories and pull requests and the outputs the report is
+    rendered to, and starts profiling, if requested.  After
+    ``report()`` returns, it closes the outputs and middleware, saves
+    what the sources learned, and emits the profile, statistics,
+    trace, metrics, snapshot, and partial report.
 
     :param args: The ``argparse.Namespace`` object constructed by
                  ``cli_tools``.
@@ -536,33 +1999,518 @@ def _process_report(args):
     :returns: A ``cli_tools`` processor generator.
     """
 
-    # Enable debugging output
-    if args.debug:
-        github.enable_console_debug_logging()
+    # A usage error is reported as a message, like the errors
+    # report() raises, rather than as a traceback
+    try:
+        _check_options(args)
+        backend = _select_backend(args)
+    except ValueError as exc:
+        if args.debug:
+            raise
+        raise SystemExit(str(exc))
+
+    # The setup is done within the guarded block, so whatever it has
+    # acquired is released even if a later step fails; start from
+    # nothing acquired
+    default, extra, urls = None, [], {}
+    recorders = []
+    tracer = None
+    repo_index = history = None
+    close = False
+    profiler = None
+    for attr in ('stats', 'progress', 'recorder', 'shared_cache', 'retry',
+                 'checkpoint', 'merge_cache', 'delta'):
+        setattr(args, attr, None)
+
+    succeeded = False
+    try:
+        default, extra, urls = _connect(args, backend)
+        tracer = _install_middleware(args, default, extra, urls, recorders)
+        repo_index, history = _select_sources(args)
+        close = _open_outputs(args)
+
+        # Set up profiling; the profiler relies on the phase markers
+        # maintained by the statistics collector
+        if args.profile:
+            profiler = profiling.profilers[args.profile](
+                args.profile_output)
+            if args.stats is None:
+                args.stats = stats.Stats()
+            args.stats.listeners.append(profiler)
+            profiler.start()
+
+        # Generate the report as requested
+        yield
+        succeeded = True
+    finally:
+        # Make sure the stream gets closed; this puts the report in
+        # place, unless generating it failed, in which case any
+        # existing report is left untouched
+        if close:
+            if succeeded:
+                args.stream.close()
+            else:
+                args.stream.abort()
+
+        _close_middleware(args, backend, default, extra, recorders)
+        _save_sources(args, succeeded, repo_index, history)
+
+        # Emit the profile, statistics, and lazy completion trace
+        if profiler:
+            profiler.finish()
+        if args.stats_output and args.stats is not None:
+            _emit_results(args.stats, args.stats_output)
+        if args.lazy_output and tracer is not None:
+            _emit_results(tracer, args.lazy_output)
+
+    # Export the metrics and save the snapshot; this is only done if
+    # the report succeeded
+    if args.metrics_output:
+        args.metrics.end_run()
+        args.metrics.write(args.metrics_output, default)
+    if args.snapshot_output:
+        args.snapshot.write(args.snapshot_output)
+    if args.partial_output:
+        args.partial.write(args.partial_output)
+
+
+def _check_partials(headers):
+    """
+    Check that a set of partial reports may be merged.  The partial
+    reports must all be sorted in the same order; if they are for
+    shards, they must be for every shard of the same number of shards,
+    exactly once.  Partial reports which are not for shards, such as
+    those for different teams, may overlap.
 
-    # Get the user's password
-    password = args.password
-    if not password:
-        password = getpass.getpass(u'Password for %s> ' % args.username)
+    :param headers: A dictionary mapping the names of the partial
+                    report files to their headers.
 
-    # Create a github handle
-    args.gh = github.Github(args.username, password, args.github_url)
+    :returns: The order the pull requests are sorted in.
+    """
+
+    sorts = set(header.get('sort_by') for header in headers.values())
+    if len(sorts) > 1:
+        raise ValueError('Partial reports are sorted in different orders: %s' %
+                         ', '.join(sorted('"%s"' % x for x in sorts)))
+    sort_by = sorts.pop()
+    if sort_by not in sort_keys:
+        raise ValueError('Partial reports are sorted in an unknown order: '
+                         '"%s"' % sort_by)
+
+    # Check the shards
+    sharded = [path for path, header in headers.items()
+               if header.get('shard') is not None]
+    if not sharded:
+        return sort_by
+    elif len(sharded) != len(headers):
+        raise ValueError('Partial report "%s" is not for a shard' %
+                         sorted(set(headers) - set(sharded))[0])
+
+    shards = {}
+    for path, header in sorted(headers.items()):
+        spec = shard.Shard.parse(header['shard'])
+        if spec.count != len(headers):
+            raise ValueError('Partial report "%s" is for shard %s, but %d '
+                             'partial reports were given' %
+                             (path, spec, len(headers)))
+        if spec.index in shards:
+            raise ValueError('Partial reports "%s" and "%s" are both for '
+                             'shard %s' % (shards[spec.index], path, spec))
+        shards[spec.index] = path
+
+    return sort_by
+
+
+def _merge_records(readers, key):
+    """
+    Merge several sorted sequences of pull request records into one.
+    This is a k-way merge: only the next record from each sequence is
+    held in memory at once.  A pull request which appears in more than
+    one sequence is only emitted once; since the sort keys identify
+    the pull request, the copies arrive together.
+
+    :param readers: A list of tuples of the name of a partial report
+                    file and an iterator over its records.
+    :param key: The sort key routine the records are sorted by; see
+                ``sort_keys``.
+
+    :returns: An iterator over the merged records.
+    """
+
+    def decorate(idx, path, reader):
+        # Check the order as we go; the input index and position
+        # break ties between copies of the same pull request, so the
+        # records themselves are never compared
+        last = None
+        for pos, record in enumerate(reader):
+            this = key(record)
+            if last is not None and this < last:
+                raise ValueError('Partial report "%s" is not sorted' % path)
+            last = this
+            yield this, idx, pos, record
+
+    previous = None
+    for _key, _idx, _pos, record in heapq.merge(*[
+            decorate(idx, path, reader)
+            for idx, (path, reader) in enumerate(readers)]):
+        if record.key == previous:
+            continue
+        previous = record.key
+        yield record
+
+
+def _render_merged(stream, records, start, template, verbose=False,
+                   split_dir=None, snapshot=None, skipped=None):
+    """
+    Render a report on a stream of sorted pull request records, such
+    as that produced by ``_merge_records()``.  The summary needed by
+    the header is only known once all the records have been seen, so
+    the rendered pull requests are spooled to a temporary file, which
+    is copied to the output after the header; the summaries are
+    computed incrementally, so memory use doesn't depend on the number
+    of pull requests.
+
+    :param stream: The output stream to receive the report.
+    :param records: An iterator over the sorted
+                    ``tugboat.records.PullRecord`` objects.
+    :param start: The time the report was started, as a naive UTC
+                  ``datetime.datetime``.
+    :param template: A ``tugboat.templates.Template`` object.
+    :param verbose: If ``True``, emit status messages to standard
+                    error.
+    :param split_dir: An optional directory to split the report into.
+                      See ``report()``.
+    :param snapshot: An optional ``tugboat.snapshot.Snapshot`` object.
+                     See ``report()``.
+    :param skipped: An optional list of tuples of the names of the
+                    repositories which were skipped or timed out and
+                    the reasons.
+    """
+
+    fd, spool_name = tempfile.mkstemp(prefix='tugboat.')
+    os.unlink(spool_name)
+    with io.open(fd, 'w+', encoding='utf-8',
+                 buffering=output.BUFSIZE) as spool:
+        pr_summary = PullSummary()
+        repos = {}
+        splits = {}
+        total = 0
+        mergeable = 0
+        pull_stream = spool
+        for record in records:
+            total += 1
+            pr_summary.add_pull(record)
+            if record.mergeable:
+                mergeable += 1
+
+            if verbose:
+                print("Emitting pull request {pull.repo.full_name}"
+                      "#{pull.number}".format(pull=record), file=sys.stderr)
+            if split_dir:
+                pull_stream = splits.setdefault(record.repo_name,
+                                                io.StringIO())
+            _emit(pull_stream, template, 'pull', _pull_values(record, start))
+
+            # Add repository breakdown data; the mergeability of a
+            # record is already known, so count it right away rather
+            # than holding on to the record
+            summary = repos.setdefault(record.repo_name,
+                                       RepoSummary(record.repo_name))
+            summary += record
+            summary.mergeable
+
+            if snapshot is not None:
+                snapshot.add(record)
+
+        # Don't do anything if there are no pulls
+        if not total:
+            print(u"No open pull requests", file=stream)
+            _emit_skipped(stream, skipped)
+            return
+
+        _emit_header(stream, template, total, mergeable, pr_summary, start,
+                     verbose)
+
+        # Copy the spooled pull requests
+        spool.seek(0)
+        shutil.copyfileobj(spool, stream, output.BUFSIZE)
+
+    _write_splits(split_dir, splits, verbose)
+    _emit_breakdown(stream, template, repos, start, verbose)
+    _emit_skipped(stream, skipped)
+    _emit_footer(stream, template, start, verbose)
+
+
+@cli_tools.argument(
+    'inputs',
+    nargs='+',
+    metavar='PARTIAL',
+    help='A partial report saved by "tugboat --partial".  The partial '
+    'reports must all be sorted in the same order.  When merging shards, a '
+    'partial report must be given for each shard; otherwise, pull requests '
+    'appearing in more than one partial report are reported once.',
+)
+@cli_tools.argument(
+    '--output', '-O',
+    default='-',
+    help='Specify the file name the report should be emitted to.  If not '
+    'provided, or if specified as "-", the report will be emitted to '
+    'standard output.',
+)
+@cli_tools.argument(
+    '--snapshot', '-s',
+    dest='snapshot_output',
+    metavar='FILE',
+    help='Save a snapshot of the open pull requests to the specified file.  '
+    'The snapshot may be used with "tugboat --since-snapshot" by a later '
+    'run.  The snapshot is only saved if the merge succeeds.',
+)
+@cli_tools.argument(
+    '--split-dir', '-D',
+    metavar='DIR',
+    help='Split the report by repository.  See "tugboat --split-dir".',
+)
+@cli_tools.argument(
+    '--template', '-t',
+    metavar='TEMPLATE',
+    help='Specify a template controlling the layout of the report.  See '
+    '"tugboat --template".',
+)
+@cli_tools.argument(
+    '--verbose', '-v',
+    action='store_true',
+    help='Request verbose output.  This will cause status messages to be '
+    'emitted while merging the report.',
+)
+@cli_tools.argument(
+    '--debug', '-d',
+    action='store_true',
+    help='Enable debugging mode.  If errors occur, a more detailed output '
+    'will be emitted.  This does not affect verbosity.'
+)
+def merge(inputs, stream=sys.stdout, template=None, split_dir=None,
+          snapshot=None, verbose=False):
+    """
+    Merge partial reports into a single report.  The partial reports
+    may be those saved by runs on each shard of the repositories (see
+    the "--shard" and "--partial" options of "tugboat"), in which case
+    the report is identical to the report of a single run on all the
+    repositories, or those saved by runs for different teams or on
+    different hosts, in which case pull requests appearing in more than
+    one partial report are only reported once.  The partial reports
+    must all be sorted in the same order; they are merged as they are
+    read, so only one pull request from each is held in memory at a
+    time.  The report is generated as of the time the earliest partial
+    report was started.
+
+    :param inputs: A list of the names of the partial report files.
+    :param stream: The output stream to receive the report.  Defaults
+                   to ``sys.stdout``.
+    :param template: An optional ``tugboat.templates.Template`` object
+                     controlling the layout of the report.  Defaults to
+                     the traditional layout.
+    :param split_dir: If provided, the name of a directory to split
+                      the report into.  See ``report()``.
+    :param snapshot: An optional ``tugboat.snapshot.Snapshot`` object
+                     to receive a record of each open pull request.
+    :param verbose: If ``True``, emit status messages to standard
+                    error.
+
+    :returns: ``EXIT_PARTIAL`` if any of the partial reports were
+              incomplete, ``None`` otherwise.
+    """
+
+    if template is None:
+        template = templates.Template()
+
+    # Read the headers, making sure the partial reports are compatible
+    headers = {}
+    readers = []
+    for path in inputs:
+        if verbose:
+            print(u'Reading partial report "%s"...' % path, file=sys.stderr)
+        header, reader = partial.read(path)
+        headers[path] = header
+        readers.append((path, reader))
+    sort_by = _check_partials(headers)
+
+    # The report is as of the earliest partial report
+    times = [records.parse_time(header['generated'])
+             for header in headers.values() if header.get('generated')]
+    start = min(times) if times else datetime.datetime.utcnow()
+    if snapshot is not None:
+        snapshot.generated = start
+
+    # Any repositories the partial reports left out are still missing
+    skipped = []
+    for path in inputs:
+        skipped.extend(tuple(item)
+                       for item in headers[path].get('skipped', []))
+
+    if verbose:
+        print(u'Generating report...', file=sys.stderr)
+    _render_merged(stream, _merge_records(readers, sort_keys[sort_by]),
+                   start, template, verbose, split_dir, snapshot, skipped)
+
+    if skipped:
+        return EXIT_PARTIAL
+
+
+@merge.processor
+def _process_merge(args):
+    """
+    A ``cli_tools`` processor that adapts between the command line
+    interface and the ``merge()`` function.  The processor compiles
+    the template, if one was given, selects the correct output stream,
+    and sets up snapshot collection, if requested.  After ``merge()``
+    returns, it ensures that the output stream is closed, if required,
+    and saves the snapshot.
+
+    :param args: The ``argparse.Namespace`` object constructed by
+                 ``cli_tools``.
+
+    :returns: A ``cli_tools`` processor generator.
+    """
+
+    # Compile the template
+    if args.template:
+        args.template = templates.load(args.template)
 
     # Select the correct output stream
     if args.output == '-':
         args.stream = sys.stdout
         close = False
     else:
-        args.stream = io.open(args.output, 'w', encoding='utf-8')
+        args.stream = output.AtomicFile(args.output)
         close = True
 
-    # Select the correct verbosity
-    args.repo_callback = verbosity[args.verbose]
+    # Set up snapshot collection
+    args.snapshot = None
+    if args.snapshot_output:
+        args.snapshot = snapshot.Snapshot()
 
-    # Generate the report as requested
+    # Merge the report
+    succeeded = False
     try:
         yield
+        succeeded = True
     finally:
         # Make sure the stream gets closed
         if close:
-            args.stream.close()
+            if succeeded:
+                args.stream.close()
+            else:
+                args.stream.abort()
+
+    # Save the snapshot; this is only done if the merge succeeded
+    if args.snapshot_output:
+        args.snapshot.write(args.snapshot_output)
+
+
+@cli_tools.console
+def cache():
+    """
+    Inspect or maintain a shared cache of Github objects, as used by
+    "tugboat --shared-cache".
+
+    :returns: An error message, as a subcommand is required.
+    """
+
+    return 'Specify a subcommand: "stats" or "prune"'
+
+
+@cache.subcommand('stats')
+@cli_tools.argument(
+    'cache_file',
+    metavar='CACHE',
+    help='The shared cache, as given to "tugboat --shared-cache".',
+)
+@cli_tools.argument(
+    '--cache-ttl',
+    dest='cache_ttls',
+    action='append',
+    type=sharedcache.parse_ttl,
+    metavar='KIND=SECONDS',
+    help='Count the entries of the specified kind of object as expired '
+    'once they are older than the specified number of seconds.  See '
+    '"tugboat --cache-ttl".',
+)
+def cache_stats(cache_file, cache_ttls=None, stream=sys.stdout):
+    """
+    Summarize the contents of a shared cache: the number of entries of
+    each kind of object, how many have expired, their size, and how
+    many times they have been served from the cache.
+
+    :param cache_file: The name of the shared cache database.
+    :param cache_ttls: An optional list of tuples of a kind of object
+                       and its time to live, in seconds.
+    :param stream: The output stream to receive the summary.  Defaults
+                   to ``sys.stdout``.
+    """
+
+    shared = sharedcache.SharedCache(cache_file, dict(cache_ttls or []))
+    try:
+        summary = shared.summary()
+    finally:
+        shared.close()
+
+    print(u'Shared cache "%s": %d entries, %d bytes' %
+          (cache_file, sum(s['entries'] for s in summary.values()),
+           sum(s['size'] for s in summary.values())), file=stream)
+    for obj_kind, entry in sorted(summary.items()):
+        print(u'    %s: %d entries (%d expired), %d bytes, %d hits' %
+              (obj_kind, entry['entries'], entry['expired'], entry['size'],
+               entry['hits']), file=stream)
+
+
+@cache.subcommand('prune')
+@cli_tools.argument(
+    'cache_file',
+    metavar='CACHE',
+    help='The shared cache, as given to "tugboat --shared-cache".',
+)
+@cli_tools.argument(
+    '--cache-ttl',
+    dest='cache_ttls',
+    action='append',
+    type=sharedcache.parse_ttl,
+    metavar='KIND=SECONDS',
+    help='Remove the entries of the specified kind of object once they are '
+    'older than the specified number of seconds.  See "tugboat '
+    '--cache-ttl".',
+)
+@cli_tools.argument(
+    '--cache-size',
+    type=int,
+    default=sharedcache.DEFAULT_MAX_SIZE,
+    metavar='BYTES',
+    help='Evict the least recently used entries until the cache is no '
+    'larger than the specified size.  Defaults to %(default)s.',
+)
+def cache_prune(cache_file, cache_ttls=None,
+                cache_size=sharedcache.DEFAULT_MAX_SIZE, stream=sys.stdout):
+    """
+    Remove the expired entries from a shared cache, and evict the
+    least recently used entries if it's too large.  Runs using the
+    cache keep it within its size themselves, but leave expired
+    entries in place until they're fetched again; pruning reclaims
+    the space held by objects no run has asked for since.
+
+    :param cache_file: The name of the shared cache database.
+    :param cache_ttls: An optional list of tuples of a kind of object
+                       and its time to live, in seconds.
+    :param cache_size: The size, in bytes, beyond which the least
+                       recently used entries are evicted.
+    :param stream: The output stream to receive the summary.  Defaults
+                   to ``sys.stdout``.
+    """
+
+    shared = sharedcache.SharedCache(cache_file, dict(cache_ttls or []),
+                                     cache_size)
+    try:
+        removed, freed = shared.prune()
+    finally:
+        shared.close()
+
+    print(u'Removed %d entries (%d bytes) from shared cache "%s"' %
+          (removed, freed, cache_file), file=stream)
@@ -0,0 +1,166 @@
+# Copyright 2014 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the
+#    License. You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing,
+#    software distributed under the License is distributed on an "AS
+#    IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+#    express or implied. See the License for the specific language
+#    governing permissions and limitations under the License.
+
+import threading
+
+from tugboat import rest
+
+
+def get_requester(gh):
+    """
+    Retrieve the object actually responsible for issuing requests to
+    the Github API.  For a ``github.Github`` handle, this is its
+    private ``github.Requester.Requester``; every PyGithub object
+    created from the handle, including lazily completed objects and
+    paginated lists, shares that requester.  A ``tugboat.rest.Client``
+    is its own requester.
+
+    :param gh: A ``github.Github`` handle or ``tugboat.rest.Client``.
+
+    :returns: The requester object.  All requests pass through its
+              ``requestJsonAndCheck()`` method.
+    """
+
+    return getattr(gh, '_Github__requester', gh)
+
+
+# Guards giving a PyGithub requester per-thread timeout caps
+_caps_lock = threading.Lock()
+
+
+def _capped(cls, caps):
+    """
+    Derive a connection class whose timeout is capped for each thread.
+    PyGithub shares one connection among all the threads using a
+    requester, and reads its ``timeout`` as each request is issued.
+
+    :param cls: The connection class.
+    :param caps: A ``threading.local`` object whose ``timeout``
+                 attribute is the cap for the calling thread.
+
+    :returns: The derived class.
+    """
+
+    class CappedConnection(cls):
+        @property
+        def timeout(self):
+            return rest.capped_timeout(self.__dict__.get('_timeout'),
+                                       getattr(caps, 'timeout', None))
+
+        @timeout.setter
+        def timeout(self, value):
+            self.__dict__['_timeout'] = value
+
+    CappedConnection.__name__ = cls.__name__
+    return CappedConnection
+
+
+def cap_timeout(requester, timeout):
+    """
+    Cap the timeout of the requests issued through a requester by the
+    calling thread, leaving the requests of other threads alone.  The
+    requester's own timeout is never changed.
+
+    :param requester: The requester object; see ``get_requester()``.
+    :param timeout: The cap, in seconds, or ``None`` to remove it.
+
+    :returns: The previous cap for the calling thread.
+    """
+
+    # The lean REST client caps its timeouts itself
+    if isinstance(requester, rest.Client):
+        return requester.cap_timeout(timeout)
+
+    with _caps_lock:
+        caps = vars(requester).get('_tugboat_caps')
+        if caps is None:
+            caps = requester._tugboat_caps = threading.local()
+            requester._Requester__connectionClass = _capped(
+                requester._Requester__connectionClass, caps)
+            connection = getattr(requester, '_Requester__connection', None)
+            if connection is not None:
+                base = vars(connection).pop('timeout', None)
+                connection.__class__ = _capped(connection.__class__, caps)
+                connection.timeout = base
+
+    previous = getattr(caps, 'timeout', None)
+    caps.timeout = timeout
+    return previous
+
+
+def add_middleware(gh, middleware):
+    """
+    Install a middleware around all API requests made through a
+    ``github.Github`` handle.  The middleware is a callable which
+    will be passed the next handler in the chain, followed by the
+    arguments of ``requestJsonAndCheck()``, that is, the HTTP verb,
+    the URL, and any further positional or keyword arguments.  It
+    must return the ``(headers, data)`` tuple for the request,
+    typically by calling the next handler with the same arguments.
+    Middleware installed later wraps middleware installed earlier.
+
+    :param gh: A ``github.Github`` handle.
+    :param middleware: The middleware callable.
+
+    :returns: The middleware, for convenience.
+    """
+
+    requester = get_requester(gh)
+    handler = requester.requestJsonAndCheck
+
+    def request(verb, url, *args, **kwargs):
+        return middleware(handler, verb, url, *args, **kwargs)
+
+    requester.requestJsonAndCheck = request
+
+    return middleware
+
+
+class RequestCounter(object):
+    """
+    A middleware which counts the requests made through a
+    ``github.Github`` handle.  Every request is counted, whether it
+    succeeds or not, and the verb and URL of each request is retained
+    in order.
+    """
+
+    def __init__(self):
+        """
+        Initialize a ``RequestCounter`` object.
+        """
+
+        self.requests = []
+
+    def __call__(self, call, verb, url, *args, **kwargs):
+        """
+        Count a request and pass it on to the next handler.
+
+        :param call: The next handler in the chain.
+        :param verb: The HTTP verb of the request.
+        :param url: The URL of the request.
+
+        :returns: The result of the next handler.
+        """
+
+        self.requests.append((verb, url))
+
+        return call(verb, url, *args, **kwargs)
+
+    def __len__(self):
+        """
+        Return the number of requests counted so far.
+        """
+
+        return len(self.requests)
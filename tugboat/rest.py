@@ -0,0 +1,754 @@
+# Copyright 2014 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the
+#    License. You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing,
+#    software distributed under the License is distributed on an "AS
+#    IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+#    express or implied. See the License for the specific language
+#    governing permissions and limitations under the License.
+
+import base64
+import errno
+import json
+import re
+import threading
+import zlib
+
+try:
+    from http import client as http_client
+    from urllib import parse
+    from urllib.parse import urlencode
+except ImportError:  # pragma: no cover
+    import httplib as http_client
+    from urllib import urlencode
+    import urlparse as parse
+
+from tugboat import records
+
+
+# The default API URL
+DEFAULT_BASE_URL = 'https://api.github.com'
+
+# The default request timeout, in seconds
+DEFAULT_TIMEOUT = 15
+
+# The number of items requested per page of a list; 100 is the most
+# Github will return
+PER_PAGE = 100
+
+# The maximum number of idle connections kept open for each host
+DEFAULT_POOL_SIZE = 4
+
+# The redirects followed, as for a renamed or transferred repository,
+# and the most followed for a single request
+REDIRECTS = frozenset([301, 302, 307, 308])
+MAX_REDIRECTS = 5
+
+# The errors which mean a pooled connection was closed by the server
+# before it sent any of its response
+_STALE_ERRNOS = frozenset([errno.ECONNRESET, errno.ECONNABORTED,
+                           errno.EPIPE])
+
+# Matches a link in a "Link" header
+_link_re = re.compile(r'<([^>]*)>\s*;\s*rel="([^"]*)"')
+
+
+class RestError(Exception):
+    """
+    Raised when the Github API returns an error.  Like PyGithub's
+    ``github.GithubException``, it carries the HTTP status of the
+    response, so it can be recognized as transient or not.
+    """
+
+    def __init__(self, status, data=None, headers=None):
+        """
+        Initialize a ``RestError`` object.
+
+        :param status: The HTTP status of the response.
+        :param data: The decoded body of the response.
+        :param headers: A dictionary of the response headers.
+        """
+
+        super(RestError, self).__init__(status, data)
+        self.status = status
+        self.data = data
+        self.headers = headers or {}
+
+    def __str__(self):
+        """
+        Format the error.
+        """
+
+        message = None
+        if isinstance(self.data, dict):
+            message = self.data.get('message')
+        return '%s %s' % (self.status, message or '')
+
+
+def parse_links(header):
+    """
+    Parse a "Link" header, as used by Github to paginate lists.
+
+    :param header: The value of the header, or ``None``.
+
+    :returns: A dictionary mapping relations, such as "next", to URLs.
+    """
+
+    if not header:
+        return {}
+
+    return dict((rel, url) for url, rel in _link_re.findall(header))
+
+
+def parse_time(text):
+    """
+    Parse a time returned by the Github API.
+
+    :param text: The time, e.g., "2014-01-01T00:00:00Z", or ``None``.
+
+    :returns: A timezone-aware UTC ``datetime.datetime``, as PyGithub
+              would return, or ``None``.
+    """
+
+    return records.aware(records.parse_time(text))
+
+
+def _stale(exc):
+    """
+    Determine whether a request on a pooled connection failed because
+    the server had already closed the connection.  Such a request
+    never reached the server, so it's safe to send again; a timeout,
+    on the other hand, may mean the server is still working on it.
+
+    :param exc: The exception raised by the request.
+
+    :returns: ``True`` if the connection was stale, ``False``
+              otherwise.
+    """
+
+    # Python 3 raises RemoteDisconnected, a BadStatusLine, when the
+    # connection is closed without a response
+    if isinstance(exc, http_client.BadStatusLine):
+        return True
+
+    return getattr(exc, 'errno', None) in _STALE_ERRNOS
+
+
+def capped_timeout(timeout, cap):
+    """
+    Apply a cap to a request timeout.
+
+    :param timeout: The timeout, in seconds, or ``None`` for no
+                    timeout.
+    :param cap: The cap, in seconds, or ``None`` for no cap.
+
+    :returns: The lesser of the two, ignoring ``None``.
+    """
+
+    if cap is None:
+        return timeout
+    if timeout is None:
+        return cap
+    return min(timeout, cap)
+
+
+class Client(object):
+    """
+    A minimal client for the Github REST API, covering only what a
+    report needs: listing repositories, listing pull requests, and
+    looking up pull requests and users.  Compared to PyGithub, it
+    keeps connections open between requests, requests compressed
+    responses, asks for the largest pages Github will return, and
+    decodes responses directly into compact objects, with nothing
+    completed lazily except mergeability and author names.  Author
+    names are looked up once per author, rather than once per pull
+    request.
+
+    The client provides the subset of the ``github.Github`` interface
+    used by ``tugboat.pulls.PullRequest``, and issues every request
+    through ``requestJsonAndCheck()``, just as PyGithub's requester
+    does, so it serves as its own requester for
+    ``tugboat.requester.add_middleware()``.
+    """
+
+    def __init__(self, login=None, password=None, base_url=DEFAULT_BASE_URL,
+                 timeout=DEFAULT_TIMEOUT, pool_size=DEFAULT_POOL_SIZE):
+        """
+        Initialize a ``Client`` object.
+
+        :param login: The user name to authenticate as.
+        :param password: The password or token to authenticate with.
+        :param base_url: The API URL.
+        :param timeout: The request timeout, in seconds.
+        :param pool_size: The maximum number of idle connections kept
+                          open for each host.
+        """
+
+        self.base_url = (base_url or DEFAULT_BASE_URL).rstrip('/')
+        self.timeout = timeout
+        self.pool_size = pool_size
+
+        # A tuple of the remaining and total API rate limit, as last
+        # reported by Github; (-1, -1) until a response reports it
+        self.rate_limiting = (-1, -1)
+
+        self._headers = {
+            'Accept': 'application/vnd.github.v3+json',
+            'Accept-Encoding': 'gzip',
+            'User-Agent': 'tugboat',
+        }
+        if login and password:
+            token = base64.b64encode(
+                (u'%s:%s' % (login, password)).encode('utf-8'))
+            self._headers['Authorization'] = 'Basic %s' % token.decode(
+                'ascii')
+
+        # A dictionary mapping (scheme, host) tuples to lists of idle
+        # connections
+        self._pool = {}
+
+        # A dictionary mapping user logins to names, and one mapping
+        # the logins being looked up to locks held while they are
+        self._names = {}
+        self._lookups = {}
+
+        # The cap on the timeout of the requests each thread issues;
+        # see cap_timeout()
+        self._caps = threading.local()
+
+        self._lock = threading.Lock()
+
+    def cap_timeout(self, timeout):
+        """
+        Cap the timeout of the requests issued by the calling thread,
+        leaving the requests of other threads alone.
+
+        :param timeout: The cap, in seconds, or ``None`` to remove it.
+
+        :returns: The previous cap for the calling thread.
+        """
+
+        previous = getattr(self._caps, 'timeout', None)
+        self._caps.timeout = timeout
+        return previous
+
+    def _timeout(self):
+        """
+        Compute the timeout of a request issued by the calling thread.
+
+        :returns: The timeout, in seconds, or ``None``.
+        """
+
+        return capped_timeout(self.timeout,
+                              getattr(self._caps, 'timeout', None))
+
+    def requestJsonAndCheck(self, verb, url, parameters=None, headers=None,
+                            input=None):
+        """
+        Issue a request to the Github API.  The signature and result
+        match those of PyGithub's requester, so middleware may be
+        installed around this method.
+
+        :param verb: The HTTP verb of the request.
+        :param url: The URL of the request.  A URL beginning with "/"
+                    is relative to the API URL.
+        :param parameters: An optional dictionary of query parameters.
+        :param headers: An optional dictionary of additional request
+                        headers.
+        :param input: An optional object to send as the JSON body of
+                      the request.
+
+        :returns: A tuple of a dictionary of the response headers,
+                  with lowercased names, and the decoded response
+                  body.
+        """
+
+        if url.startswith('/'):
+            url = self.base_url + url
+        if parameters:
+            url = '%s%s%s' % (url, '&' if '?' in url else '?',
+                              urlencode(sorted(parameters.items())))
+
+        request_headers = dict(self._headers)
+        request_headers.update(headers or {})
+        body = None
+        if input is not None:
+            body = json.dumps(input).encode('utf-8')
+            request_headers['Content-Type'] = 'application/json'
+
+        redirects = 0
+        while True:
+            status, response_headers, data = self._request(
+                verb, url, body, request_headers)
+
+            if 'x-ratelimit-remaining' in response_headers:
+                self.rate_limiting = (
+                    int(response_headers['x-ratelimit-remaining']),
+                    int(response_headers.get('x-ratelimit-limit', -1)),
+                )
+
+            # Follow the redirect for a renamed or transferred
+            # repository; the credentials only go to the same host
+            location = response_headers.get('location')
+            if (status in REDIRECTS and location and
+                    redirects < MAX_REDIRECTS):
+                redirects += 1
+                target = parse.urljoin(url, location)
+                if parse.urlparse(target).netloc != parse.urlparse(
+                        url).netloc:
+                    request_headers = dict(
+                        (name, value) for name, value
+                        in request_headers.items() if name != 'Authorization')
+                url = target
+                continue
+
+            break
+
+        if not 200 <= status < 300:
+            raise RestError(status, data, response_headers)
+
+        return response_headers, data
+
+    def _request(self, verb, url, body, headers):
+        """
+        Issue a request over a pooled connection.  A request on a
+        connection taken from the pool is retried on a fresh
+        connection if the server had already closed it, before
+        sending any of its response.
+
+        :param verb: The HTTP verb of the request.
+        :param url: The absolute URL of the request.
+        :param body: The body of the request, or ``None``.
+        :param headers: A dictionary of request headers.
+
+        :returns: A tuple of the HTTP status, a dictionary of the
+                  response headers, with lowercased names, and the
+                  decoded response body.
+        """
+
+        parsed = parse.urlparse(url)
+        key = (parsed.scheme, parsed.netloc)
+        path = parsed.path or '/'
+        if parsed.query:
+            path = '%s?%s' % (path, parsed.query)
+
+        while True:
+            conn, reused = self._acquire(key)
+            try:
+                conn.request(verb, path, body, headers)
+                response = conn.getresponse()
+            except (http_client.HTTPException, IOError) as exc:
+                conn.close()
+                if reused and _stale(exc):
+                    continue
+                raise
+            break
+
+        # Once the response has begun, a failure is not retried
+        try:
+            content = response.read()
+        except (http_client.HTTPException, IOError):
+            conn.close()
+            raise
+
+        response_headers = dict((name.lower(), value)
+                                for name, value in response.getheaders())
+        if response.will_close:
+            conn.close()
+        else:
+            self._release(key, conn)
+
+        if response_headers.get('content-encoding') == 'gzip':
+            content = zlib.decompress(content, 16 + zlib.MAX_WBITS)
+
+        data = None
+        if content:
+            try:
+                data = json.loads(content.decode('utf-8'))
+            except ValueError:
+                data = content.decode('utf-8', 'replace')
+
+        return response.status, response_headers, data
+
+    def _acquire(self, key):
+        """
+        Take an idle connection from the pool, or open a new one.
+
+        :param key: A tuple of the URL scheme and host.
+
+        :returns: A tuple of the connection and a flag indicating
+                  whether it was taken from the pool.
+        """
+
+        with self._lock:
+            idle = self._pool.get(key)
+            conn = idle.pop() if idle else None
+
+        timeout = self._timeout()
+        if conn is None:
+            scheme, host = key
+            if scheme == 'https':
+                conn = http_client.HTTPSConnection(host, timeout=timeout)
+            else:
+                conn = http_client.HTTPConnection(host, timeout=timeout)
+            return conn, False
+
+        # The timeout may have changed since the connection was opened
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+
+        return conn, True
+
+    def _release(self, key, conn):
+        """
+        Return a connection to the pool, or close it if the pool is
+        full.
+
+        :param key: A tuple of the URL scheme and host.
+        :param conn: The connection.
+        """
+
+        with self._lock:
+            idle = self._pool.setdefault(key, [])
+            if len(idle) < self.pool_size:
+                idle.append(conn)
+                return
+
+        conn.close()
+
+    def close(self):
+        """
+        Close all idle connections.
+        """
+
+        with self._lock:
+            pool, self._pool = self._pool, {}
+
+        for idle in pool.values():
+            for conn in idle:
+                conn.close()
+
+    def paginate(self, url, parameters=None):
+        """
+        Retrieve all the items of a list, following the "Link" header
+        from page to page.
+
+        :param url: The URL of the list.
+        :param parameters: An optional dictionary of query parameters.
+
+        :returns: An iterator over the items, as decoded from JSON.
+        """
+
+        parameters = dict(parameters or {}, per_page=PER_PAGE)
+        while url:
+            headers, data = self.requestJsonAndCheck('GET', url, parameters)
+            for item in data or []:
+                yield item
+
+            # The next URL carries the query parameters
+            url = parse_links(headers.get('link')).get('next')
+            parameters = None
+
+    def get_repo(self, full_name):
+        """
+        Look up a repository.  No request is made; a repository which
+        doesn't exist is reported when its pull requests are listed.
+
+        :param full_name: The full name of the repository.
+
+        :returns: A ``Repository`` object.
+        """
+
+        return Repository(self, full_name)
+
+    def get_organization(self, login):
+        """
+        Look up an organization.  No request is made.
+
+        :param login: The name of the organization.
+
+        :returns: An ``Owner`` object.
+        """
+
+        return Owner(self, '/orgs/%s' % login)
+
+    def get_user(self, login):
+        """
+        Look up a user.  No request is made.
+
+        :param login: The login name of the user.
+
+        :returns: An ``Owner`` object.
+        """
+
+        return Owner(self, '/users/%s' % login)
+
+    def get_repos(self, since=None):
+        """
+        List all repositories visible to the authenticated user, in
+        order of ID.
+
+        :param since: If provided, only repositories with a higher ID
+                      are listed.
+
+        :returns: An iterator over ``Repository`` objects.
+        """
+
+        parameters = None if since is None else {'since': since}
+        for item in self.paginate('/repositories', parameters):
+            yield Repository(self, item['full_name'], item.get('id'),
+                             item.get('open_issues_count'))
+
+    def get_pull(self, full_name, number):
+        """
+        Look up a single pull request.
+
+        :param full_name: The full name of the repository.
+        :param number: The pull request number.
+
+        :returns: The pull request, as decoded from JSON.
+        """
+
+        _headers, data = self.requestJsonAndCheck(
+            'GET', '/repos/%s/pulls/%d' % (full_name, number))
+        return data
+
+    def user_name(self, login):
+        """
+        Look up the name of a user.  Names are cached, so each user is
+        looked up only once, even by several threads at once.
+
+        :param login: The login name of the user.
+
+        :returns: The name of the user, or ``None`` if the user hasn't
+                  set one.
+        """
+
+        with self._lock:
+            if login in self._names:
+                return self._names[login]
+            lookup = self._lookups.setdefault(login, threading.Lock())
+
+        # Another thread looking up the same user is waited for
+        with lookup:
+            with self._lock:
+                if login in self._names:
+                    return self._names[login]
+
+            _headers, data = self.requestJsonAndCheck('GET',
+                                                      '/users/%s' % login)
+            name = data.get('name')
+
+            with self._lock:
+                self._names[login] = name
+                self._lookups.pop(login, None)
+
+        return name
+
+
+class Owner(object):
+    """
+    A user or organization, as far as listing its repositories.
+    """
+
+    __slots__ = ('_client', '_url')
+
+    def __init__(self, client, url):
+        """
+        Initialize an ``Owner`` object.
+
+        :param client: The ``Client`` object.
+        :param url: The API URL of the user or organization.
+        """
+
+        self._client = client
+        self._url = url
+
+    def get_repos(self):
+        """
+        List the repositories of the user or organization.
+
+        :returns: An iterator over ``Repository`` objects.
+        """
+
+        for item in self._client.paginate('%s/repos' % self._url):
+            yield Repository(self._client, item['full_name'], item.get('id'),
+                             item.get('open_issues_count'))
+
+
+class Repository(object):
+    """
+    A repository, as far as listing its open pull requests.
+    """
+
+    __slots__ = ('_client', 'full_name', 'id', 'open_issues_count')
+
+    def __init__(self, client, full_name, repo_id=None,
+                 open_issues_count=None):
+        """
+        Initialize a ``Repository`` object.
+
+        :param client: The ``Client`` object.
+        :param full_name: The full name of the repository.
+        :param repo_id: The ID of the repository, if known.
+        :param open_issues_count: The number of open issues, including
+                                  pull requests, if known.
+        """
+
+        self._client = client
+        self.full_name = full_name
+        self.id = repo_id
+        self.open_issues_count = open_issues_count
+
+    def get_pulls(self, state=None, sort=None, direction=None):
+        """
+        List the pull requests in the repository.  The pages of the
+        list are requested as they're needed, so a caller which stops
+        early doesn't pay for the rest.
+
+        :param state: The state of the pull requests to list: "open",
+                      "closed", or "all".  Defaults to "open".
+        :param sort: The order to list the pull requests in, such as
+                     "created" or "updated".  Defaults to "created".
+        :param direction: The direction of the order, "asc" or
+                          "desc".
+
+        :returns: An iterator over ``Pull`` objects.
+        """
+
+        parameters = dict((key, value) for key, value in
+                          (('state', state), ('sort', sort),
+                           ('direction', direction))
+                          if value is not None)
+        for item in self._client.paginate('/repos/%s/pulls' % self.full_name,
+                                          parameters or None):
+            yield Pull(self._client, self, item)
+
+    def get_pulls_page(self, parameters):
+        """
+        Retrieve a single page of the pull requests in the repository,
+        along with the links to the other pages.
+
+        :param parameters: A dictionary of query parameters, such as
+                           "sort", "per_page", and "page".
+
+        :returns: A tuple of a list of ``Pull`` objects and a
+                  dictionary mapping link relations, such as "next"
+                  and "last", to URLs.
+        """
+
+        headers, data = self._client.requestJsonAndCheck(
+            'GET', '/repos/%s/pulls' % self.full_name, parameters)
+        return ([Pull(self._client, self, item) for item in data or []],
+                parse_links(headers.get('link')))
+
+
+class User(object):
+    """
+    The author of a pull request.  The name is looked up when it's
+    first needed, through the client's cache of names.
+    """
+
+    __slots__ = ('_client', 'login')
+
+    def __init__(self, client, login):
+        """
+        Initialize a ``User`` object.
+
+        :param client: The ``Client`` object.
+        :param login: The login name of the user.
+        """
+
+        self._client = client
+        self.login = login
+
+    @property
+    def name(self):
+        """
+        The name of the user.
+        """
+
+        return self._client.user_name(self.login)
+
+
+class Pull(object):
+    """
+    A pull request, decoded from a list of pull requests.  It holds
+    the same data as a ``tugboat.records.PullRecord``; since Github
+    doesn't include the mergeability in lists, the pull request is
+    looked up when it's first needed.
+    """
+
+    __slots__ = ('_client', 'repo', 'number', 'html_url', 'head', 'base',
+                 'created_at', 'updated_at', 'user', '_mergeable',
+                 '_completed')
+
+    # The attributes a report may look up; see
+    # ``tugboat.templates.Template.unsupported()``
+    attributes = {
+        'repo': {'full_name': None, 'id': None, 'open_issues_count': None},
+        'number': None,
+        'html_url': None,
+        'head': {'label': None, 'sha': None},
+        'base': {'label': None, 'sha': None},
+        'created_at': None,
+        'updated_at': None,
+        'user': {'login': None, 'name': None},
+        'mergeable': None,
+    }
+
+    def __init__(self, client, repo, data):
+        """
+        Initialize a ``Pull`` object.
+
+        :param client: The ``Client`` object.
+        :param repo: The ``Repository`` object.
+        :param data: The pull request, as decoded from JSON.
+        """
+
+        self._client = client
+        self.repo = repo
+        self.number = data['number']
+        self.html_url = data.get('html_url')
+        self.created_at = parse_time(data.get('created_at'))
+        self.updated_at = parse_time(data.get('updated_at'))
+        self.user = User(client, (data.get('user') or {}).get('login'))
+        self._update(data)
+
+        self._mergeable = data.get('mergeable')
+        self._completed = 'mergeable' in data
+
+    def _update(self, data):
+        """
+        Update the head and base branches from the pull request data.
+
+        :param data: The pull request, as decoded from JSON.
+        """
+
+        head = data.get('head') or {}
+        base = data.get('base') or {}
+        self.head = records.Ref(label=head.get('label'), sha=head.get('sha'))
+        self.base = records.Ref(label=base.get('label'), sha=base.get('sha'))
+
+    @property
+    def mergeable(self):
+        """
+        Whether the pull request is mergeable.  Looking it up also
+        refreshes the head and base branches, so the answer matches
+        them.
+        """
+
+        if not self._completed:
+            data = self._client.get_pull(self.repo.full_name, self.number)
+            self._update(data)
+            self._mergeable = data.get('mergeable')
+            self._completed = True
+
+        return self._mergeable
@@ -0,0 +1,313 @@
+# Copyright 2014 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the
+#    License. You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing,
+#    software distributed under the License is distributed on an "AS
+#    IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+#    express or implied. See the License for the specific language
+#    governing permissions and limitations under the License.
+
+import random
+import threading
+import time
+
+try:
+    from urllib import parse
+except ImportError:  # pragma: no cover
+    import urlparse as parse
+
+from tugboat import stats as stats_mod
+
+
+# The default number of times a failed request is retried
+DEFAULT_RETRIES = 3
+
+# The default base delay between retries, in seconds; the delay
+# doubles with each retry, up to DEFAULT_MAX_BACKOFF
+DEFAULT_BACKOFF = 0.5
+DEFAULT_MAX_BACKOFF = 10.0
+
+# The default number of consecutive transient failures after which
+# the circuit breaker for a host opens, and the time, in seconds,
+# after which a trial request is let through
+DEFAULT_THRESHOLD = 5
+DEFAULT_RESET = 30.0
+
+
+class CircuitOpen(Exception):
+    """
+    Raised when a request is refused because the circuit breaker for
+    its host is open.
+    """
+
+    pass
+
+
+def transient(exc):
+    """
+    Determine whether a request failure is transient, and thus worth
+    retrying.  Server errors, that is, responses with a 5xx status,
+    and network errors, such as connection resets and timeouts, are
+    transient; other errors, such as a 404 response, are not.
+
+    :param exc: The exception raised by the request.
+
+    :returns: ``True`` if the failure is transient, ``False``
+              otherwise.
+    """
+
+    # PyGithub is expensive to import, so its exceptions are
+    # recognized by their status attribute
+    status = getattr(exc, 'status', None)
+    if isinstance(status, int):
+        return status >= 500
+
+    # Socket errors, as well as the connection errors and timeouts
+    # raised by requests, are all IOErrors
+    return isinstance(exc, (IOError, OSError))
+
+
+class Breaker(object):
+    """
+    A circuit breaker for a single host.  The breaker opens once the
+    host has failed a number of times in a row, after which requests
+    are refused.  Once the reset time has passed, a single trial
+    request is let through; if it succeeds, the breaker closes again,
+    and if it fails, the breaker stays open for another reset time.
+    """
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, reset=DEFAULT_RESET):
+        """
+        Initialize a ``Breaker`` object.
+
+        :param threshold: The number of consecutive failures after
+                          which the breaker opens.
+        :param reset: The time, in seconds, after which an open
+                      breaker lets a trial request through.
+        """
+
+        self.threshold = threshold
+        self.reset = reset
+        self.failures = 0
+
+        self._opened = None
+        self._trial = False
+
+    @property
+    def open(self):
+        """
+        ``True`` if the breaker is open.
+        """
+
+        return self._opened is not None
+
+    def allow(self):
+        """
+        Determine whether a request may be issued.
+
+        :returns: ``True`` if the request may be issued, ``False`` if
+                  it should be refused.
+        """
+
+        if self._opened is None:
+            return True
+        if self._trial or stats_mod.clock() - self._opened < self.reset:
+            return False
+
+        self._trial = True
+        return True
+
+    def success(self):
+        """
+        Record a successful request, closing the breaker.
+        """
+
+        self.failures = 0
+        self._opened = None
+        self._trial = False
+
+    def failure(self):
+        """
+        Record a failed request.
+
+        :returns: ``True`` if the failure tripped the breaker, that
+                  is, opened it, or failed the trial request of an
+                  open breaker.
+        """
+
+        self.failures += 1
+        if self._opened is not None or self.failures >= self.threshold:
+            self._opened = stats_mod.clock()
+            self._trial = False
+            return True
+
+        return False
+
+
+class Retry(object):
+    """
+    A middleware which retries requests that fail transiently, such
+    as with a 502 from a load balancer or a connection reset.  Only
+    GET requests, which are idempotent, are retried; the delay before
+    each retry grows exponentially, with full jitter, so that clients
+    which failed together don't retry together.  A circuit breaker
+    for each host fails requests fast once the host is clearly down,
+    rather than retrying every request against it.
+    """
+
+    def __init__(self, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF,
+                 max_backoff=DEFAULT_MAX_BACKOFF, threshold=DEFAULT_THRESHOLD,
+                 reset=DEFAULT_RESET, base_url=None, stats=None):
+        """
+        Initialize a ``Retry`` object.
+
+        :param retries: The maximum number of times a request is
+                        retried.
+        :param backoff: The base delay before a retry, in seconds.
+        :param max_backoff: The maximum delay before a retry, in
+                            seconds.
+        :param threshold: The number of consecutive transient failures
+                          after which the circuit breaker for a host
+                          opens.
+        :param reset: The time, in seconds, after which an open
+                      circuit breaker lets a trial request through.
+        :param base_url: The API URL requests with a relative URL
+                         are issued against.
+        :param stats: An optional ``tugboat.stats.Stats`` object to
+                      receive the "retries" and "breaker_trips"
+                      counters.
+        """
+
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.threshold = threshold
+        self.reset = reset
+        self.host = parse.urlparse(base_url).netloc if base_url else None
+        self.stats = stats
+
+        # The number of retries and breaker trips
+        self.retried = 0
+        self.trips = 0
+
+        # A dictionary mapping host names to ``Breaker`` objects
+        self.breakers = {}
+
+        self._lock = threading.Lock()
+
+    def __call__(self, call, verb, url, *args, **kwargs):
+        """
+        Issue a request, retrying it if it fails transiently.
+
+        :param call: The next handler in the chain.
+        :param verb: The HTTP verb of the request.
+        :param url: The URL of the request.
+
+        :returns: The result of the next handler.
+        """
+
+        return self._request(self.host, call, verb, url, *args, **kwargs)
+
+    def bind(self, base_url):
+        """
+        Construct a middleware retrying the requests of another
+        client, such as that of a second Github host.  The retry
+        policy and counts are shared, but requests with a relative
+        URL are attributed to the given API URL's host.
+
+        :param base_url: The API URL the client's requests with a
+                         relative URL are issued against.
+
+        :returns: A middleware callable.
+        """
+
+        default_host = parse.urlparse(base_url).netloc
+
+        def middleware(call, verb, url, *args, **kwargs):
+            return self._request(default_host, call, verb, url, *args,
+                                 **kwargs)
+
+        return middleware
+
+    def _request(self, default_host, call, verb, url, *args, **kwargs):
+        """
+        Issue a request, retrying it if it fails transiently.
+
+        :param default_host: The host requests with a relative URL
+                             are issued against.
+        :param call: The next handler in the chain.
+        :param verb: The HTTP verb of the request.
+        :param url: The URL of the request.
+
+        :returns: The result of the next handler.
+        """
+
+        host = parse.urlparse(url).netloc or default_host
+        with self._lock:
+            breaker = self.breakers.get(host)
+            if breaker is None:
+                breaker = Breaker(self.threshold, self.reset)
+                self.breakers[host] = breaker
+
+        attempt = 0
+        while True:
+            with self._lock:
+                allowed = breaker.allow()
+            if not allowed:
+                raise CircuitOpen('Circuit breaker open for "%s" after %d '
+                                  'consecutive failures' %
+                                  (host, breaker.failures))
+
+            try:
+                result = call(verb, url, *args, **kwargs)
+            except Exception as exc:
+                if not transient(exc):
+                    raise
+
+                with self._lock:
+                    tripped = breaker.failure()
+                if tripped:
+                    self._count('trips', 'breaker_trips')
+                if tripped or verb != 'GET' or attempt >= self.retries:
+                    raise
+
+                attempt += 1
+                self._count('retried', 'retries')
+                time.sleep(self.delay(attempt))
+                continue
+
+            with self._lock:
+                breaker.success()
+            return result
+
+    def delay(self, attempt):
+        """
+        Compute the delay before a retry.  The delay is chosen at
+        random, up to a limit which doubles with each attempt.
+
+        :param attempt: The number of the retry, starting from 1.
+
+        :returns: The delay, in seconds.
+        """
+
+        limit = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+        return random.uniform(0, limit)
+
+    def _count(self, attr, counter):
+        """
+        Increment a count, and the corresponding statistics counter.
+
+        :param attr: The name of the attribute holding the count.
+        :param counter: The name of the statistics counter.
+        """
+
+        with self._lock:
+            setattr(self, attr, getattr(self, attr) + 1)
+        if self.stats is not None:
+            self.stats.count(counter)
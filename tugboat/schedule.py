@@ -0,0 +1,351 @@
+# Copyright 2014 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the
+#    License. You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing,
+#    software distributed under the License is distributed on an "AS
+#    IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+#    express or implied. See the License for the specific language
+#    governing permissions and limitations under the License.
+
+import io
+import json
+import os
+import threading
+
+from tugboat import output
+from tugboat import stats as stats_mod
+
+
+# The version of the history file format
+VERSION = 1
+
+# The number of repositories fetched at once
+DEFAULT_JOBS = 1
+
+# The scheduling policies: fetch the repositories expected to take
+# longest first, or in the order they were listed
+POLICIES = ('largest', 'listed')
+
+
+class History(object):
+    """
+    The number of open pull requests in each repository, and the time
+    it took to fetch them, as of the last run which fetched it.  This
+    is the best guide to how long fetching the repository will take
+    next time.
+    """
+
+    def __init__(self):
+        """
+        Initialize a ``History`` object.
+        """
+
+        # A dictionary mapping repository names to tuples of the
+        # number of pull requests and the fetch time, in seconds
+        self.repos = {}
+
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        """
+        Look up the history of a repository.
+
+        :param name: The full name of the repository.
+
+        :returns: A tuple of the number of pull requests and the time
+                  it took to fetch them, or ``None`` if the
+                  repository hasn't been fetched before.
+        """
+
+        with self._lock:
+            return self.repos.get(name)
+
+    def add(self, name, pulls, elapsed):
+        """
+        Record the fetch of a repository.
+
+        :param name: The full name of the repository.
+        :param pulls: The number of pull requests fetched.
+        :param elapsed: The time the fetch took, in seconds.
+        """
+
+        with self._lock:
+            self.repos[name] = (pulls, elapsed)
+
+    def rate(self):
+        """
+        Estimate the time it takes to fetch a pull request, from the
+        repositories fetched before.  Every repository costs at least
+        one request, so it's counted as one more pull request.
+
+        :returns: The estimated time per pull request, in seconds, or
+                  ``None`` if no repository has been fetched before.
+        """
+
+        with self._lock:
+            if not self.repos:
+                return None
+            pulls = sum(count + 1 for count, _elapsed in self.repos.values())
+            elapsed = sum(elapsed for _count, elapsed in self.repos.values())
+
+        return elapsed / pulls
+
+    def to_dict(self):
+        """
+        Serialize the history.
+
+        :returns: A dictionary suitable for serializing as JSON.
+        """
+
+        with self._lock:
+            return {
+                'version': VERSION,
+                'repos': dict((name, {'pulls': pulls, 'time': elapsed})
+                              for name, (pulls, elapsed)
+                              in self.repos.items()),
+            }
+
+    def write(self, path):
+        """
+        Atomically write the history to a file.
+
+        :param path: The name of the file to write.
+        """
+
+        output.atomic_write(path, u'%s\n' % json.dumps(
+            self.to_dict(), sort_keys=True, separators=(',', ':')))
+
+
+def load(path):
+    """
+    Load the fetch history from a file.  If the file doesn't exist
+    yet, the history starts out empty.
+
+    :param path: The name of the file to read.
+
+    :returns: A ``History`` object.
+    """
+
+    history = History()
+    if not os.path.exists(path):
+        return history
+
+    with io.open(path, encoding='utf-8') as f:
+        data = json.load(f)
+
+    if data.get('version') != VERSION:
+        raise ValueError('Unsupported history version %r in "%s"' %
+                         (data.get('version'), path))
+
+    for name, entry in data.get('repos', {}).items():
+        history.add(name, entry['pulls'], entry['time'])
+
+    return history
+
+
+class Scheduler(object):
+    """
+    Fetch the repositories of a target several at a time.  With any
+    parallelism, the time the fetch takes as a whole is set by the
+    repository which finishes last; a large repository started last
+    leaves the other workers idle while it's fetched.  The "largest"
+    policy therefore starts the repositories expected to take longest
+    first.  The expected cost of a repository is the time it took to
+    fetch on the last run, if it's in the history; otherwise, it's
+    estimated from its count of open issues, which includes its pull
+    requests, at the time per pull request of the repositories in the
+    history.
+
+    Most of the requests a report makes are for the mergeability and
+    author of each pull request, which are otherwise looked up one at
+    a time as the report is rendered; the attributes named by
+    ``lookups`` are instead looked up by the worker fetching each
+    repository, so those requests are made in parallel, and counted in
+    the time the repository takes.
+    """
+
+    def __init__(self, jobs=DEFAULT_JOBS, policy='largest', history=None,
+                 stats=None, progress=None, lookups=None):
+        """
+        Initialize a ``Scheduler`` object.
+
+        :param jobs: The number of repositories to fetch at once.
+        :param policy: The scheduling policy; one of ``POLICIES``.
+        :param history: An optional ``History`` object, consulted for
+                        the expected cost of each repository and
+                        updated as each is fetched.
+        :param stats: An optional ``tugboat.stats.Stats`` object to
+                      receive the schedule.
+        :param progress: An optional ``tugboat.progress.Progress``
+                         object to receive the schedule.
+        :param lookups: A sequence of the names of the attributes of
+                        each pull request to look up as its repository
+                        is fetched, such as "mergeable" or
+                        "user.name".
+        """
+
+        if policy not in POLICIES:
+            raise ValueError('Unknown scheduling policy "%s"' % policy)
+
+        self.jobs = jobs
+        self.policy = policy
+        self.history = history
+        self.stats = stats
+        self.progress = progress
+        self.lookups = tuple(lookups or ())
+
+        # The expected cost of each repository scheduled, by name
+        self._costs = {}
+        self._start = None
+        self._lock = threading.Lock()
+
+    def cost(self, repo, rate=None):
+        """
+        Estimate the time it will take to fetch a repository.
+
+        :param repo: The repository.
+        :param rate: The estimated time per pull request; see
+                     ``History.rate()``.  Defaults to 1.0, in which
+                     case the cost is only good for comparing
+                     repositories.
+
+        :returns: The expected cost.
+        """
+
+        entry = None
+        if self.history is not None:
+            entry = self.history.get(repo.full_name)
+        if entry is not None:
+            return entry[1]
+
+        pulls = getattr(repo, 'open_issues_count', None) or 0
+        return (pulls + 1) * (rate or 1.0)
+
+    def order(self, repos):
+        """
+        Order a list of repositories according to the policy.
+
+        :param repos: A list of repositories.
+
+        :returns: A list of the repositories, in the order they
+                  should be fetched.  Repositories with the same
+                  expected cost are kept in the order given.
+        """
+
+        rate = None
+        if self.history is not None:
+            rate = self.history.rate()
+
+        costs = [(self.cost(repo, rate), repo) for repo in repos]
+        with self._lock:
+            for cost, repo in costs:
+                self._costs[repo.full_name] = cost
+
+        if self.policy == 'largest':
+            costs.sort(key=lambda x: x[0], reverse=True)
+
+        if self.progress is not None and costs:
+            self.progress.emit('schedule', policy=self.policy,
+                               order=[repo.full_name for _c, repo in costs],
+                               costs=[cost for cost, _r in costs])
+
+        return [repo for _cost, repo in costs]
+
+    def run(self, repos, func):
+        """
+        Call a function for each of a sequence of repositories, up to
+        ``jobs`` at a time, in the order they're produced.  If any of
+        the calls raises an exception, no further calls are started,
+        and the exception is re-raised once those in progress have
+        finished.
+
+        :param repos: A sequence of repositories; this may be an
+                      iterator, which is consumed as workers become
+                      free.
+        :param func: The function to call.  It is passed the index of
+                     the repository in the sequence and the repository.
+
+        :returns: A list of the results of the calls, in the order of
+                  the repositories.
+        """
+
+        if self._start is None:
+            self._start = stats_mod.clock()
+
+        items = enumerate(repos)
+        results = {}
+        errors = []
+        lock = threading.Lock()
+
+        def work():
+            while True:
+                with lock:
+                    if errors:
+                        return
+                    try:
+                        idx, repo = next(items)
+                    except StopIteration:
+                        return
+
+                try:
+                    result = func(idx, repo)
+                except Exception as exc:
+                    with lock:
+                        errors.append(exc)
+                    return
+
+                with lock:
+                    results[idx] = result
+
+        if self.jobs <= 1:
+            work()
+        else:
+            threads = [threading.Thread(target=work)
+                       for _i in range(self.jobs)]
+            for thread in threads:
+                thread.daemon = True
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        if errors:
+            raise errors[0]
+
+        return [results[idx] for idx in sorted(results)]
+
+    def fetch(self, name, func, *args, **kwargs):
+        """
+        Fetch a repository, recording how long it took in the history
+        and the statistics.
+
+        :param name: The full name of the repository.
+        :param func: A function to call to fetch the repository.  It
+                     returns a list of pull requests, or ``None`` if
+                     the repository wasn't fetched.
+        :param args: Positional arguments for ``func``.
+        :param kwargs: Keyword arguments for ``func``.
+
+        :returns: The result of ``func``.
+        """
+
+        start = stats_mod.clock()
+        result = func(*args, **kwargs)
+        elapsed = stats_mod.clock() - start
+        if result is None:
+            return None
+
+        if self.history is not None:
+            self.history.add(name, len(result), elapsed)
+        if self.stats is not None:
+            with self._lock:
+                cost = self._costs.get(name)
+                offset = start - (self._start or start)
+            self.stats.fetched(name, cost, offset, elapsed)
+
+        return result
@@ -0,0 +1,90 @@
+# Copyright 2014 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the
+#    License. You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing,
+#    software distributed under the License is distributed on an "AS
+#    IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+#    express or implied. See the License for the specific language
+#    governing permissions and limitations under the License.
+
+import argparse
+import zlib
+
+
+class Shard(object):
+    """
+    Identify a slice of the set of repositories.  Repositories are
+    assigned to shards by a hash of their full names, so independent
+    processes, on one host or several, each given a different shard
+    index and the same shard count, report on disjoint sets of
+    repositories which together cover every repository.  The
+    assignment only depends on the repository name, so it is stable
+    across runs, hosts, and Python versions.
+    """
+
+    @classmethod
+    def parse(cls, text):
+        """
+        Parse a shard specification.  This is suitable for use as the
+        ``type`` of an ``argparse`` argument.
+
+        :param text: The shard specification, "I/N", where "N" is the
+                     number of shards and "I" is the index of the
+                     shard, counting from 0.
+
+        :returns: A ``Shard`` object.
+        """
+
+        try:
+            index, count = [int(x) for x in text.split('/')]
+        except ValueError:
+            raise argparse.ArgumentTypeError(
+                'invalid shard "%s"; expected "I/N"' % text)
+
+        if count < 1 or not 0 <= index < count:
+            raise argparse.ArgumentTypeError(
+                'invalid shard "%s"; the index must be at least 0 and less '
+                'than the number of shards' % text)
+
+        return cls(index, count)
+
+    def __init__(self, index, count):
+        """
+        Initialize a ``Shard`` object.
+
+        :param index: The index of the shard, counting from 0.
+        :param count: The total number of shards.
+        """
+
+        self.index = index
+        self.count = count
+
+    def __contains__(self, repo_name):
+        """
+        Determine whether a repository belongs to the shard.
+
+        :param repo_name: The full name of the repository.  Github
+                          repository names are not case sensitive, and
+                          neither is the shard assignment.
+
+        :returns: ``True`` if the repository belongs to the shard,
+                  ``False`` otherwise.
+        """
+
+        digest = zlib.crc32(repo_name.lower().encode('utf-8')) & 0xffffffff
+        return digest % self.count == self.index
+
+    def __str__(self):
+        """
+        Return the shard specification.
+
+        :returns: The shard specification, "I/N".
+        """
+
+        return '%d/%d' % (self.index, self.count)
@@ -0,0 +1,494 @@
+# Copyright 2014 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the
+#    License. You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing,
+#    software distributed under the License is distributed on an "AS
+#    IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+#    express or implied. See the License for the specific language
+#    governing permissions and limitations under the License.
+
+import json
+import threading
+import time
+
+try:
+    from urllib import parse
+except ImportError:  # pragma: no cover
+    import urlparse as parse
+
+from tugboat import stats as stats_mod
+
+
+# The version of the cache database schema
+VERSION = 1
+
+# The kinds of objects cached, and the default time, in seconds, for
+# which each is served from the cache: repositories rarely change,
+# and user names even more rarely, but pull requests change all the
+# time, so they're only shared between runs at about the same time
+DEFAULT_TTLS = {
+    'repos': 60 * 60,
+    'users': 24 * 60 * 60,
+    'pulls': 5 * 60,
+}
+
+# The default size, in bytes, beyond which the least recently used
+# entries are evicted: 256 MiB
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+# The time, in seconds, to wait for another process to release its
+# lock on the database
+TIMEOUT = 30.0
+
+# The time, in seconds, for which the use of cache entries is noted in
+# memory before it's written to the database, so each hit doesn't
+# take the write lock
+TOUCH_INTERVAL = 30.0
+
+# The kind of object returned by each cached endpoint
+_kinds = {
+    'GET /repositories': 'repos',
+    'GET /orgs/:/repos': 'repos',
+    'GET /users/:/repos': 'repos',
+    'GET /repos/:/:': 'repos',
+    'GET /users/:': 'users',
+    'GET /repos/:/:/pulls': 'pulls',
+    'GET /repos/:/:/pulls/:': 'pulls',
+}
+
+_schema = [
+    'CREATE TABLE IF NOT EXISTS meta ('
+    'name TEXT PRIMARY KEY, value INTEGER)',
+    'CREATE TABLE IF NOT EXISTS entries ('
+    'key TEXT PRIMARY KEY, kind TEXT, stored REAL, used REAL, '
+    'size INTEGER, hits INTEGER, headers TEXT, data TEXT)',
+    'CREATE INDEX IF NOT EXISTS entries_used ON entries (used)',
+]
+
+
+def kind(verb, url):
+    """
+    Determine the kind of object a request returns, if it's one which
+    is cached.
+
+    :param verb: The HTTP verb of the request.
+    :param url: The URL of the request.
+
+    :returns: One of the keys of ``DEFAULT_TTLS``, or ``None`` if the
+              request isn't cached.
+    """
+
+    return _kinds.get(stats_mod.endpoint(verb, url))
+
+
+def parse_ttl(text):
+    """
+    Parse a time to live given on the command line.
+
+    :param text: The text, of the form "KIND=SECONDS".
+
+    :returns: A tuple of the kind and the time to live, in seconds.
+    """
+
+    name, sep, value = text.partition('=')
+    if not sep or name not in DEFAULT_TTLS:
+        raise ValueError('Expected KIND=SECONDS, where KIND is one of %s' %
+                         ', '.join(sorted(DEFAULT_TTLS)))
+
+    return name, float(value)
+
+
+class SharedCache(object):
+    """
+    A middleware which caches repositories, users, and pull requests
+    in a SQLite database which any number of tugboat processes may
+    share, so runs which overlap need not each fetch the same
+    objects.  The database is used in write-ahead logging mode, so
+    readers don't block the writer, and SQLite's locking keeps the
+    processes from trampling one another.
+
+    Each kind of object is served from the cache for a time to live
+    of its own.  Each entry records when it was last used; once the
+    entries exceed the maximum size, the least recently used are
+    evicted.  The total size is kept in the "meta" table as entries
+    come and go, so it's never summed over the whole cache, and the
+    use of entries is written out in batches, so a hit doesn't take
+    the write lock.  Only successful ``GET`` requests are cached, and
+    a pull request whose mergeability Github is still computing is
+    not.
+
+    The cache is keyed by host and request, not by user, so it should
+    only be shared by runs which may see the same repositories.
+    """
+
+    def __init__(self, path, ttls=None, max_size=DEFAULT_MAX_SIZE,
+                 base_url=None, stats=None):
+        """
+        Initialize a ``SharedCache`` object, opening the database.
+
+        :param path: The name of the database file.  It's created if
+                     it doesn't exist.
+        :param ttls: An optional dictionary mapping kinds of objects
+                     to the time, in seconds, for which they're served
+                     from the cache, overriding ``DEFAULT_TTLS``.  A
+                     kind with a time to live of 0 isn't cached.
+        :param max_size: The size, in bytes, beyond which the least
+                         recently used entries are evicted.
+        :param base_url: The API URL requests with a relative URL are
+                         issued against.
+        :param stats: An optional ``tugboat.stats.Stats`` object to
+                      receive the cache hit rate, as the "shared"
+                      cache.
+        """
+
+        self.path = path
+        self.ttls = dict(DEFAULT_TTLS)
+        self.ttls.update(ttls or {})
+        self.max_size = max_size
+        self.host = parse.urlparse(base_url).netloc if base_url else None
+        self.stats = stats
+
+        # A dictionary mapping the keys of the entries used since the
+        # use was last written out to a list of the time of last use
+        # and the number of hits, and the time it was written out
+        self._touched = {}
+        self._flushed = time.time()
+
+        # The command line interface names this module's defaults, so
+        # sqlite3 isn't imported until a cache is actually opened
+        import sqlite3
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=TIMEOUT,
+                                   isolation_level=None,
+                                   check_same_thread=False)
+        try:
+            self._setup()
+        except Exception:
+            self._db.close()
+            raise
+
+    def _setup(self):
+        """
+        Set up the database, creating the tables if needed.
+        """
+
+        # Space freed by evictions is returned to the file system when
+        # the cache is pruned; this only takes effect on a new database
+        self._db.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        self._db.execute('PRAGMA journal_mode = WAL')
+        for statement in _schema:
+            self._db.execute(statement)
+        self._db.execute('INSERT OR IGNORE INTO meta VALUES (?, ?)',
+                         ('version', VERSION))
+
+        # The total size is summed once, for a cache created before it
+        # was kept
+        self._db.execute(
+            'INSERT OR IGNORE INTO meta SELECT ?, COALESCE(SUM(size), 0) '
+            'FROM entries', ('size',))
+
+        version = self._db.execute(
+            'SELECT value FROM meta WHERE name = ?', ('version',)).fetchone()
+        if version[0] != VERSION:
+            raise ValueError('Unsupported shared cache version %r in "%s"' %
+                             (version[0], self.path))
+
+    def __call__(self, call, verb, url, parameters=None, headers=None,
+                 input=None, **kwargs):
+        """
+        Serve a request from the cache, or issue it and cache the
+        response.
+
+        :param call: The next handler in the chain.
+        :param verb: The HTTP verb of the request.
+        :param url: The URL of the request.
+        :param parameters: An optional dictionary of query parameters.
+        :param headers: An optional dictionary of request headers.
+        :param input: An optional request body.
+
+        :returns: The result of the next handler, or a tuple of the
+                  cached response headers and body.
+        """
+
+        return self._request(self.host, call, verb, url, parameters,
+                             headers, input, **kwargs)
+
+    def bind(self, base_url):
+        """
+        Construct a middleware caching the requests of another client,
+        such as that of a second Github host.  The database is shared,
+        but requests with a relative URL are attributed to the given
+        API URL's host.
+
+        :param base_url: The API URL the client's requests with a
+                         relative URL are issued against.
+
+        :returns: A middleware callable.
+        """
+
+        default_host = parse.urlparse(base_url).netloc
+
+        def middleware(call, verb, url, *args, **kwargs):
+            return self._request(default_host, call, verb, url, *args,
+                                 **kwargs)
+
+        return middleware
+
+    def _request(self, default_host, call, verb, url, parameters=None,
+                 headers=None, input=None, **kwargs):
+        """
+        Serve a request from the cache, or issue it and cache the
+        response.
+
+        :param default_host: The host requests with a relative URL
+                             are issued against.
+        :param call: The next handler in the chain.
+        :param verb: The HTTP verb of the request.
+        :param url: The URL of the request.
+        :param parameters: An optional dictionary of query parameters.
+        :param headers: An optional dictionary of request headers.
+        :param input: An optional request body.
+
+        :returns: The result of the next handler, or a tuple of the
+                  cached response headers and body.
+        """
+
+        obj_kind = kind(verb, url)
+        if obj_kind is None or input is not None or not self.ttls[obj_kind]:
+            return call(verb, url, parameters, headers, input, **kwargs)
+
+        # This pulls in the REST client, which the command line
+        # interface doesn't need
+        from tugboat import replay
+
+        key = u'%s %s' % (parse.urlparse(url).netloc or default_host,
+                          replay.request_key(verb, url, parameters))
+        cached = self.get(key, obj_kind)
+        if self.stats is not None:
+            self.stats.cache('shared', cached is not None)
+        if cached is not None:
+            return cached
+
+        response_headers, data = call(verb, url, parameters, headers, input,
+                                      **kwargs)
+
+        # Github computes mergeability in the background; until it's
+        # done, the pull request is incomplete
+        if not (isinstance(data, dict) and 'mergeable' in data and
+                data['mergeable'] is None):
+            self.put(key, obj_kind, response_headers, data)
+
+        return response_headers, data
+
+    def get(self, key, obj_kind):
+        """
+        Look up a cache entry.
+
+        :param key: The key of the entry.
+        :param obj_kind: The kind of object cached under the key.
+
+        :returns: A tuple of the response headers and body, or
+                  ``None`` if the entry is missing or has expired.
+        """
+
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                'SELECT headers, data FROM entries '
+                'WHERE key = ? AND stored >= ?',
+                (key, now - self.ttls[obj_kind])).fetchone()
+            if row is None:
+                return None
+
+            touch = self._touched.setdefault(key, [now, 0])
+            touch[0] = now
+            touch[1] += 1
+            if now - self._flushed >= TOUCH_INTERVAL:
+                self._transaction(lambda: None)
+
+        return json.loads(row[0]), json.loads(row[1])
+
+    def put(self, key, obj_kind, headers, data):
+        """
+        Add an entry to the cache, evicting the least recently used
+        entries if the cache has grown too large.
+
+        :param key: The key of the entry.
+        :param obj_kind: The kind of object cached.
+        :param headers: The response headers.
+        :param data: The response body.
+        """
+
+        headers = json.dumps(dict(headers or {}), sort_keys=True,
+                             separators=(',', ':'))
+        data = json.dumps(data, sort_keys=True, separators=(',', ':'))
+        size = len(headers) + len(data)
+        now = time.time()
+
+        def store():
+            row = self._db.execute('SELECT size FROM entries WHERE key = ?',
+                                   (key,)).fetchone()
+            self._db.execute(
+                'INSERT OR REPLACE INTO entries '
+                'VALUES (?, ?, ?, ?, ?, 0, ?, ?)',
+                (key, obj_kind, now, now, size, headers, data))
+            self._grow(size - (row[0] if row else 0))
+            self._evict()
+
+        with self._lock:
+            self._transaction(store)
+
+    def _transaction(self, func):
+        """
+        Call a function within a write transaction, first writing out
+        the use of the entries used since it was last written.  The
+        caller must hold the lock.
+
+        :param func: The function to call.  It's passed no arguments.
+
+        :returns: The result of ``func``.
+        """
+
+        self._db.execute('BEGIN IMMEDIATE')
+        try:
+            if self._touched:
+                self._db.executemany(
+                    'UPDATE entries SET used = MAX(used, ?), '
+                    'hits = hits + ? WHERE key = ?',
+                    [(used, hits, key) for key, (used, hits)
+                     in self._touched.items()])
+            result = func()
+        except Exception:
+            self._db.execute('ROLLBACK')
+            raise
+        self._db.execute('COMMIT')
+
+        self._touched = {}
+        self._flushed = time.time()
+
+        return result
+
+    def _grow(self, delta):
+        """
+        Adjust the total size of the entries.  The caller must hold the
+        lock and have begun a transaction.
+
+        :param delta: The change in size, in bytes.
+        """
+
+        if delta:
+            self._db.execute('UPDATE meta SET value = value + ? '
+                             'WHERE name = ?', (delta, 'size'))
+
+    def _evict(self):
+        """
+        Evict the least recently used entries until the cache is no
+        larger than the maximum size.  The caller must hold the lock
+        and have begun a transaction.
+
+        :returns: A tuple of the number of entries evicted and their
+                  total size, in bytes.
+        """
+
+        total = self._db.execute('SELECT value FROM meta WHERE name = ?',
+                                 ('size',)).fetchone()[0]
+        excess = total - self.max_size
+        if excess <= 0:
+            return 0, 0
+
+        keys = []
+        freed = 0
+        for key, size in self._db.execute(
+                'SELECT key, size FROM entries ORDER BY used'):
+            if freed >= excess:
+                break
+            keys.append(key)
+            freed += size
+        self._db.executemany('DELETE FROM entries WHERE key = ?',
+                             [(key,) for key in keys])
+        self._grow(-freed)
+
+        return len(keys), freed
+
+    def prune(self):
+        """
+        Remove the expired entries from the cache, and evict the least
+        recently used entries if the cache is too large.
+
+        :returns: A tuple of the number of entries removed and their
+                  total size, in bytes.
+        """
+
+        now = time.time()
+
+        def expire():
+            removed = freed = 0
+            for obj_kind, ttl in sorted(self.ttls.items()):
+                count, size = self._db.execute(
+                    'SELECT COUNT(*), COALESCE(SUM(size), 0) '
+                    'FROM entries WHERE kind = ? AND stored < ?',
+                    (obj_kind, now - ttl)).fetchone()
+                self._db.execute(
+                    'DELETE FROM entries WHERE kind = ? AND stored < ?',
+                    (obj_kind, now - ttl))
+                removed += count
+                freed += size
+            self._grow(-freed)
+            count, size = self._evict()
+            return removed + count, freed + size
+
+        with self._lock:
+            result = self._transaction(expire)
+            self._db.execute('PRAGMA incremental_vacuum')
+
+        return result
+
+    def summary(self):
+        """
+        Summarize the contents of the cache.
+
+        :returns: A dictionary mapping each kind of object to a
+                  dictionary with the keys "entries", "expired",
+                  "size", and "hits".
+        """
+
+        now = time.time()
+        result = dict((obj_kind, {'entries': 0, 'expired': 0, 'size': 0,
+                                  'hits': 0})
+                      for obj_kind in self.ttls)
+        with self._lock:
+            if self._touched:
+                self._transaction(lambda: None)
+            rows = self._db.execute(
+                'SELECT kind, stored, size, hits FROM entries').fetchall()
+
+        for obj_kind, stored, size, hits in rows:
+            entry = result.setdefault(obj_kind, {
+                'entries': 0, 'expired': 0, 'size': 0, 'hits': 0,
+            })
+            entry['entries'] += 1
+            entry['size'] += size
+            entry['hits'] += hits
+            if stored < now - self.ttls.get(obj_kind, 0):
+                entry['expired'] += 1
+
+        return result
+
+    def close(self):
+        """
+        Close the database, first writing out the use of the entries.
+        """
+
+        with self._lock:
+            try:
+                if self._touched:
+                    self._transaction(lambda: None)
+            finally:
+                self._db.close()
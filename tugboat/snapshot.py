@@ -0,0 +1,224 @@
+# Copyright 2014 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the
+#    License. You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing,
+#    software distributed under the License is distributed on an "AS
+#    IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+#    express or implied. See the License for the specific language
+#    governing permissions and limitations under the License.
+
+import io
+import json
+
+from tugboat import output
+from tugboat import records
+
+
+# The version of the snapshot file format
+VERSION = 1
+
+
+class Snapshot(object):
+    """
+    The set of open pull requests seen by a run, as
+    ``tugboat.records.PullRecord`` objects.  A snapshot is saved at the
+    end of a run; a later run can then report only the differences
+    from it.
+    """
+
+    def __init__(self, generated=None):
+        """
+        Initialize a ``Snapshot`` object.
+
+        :param generated: The time the snapshot was generated, as a
+                          naive UTC ``datetime.datetime``.
+        """
+
+        self.generated = generated
+        self.pulls = {}
+
+    def __len__(self):
+        """
+        Return the number of pull requests in the snapshot.
+
+        :returns: The number of pull requests.
+        """
+
+        return len(self.pulls)
+
+    def __contains__(self, key):
+        """
+        Determine whether a pull request is in the snapshot.
+
+        :param key: The key of the pull request; see
+                    ``tugboat.records.PullRecord.key``.
+
+        :returns: ``True`` if the pull request is in the snapshot.
+        """
+
+        return key in self.pulls
+
+    def get(self, key):
+        """
+        Look up a pull request in the snapshot.
+
+        :param key: The key of the pull request; see
+                    ``tugboat.records.PullRecord.key``.
+
+        :returns: The ``tugboat.records.PullRecord`` object, or
+                  ``None`` if the pull request is not in the snapshot.
+        """
+
+        return self.pulls.get(key)
+
+    def add(self, record):
+        """
+        Add a pull request to the snapshot.
+
+        :param record: A ``tugboat.records.PullRecord`` object.
+        """
+
+        self.pulls[record.key] = record
+
+    def diff(self, current, incomplete=None):
+        """
+        Compare the current set of open pull requests to the snapshot.
+
+        :param current: A list of ``tugboat.records.PullRecord``
+                        objects for the currently open pull requests,
+                        in the order they should be reported.
+        :param incomplete: An optional function which is passed the
+                           full name of a repository, and returns
+                           ``True`` if its pull requests weren't
+                           fetched.  See ``Diff``.
+
+        :returns: A ``Diff`` object.
+        """
+
+        return Diff(self, current, incomplete)
+
+    def to_dict(self):
+        """
+        Serialize the snapshot.
+
+        :returns: A dictionary suitable for serializing as JSON.
+        """
+
+        return {
+            'version': VERSION,
+            'generated': records.format_time(self.generated),
+            'pulls': [self.pulls[key].to_dict()
+                      for key in sorted(self.pulls)],
+        }
+
+    def write(self, path):
+        """
+        Atomically write the snapshot to a file.
+
+        :param path: The name of the file to write.
+        """
+
+        output.atomic_write(path, u'%s\n' % json.dumps(
+            self.to_dict(), sort_keys=True, separators=(',', ':')))
+
+
+def load(path):
+    """
+    Load a snapshot from a file.
+
+    :param path: The name of the file to read.
+
+    :returns: A ``Snapshot`` object.
+    """
+
+    with io.open(path, encoding='utf-8') as f:
+        data = json.load(f)
+
+    if data.get('version') != VERSION:
+        raise ValueError('Unsupported snapshot version %r in "%s"' %
+                         (data.get('version'), path))
+
+    snap = Snapshot(records.parse_time(data.get('generated')))
+    for pull in data.get('pulls', []):
+        snap.add(records.PullRecord.from_dict(pull))
+
+    return snap
+
+
+class Diff(object):
+    """
+    The differences between a snapshot and the current set of open
+    pull requests.
+    """
+
+    def __init__(self, previous, current, incomplete=None):
+        """
+        Initialize a ``Diff`` object.
+
+        :param previous: The earlier ``Snapshot`` object.
+        :param current: A list of ``tugboat.records.PullRecord``
+                        objects for the currently open pull requests,
+                        in the order they should be reported.
+        :param incomplete: An optional function which is passed the
+                           full name of a repository, and returns
+                           ``True`` if its pull requests weren't
+                           fetched, such as when the deadline ran
+                           out.  Pull requests in such repositories
+                           aren't reported as closed.
+        """
+
+        self.previous = previous
+
+        # Pull requests which were opened since the snapshot
+        self.new = []
+
+        # Pull requests which were updated since the snapshot, or
+        # whose head or base moved
+        self.updated = []
+
+        # Pull requests whose mergeability changed; these are also
+        # included in ``updated`` if they were updated
+        self.flipped = []
+
+        # The number of pull requests with no changes
+        self.unchanged = 0
+
+        seen = set()
+        for record in current:
+            seen.add(record.key)
+            old = previous.get(record.key)
+            if old is None:
+                self.new.append(record)
+                continue
+
+            flipped = record.mergeable != old.mergeable
+            if flipped:
+                self.flipped.append(record)
+            if not record.same_as(old):
+                self.updated.append(record)
+            elif not flipped:
+                self.unchanged += 1
+
+        # Pull requests which were closed since the snapshot
+        self.closed = [previous.pulls[key]
+                       for key in sorted(previous.pulls)
+                       if key not in seen and not
+                       (incomplete and incomplete(key[0]))]
+
+    def __bool__(self):
+        """
+        Determine whether there are any differences.
+
+        :returns: ``True`` if there are differences, ``False``
+                  otherwise.
+        """
+
+        return bool(self.new or self.updated or self.flipped or
+                    self.closed)
+    __nonzero__ = __bool__
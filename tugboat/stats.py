@@ -0,0 +1,381 @@
+# Copyright 2014 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the
+#    License. You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing,
+#    software distributed under the License is distributed on an "AS
+#    IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+#    express or implied. See the License for the specific language
+#    governing permissions and limitations under the License.
+
+import threading
+import time
+
+try:
+    from urllib import parse
+except ImportError:  # pragma: no cover
+    import urlparse as parse
+
+
+# A monotonic clock, where available
+clock = getattr(time, 'monotonic', time.time)
+
+# The number of repository fetches listed when formatting the schedule
+SCHEDULE_LINES = 10
+
+# Path segments which are followed by a fixed number of variable
+# segments when normalizing a URL into an endpoint name
+_variable_segments = {
+    'repos': 2,
+    'users': 1,
+    'orgs': 1,
+    'pulls': 1,
+    'issues': 1,
+    'commits': 1,
+}
+
+
+def endpoint(verb, url):
+    """
+    Normalize a request into an endpoint name.  Variable path segments,
+    such as repository names and pull request numbers, are replaced
+    by placeholders, so that all requests for the same kind of
+    object are counted together.
+
+    :param verb: The HTTP verb of the request.
+    :param url: The URL of the request.  Query parameters are
+                ignored.
+
+    :returns: The endpoint name, e.g., "GET /repos/:/:/pulls/:".
+    """
+
+    parts = parse.urlparse(url).path.strip('/').split('/')
+
+    # Strip any API path prefix, as used by Github Enterprise
+    if parts[:2] == ['api', 'v3']:
+        parts = parts[2:]
+
+    result = []
+    skip = 0
+    for part in parts:
+        if skip:
+            result.append(':')
+            skip -= 1
+        else:
+            result.append(part)
+            skip = _variable_segments.get(part, 0)
+
+    return '%s /%s' % (verb, '/'.join(result))
+
+
+def percentile(samples, pct):
+    """
+    Compute a percentile of a sorted list of samples, using the
+    nearest-rank method.
+
+    :param samples: A sorted list of samples.
+    :param pct: The desired percentile, from 0 to 100.
+
+    :returns: The sample at the percentile, or ``None`` if
+              ``samples`` is empty.
+    """
+
+    if not samples:
+        return None
+
+    rank = max(int(-(-pct * len(samples) // 100)), 1)
+    return samples[rank - 1]
+
+
+class Stats(object):
+    """
+    Collect run statistics.  This keeps track of the wall time spent
+    in each phase of the run, the number and latency of requests to
+    each API endpoint, cache hit rates, arbitrary event counters, such
+    as retries, the schedule of repository fetches, and the number of
+    requests allowed in flight to each host over time.  A ``Stats``
+    object is a middleware; install it with
+    ``tugboat.requester.add_middleware()`` to collect request
+    statistics.
+
+    Objects appended to the ``listeners`` list are notified of phase
+    changes by calls to their ``phase_start()`` and ``phase_end()``
+    methods, which are passed the name of the phase.
+    """
+
+    def __init__(self):
+        """
+        Initialize a ``Stats`` object.
+        """
+
+        self.phases = []
+        self.phase_times = {}
+        self.requests = {}
+        self.errors = {}
+        self.caches = {}
+        self.counters = {}
+        self.fetches = []
+        self.limits = {}
+        self.listeners = []
+
+        self._current = None
+        self._phase_start = None
+        self._lock = threading.Lock()
+
+    def __call__(self, call, verb, url, *args, **kwargs):
+        """
+        Time a request and record the result.
+
+        :param call: The next handler in the chain.
+        :param verb: The HTTP verb of the request.
+        :param url: The URL of the request.
+
+        :returns: The result of the next handler.
+        """
+
+        name = endpoint(verb, url)
+        start = clock()
+        try:
+            return call(verb, url, *args, **kwargs)
+        except Exception:
+            with self._lock:
+                self.errors[name] = self.errors.get(name, 0) + 1
+            raise
+        finally:
+            elapsed = clock() - start
+            with self._lock:
+                self.requests.setdefault(name, []).append(elapsed)
+
+    def phase(self, name):
+        """
+        Enter a phase of the run, leaving the current phase, if any.
+        Time spent in a phase accumulates if the same phase is entered
+        several times.
+
+        :param name: The name of the phase.
+        """
+
+        self.stop()
+
+        if name not in self.phase_times:
+            self.phases.append(name)
+            self.phase_times[name] = 0.0
+        self._current = name
+        self._phase_start = clock()
+
+        for listener in self.listeners:
+            listener.phase_start(name)
+
+    def stop(self):
+        """
+        Leave the current phase, if any.
+        """
+
+        if self._current is not None:
+            self.phase_times[self._current] += clock() - self._phase_start
+
+            for listener in self.listeners:
+                listener.phase_end(self._current)
+
+            self._current = None
+            self._phase_start = None
+
+    def repo_callback(self, repo_callback):
+        """
+        Wrap a ``repo_callback`` so that the "fetch" phase is entered
+        once the repositories for a target have been enumerated.
+
+        :param repo_callback: The ``repo_callback`` to wrap, or
+                              ``None``.
+
+        :returns: A ``repo_callback`` callable.
+        """
+
+        def callback(idx, count, repo, pulls=None):
+            if pulls is None and self._current != 'fetch':
+                self.phase('fetch')
+            if repo_callback:
+                if pulls is None:
+                    repo_callback(idx, count, repo)
+                else:
+                    repo_callback(idx, count, repo, pulls)
+
+        return callback
+
+    def cache(self, name, hit):
+        """
+        Record a cache lookup.
+
+        :param name: The name of the cache.
+        :param hit: A boolean indicating whether the lookup was a
+                    hit.
+        """
+
+        with self._lock:
+            counts = self.caches.setdefault(name, [0, 0])
+            counts[0 if hit else 1] += 1
+
+    def count(self, name, value=1):
+        """
+        Increment an event counter.
+
+        :param name: The name of the counter.
+        :param value: The amount to increment the counter by.
+                      Defaults to 1.
+        """
+
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def fetched(self, name, cost, start, elapsed):
+        """
+        Record the fetch of a repository by a
+        ``tugboat.schedule.Scheduler``.
+
+        :param name: The full name of the repository.
+        :param cost: The expected cost of the repository, or ``None``
+                     if it wasn't estimated.
+        :param start: The time the fetch started, in seconds since
+                      the scheduler started.
+        :param elapsed: The time the fetch took, in seconds.
+        """
+
+        with self._lock:
+            self.fetches.append((start, name, cost, elapsed))
+
+    def concurrency(self, host, offset, limit):
+        """
+        Record a change in the number of requests allowed in flight
+        to a host by a ``tugboat.adaptive.Limiter``.
+
+        :param host: The name of the host.
+        :param offset: The time of the change, in seconds since the
+                       limiter was created.
+        :param limit: The number of requests allowed in flight from
+                      then on.
+        """
+
+        with self._lock:
+            self.limits.setdefault(host, []).append((offset, limit))
+
+    def to_dict(self):
+        """
+        Summarize the statistics as a dictionary suitable for
+        serializing as JSON.
+
+        :returns: A dictionary of statistics.
+        """
+
+        requests = {}
+        for name, samples in self.requests.items():
+            samples = sorted(samples)
+            requests[name] = {
+                'count': len(samples),
+                'errors': self.errors.get(name, 0),
+                'total': sum(samples),
+                'p50': percentile(samples, 50),
+                'p95': percentile(samples, 95),
+                'p99': percentile(samples, 99),
+            }
+
+        caches = {}
+        for name, (hits, misses) in self.caches.items():
+            caches[name] = {
+                'hits': hits,
+                'misses': misses,
+                'hit_rate': float(hits) / (hits + misses),
+            }
+
+        result = {
+            'phases': [{'name': name, 'time': self.phase_times[name]}
+                       for name in self.phases],
+            'requests': requests,
+            'total_requests': sum(len(s) for s in self.requests.values()),
+            'caches': caches,
+            'counters': dict(self.counters),
+        }
+
+        # The repositories are listed in the order they were started,
+        # and the makespan is the time until the last one finished
+        if self.fetches:
+            fetches = sorted(self.fetches, key=lambda x: x[0])
+            result['schedule'] = {
+                'makespan': max(start + elapsed
+                                for start, _n, _c, elapsed in fetches),
+                'repos': [{'repo': name, 'cost': cost, 'start': start,
+                           'time': elapsed}
+                          for start, name, cost, elapsed in fetches],
+            }
+
+        # The concurrency chosen for each host over time
+        if self.limits:
+            result['concurrency'] = dict(
+                (host, {
+                    'final': changes[-1][1],
+                    'min': min(limit for _o, limit in changes),
+                    'max': max(limit for _o, limit in changes),
+                    'changes': [[offset, limit]
+                                for offset, limit in changes],
+                })
+                for host, changes in self.limits.items()
+            )
+
+        return result
+
+    def format(self):
+        """
+        Format the statistics for human consumption.
+
+        :returns: A list of lines.
+        """
+
+        data = self.to_dict()
+
+        lines = [u'Run statistics:', u'    Phases:']
+        for phase in data['phases']:
+            lines.append(u'        %s: %.3fs' % (phase['name'],
+                                                 phase['time']))
+
+        lines.append(u'    Requests: %d' % data['total_requests'])
+        for name, req in sorted(data['requests'].items()):
+            lines.append(u'        %s: %d (%d errors), %.3fs total, '
+                         u'p50 %.3fs, p95 %.3fs, p99 %.3fs' %
+                         (name, req['count'], req['errors'], req['total'],
+                          req['p50'], req['p95'], req['p99']))
+
+        if data['caches']:
+            lines.append(u'    Caches:')
+            for name, cache in sorted(data['caches'].items()):
+                lines.append(u'        %s: %d hits, %d misses (%.1f%%)' %
+                             (name, cache['hits'], cache['misses'],
+                              cache['hit_rate'] * 100))
+
+        if data['counters']:
+            lines.append(u'    Counters:')
+            for name, value in sorted(data['counters'].items()):
+                lines.append(u'        %s: %d' % (name, value))
+
+        if 'schedule' in data:
+            schedule = data['schedule']
+            lines.append(u'    Schedule: %d repositories, makespan %.3fs' %
+                         (len(schedule['repos']), schedule['makespan']))
+            for fetch in schedule['repos'][:SCHEDULE_LINES]:
+                lines.append(u'        %s: started %.3fs, took %.3fs' %
+                             (fetch['repo'], fetch['start'], fetch['time']))
+            if len(schedule['repos']) > SCHEDULE_LINES:
+                lines.append(u'        ... and %d more' %
+                             (len(schedule['repos']) - SCHEDULE_LINES))
+
+        if 'concurrency' in data:
+            lines.append(u'    Concurrency:')
+            for host, conc in sorted(data['concurrency'].items()):
+                lines.append(u'        %s: %d to %d, finally %d, %d changes' %
+                             (host, conc['min'], conc['max'], conc['final'],
+                              len(conc['changes']) - 1))
+
+        return lines
@@ -0,0 +1,214 @@
+# Copyright 2014 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the
+#    License. You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing,
+#    software distributed under the License is distributed on an "AS
+#    IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+#    express or implied. See the License for the specific language
+#    governing permissions and limitations under the License.
+
+import threading
+
+try:
+    from urllib import parse
+except ImportError:  # pragma: no cover
+    import urlparse as parse
+
+from tugboat import pulls
+from tugboat import rest
+
+
+# The number of pull requests requested per page; 100 is the most
+# Github will return
+PER_PAGE = rest.PER_PAGE
+
+
+def pulls_page(repo, parameters):
+    """
+    Retrieve a single page of the pull requests in a repository,
+    along with the links to the other pages.
+
+    :param repo: The repository.
+    :param parameters: A dictionary of query parameters, such as
+                       "sort", "direction", "per_page", and "page".
+
+    :returns: A tuple of a list of the pull requests on the page and
+              a dictionary mapping link relations, such as "next" and
+              "last", to URLs.
+    """
+
+    getter = getattr(repo, 'get_pulls_page', None)
+    if getter is not None:
+        return getter(parameters)
+
+    # PyGithub can't list a single page along with its links, so the
+    # request is made through the requester of the repository
+    import github
+
+    requester = repo._requester
+    headers, data = requester.requestJsonAndCheck(
+        'GET', '%s/pulls' % repo.url, parameters=parameters)
+    return ([github.PullRequest.PullRequest(requester, headers, item, False)
+             for item in data or []],
+            rest.parse_links(headers.get('link')))
+
+
+def _page_number(url):
+    """
+    Determine the page a page link refers to.
+
+    :param url: The URL of the page.
+
+    :returns: The page number.
+    """
+
+    query = dict(parse.parse_qsl(parse.urlparse(url).query))
+    return int(query.get('page', 1))
+
+
+class RepoCount(object):
+    """
+    The count of the open pull requests in a repository, as collected
+    by ``Summary``.  This stands in for ``tugboat.reports.RepoSummary``
+    in the repository breakdown of a report.  The mergeable pull
+    requests are only counted if the count is needed; that requires
+    every open pull request to be listed and looked up, so it's as
+    expensive as a full report on the repository.
+    """
+
+    def __init__(self, repo, pulls, oldest, merge_cache=None, listed=None):
+        """
+        Initialize a ``RepoCount`` object.
+
+        :param repo: The repository.
+        :param pulls: The number of open pull requests.
+        :param oldest: The creation time of the oldest open pull
+                       request.
+        :param merge_cache: An optional
+                            ``tugboat.mergecache.MergeCache`` object
+                            consulted for the mergeability of each
+                            pull request.
+        :param listed: An optional list of all the open pull
+                       requests, as ``tugboat.pulls.PullRequest``
+                       objects, if they were all listed already.
+        """
+
+        self.name = repo.full_name
+        self.pulls = pulls
+        self.oldest = oldest
+
+        self._repo = repo
+        self._merge_cache = merge_cache
+        self._listed = listed
+        self._mergeable = None
+
+    @property
+    def mergeable(self):
+        """
+        The number of mergeable pull requests.
+        """
+
+        if self._mergeable is None:
+            listed = self._listed
+            if listed is None:
+                listed = pulls.PullRequest._fetch(self._repo,
+                                                  self._merge_cache)
+            self._mergeable = sum(1 for pull in listed if pull.mergeable)
+
+        return self._mergeable
+
+
+class Summary(object):
+    """
+    Count the open pull requests in each repository, and find the
+    oldest and youngest, and the least and most recently updated, of
+    them, without fetching every pull request.  Github reports the
+    number of the last page of a list in the "Link" header of each
+    page, so a repository's pull requests are listed by creation time,
+    a full page at a time: if it all fits on the first page, that's
+    the only request made; otherwise, the last page gives the count
+    and the youngest pull request, and a one-item page in each
+    direction of update time gives the least and most recently
+    updated.  Each repository thus costs one request, or four, however
+    many pull requests it has, and no pull request or author is
+    looked up.
+    """
+
+    def __init__(self):
+        """
+        Initialize a ``Summary`` object.
+        """
+
+        # A dictionary mapping repository names to ``RepoCount``
+        # objects, for the repositories with open pull requests
+        self.repos = {}
+
+        self._lock = threading.Lock()
+
+    def fetch(self, repo, merge_cache=None):
+        """
+        Count the open pull requests in a repository.
+
+        :param repo: The repository.
+        :param merge_cache: An optional
+                            ``tugboat.mergecache.MergeCache`` object
+                            consulted for the mergeability of each
+                            pull request, should the mergeable pull
+                            requests be counted.
+
+        :returns: A list of ``tugboat.pulls.PullRequest`` objects for
+                  the oldest, youngest, least recently updated, and
+                  most recently updated pull requests, without
+                  duplicates, in order of number.
+        """
+
+        params = {'state': 'open', 'sort': 'created', 'direction': 'asc',
+                  'per_page': PER_PAGE}
+        first, links = pulls_page(repo, params)
+
+        complete = 'last' not in links
+        if complete:
+            total = len(first)
+            extremes = first
+        else:
+            last = _page_number(links['last'])
+            tail, _links = pulls_page(repo, dict(params, page=last))
+            total = (last - 1) * PER_PAGE + len(tail)
+            extremes = first[:1] + tail[-1:]
+            for direction in ('asc', 'desc'):
+                found, _links = pulls_page(repo, dict(
+                    params, sort='updated', direction=direction,
+                    per_page=1))
+                extremes.extend(found)
+
+        found = {}
+        for pr in extremes:
+            if pr.number not in found:
+                found[pr.number] = pulls.PullRequest(repo, pr, merge_cache)
+        result = [pull for _number, pull in sorted(found.items())]
+
+        # If every pull request was listed, counting the mergeable
+        # ones needn't list them again
+        if total:
+            count = RepoCount(repo, total,
+                              min(pull.created_at for pull in result),
+                              merge_cache, result if complete else None)
+            with self._lock:
+                self.repos[repo.full_name] = count
+
+        return result
+
+    @property
+    def total(self):
+        """
+        The number of open pull requests in all the repositories.
+        """
+
+        with self._lock:
+            return sum(count.pulls for count in self.repos.values())
@@ -0,0 +1,370 @@
+# Copyright 2014 Rackspace
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the
+#    License. You may obtain a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing,
+#    software distributed under the License is distributed on an "AS
+#    IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+#    express or implied. See the License for the specific language
+#    governing permissions and limitations under the License.
+
+import io
+import operator
+import os
+import re
+import string
+
+
+# The sections of a report, in the order they are emitted, and the
+# names of the fields available to each.  The "header" is emitted
+# once, before the pull requests; "pull" once for each pull request;
+# "breakdown" once, before the repository breakdown; "repo" once for
+# each repository; and "footer" once, at the end of the report.
+sections = {
+    'header': set(['total', 'mergeable', 'oldest', 'youngest',
+                   'least_recent', 'most_recent', 'start']),
+    'pull': set(['pull', 'mergeable', 'username', 'age', 'update']),
+    'breakdown': set(['repos']),
+    'repo': set(['repo']),
+    'footer': set(['elapsed', 'start', 'end']),
+}
+
+# The default template, which produces the traditional report
+default = {
+    'header': (
+        u'Open PRs: {total} ({mergeable} mergeable)\n'
+        u'    Oldest PR, from {oldest.created_at}: '
+        u'{oldest.repo.full_name}#{oldest.number}\n'
+        u'    Youngest PR, from {youngest.created_at}: '
+        u'{youngest.repo.full_name}#{youngest.number}\n'
+        u'    Least recently updated PR, at {least_recent.updated_at}: '
+        u'{least_recent.repo.full_name}#{least_recent.number}\n'
+        u'    Most recently updated PR, at {most_recent.updated_at}: '
+        u'{most_recent.repo.full_name}#{most_recent.number}'
+    ),
+    'pull': (
+        u'\n'
+        u'Pull request {pull.repo.full_name}#{pull.number}:\n'
+        u'    URL: {pull.html_url}\n'
+        u'    Merge {pull.head.label} -> {pull.base.label}\n'
+        u'    Proposed {pull.created_at}{age}\n'
+        u'    Proposed by {username} ({pull.user.login})\n'
+        u'    Last updated: {pull.updated_at}{update}\n'
+        u'    Mergeable: {mergeable}'
+    ),
+    'breakdown': (
+        u'\n'
+        u'Repositories with open pull requests: {repos}\n'
+        u'Breakdown by repository:'
+    ),
+    'repo': (
+        u'    Open PRs for {repo.name}: {repo.pulls} '
+        u'({repo.mergeable} mergeable)'
+    ),
+    'footer': (
+        u'\n'
+        u'Report generated in {elapsed} at {start}'
+    ),
+}
+
+# The default template of a summary-only report, which leaves out the
+# counts of mergeable pull requests, since they can't be had without
+# looking up every pull request
+summary = dict(default, header=(
+    u'Open PRs: {total}\n'
+    u'    Oldest PR, from {oldest.created_at}: '
+    u'{oldest.repo.full_name}#{oldest.number}\n'
+    u'    Youngest PR, from {youngest.created_at}: '
+    u'{youngest.repo.full_name}#{youngest.number}\n'
+    u'    Least recently updated PR, at {least_recent.updated_at}: '
+    u'{least_recent.repo.full_name}#{least_recent.number}\n'
+    u'    Most recently updated PR, at {most_recent.updated_at}: '
+    u'{most_recent.repo.full_name}#{most_recent.number}'
+), repo=(
+    u'    Open PRs for {repo.name}: {repo.pulls}'
+))
+
+# Matches a section marker line in a template file
+_marker_re = re.compile(r'^\[(\w+)\]\s*$')
+
+# Used to parse format strings and look up complex field names
+_formatter = string.Formatter()
+
+# The conversions allowed on a field
+_conversions = {
+    None: None,
+    's': lambda x: u'%s' % (x,),
+    'r': repr,
+}
+
+
+def _split_field(field_name):
+    """
+    Split a field name into its root name and the remainder.
+
+    :param field_name: The field name, e.g., "pull.user.login".
+
+    :returns: A tuple of the root name and the remainder, which will
+              begin with "." or "[", or be empty.
+    """
+
+    match = re.match(r'^([^.[]*)(.*)$', field_name)
+    return match.group(1), match.group(2)
+
+
+def _getter(field_name, root, rest):
+    """
+    Construct a function to look up the value of a field, given the
+    value of the root name.
+
+    :param field_name: The full field name.
+    :param root: The root name.
+    :param rest: The remainder of the field name.
+
+    :returns: A function taking the value of the root name and
+              returning the value of the field.
+    """
+
+    # Plain names and attribute chains are the common cases
+    if not rest:
+        return lambda x: x
+    if '[' not in rest:
+        return operator.attrgetter(rest[1:])
+
+    # Fall back to the full format string field lookup
+    return lambda x: _formatter.get_field(field_name, (), {root: x})[0]
+
+
+class Section(object):
+    """
+    A compiled template section.  The section text is parsed once, in
+    the same syntax as ``str.format()``; rendering then only looks up
+    the fields the section references, so expensive values which
+    aren't used, such as those requiring a request to the Github API,
+    are never computed.
+    """
+
+    def __init__(self, name, text):
+        """
+        Initialize a ``Section`` object.
+
+        :param name: The name of the section.  Must be one of the keys
+                     of ``sections``.
+        :param text: The text of the section.
+        """
+
+        self.name = name
+        self.text = text
+        self.names = set()
+        self.fields = set()
+        self.parts = []
+
+        try:
+            parsed = list(_formatter.parse(text))
+        except ValueError as exc:
+            raise ValueError('Invalid "%s" template: %s' % (name, exc))
+
+        for literal, field_name, spec, conversion in parsed:
+            if field_name is None:
+                self.parts.append((literal, None, None, None, None))
+                continue
+
+            root, rest = _split_field(field_name)
+            if root not in sections[name]:
+                raise ValueError(
+                    'Unknown field "%s" in "%s" template; available fields '
+                    'are: %s' % (field_name, name,
+                                 ', '.join(sorted(sections[name]))))
+            if '{' in spec:
+                raise ValueError(
+                    'Nested fields are not supported in "%s" template' % name)
+            if conversion not in _conversions:
+                raise ValueError(
+                    'Unknown conversion "!%s" in "%s" template' %
+                    (conversion, name))
+
+            self.names.add(root)
+            self.fields.add(field_name)
+            self.parts.append((literal, root,
+                               _getter(field_name, root, rest),
+                               _conversions[conversion], spec))
+
+    def render(self, values):
+        """
+        Render the section.
+
+        :param values: A dictionary mapping field names to functions
+                       of no arguments returning the field values.
+                       Only the functions for the names the section
+                       references are called, each at most once.
+
+        :returns: The rendered text.
+        """
+
+        cache = {}
+        result = []
+        for literal, root, getter, conversion, spec in self.parts:
+            result.append(literal)
+            if root is None:
+                continue
+
+            if root not in cache:
+                cache[root] = values[root]()
+            value = getter(cache[root])
+            if conversion:
+                value = conversion(value)
+            result.append(format(value, spec))
+
+        return u''.join(result)
+
+
+class Template(object):
+    """
+    A compiled report template.  Sections not provided by the template
+    fall back to the default template.
+    """
+
+    def __init__(self, texts=None, defaults=None):
+        """
+        Initialize a ``Template`` object.
+
+        :param texts: A dictionary mapping section names to the text
+                      of the section.
+        :param defaults: A dictionary mapping section names to the
+                         text of the sections not provided by
+                         ``texts``.  Defaults to ``default``.
+        """
+
+        texts = texts or {}
+        for name in texts:
+            if name not in sections:
+                raise ValueError(
+                    'Unknown template section "%s"; available sections '
+                    'are: %s' % (name, ', '.join(sorted(sections))))
+
+        defaults = defaults or default
+        self.sections = {}
+        for name in sections:
+            self.sections[name] = Section(name, texts.get(name,
+                                                          defaults[name]))
+
+    def uses(self, section, name):
+        """
+        Determine whether a section references a field.
+
+        :param section: The name of the section.
+        :param name: The name of the field, or a full field name,
+                     such as "repo.mergeable".
+
+        :returns: ``True`` if the field is referenced, ``False``
+                  otherwise.
+        """
+
+        compiled = self.sections[section]
+        return name in compiled.names or name in compiled.fields
+
+    def unsupported(self, section, root, attributes):
+        """
+        Find the fields of a section which look up attributes of the
+        value of a root name that the value doesn't provide.
+
+        :param section: The name of the section.
+        :param root: The root name, e.g., "pull".
+        :param attributes: A dictionary mapping the name of each
+                           attribute the value provides to ``None``,
+                           if any attribute of the attribute's value
+                           may be looked up, or to a dictionary of the
+                           same form describing the attribute's value.
+
+        :returns: A sorted list of the full names of the fields which
+                  aren't supported.
+        """
+
+        result = []
+        for field_name in self.sections[section].fields:
+            name, rest = _split_field(field_name)
+            if name != root:
+                continue
+
+            provided = attributes
+            for attr in rest.partition('[')[0].split('.')[1:]:
+                if provided is None:
+                    break
+                if attr not in provided:
+                    result.append(field_name)
+                    break
+                provided = provided[attr]
+
+        return sorted(result)
+
+    def render(self, section, values):
+        """
+        Render a section.  See ``Section.render()``.
+
+        :param section: The name of the section.
+        :param values: A dictionary mapping field names to functions
+                       of no arguments returning the field values.
+
+        :returns: The rendered text.
+        """
+
+        return self.sections[section].render(values)
+
+
+def parse(text):
+    """
+    Parse the text of a template file.  A template file consists of
+    sections, each introduced by a line containing the section name in
+    brackets, e.g., "[pull]", and running up to the next such line;
+    any text before the first such line belongs to the "pull"
+    section.  Since each section is emitted as a line, the newline
+    ending its last line is not part of the section.
+
+    :param text: The text of the template file.
+
+    :returns: A dictionary mapping section names to the text of the
+              section.
+    """
+
+    texts = {}
+    name = None
+    lines = []
+    for line in text.splitlines() + [None]:
+        match = _marker_re.match(line) if line is not None else None
+        if line is None or match:
+            # Text before the first section line is only a "pull"
+            # section if it isn't just blank lines
+            if name is not None or u''.join(lines).strip():
+                texts[name or 'pull'] = u'\n'.join(lines)
+            if match:
+                name = match.group(1)
+                lines = []
+        else:
+            lines.append(line)
+
+    return texts
+
+
+def load(template, defaults=None):
+    """
+    Load a template.
+
+    :param template: The name of a template file, or, if no such file
+                     exists, the text of the "pull" section.
+    :param defaults: A dictionary mapping section names to the text
+                     of the sections the template doesn't provide.
+                     Defaults to ``default``.
+
+    :returns: A ``Template`` object.
+    """
+
+    if os.path.isfile(template):
+        with io.open(template, encoding='utf-8') as f:
+            return Template(parse(f.read()), defaults)
+
+    return Template({'pull': template}, defaults)